@@ -1,50 +1,435 @@
 <?php
 /**
  * 曲げ見積り実績の一元管理API
- * GET: 実績一覧（JSON配列）を返す
- * POST: 実績一覧（JSON配列）を保存する
+ * 保存先は data/records.sqlite3（src/records_store.py と同じスキーマ）。1レコード1行・版（_version）付き。
+ * 旧形式の data/records.json があり DB が空なら、初回アクセス時に取り込む。
+ *
+ * GET                     実績一覧（JSON配列）を返す（従来どおり）。X-Records-Cursor に読んだ時点の変更番号を付ける
+ * GET ?limit=&cursor=&shape=&customer=&date_from=&date_to=
+ *                         日付の新しい順に1ページ分 {"records": [...], "next_cursor": ...}
+ * GET ?since=<cursor>&limit=
+ *                         差分。cursor より後に変わったレコードを変更順に {"changes": [...], "cursor": "...", "more": bool}
+ *                         削除は {"_id", "_version", "_deleted": true}。初回は since=0。more が true なら続けて取る。
+ *                         compact で消えた削除より前の cursor は 410（since=0 から取り直す）
+ * POST [?since=<X-Records-Cursor>]
+ *                         レコードの配列を全件として保存する（従来どおり）。内容が同じレコードは書かない。
+ *                         配列に無い _id は、変更番号が since 以下のもの（配列を取得した時点で見えていたもの）だけ論理削除する。
+ *                         取得後に他の端末が追加・更新したレコードは消さない。since が無ければ何も削除しない
+ *                         _version があれば保存済みの版と一致するときだけ書く（1件でも不一致なら何も書かずに 409）
+ * POST {"upserts": [...], "deletes": [{"_id", "_version"}]}
+ *                         差分の書き込み（1トランザクション）。_version は編集元の版（新規は 0、省略で上書き）。
+ *                         版が合わないものだけ書かずに {"applied": [...], "conflicts": [...], "cursor": "..."} で返す
+ * DELETE ?id=&version=    1件を論理削除する
+ *
+ * GET の応答には ETag（最後の変更番号とクエリから作る）を付け、If-None-Match が一致すれば 304。
+ * Accept-Encoding: gzip なら 1KB を超える応答を gzip で返す。POST 本文も Content-Encoding: gzip を受け付ける。
  */
 header('Content-Type: application/json; charset=utf-8');
 header('Access-Control-Allow-Origin: *');
-header('Access-Control-Allow-Methods: GET, POST, OPTIONS');
-header('Access-Control-Allow-Headers: Content-Type');
+header('Access-Control-Allow-Methods: GET, POST, DELETE, OPTIONS');
+header('Access-Control-Allow-Headers: Content-Type, Content-Encoding, If-None-Match');
+header('Access-Control-Expose-Headers: ETag, X-Records-Cursor');
 
 if ($_SERVER['REQUEST_METHOD'] === 'OPTIONS') {
   exit(0);
 }
 
 $dataDir = __DIR__ . '/../data';
-$file = $dataDir . '/records.json';
+$dbFile = $dataDir . '/records.sqlite3';
+$legacyFile = $dataDir . '/records.json';
+// 差分の1回の上限（src/records_store.py の MAX_CHANGES と同じ）
+$maxChanges = 5000;
 
-if ($_SERVER['REQUEST_METHOD'] === 'GET') {
-  if (!is_file($file)) {
-    echo '[]';
-    exit;
+class VersionConflict extends Exception {
+  public $rid;
+  public $current;
+  public function __construct($rid, $current) {
+    parent::__construct('Version conflict');
+    $this->rid = $rid;
+    $this->current = $current;
   }
-  $raw = file_get_contents($file);
-  $data = json_decode($raw, true);
-  echo json_encode(is_array($data) ? $data : []);
+}
+
+function fail($status, $message) {
+  http_response_code($status);
+  echo json_encode(['error' => $message], JSON_UNESCAPED_UNICODE);
   exit;
 }
 
-if ($_SERVER['REQUEST_METHOD'] === 'POST') {
+/** JSON を返す。クライアントが gzip を受け付け、1KB を超えるなら圧縮する。 */
+function send_json($payload, $status = 200) {
+  http_response_code($status);
+  $body = json_encode($payload, JSON_UNESCAPED_UNICODE);
+  header('Vary: Accept-Encoding');
+  $accept = $_SERVER['HTTP_ACCEPT_ENCODING'] ?? '';
+  if (strlen($body) > 1024 && function_exists('gzencode') && preg_match('/\bgzip\b/i', $accept)) {
+    header('Content-Encoding: gzip');
+    $body = gzencode($body, 6);
+  }
+  header('Content-Length: ' . strlen($body));
+  echo $body;
+  exit;
+}
+
+/** GET の ETag。変更のたびに seq が増えるので、最後の seq・物理削除の位置・クエリが同じなら応答も同じ。 */
+function check_etag($db) {
+  $head = head_seq($db);
+  header('X-Records-Cursor: ' . $head);
+  $etag = '"' . $head . '-' . purged_seq($db) . '-' . substr(md5($_SERVER['QUERY_STRING'] ?? ''), 0, 8) . '"';
+  header('ETag: ' . $etag);
+  $inm = $_SERVER['HTTP_IF_NONE_MATCH'] ?? '';
+  foreach (explode(',', $inm) as $tag) {
+    $tag = trim($tag);
+    if (strncmp($tag, 'W/', 2) === 0) {
+      $tag = substr($tag, 2);
+    }
+    if ($tag === $etag || $tag === '*') {
+      http_response_code(304);
+      exit;
+    }
+  }
+}
+
+/** 最後に振った seq。compact で最後の行が消えても番号を使い回さないよう、物理削除した位置も見る。 */
+function head_seq($db) {
+  $sql = "SELECT MAX(COALESCE((SELECT MAX(seq) FROM records), 0),
+    COALESCE((SELECT CAST(value AS INTEGER) FROM meta WHERE key = 'purged_seq'), 0))";
+  return (int)$db->query($sql)->fetchColumn();
+}
+
+function purged_seq($db) {
+  $v = $db->query("SELECT value FROM meta WHERE key = 'purged_seq'")->fetchColumn();
+  return $v === false ? 0 : (int)$v;
+}
+
+function read_body() {
   $body = file_get_contents('php://input');
-  $data = json_decode($body, true);
+  if (strtolower($_SERVER['HTTP_CONTENT_ENCODING'] ?? '') === 'gzip') {
+    $body = function_exists('gzdecode') ? @gzdecode($body) : false;
+    if ($body === false) {
+      fail(400, 'Invalid gzip body');
+    }
+  }
+  return $body;
+}
+
+function open_db($dbFile) {
+  $db = new PDO('sqlite:' . $dbFile);
+  $db->setAttribute(PDO::ATTR_ERRMODE, PDO::ERRMODE_EXCEPTION);
+  $db->setAttribute(PDO::ATTR_TIMEOUT, 30);
+  $db->exec('PRAGMA journal_mode=WAL');
+  $db->exec('PRAGMA synchronous=NORMAL');
+  $db->exec("CREATE TABLE IF NOT EXISTS records (
+    rid TEXT PRIMARY KEY, version INTEGER NOT NULL, seq INTEGER NOT NULL,
+    deleted INTEGER NOT NULL DEFAULT 0, date TEXT NOT NULL DEFAULT '', shape TEXT NOT NULL DEFAULT '',
+    customer TEXT NOT NULL DEFAULT '', updated_at TEXT NOT NULL, data TEXT NOT NULL)");
+  $db->exec('CREATE UNIQUE INDEX IF NOT EXISTS idx_records_seq ON records(seq)');
+  $db->exec('CREATE INDEX IF NOT EXISTS idx_records_date ON records(deleted, date, rid)');
+  $db->exec('CREATE INDEX IF NOT EXISTS idx_records_shape ON records(shape, deleted, date, rid)');
+  $db->exec('CREATE INDEX IF NOT EXISTS idx_records_customer ON records(customer, deleted, date, rid)');
+  $db->exec('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)');
+  return $db;
+}
+
+function decode_row($row) {
+  $rec = json_decode($row['data'], true);
+  $rec['_version'] = (int)$row['version'];
+  return $rec;
+}
+
+/** 現在の版と内容（削除済み・存在しなければ内容は null）。 */
+function current_record($db, $rid) {
+  $st = $db->prepare('SELECT data, version, deleted FROM records WHERE rid = ?');
+  $st->execute([$rid]);
+  $row = $st->fetch(PDO::FETCH_ASSOC);
+  if (!$row) {
+    return [0, null];
+  }
+  return [(int)$row['version'], (int)$row['deleted'] === 1 ? null : decode_row($row)];
+}
+
+/**
+ * 保存済みの data（JSON）と $rec が同じ内容か。== は "10" と 10 を同じとみなすので、
+ * 両方を同じフラグで JSON にし直して文字列で比べる（型が変わっただけでも別の内容）。
+ */
+function same_data($stored, $rec) {
+  return json_encode(json_decode($stored, true), JSON_UNESCAPED_UNICODE) === json_encode($rec, JSON_UNESCAPED_UNICODE);
+}
+
+/** 保存済み（削除されていない）の内容が $rec と同じならその版、違えば null。 */
+function unchanged_version($db, $rec) {
+  $st = $db->prepare('SELECT data, version, deleted FROM records WHERE rid = ?');
+  $st->execute([(string)$rec['_id']]);
+  $row = $st->fetch(PDO::FETCH_ASSOC);
+  if (!$row || (int)$row['deleted'] === 1) {
+    return null;
+  }
+  unset($rec['_version'], $rec['_deleted']);
+  return same_data($row['data'], $rec) ? (int)$row['version'] : null;
+}
+
+/** 1件を書く（トランザクション内で呼ぶ）。$checkVersion が true なら _version を照合する。内容が同じなら書かない。 */
+function put_record($db, $rec, $checkVersion) {
+  // _version が無い・null なら照合しない（records_store.py の None と同じ）
+  $expected = isset($rec['_version']) ? (int)$rec['_version'] : null;
+  unset($rec['_version'], $rec['_deleted']);
+  if (empty($rec['_id'])) {
+    $rec['_id'] = 'r_' . (int)(microtime(true) * 1000) . '_' . substr(bin2hex(random_bytes(2)), 0, 4);
+  }
+  $rid = (string)$rec['_id'];
+  $st = $db->prepare('SELECT data, version, deleted FROM records WHERE rid = ?');
+  $st->execute([$rid]);
+  $row = $st->fetch(PDO::FETCH_ASSOC);
+  $current = $row ? (int)$row['version'] : 0;
+  if ($checkVersion && $expected !== null && $expected !== $current) {
+    throw new VersionConflict($rid, $current);
+  }
+  // 内容が同じなら書かない（版・seq を上げると差分同期で変更として配られてしまう）
+  if ($row && (int)$row['deleted'] === 0 && same_data($row['data'], $rec)) {
+    return ['_id' => $rid, '_version' => $current];
+  }
+  $seq = head_seq($db) + 1;
+  $ins = $db->prepare('INSERT OR REPLACE INTO records (rid, version, seq, deleted, date, shape, customer, updated_at, data)
+    VALUES (?, ?, ?, 0, ?, ?, ?, ?, ?)');
+  $ins->execute([
+    $rid, $current + 1, $seq,
+    (string)($rec['date'] ?? ''), (string)($rec['shape'] ?? ''), (string)($rec['customer'] ?? ''),
+    date('Y-m-d\TH:i:s'), json_encode($rec, JSON_UNESCAPED_UNICODE),
+  ]);
+  return ['_id' => $rid, '_version' => $current + 1];
+}
+
+if (!is_dir($dataDir)) {
+  mkdir($dataDir, 0755, true);
+}
+try {
+  $db = open_db($dbFile);
+  // 旧 records.json からの移行（DB が空のときだけ）
+  if (is_file($legacyFile) && (int)$db->query('SELECT COUNT(*) FROM records')->fetchColumn() === 0) {
+    $legacy = json_decode(file_get_contents($legacyFile), true);
+    if (is_array($legacy) && count($legacy) > 0) {
+      $db->exec('BEGIN IMMEDIATE');
+      foreach ($legacy as $rec) {
+        if (is_array($rec)) {
+          put_record($db, $rec, false);
+        }
+      }
+      $db->exec('COMMIT');
+    }
+  }
+} catch (Exception $e) {
+  fail(500, 'Failed to open database');
+}
+
+if ($_SERVER['REQUEST_METHOD'] === 'GET') {
+  check_etag($db);
+  if (isset($_GET['since'])) {
+    $since = (int)$_GET['since'];
+    if ($since > 0 && $since < purged_seq($db)) {
+      send_json(['error' => 'Cursor expired', 'cursor' => '0'], 410);
+    }
+    $limit = max(1, min($maxChanges, (int)($_GET['limit'] ?? 1000)));
+    $st = $db->prepare('SELECT rid, version, deleted, seq, data FROM records WHERE seq > ? ORDER BY seq LIMIT ' . ($limit + 1));
+    $st->execute([$since]);
+    $rows = $st->fetchAll(PDO::FETCH_ASSOC);
+    $more = count($rows) > $limit;
+    $rows = array_slice($rows, 0, $limit);
+    $changes = [];
+    foreach ($rows as $row) {
+      if ((int)$row['deleted'] === 1) {
+        $changes[] = ['_id' => $row['rid'], '_version' => (int)$row['version'], '_deleted' => true];
+      } else {
+        $changes[] = decode_row($row);
+      }
+    }
+    $last = end($rows);
+    send_json(['changes' => $changes, 'cursor' => (string)($last ? $last['seq'] : $since), 'more' => $more]);
+  }
+  $paged = false;
+  foreach (['limit', 'cursor', 'shape', 'customer', 'date_from', 'date_to'] as $k) {
+    if (isset($_GET[$k])) {
+      $paged = true;
+    }
+  }
+  if (!$paged) {
+    $rows = $db->query('SELECT data, version FROM records WHERE deleted = 0 ORDER BY seq')->fetchAll(PDO::FETCH_ASSOC);
+    send_json(array_map('decode_row', $rows));
+  }
+  $where = ['deleted = 0'];
+  $args = [];
+  foreach (['shape' => 'shape = ?', 'customer' => 'customer = ?', 'date_from' => 'date >= ?', 'date_to' => 'date <= ?'] as $k => $cond) {
+    if (isset($_GET[$k])) {
+      $where[] = $cond;
+      $args[] = (string)$_GET[$k];
+    }
+  }
+  if (!empty($_GET['cursor'])) {
+    $parts = explode("\t", (string)$_GET['cursor'], 2);
+    $where[] = '(date, rid) < (?, ?)';
+    $args[] = $parts[0];
+    $args[] = $parts[1] ?? '';
+  }
+  $limit = max(1, min(1000, (int)($_GET['limit'] ?? 100)));
+  $st = $db->prepare('SELECT data, version, date, rid FROM records WHERE ' . implode(' AND ', $where)
+    . ' ORDER BY date DESC, rid DESC LIMIT ' . ($limit + 1));
+  $st->execute($args);
+  $rows = $st->fetchAll(PDO::FETCH_ASSOC);
+  $more = count($rows) > $limit;
+  $rows = array_slice($rows, 0, $limit);
+  $last = end($rows);
+  send_json([
+    'records' => array_map('decode_row', $rows),
+    'next_cursor' => ($more && $last) ? $last['date'] . "\t" . $last['rid'] : null,
+  ]);
+}
+
+if ($_SERVER['REQUEST_METHOD'] === 'POST') {
+  $data = json_decode(read_body(), true);
   if (!is_array($data)) {
-    http_response_code(400);
-    echo json_encode(['error' => 'Invalid JSON array']);
-    exit;
+    fail(400, 'Invalid JSON array');
+  }
+  // 差分の書き込み {"upserts": [...], "deletes": [...]}
+  if (array_key_exists('upserts', $data) || array_key_exists('deletes', $data)) {
+    $upserts = $data['upserts'] ?? [];
+    $deletes = $data['deletes'] ?? [];
+    if (!is_array($upserts) || !is_array($deletes)) {
+      fail(400, 'upserts and deletes must be arrays');
+    }
+    if (count($upserts) + count($deletes) > $maxChanges) {
+      fail(413, 'Too many changes');
+    }
+    $applied = [];
+    $conflicts = [];
+    try {
+      $db->exec('BEGIN IMMEDIATE');
+      foreach ($upserts as $rec) {
+        if (!is_array($rec)) {
+          throw new InvalidArgumentException('Invalid record');
+        }
+        try {
+          $applied[] = put_record($db, $rec, true);
+        } catch (VersionConflict $e) {
+          list($version, $current) = current_record($db, $e->rid);
+          $conflicts[] = ['_id' => $e->rid, 'op' => 'upsert', '_version' => $version, 'record' => $current];
+        }
+      }
+      foreach ($deletes as $d) {
+        $rid = is_array($d) ? (string)($d['_id'] ?? '') : '';
+        if ($rid === '') {
+          throw new InvalidArgumentException('Invalid delete');
+        }
+        $st = $db->prepare('SELECT version, deleted FROM records WHERE rid = ?');
+        $st->execute([$rid]);
+        $row = $st->fetch(PDO::FETCH_ASSOC);
+        if ($row && array_key_exists('_version', $d) && $d['_version'] !== null && (int)$d['_version'] !== (int)$row['version']) {
+          list($version, $current) = current_record($db, $rid);
+          $conflicts[] = ['_id' => $rid, 'op' => 'delete', '_version' => $version, 'record' => $current];
+          continue;
+        }
+        if (!$row || (int)$row['deleted'] === 1) {
+          $applied[] = ['_id' => $rid, '_version' => $row ? (int)$row['version'] : 0, '_deleted' => true];
+          continue;
+        }
+        $seq = head_seq($db) + 1;
+        $up = $db->prepare('UPDATE records SET version = version + 1, seq = ?, deleted = 1, updated_at = ? WHERE rid = ?');
+        $up->execute([$seq, date('Y-m-d\TH:i:s'), $rid]);
+        $applied[] = ['_id' => $rid, '_version' => (int)$row['version'] + 1, '_deleted' => true];
+      }
+      $db->exec('COMMIT');
+    } catch (InvalidArgumentException $e) {
+      $db->exec('ROLLBACK');
+      fail(400, $e->getMessage());
+    } catch (Exception $e) {
+      try {
+        $db->exec('ROLLBACK');
+      } catch (Exception $ignored) {
+      }
+      fail(500, 'Failed to write records');
+    }
+    $head = head_seq($db);
+    send_json(['ok' => true, 'applied' => $applied, 'conflicts' => $conflicts, 'cursor' => (string)$head]);
   }
-  if (!is_dir($dataDir)) {
-    mkdir($dataDir, 0755, true);
+  // 従来の配列は全件: 内容が同じレコードは書かず（版・seq はそのまま）、配列に無い _id は論理削除する
+  // （計算書の deleteRecord() は消したいレコードを除いた配列を送ってくる）。
+  // 消すのは since（配列を取得した時点の変更番号）までに変わったものだけ。それより後の追加・更新はクライアントが見ていない
+  $since = isset($_GET['since']) && $_GET['since'] !== '' ? $_GET['since'] : null;
+  if ($since !== null && !ctype_digit((string)$since)) {
+    fail(400, 'Invalid since');
   }
-  $ok = file_put_contents($file, json_encode($data, JSON_UNESCAPED_UNICODE | JSON_PRETTY_PRINT));
-  if ($ok === false) {
-    http_response_code(500);
-    echo json_encode(['error' => 'Failed to write file']);
+  $saved = [];
+  $keep = [];
+  $deleted = 0;
+  try {
+    $db->exec('BEGIN IMMEDIATE');
+    foreach ($data as $rec) {
+      if (!is_array($rec)) {
+        throw new InvalidArgumentException('Invalid record');
+      }
+      $version = empty($rec['_id']) ? null : unchanged_version($db, $rec);
+      $r = $version === null ? put_record($db, $rec, true) : ['_id' => (string)$rec['_id'], '_version' => $version];
+      $keep[$r['_id']] = true;
+      $saved[] = $r;
+    }
+    if ($since !== null) {
+      $up = $db->prepare('UPDATE records SET version = version + 1, seq = ?, deleted = 1, updated_at = ? WHERE rid = ?');
+      $st = $db->prepare('SELECT rid FROM records WHERE deleted = 0 AND seq <= ?');
+      $st->execute([(int)$since]);
+      foreach ($st->fetchAll(PDO::FETCH_COLUMN) as $rid) {
+        if (!isset($keep[$rid])) {
+          $up->execute([head_seq($db) + 1, date('Y-m-d\TH:i:s'), $rid]);
+          $deleted++;
+        }
+      }
+    }
+    $db->exec('COMMIT');
+  } catch (VersionConflict $e) {
+    $db->exec('ROLLBACK');
+    http_response_code(409);
+    echo json_encode(['error' => 'Version conflict', '_id' => $e->rid, '_version' => $e->current], JSON_UNESCAPED_UNICODE);
     exit;
+  } catch (InvalidArgumentException $e) {
+    $db->exec('ROLLBACK');
+    fail(400, 'Invalid record');
+  } catch (Exception $e) {
+    $db->exec('ROLLBACK');
+    fail(500, 'Failed to write records');
+  }
+  echo json_encode(['ok' => true, 'records' => $saved, 'deleted' => $deleted], JSON_UNESCAPED_UNICODE);
+  exit;
+}
+
+if ($_SERVER['REQUEST_METHOD'] === 'DELETE') {
+  $rid = (string)($_GET['id'] ?? '');
+  if ($rid === '') {
+    fail(400, 'id is required');
+  }
+  try {
+    $db->exec('BEGIN IMMEDIATE');
+    $st = $db->prepare('SELECT version, deleted FROM records WHERE rid = ?');
+    $st->execute([$rid]);
+    $row = $st->fetch(PDO::FETCH_ASSOC);
+    if (!$row || (int)$row['deleted'] === 1) {
+      $db->exec('ROLLBACK');
+      fail(404, 'Not found');
+    }
+    if (isset($_GET['version']) && (int)$_GET['version'] !== (int)$row['version']) {
+      $db->exec('ROLLBACK');
+      http_response_code(409);
+      echo json_encode(['error' => 'Version conflict', '_id' => $rid, '_version' => (int)$row['version']], JSON_UNESCAPED_UNICODE);
+      exit;
+    }
+    $seq = head_seq($db) + 1;
+    $up = $db->prepare('UPDATE records SET version = version + 1, seq = ?, deleted = 1, updated_at = ? WHERE rid = ?');
+    $up->execute([$seq, date('Y-m-d\TH:i:s'), $rid]);
+    $db->exec('COMMIT');
+  } catch (Exception $e) {
+    try {
+      $db->exec('ROLLBACK');
+    } catch (Exception $ignored) {
+    }
+    fail(500, 'Failed to delete record');
   }
-  echo json_encode(['ok' => true]);
+  echo json_encode(['ok' => true, '_id' => $rid, '_version' => (int)$row['version'] + 1]);
   exit;
 }
 
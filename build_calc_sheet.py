@@ -3,14 +3,23 @@
 曲げ加工見積り 計算書（Excel）を生成する。
 Googleスプレッドシートで開いて使う想定。
 実行: python3 build_calc_sheet.py
+      python3 build_calc_sheet.py --quotes quotes.jsonl            # 1件1シートの見積りをまとめて出力
+      python3 build_calc_sheet.py --quotes quotes.csv --summary  # 1件1行の一覧シートで出力
+  data/*.json（と --quotes のファイル）が前回から変わっていなければ作り直さない（--force で強制）。
+  --quotes の各行: 形状, 板厚_mm, 展開幅_mm, 製品長さ_mm, 材質, 数量, 丸穴数, 長穴数（id は任意）
 要: pip install openpyxl
 """
+import csv
+import hashlib
 import json
 import os
+import re
 
 try:
     from openpyxl import Workbook
-    from openpyxl.styles import Font, Alignment, Border, Side, PatternFill, numbers
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Font, Border, Side, PatternFill, NamedStyle
+    from openpyxl.styles.fonts import DEFAULT_FONT
     from openpyxl.worksheet.datavalidation import DataValidation
 except ImportError:
     print("openpyxl が必要です: pip install openpyxl")
@@ -19,6 +28,13 @@ except ImportError:
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 DATA_DIR = os.path.join(SCRIPT_DIR, "data")
 OUT_PATH = os.path.join(SCRIPT_DIR, "曲げ加工見積り_計算書.xlsx")
+CACHE_PATH = os.path.join(SCRIPT_DIR, ".build_calc_sheet_cache.json")
+DATA_FILES = ["prices.json", "rates.json", "hole_prices.json"]
+
+# 見積りの入力項目（--quotes の列名）
+QUOTE_FIELDS = ["形状", "板厚_mm", "展開幅_mm", "製品長さ_mm", "材質", "数量", "丸穴数", "長穴数"]
+# 計算の中間値・結果（calc_formulas() のキー、表示順）
+CALC_KEYS = ["比重", "重量", "重量区分", "長さ区分", "基準価格", "形状乗率", "数量調整", "単価", "穴あけ", "曲げ工賃", "消費税", "合計"]
 
 
 def load_data():
@@ -34,20 +50,54 @@ def load_data():
     return prices, rates, hole_prices
 
 
-def main():
-    prices, rates, hole_prices = load_data()
-    wb = Workbook()
+# =============================================
+# スタイル: 名前付きスタイルとしてブックに1回だけ登録し、セルからは名前で参照する
+# =============================================
+
+def register_styles(wb):
     thin = Side(style="thin")
     border_all = Border(top=thin, bottom=thin, left=thin, right=thin)
     header_fill = PatternFill(start_color="D9E1F2", end_color="D9E1F2", fill_type="solid")
     input_fill = PatternFill(start_color="FFF2CC", end_color="FFF2CC", fill_type="solid")
-    bold = Font(bold=True)
+    styles = [
+        NamedStyle("太字", font=Font(bold=True)),
+        NamedStyle("表題", font=Font(bold=True, size=11)),
+        NamedStyle("タイトル", font=Font(bold=True, size=14)),
+        NamedStyle("区分", font=Font(bold=True, size=11, color="2F5496")),
+        NamedStyle("見出し", font=Font(bold=True), fill=header_fill, border=border_all),
+        NamedStyle("見出し_塗り", font=Font(bold=True), fill=header_fill),
+        NamedStyle("枠", font=DEFAULT_FONT, border=border_all),
+        NamedStyle("枠_数値", font=DEFAULT_FONT, border=border_all, number_format="#,##0"),
+        NamedStyle("項目", font=Font(bold=True), border=border_all),
+        NamedStyle("項目_強調", font=Font(bold=True, size=11), border=border_all),
+        NamedStyle("入力", font=DEFAULT_FONT, fill=input_fill, border=border_all),
+        NamedStyle("計算_強調", font=Font(bold=True, size=11), border=border_all, number_format="#,##0"),
+        NamedStyle("合計", font=Font(bold=True, size=12, color="C00000"), border=border_all, number_format="#,##0"),
+    ]
+    for st in styles:
+        wb.add_named_style(st)
 
-    # =============================================
-    # シート「データ」: 全マスターデータ
-    # =============================================
-    ws_data = wb.active
-    ws_data.title = "データ"
+
+# =============================================
+# レイアウト: セル → (値, スタイル名) の辞書を作る。通常モードでも書き込み専用モードでも同じものを書く
+# =============================================
+
+class Sheet:
+    """1シート分のセル・結合・入力規則・列幅。"""
+
+    def __init__(self):
+        self.cells = {}
+        self.merges = []
+        self.validations = []
+        self.widths = {}
+
+    def set(self, row, col, value, style=None):
+        self.cells[(row, col)] = (value, style)
+
+
+def layout_data_sheet(prices, rates, hole_prices):
+    """シート「データ」: 全マスターデータ。戻り値: (Sheet, 見積りシートから参照する範囲の辞書)"""
+    s = Sheet()
 
     # --- 基準価格テーブル (A1〜F12) ---
     weight_limits = prices["重量区分"]
@@ -68,244 +118,443 @@ def main():
         else:
             length_labels.append(f"≤{ll}mm")
 
-    ws_data["A1"] = "基準価格(L曲げ)"
-    ws_data["A1"].font = Font(bold=True, size=11)
+    s.set(1, 1, "基準価格(L曲げ)", "表題")
     for j, label in enumerate(length_labels):
-        c = ws_data.cell(row=2, column=j + 2, value=label)
-        c.font = bold
-        c.fill = header_fill
-        c.border = border_all
+        s.set(2, j + 2, label, "見出し")
     for i, row_data in enumerate(price_table):
-        c = ws_data.cell(row=i + 3, column=1, value=weight_labels[i])
-        c.font = bold
-        c.fill = header_fill
-        c.border = border_all
+        s.set(i + 3, 1, weight_labels[i], "見出し")
         for j, val in enumerate(row_data):
-            c = ws_data.cell(row=i + 3, column=j + 2, value=val)
-            c.border = border_all
-            c.number_format = "#,##0"
+            s.set(i + 3, j + 2, val, "枠_数値")
 
     n_weights = len(weight_labels)  # 11
     n_lengths = len(length_labels)  # 5
     # 基準価格テーブル範囲: B3:F13
 
     # --- 重量区分・長さ区分（MATCH参照用）(H列) ---
-    ws_data["H1"] = "重量区分(kg)"
-    ws_data["H1"].font = bold
+    s.set(1, 8, "重量区分(kg)", "太字")
     for i, w in enumerate(weight_limits):
-        ws_data.cell(row=i + 2, column=8, value=w)
+        s.set(i + 2, 8, w)
 
-    ws_data["I1"] = "長さ区分(mm)"
-    ws_data["I1"].font = bold
+    s.set(1, 9, "長さ区分(mm)", "太字")
     for i, ll in enumerate(length_limits):
-        ws_data.cell(row=i + 2, column=9, value=ll)
+        s.set(i + 2, 9, ll)
 
     # --- 形状乗率 (A16〜) ---
     shape_start = n_weights + 5  # row 16
-    ws_data.cell(row=shape_start, column=1, value="形状").font = bold
-    ws_data.cell(row=shape_start, column=2, value="乗率").font = bold
-    ws_data.cell(row=shape_start, column=1).fill = header_fill
-    ws_data.cell(row=shape_start, column=2).fill = header_fill
+    s.set(shape_start, 1, "形状", "見出し_塗り")
+    s.set(shape_start, 2, "乗率", "見出し_塗り")
     shape_items = list(rates["形状乗率"].items())
     for i, (shape, r) in enumerate(shape_items):
-        ws_data.cell(row=shape_start + 1 + i, column=1, value=shape).border = border_all
-        ws_data.cell(row=shape_start + 1 + i, column=2, value=r).border = border_all
+        s.set(shape_start + 1 + i, 1, shape, "枠")
+        s.set(shape_start + 1 + i, 2, r, "枠")
 
     # --- 数量調整 (D16〜) ---
-    ws_data.cell(row=shape_start, column=4, value="数量min").font = bold
-    ws_data.cell(row=shape_start, column=5, value="数量max").font = bold
-    ws_data.cell(row=shape_start, column=6, value="調整率").font = bold
-    for col in [4, 5, 6]:
-        ws_data.cell(row=shape_start, column=col).fill = header_fill
+    s.set(shape_start, 4, "数量min", "見出し_塗り")
+    s.set(shape_start, 5, "数量max", "見出し_塗り")
+    s.set(shape_start, 6, "調整率", "見出し_塗り")
     for i, band in enumerate(rates["数量調整"]):
-        ws_data.cell(row=shape_start + 1 + i, column=4, value=band["min"]).border = border_all
-        ws_data.cell(row=shape_start + 1 + i, column=5, value=band["max"] if band["max"] is not None else 9999).border = border_all
-        ws_data.cell(row=shape_start + 1 + i, column=6, value=band["rate"]).border = border_all
+        s.set(shape_start + 1 + i, 4, band["min"], "枠")
+        s.set(shape_start + 1 + i, 5, band["max"] if band["max"] is not None else 9999, "枠")
+        s.set(shape_start + 1 + i, 6, band["rate"], "枠")
 
     # --- 比重 (H16〜) ---
-    ws_data.cell(row=shape_start, column=8, value="材質").font = bold
-    ws_data.cell(row=shape_start, column=9, value="比重").font = bold
-    ws_data.cell(row=shape_start, column=8).fill = header_fill
-    ws_data.cell(row=shape_start, column=9).fill = header_fill
+    s.set(shape_start, 8, "材質", "見出し_塗り")
+    s.set(shape_start, 9, "比重", "見出し_塗り")
     mat_items = [(k, v) for k, v in rates["比重"].items() if v is not None]
     # CP400はnullなので除外し、別途「縞板」セクションで管理
     for i, (mat, g) in enumerate(mat_items):
-        ws_data.cell(row=shape_start + 1 + i, column=8, value=mat).border = border_all
-        ws_data.cell(row=shape_start + 1 + i, column=9, value=g).border = border_all
+        s.set(shape_start + 1 + i, 8, mat, "枠")
+        s.set(shape_start + 1 + i, 9, g, "枠")
     # CP400行（比重欄に「単位重量表」と注記）
     cp_row = shape_start + 1 + len(mat_items)
-    ws_data.cell(row=cp_row, column=8, value="CP400").border = border_all
-    ws_data.cell(row=cp_row, column=9, value="単位重量表").border = border_all
+    s.set(cp_row, 8, "CP400", "枠")
+    s.set(cp_row, 9, "単位重量表", "枠")
 
     # --- 縞板単位重量 (H21〜) ---
     stripe_start = cp_row + 2
-    ws_data.cell(row=stripe_start, column=8, value="縞板 板厚(mm)").font = bold
-    ws_data.cell(row=stripe_start, column=9, value="単位重量(kg/m²)").font = bold
-    ws_data.cell(row=stripe_start, column=8).fill = header_fill
-    ws_data.cell(row=stripe_start, column=9).fill = header_fill
+    s.set(stripe_start, 8, "縞板 板厚(mm)", "見出し_塗り")
+    s.set(stripe_start, 9, "単位重量(kg/m²)", "見出し_塗り")
     stripe_data = rates.get("縞板_単位重量", {})
     stripe_items = [(k, v) for k, v in stripe_data.items() if k != "_doc"]
     for i, (t, w) in enumerate(stripe_items):
-        ws_data.cell(row=stripe_start + 1 + i, column=8, value=float(t)).border = border_all
-        ws_data.cell(row=stripe_start + 1 + i, column=9, value=w).border = border_all
+        s.set(stripe_start + 1 + i, 8, float(t), "枠")
+        s.set(stripe_start + 1 + i, 9, w, "枠")
 
     # --- 穴あけ単価 (A28〜) ---
+    ranges = {}
     if hole_prices:
         hole_start = stripe_start + len(stripe_items) + 3
-        ws_data.cell(row=hole_start, column=1, value="穴あけ単価").font = Font(bold=True, size=11)
+        s.set(hole_start, 1, "穴あけ単価", "表題")
         hr = hole_start + 1
         headers_h = ["板厚min", "板厚max", "丸穴_標準", "丸穴_下限", "長穴_標準", "長穴_下限"]
         for j, h in enumerate(headers_h):
-            c = ws_data.cell(row=hr, column=j + 1, value=h)
-            c.font = bold
-            c.fill = header_fill
-            c.border = border_all
+            s.set(hr, j + 1, h, "見出し")
         for i, row in enumerate(hole_prices["穴あけ単価"]):
             r = hr + 1 + i
-            ws_data.cell(row=r, column=1, value=row["板厚min_mm"]).border = border_all
-            ws_data.cell(row=r, column=2, value=row["板厚max_mm"]).border = border_all
+            s.set(r, 1, row["板厚min_mm"], "枠")
+            s.set(r, 2, row["板厚max_mm"], "枠")
             for j, key in enumerate(["丸穴_標準", "丸穴_下限", "長穴_標準", "長穴_下限"]):
                 v = row.get(key)
-                c = ws_data.cell(row=r, column=j + 3, value=v if v is not None else "")
-                c.border = border_all
+                s.set(r, j + 3, v if v is not None else "", "枠")
+
+        # 穴あけデータ範囲（動的に計算）
+        n_holes = len(hole_prices["穴あけ単価"])
+        hole_data_start = hole_start + 2  # hr+1
+        hole_data_end = hole_data_start + n_holes - 1
+        # A=板厚min, B=板厚max, C=丸穴_標準, E=長穴_標準
+        ranges["hole_min"] = f"データ!$A${hole_data_start}:$A${hole_data_end}"
+        ranges["hole_max"] = f"データ!$B${hole_data_start}:$B${hole_data_end}"
+        ranges["hole_maru"] = f"データ!$C${hole_data_start}:$C${hole_data_end}"
+        ranges["hole_naga"] = f"データ!$E${hole_data_start}:$E${hole_data_end}"
 
     # 列幅調整
-    ws_data.column_dimensions["A"].width = 12
+    s.widths["A"] = 12
     for col_letter in ["B", "C", "D", "E", "F"]:
-        ws_data.column_dimensions[col_letter].width = 10
-    ws_data.column_dimensions["H"].width = 16
-    ws_data.column_dimensions["I"].width = 16
+        s.widths[col_letter] = 10
+    s.widths["H"] = 16
+    s.widths["I"] = 16
 
-    # =============================================
-    # シート「見積り」: 入力 → 自動計算
-    # =============================================
-    ws = wb.create_sheet("見積り", 0)
+    # セル参照のための変数
+    # データシートの基準価格: B3:F13 (11行×5列)
+    ranges["price"] = f"データ!$B$3:$F${2 + n_weights}"
+    # 重量区分: H2:H12
+    ranges["wt"] = f"データ!$H$2:$H${1 + n_weights}"
+    # 長さ区分: I2:I6
+    ranges["lt"] = f"データ!$I$2:$I${1 + n_lengths}"
+    # 形状乗率VLOOKUP: A17:B23
+    ranges["shape"] = f"データ!$A${shape_start + 1}:$B${shape_start + len(shape_items)}"
+    # 数量調整VLOOKUP: D17:F19
+    ranges["qty"] = f"データ!$D${shape_start + 1}:$F${shape_start + len(rates['数量調整'])}"
+    # 比重VLOOKUP: H17:I18 (SS400, SUS304のみ)
+    ranges["grav"] = f"データ!$H${shape_start + 1}:$I${shape_start + len(mat_items)}"
+    # 縞板単位重量VLOOKUP: H(stripe_start+1):I(stripe_start+len)
+    ranges["stripe"] = f"データ!$H${stripe_start + 1}:$I${stripe_start + len(stripe_items)}"
+    return s, ranges
+
+
+def calc_formulas(r, ranges):
+    """
+    CALC_KEYS の各項目の数式。r は入力項目（QUOTE_FIELDS）と CALC_KEYS → セル番地の辞書。
+    見積りシート（縦に1件）でも一覧シート（1行1件）でも同じ式を使う。
+    """
+    if "hole_min" in ranges:
+        hole_formula = (
+            f'=IFERROR(SUMPRODUCT(({ranges["hole_min"]}<={r["板厚_mm"]})*({ranges["hole_max"]}>={r["板厚_mm"]})*{ranges["hole_maru"]})*{r["丸穴数"]},0)'
+            f'+IFERROR(SUMPRODUCT(({ranges["hole_min"]}<={r["板厚_mm"]})*({ranges["hole_max"]}>={r["板厚_mm"]})*{ranges["hole_naga"]})*{r["長穴数"]},0)'
+        )
+    else:
+        hole_formula = "=0"
+    # 単価の元は銭（小数2桁）に丸めてから 50円判定する（浮動小数の誤差で 3849.999… にならないように。fixed_point と同じ）
+    unit = f'ROUND({r["基準価格"]}*{r["形状乗率"]}*{r["数量調整"]},2)'
+    return {
+        "比重": f'=IF({r["材質"]}="CP400",IFERROR(VLOOKUP({r["板厚_mm"]},{ranges["stripe"]},2,0),"板厚なし"),IFERROR(VLOOKUP({r["材質"]},{ranges["grav"]},2,0),""))',
+        "重量": f'=IF({r["材質"]}="CP400",({r["展開幅_mm"]}/1000)*({r["製品長さ_mm"]}/1000)*{r["比重"]},({r["展開幅_mm"]}/1000)*({r["製品長さ_mm"]}/1000)*({r["板厚_mm"]}/1000)*({r["比重"]}*1000))',
+        "重量区分": f'=IFERROR(MATCH({r["重量"]},{ranges["wt"]},1),1)',
+        "長さ区分": f'=IFERROR(MATCH({r["製品長さ_mm"]},{ranges["lt"]},1),1)',
+        "基準価格": f'=INDEX({ranges["price"]},{r["重量区分"]},{r["長さ区分"]})',
+        "形状乗率": f'=IFERROR(VLOOKUP({r["形状"]},{ranges["shape"]},2,0),"")',
+        "数量調整": f'=IFERROR(VLOOKUP({r["数量"]},{ranges["qty"]},3,1),"")',
+        "単価": f'=IF(MOD({unit},50)=0,{unit},ROUND({unit}/100,0)*100)',
+        "穴あけ": hole_formula,
+        "曲げ工賃": f'={r["単価"]}*{r["数量"]}+{r["穴あけ"]}',
+        "消費税": f'=ROUND({r["曲げ工賃"]}*0.1,0)',
+        "合計": f'={r["曲げ工賃"]}+{r["消費税"]}',
+    }
+
+
+# 見積りシートの行配置
+QUOTE_INPUT_ROWS = [
+    (4, "形状", "形状"),
+    (5, "板厚_mm", "板厚(mm)"),
+    (6, "展開幅_mm", "展開幅(mm)"),
+    (7, "製品長さ_mm", "製品長さ(mm)"),
+    (8, "材質", "材質"),
+    (9, "数量", "数量"),
+    (10, "丸穴数", "丸穴数"),
+    (11, "長穴数", "長穴数"),
+]
+QUOTE_CALC_ROWS = [
+    (14, "比重", "比重/単位重量"),
+    (15, "重量", "重量(kg)"),
+    (16, "重量区分", "重量区分"),
+    (17, "長さ区分", "長さ区分"),
+    (18, "基準価格", "基準価格"),
+    (19, "形状乗率", "形状乗率"),
+    (20, "数量調整", "数量調整"),
+    (21, "単価", "単価(税抜)"),
+    (22, "穴あけ", "穴あけ加算"),
+    (23, "曲げ工賃", "曲げ工賃(税抜)"),
+    (24, "消費税", "消費税10%"),
+    (25, "合計", "合計(税込)"),
+]
+DEFAULT_QUOTE = {"形状": "L曲げ", "板厚_mm": 3.2, "展開幅_mm": 200, "製品長さ_mm": 1500, "材質": "SS400", "数量": 1, "丸穴数": 0, "長穴数": 0}
+
+
+def layout_quote_sheet(quote, rates, ranges, title="曲げ加工 見積り計算書"):
+    """シート「見積り」: 入力 → 自動計算。quote は QUOTE_FIELDS の値。"""
+    s = Sheet()
 
     # タイトル
-    ws["A1"] = "曲げ加工 見積り計算書"
-    ws["A1"].font = Font(bold=True, size=14)
-    ws.merge_cells("A1:C1")
+    s.set(1, 1, title, "タイトル")
+    s.merges.append("A1:C1")
 
     # 入力エリア
-    ws["A3"] = "【入力】"
-    ws["A3"].font = Font(bold=True, size=11, color="2F5496")
-
-    input_labels = [
-        (4, "形状"),
-        (5, "板厚(mm)"),
-        (6, "展開幅(mm)"),
-        (7, "製品長さ(mm)"),
-        (8, "材質"),
-        (9, "数量"),
-        (10, "丸穴数"),
-        (11, "長穴数"),
-    ]
-    for row_num, label in input_labels:
-        c = ws.cell(row=row_num, column=1, value=label)
-        c.font = bold
-        c.border = border_all
-        bc = ws.cell(row=row_num, column=2)
-        bc.fill = input_fill
-        bc.border = border_all
-
-    # 初期値
-    ws["B4"] = "L曲げ"
-    ws["B5"] = 3.2
-    ws["B6"] = 200
-    ws["B7"] = 1500
-    ws["B8"] = "SS400"
-    ws["B9"] = 1
-    ws["B10"] = 0
-    ws["B11"] = 0
+    s.set(3, 1, "【入力】", "区分")
+    for row_num, key, label in QUOTE_INPUT_ROWS:
+        s.set(row_num, 1, label, "項目")
+        s.set(row_num, 2, quote.get(key), "入力")
 
     # ドロップダウン: 形状
     shape_list = ",".join(rates["形状乗率"].keys())
     dv_shape = DataValidation(type="list", formula1=f'"{shape_list}"', allow_blank=False)
     dv_shape.error = "一覧から選択してください"
-    ws.add_data_validation(dv_shape)
     dv_shape.add("B4")
+    s.validations.append(dv_shape)
 
     # ドロップダウン: 材質
     mat_list = ",".join([k for k in rates["比重"].keys()])
     dv_mat = DataValidation(type="list", formula1=f'"{mat_list}"', allow_blank=False)
-    ws.add_data_validation(dv_mat)
     dv_mat.add("B8")
+    s.validations.append(dv_mat)
 
     # 計算エリア
-    ws["A13"] = "【計算結果】"
-    ws["A13"].font = Font(bold=True, size=11, color="2F5496")
-
-    # セル参照のための変数
-    # データシートの基準価格: B3:F13 (11行×5列)
-    price_range = f"データ!$B$3:$F${2 + n_weights}"
-    # 重量区分: H2:H12
-    wt_range = f"データ!$H$2:$H${1 + n_weights}"
-    # 長さ区分: I2:I6
-    lt_range = f"データ!$I$2:$I${1 + n_lengths}"
-    # 形状乗率VLOOKUP: A17:B23
-    shape_range = f"データ!$A${shape_start + 1}:$B${shape_start + len(shape_items)}"
-    # 数量調整VLOOKUP: D17:F19
-    qty_range = f"データ!$D${shape_start + 1}:$F${shape_start + len(rates['数量調整'])}"
-    # 比重VLOOKUP: H17:I18 (SS400, SUS304のみ)
-    grav_range = f"データ!$H${shape_start + 1}:$I${shape_start + len(mat_items)}"
-    # 縞板単位重量VLOOKUP: H(stripe_start+1):I(stripe_start+len)
-    stripe_range = f"データ!$H${stripe_start + 1}:$I${stripe_start + len(stripe_items)}"
+    s.set(13, 1, "【計算結果】", "区分")
+    refs = {key: f"B{row}" for row, key, _ in QUOTE_INPUT_ROWS + QUOTE_CALC_ROWS}
+    formulas = calc_formulas(refs, ranges)
+    for row_num, key, label in QUOTE_CALC_ROWS:
+        # 単価と合計は目立たせる
+        if row_num in (21, 23):
+            s.set(row_num, 1, label, "項目_強調")
+            s.set(row_num, 2, formulas[key], "計算_強調")
+        elif row_num == 25:
+            s.set(row_num, 1, label, "項目_強調")
+            s.set(row_num, 2, formulas[key], "合計")
+        else:
+            s.set(row_num, 1, label, "項目")
+            s.set(row_num, 2, formulas[key], "枠_数値")
 
-    # 穴あけデータ範囲（動的に計算）
-    if hole_prices:
-        n_holes = len(hole_prices["穴あけ単価"])
-        hole_data_start = hole_start + 2  # hr+1
-        hole_data_end = hole_data_start + n_holes - 1
-        # A=板厚min, B=板厚max, C=丸穴_標準, E=長穴_標準
-        hole_min_range = f"データ!$A${hole_data_start}:$A${hole_data_end}"
-        hole_max_range = f"データ!$B${hole_data_start}:$B${hole_data_end}"
-        hole_maru_range = f"データ!$C${hole_data_start}:$C${hole_data_end}"
-        hole_naga_range = f"データ!$E${hole_data_start}:$E${hole_data_end}"
-        hole_formula = (
-            f'=IFERROR(SUMPRODUCT(({hole_min_range}<=B5)*({hole_max_range}>=B5)*{hole_maru_range})*B10,0)'
-            f'+IFERROR(SUMPRODUCT(({hole_min_range}<=B5)*({hole_max_range}>=B5)*{hole_naga_range})*B11,0)'
-        )
-    else:
-        hole_formula = "=0"
+    # 列幅
+    s.widths["A"] = 18
+    s.widths["B"] = 14
+    s.widths["C"] = 10
+    return s
+
+
+SUMMARY_HEADERS = ["No.", "id"] + QUOTE_FIELDS + CALC_KEYS
+
+
+def summary_row(n, quote, ranges):
+    """一覧シートの n 行目（1始まりのデータ行、シート上は n+1 行目）のセル。"""
+    row = n + 1
+    letters = {}
+    for j, key in enumerate(SUMMARY_HEADERS):
+        letters[key] = _col_letter(j + 1) + str(row)
+    formulas = calc_formulas(letters, ranges)
+    cells = [(n, "枠"), (quote.get("id", ""), "枠")]
+    cells += [(quote.get(k), "入力") for k in QUOTE_FIELDS]
+    cells += [(formulas[k], "合計" if k == "合計" else "枠_数値") for k in CALC_KEYS]
+    return cells
+
+
+def _col_letter(n):
+    s = ""
+    while n:
+        n, rem = divmod(n - 1, 26)
+        s = chr(65 + rem) + s
+    return s
+
+
+# =============================================
+# 書き込み
+# =============================================
+
+def write_sheet(wb, ws, sheet):
+    """通常モード: セルを番地で書く。"""
+    for (row, col), (value, style) in sheet.cells.items():
+        c = ws.cell(row=row, column=col, value=value)
+        if style:
+            c.style = style
+    for rng in sheet.merges:
+        ws.merge_cells(rng)
+    for dv in sheet.validations:
+        ws.add_data_validation(dv)
+    for letter, w in sheet.widths.items():
+        ws.column_dimensions[letter].width = w
+
+
+def stream_sheet(ws, sheet):
+    """書き込み専用モード: 行の順にセルを追加する（行をまたいでメモリに溜めない）。"""
+    for letter, w in sheet.widths.items():
+        ws.column_dimensions[letter].width = w
+    for rng in sheet.merges:
+        ws.merged_cells.add(rng)
+    for dv in sheet.validations:
+        ws.data_validations.append(dv)
+    by_row = {}
+    for (row, col), v in sheet.cells.items():
+        by_row.setdefault(row, {})[col] = v
+    for row in range(1, max(by_row) + 1):
+        cols = by_row.get(row, {})
+        out = []
+        for col in range(1, (max(cols) if cols else 0) + 1):
+            value, style = cols.get(col, (None, None))
+            c = WriteOnlyCell(ws, value=value)
+            if style:
+                c.style = style
+            out.append(c)
+        ws.append(out)
+
+
+def read_quotes(path):
+    """--quotes の JSONL / CSV を1件ずつ返す（全体は読み込まない）。"""
+    numeric = {"板厚_mm": float, "展開幅_mm": float, "製品長さ_mm": float, "数量": int, "丸穴数": int, "長穴数": int}
+    with open(path, encoding="utf-8", newline="") as f:
+        if path.lower().endswith(".csv"):
+            rows = csv.DictReader(f)
+        else:
+            rows = (json.loads(line) for line in f if line.strip())
+        for q in rows:
+            out = {"丸穴数": 0, "長穴数": 0}
+            for k, v in q.items():
+                if v in (None, ""):
+                    continue
+                out[k] = numeric[k](v) if k in numeric and isinstance(v, str) else v
+            yield out
+
+
+def _sheet_title(n, quote, used):
+    base = str(quote.get("id") or f"見積り_{n:04d}")
+    base = re.sub(r"[\[\]:*?/\\]", "_", base)[:28]
+    title = base
+    k = 2
+    while title in used:
+        title = f"{base[:25]}_{k}"
+        k += 1
+    used.add(title)
+    return title
+
+
+def build_template(out_path):
+    """従来の計算書（見積り1シート＋データ）。"""
+    prices, rates, hole_prices = load_data()
+    wb = Workbook()
+    register_styles(wb)
+    data_sheet, ranges = layout_data_sheet(prices, rates, hole_prices)
+    ws_data = wb.active
+    ws_data.title = "データ"
+    write_sheet(wb, ws_data, data_sheet)
+    ws = wb.create_sheet("見積り", 0)
+    write_sheet(wb, ws, layout_quote_sheet(DEFAULT_QUOTE, rates, ranges))
+    wb.save(out_path)
+    return 1
 
-    calc_rows = [
-        (14, "比重/単位重量", f'=IF(B8="CP400",IFERROR(VLOOKUP(B5,{stripe_range},2,0),"板厚なし"),IFERROR(VLOOKUP(B8,{grav_range},2,0),""))'),
-        (15, "重量(kg)", f'=IF(B8="CP400",(B6/1000)*(B7/1000)*B14,(B6/1000)*(B7/1000)*(B5/1000)*(B14*1000))'),
-        (16, "重量区分", f"=IFERROR(MATCH(B15,{wt_range},1),1)"),
-        (17, "長さ区分", f"=IFERROR(MATCH(B7,{lt_range},1),1)"),
-        (18, "基準価格", f"=INDEX({price_range},B16,B17)"),
-        (19, "形状乗率", f'=IFERROR(VLOOKUP(B4,{shape_range},2,0),"")'),
-        (20, "数量調整", f'=IFERROR(VLOOKUP(B9,{qty_range},3,1),"")'),
-        (21, "単価(税抜)", '=IF(MOD(B18*B19*B20,50)=0,B18*B19*B20,ROUND(B18*B19*B20/100,0)*100)'),
-        (22, "穴あけ加算", hole_formula),
-        (23, "曲げ工賃(税抜)", "=B21*B9+B22"),
-        (24, "消費税10%", "=ROUND(B23*0.1,0)"),
-        (25, "合計(税込)", "=B23+B24"),
-    ]
 
-    for row_num, label, formula in calc_rows:
-        c = ws.cell(row=row_num, column=1, value=label)
-        c.font = bold
-        c.border = border_all
-        fc = ws.cell(row=row_num, column=2)
-        fc.value = formula
-        fc.border = border_all
-        fc.number_format = "#,##0"
-
-    # 単価と合計は目立たせる
-    for r in [21, 23, 25]:
-        ws.cell(row=r, column=1).font = Font(bold=True, size=11)
-        ws.cell(row=r, column=2).font = Font(bold=True, size=11)
-    ws.cell(row=25, column=2).font = Font(bold=True, size=12, color="C00000")
+def build_bulk(out_path, quotes_path, summary=False):
+    """
+    --quotes の全件を1ブックに書き込み専用モードで出力する。
+    summary=False: 1件1シート（見積りシートと同じ配置）、True: 1件1行の「一覧」シート。
+    """
+    prices, rates, hole_prices = load_data()
+    wb = Workbook(write_only=True)
+    register_styles(wb)
+    data_sheet, ranges = layout_data_sheet(prices, rates, hole_prices)
+    n = 0
+    if summary:
+        ws = wb.create_sheet("一覧")
+        ws.freeze_panes = "A2"
+        ws.column_dimensions["A"].width = 6
+        ws.column_dimensions["B"].width = 14
+        header = []
+        for h in SUMMARY_HEADERS:
+            c = WriteOnlyCell(ws, value=h)
+            c.style = "見出し"
+            header.append(c)
+        ws.append(header)
+        for n, quote in enumerate(read_quotes(quotes_path), start=1):
+            row = []
+            for value, style in summary_row(n, quote, ranges):
+                c = WriteOnlyCell(ws, value=value)
+                c.style = style
+                row.append(c)
+            ws.append(row)
+    else:
+        used = {"データ"}
+        for n, quote in enumerate(read_quotes(quotes_path), start=1):
+            title = _sheet_title(n, quote, used)
+            ws = wb.create_sheet(title)
+            stream_sheet(ws, layout_quote_sheet(quote, rates, ranges, title=f"曲げ加工 見積り計算書 {title}"))
+    stream_sheet(wb.create_sheet("データ"), data_sheet)
+    wb.save(out_path)
+    return n
+
+
+# =============================================
+# ビルドキャッシュ: 入力の内容ハッシュが前回と同じなら作り直さない
+# =============================================
+
+def input_hash(quotes_path=None, mode="template"):
+    h = hashlib.sha256()
+    h.update(mode.encode("utf-8"))
+    paths = [os.path.join(DATA_DIR, name) for name in DATA_FILES] + [os.path.abspath(__file__)]
+    if quotes_path:
+        paths.append(quotes_path)
+    for path in paths:
+        h.update(os.path.basename(path).encode("utf-8"))
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                for block in iter(lambda: f.read(1 << 16), b""):
+                    h.update(block)
+    return h.hexdigest()
+
+
+def _load_cache():
+    if not os.path.exists(CACHE_PATH):
+        return {}
+    try:
+        with open(CACHE_PATH, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_cache(cache):
+    with open(CACHE_PATH, "w", encoding="utf-8") as f:
+        json.dump(cache, f, ensure_ascii=False, indent=2)
 
-    # 列幅
-    ws.column_dimensions["A"].width = 18
-    ws.column_dimensions["B"].width = 14
-    ws.column_dimensions["C"].width = 10
 
-    wb.save(OUT_PATH)
-    print(f"作成しました: {OUT_PATH}")
+def main():
+    import argparse
+    p = argparse.ArgumentParser(description="曲げ加工見積り 計算書（Excel）を生成")
+    p.add_argument("--out", default=None, help="出力パス（既定: 曲げ加工見積り_計算書.xlsx、--quotes 時は 曲げ加工見積り_一括.xlsx）")
+    p.add_argument("--quotes", default=None, help="見積り一覧（JSONL または CSV）。1件1シートで出力")
+    p.add_argument("--summary", action="store_true", help="--quotes を1件1行の一覧シートで出力")
+    p.add_argument("--force", action="store_true", help="入力が変わっていなくても作り直す")
+    args = p.parse_args()
+
+    if args.quotes:
+        out_path = args.out or os.path.join(SCRIPT_DIR, "曲げ加工見積り_一括.xlsx")
+        mode = "summary" if args.summary else "sheets"
+    else:
+        out_path = args.out or OUT_PATH
+        mode = "template"
+    out_path = os.path.abspath(out_path)
+
+    digest = input_hash(args.quotes, mode)
+    cache = _load_cache()
+    if not args.force and cache.get(out_path) == digest and os.path.exists(out_path):
+        print(f"変更なし（スキップ）: {out_path}")
+        return 0
+
+    if args.quotes:
+        n = build_bulk(out_path, args.quotes, args.summary)
+        print(f"作成しました: {out_path}（{n} 件）")
+    else:
+        build_template(out_path)
+        print(f"作成しました: {out_path}")
+    cache[out_path] = digest
+    _save_cache(cache)
+    return 0
 
 
 if __name__ == "__main__":
-    main()
+    exit(main())
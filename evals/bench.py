@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+"""
+見積りエンジンのベンチマークと性能回帰チェック。
+実行:
+  python3 evals/bench.py run [--quick]           # 計測して evals/bench_results.json にコミット単位で保存
+  python3 evals/bench.py compare [BASE] [HEAD]   # 2つの結果を比べ、しきい値を超えて遅く/重くなっていれば終了コード1
+  python3 evals/bench.py list                    # 保存済みの結果キー
+BASE/HEAD を省略すると、保存済みの最後の2件を比べる。
+"""
+import io
+import json
+import os
+import subprocess
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Tuple
+
+from workload import SKILL_DIR, calc_bending, generate_parts, to_columns
+
+EVALS_DIR = os.path.dirname(os.path.abspath(__file__))
+RESULTS_PATH = os.path.join(EVALS_DIR, "bench_results.json")
+
+
+def git_commit_key() -> str:
+    """現在のコミット（短縮）。作業ツリーに変更があれば +dirty を付ける。"""
+    try:
+        rev = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=SKILL_DIR, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+        dirty = subprocess.run(
+            ["git", "status", "--porcelain", "--untracked-files=no"], cwd=SKILL_DIR, capture_output=True, text=True,
+        ).stdout.strip()
+        return rev + ("+dirty" if dirty else "")
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+class _NullWriter:
+    """出力を捨てる（run_batch の出力でメモリ計測が膨らまないように）。"""
+
+    def write(self, s: str) -> int:
+        return len(s)
+
+    def flush(self) -> None:
+        pass
+
+
+# ===== ベンチマーク本体 =====
+# 各ベンチは (準備関数) → (1回分の処理, 1回あたりの件数) を返す。
+
+def build_benches(n_parts: int, seed: int) -> Dict[str, Callable[[], Tuple[Callable[[], Any], int]]]:
+    table_path = calc_bending.DEFAULT_TABLE_PATH
+    parts = generate_parts(n_parts, seed)
+    table = calc_bending.get_price_table()
+    rows = calc_bending.load_price_table(table_path)
+
+    def b_load_price_table():
+        return (lambda: calc_bending.load_price_table(table_path)), 1
+
+    def b_get_base_price_rows():
+        def run():
+            for p in parts:
+                calc_bending.get_base_price(rows, p["shape"], p["weight_kg"], p["length_mm"])
+        return run, len(parts)
+
+    def b_get_base_price():
+        def run():
+            for p in parts:
+                calc_bending.get_base_price(table, p["shape"], p["weight_kg"], p["length_mm"])
+        return run, len(parts)
+
+    def b_calc_bending():
+        def run():
+            for p in parts:
+                calc_bending.calc_bending(
+                    table, p["shape"], p["weight_kg"], p["length_mm"], p["long_side_mm"], p["lot"],
+                    nakagoshi=p["nakagoshi"], reverse_bend=p["reverse_bend"],
+                    meoshi_long=p["meoshi_long"], fukabend=p["fukabend"],
+                )
+        return run, len(parts)
+
+    def b_calc_hole_cost():
+        def run():
+            for p in parts:
+                calc_bending.calc_hole_cost(p["thickness_mm"], p["punch_count"], p["pierce_count"])
+        return run, len(parts)
+
+    def b_estimate():
+        def run():
+            for p in parts:
+                calc_bending.estimate(**p)
+        return run, len(parts)
+
+    def b_estimate_many():
+        cols = to_columns(parts)
+        return (lambda: calc_bending.estimate_many(**cols)), len(parts)
+
+    def b_nest():
+        import nesting
+        nest_parts = nesting.random_parts(5000, seed)
+        rates = nesting.load_rates()
+        return (lambda: nesting.nest(nest_parts, rates=rates)), 5000
+
+    def b_run_batch():
+        text = "".join(json.dumps(p, ensure_ascii=False) + "\n" for p in parts)
+
+        def run():
+            calc_bending.run_batch(io.StringIO(text), _NullWriter(), fmt="jsonl")
+        return run, len(parts)
+
+    benches = {
+        "load_price_table": b_load_price_table,
+        "get_base_price[rows]": b_get_base_price_rows,
+        "get_base_price": b_get_base_price,
+        "calc_bending": b_calc_bending,
+        "calc_hole_cost": b_calc_hole_cost,
+        "estimate": b_estimate,
+        "run_batch": b_run_batch,
+        "nest[5000]": b_nest,
+    }
+    try:
+        import numpy  # noqa: F401
+        benches["estimate_many"] = b_estimate_many
+    except ImportError:
+        pass
+    return benches
+
+
+def measure(setup: Callable[[], Tuple[Callable[[], Any], int]], min_time: float) -> Dict[str, float]:
+    """ops/sec（min_time 秒以上回した中央値）と1回分のピークメモリ（tracemalloc）を測る。"""
+    fn, ops = setup()
+    fn()  # ウォームアップ
+    rates: List[float] = []
+    start = time.perf_counter()
+    while True:
+        t0 = time.perf_counter()
+        fn()
+        dt = time.perf_counter() - t0
+        rates.append(ops / dt if dt > 0 else float("inf"))
+        if time.perf_counter() - start >= min_time and len(rates) >= 3:
+            break
+    rates.sort()
+
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "ops_per_s": round(rates[len(rates) // 2], 1),
+        "peak_kib": round(peak / 1024, 1),
+        "runs": len(rates),
+    }
+
+
+def run(quick: bool = False, seed: int = 1, only: List[str] = None) -> Dict[str, Any]:
+    n_parts = 2000 if quick else 20000
+    min_time = 0.2 if quick else 1.0
+    results = {}
+    for name, setup in build_benches(n_parts, seed).items():
+        if only and name not in only:
+            continue
+        results[name] = measure(setup, min_time)
+        r = results[name]
+        print(f"{name:24s} {r['ops_per_s']:>14,.0f} ops/s  peak {r['peak_kib']:>10,.1f} KiB", file=sys.stderr)
+    return {
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": sys.version.split()[0],
+        "workload": {"parts": n_parts, "seed": seed},
+        "results": results,
+    }
+
+
+# ===== 保存・比較 =====
+
+def load_results(path: str = RESULTS_PATH) -> Dict[str, Any]:
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_result(key: str, entry: Dict[str, Any], path: str = RESULTS_PATH) -> None:
+    data = load_results(path)
+    data.pop(key, None)  # 同じキーは最後に回す（挿入順 = 実行順）
+    data[key] = entry
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+
+
+def compare(base: Dict[str, Any], head: Dict[str, Any], threshold: float, mem_threshold: float) -> List[str]:
+    """回帰した項目のメッセージを返す。ops/sec が (1-threshold) 倍未満、またはメモリが (1+mem_threshold) 倍超で回帰。"""
+    regressions = []
+    for name, h in head["results"].items():
+        b = base["results"].get(name)
+        if b is None:
+            print(f"NEW {name}")
+            continue
+        speed = h["ops_per_s"] / b["ops_per_s"] if b["ops_per_s"] else float("inf")
+        mem = h["peak_kib"] / b["peak_kib"] if b["peak_kib"] else 1.0
+        bad = []
+        if speed < 1 - threshold:
+            bad.append(f"ops/s {b['ops_per_s']:,.0f} → {h['ops_per_s']:,.0f} (x{speed:.2f})")
+        if mem > 1 + mem_threshold:
+            bad.append(f"peak {b['peak_kib']:,.1f} → {h['peak_kib']:,.1f} KiB (x{mem:.2f})")
+        if bad:
+            regressions.append(f"{name}: " + ", ".join(bad))
+            print(f"NG  {name}  " + ", ".join(bad))
+        else:
+            print(f"OK  {name}  ops/s x{speed:.2f}  peak x{mem:.2f}")
+    return regressions
+
+
+def main():
+    import argparse
+    p = argparse.ArgumentParser(description="見積りエンジンのベンチマーク")
+    p.add_argument("--results", default=RESULTS_PATH, help="結果ファイル（JSON、コミットをキーに保存）")
+    sub = p.add_subparsers(dest="cmd", required=True)
+    r = sub.add_parser("run", help="計測して保存")
+    r.add_argument("--quick", action="store_true", help="件数・時間を減らして素早く測る")
+    r.add_argument("--seed", type=int, default=1)
+    r.add_argument("--key", default=None, help="保存キー（既定: git のコミット）")
+    r.add_argument("--only", nargs="*", default=None, help="測るベンチ名")
+    c = sub.add_parser("compare", help="2つの結果を比べる")
+    c.add_argument("base", nargs="?")
+    c.add_argument("head", nargs="?")
+    c.add_argument("--threshold", type=float, default=0.10, help="ops/sec の許容低下率（既定 0.10 = 10%%）")
+    c.add_argument("--mem-threshold", type=float, default=0.20, help="ピークメモリの許容増加率（既定 0.20）")
+    sub.add_parser("list", help="保存済みの結果キー")
+    args = p.parse_args()
+
+    if args.cmd == "run":
+        entry = run(args.quick, args.seed, args.only)
+        key = args.key or git_commit_key()
+        save_result(key, entry, args.results)
+        print(f"保存しました: {key} → {args.results}")
+        return 0
+
+    data = load_results(args.results)
+    if args.cmd == "list":
+        for key, entry in data.items():
+            print(f"{key}  {entry['time']}  parts={entry['workload']['parts']}")
+        return 0
+
+    keys = list(data)
+    base_key = args.base or (keys[-2] if len(keys) >= 2 else None)
+    head_key = args.head or (keys[-1] if keys else None)
+    if base_key not in data or head_key not in data:
+        print(f"結果が見つかりません: base={base_key} head={head_key}", file=sys.stderr)
+        return 2
+    print(f"{base_key} → {head_key}")
+    regressions = compare(data[base_key], data[head_key], args.threshold, args.mem_threshold)
+    print("---")
+    print(f"回帰: {len(regressions)} 件")
+    return 0 if not regressions else 1
+
+
+if __name__ == "__main__":
+    exit(main())
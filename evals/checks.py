@@ -0,0 +1,280 @@
+"""
+同値性のチェック — 速い経路（列指向の estimate_many() など）が基準の経路（1件ずつの estimate() など）と
+同じ結果になることを、合成ワークロード（workload.py、シード固定）で確かめる。
+実績ストア（records_store.py）は、変わっていないレコードを書き直しても差分（changes_since）に出ないことを確かめる。
+run_evals.py が1チェック1ケースとして流す（期待値は {"result": "ok"}、食い違えば最初の食い違いの説明）。
+"""
+import json
+import os
+import random
+import sys
+import tempfile
+import urllib.request
+from typing import Any, Callable, Dict, List, Optional
+
+EVALS_DIR = os.path.dirname(os.path.abspath(__file__))
+SRC_DIR = os.path.join(os.path.dirname(EVALS_DIR), "src")
+
+if SRC_DIR not in sys.path:
+    sys.path.insert(0, SRC_DIR)
+
+import bending_logic  # noqa: E402
+import calc_bending  # noqa: E402
+import records_store  # noqa: E402
+import records_stub_server  # noqa: E402
+import workload  # noqa: E402
+
+# 1チェックあたりの部品数
+N_PARTS = 5000
+SEED = 7
+
+CHECKS: Dict[str, Callable[[], Optional[str]]] = {}
+
+
+def check(name: str):
+    """チェックを登録する。関数は食い違いが無ければ None、あればその説明を返す。"""
+    def register(fn):
+        CHECKS[name] = fn
+        return fn
+    return register
+
+
+def run(name: str) -> Dict[str, Any]:
+    msg = CHECKS[name]()
+    return {"result": "ok" if msg is None else msg}
+
+
+def _first_mismatch(label: str, got: List[Any], expected: List[Any], parts: List[Dict[str, Any]]) -> Optional[str]:
+    for i, (g, e) in enumerate(zip(got, expected)):
+        if g != e:
+            return f"{label} {i} 番目: 期待={e!r} 実際={g!r} 入力={parts[i]!r}"
+    return None
+
+
+@check("estimate_many と estimate の一致")
+def _estimate_many_matches_estimate() -> Optional[str]:
+    parts = workload.generate_parts(N_PARTS, SEED)
+    cols = workload.to_columns(parts)
+    many = calc_bending.estimate_many(**cols)
+    fields = (
+        ("base_price", lambda r: r["breakdown"]["bending_cost"]["base_price"]),
+        ("quantity_adjustment", lambda r: r["breakdown"]["bending_cost"]["quantity_adjustment"]),
+        ("complexity_adjustment", lambda r: r["breakdown"]["bending_cost"]["complexity_adjustment"]),
+        ("small_part_adjustment", lambda r: r["breakdown"]["bending_cost"]["small_part_adjustment"]),
+        ("bending_total", lambda r: r["breakdown"]["bending_cost"]["total"]),
+        ("pierce_price", lambda r: r["breakdown"]["hole_cost"]["pierce_price"]),
+        ("hole_total", lambda r: r["breakdown"]["hole_cost"]["total"]),
+        ("processing_cost_tax_excluded", lambda r: r["total_estimate"]["processing_cost_tax_excluded"]),
+        ("processing_cost_tax_included", lambda r: r["total_estimate"]["processing_cost_tax_included"]),
+    )
+    single = [calc_bending.estimate(**p) for p in parts]
+    for name, get in fields:
+        msg = _first_mismatch(name, many[name].tolist(), [get(r) for r in single], parts)
+        if msg:
+            return msg
+    return None
+
+
+@check("json_body と json.dumps(to_dict()) の一致")
+def _json_body_matches_dumps() -> Optional[str]:
+    import json
+    parts = workload.generate_parts(N_PARTS, SEED + 1)
+    batch = calc_bending.estimate_batch(parts)
+    for i, p in enumerate(parts):
+        expected = json.dumps(calc_bending.estimate(**p), ensure_ascii=False)
+        est = calc_bending.estimate_result(**p)
+        for label, got in (
+            ("Estimate.to_json()", est.to_json()),
+            ("EstimateBatch.json_body()", "{" + batch.json_body(i) + "}"),
+        ):
+            if got != expected:
+                return f"{label} {i} 番目: 期待={expected} 実際={got} 入力={p!r}"
+    return None
+
+
+def _random_holes(rng) -> List[Dict[str, Any]]:
+    """穴ごとの指定をランダムに作る（径の指定なし・φ30 の境界・個数 0・不正な種類・不正な個数を含む）。"""
+    holes = []
+    for _ in range(rng.choice([0, 1, 1, 2, 3, 5])):
+        h: Dict[str, Any] = {"type": rng.choice(["丸穴", "丸穴", "長穴", "ポンチ", "ピアス", "round", "slot"])}
+        if rng.random() < 0.7:
+            h["diameter_mm"] = rng.choice([6, 12.5, 29.9, 30, 45, 80])
+        if rng.random() < 0.8:
+            h["count"] = rng.choice([0, 1, 2, 4, 10])
+        if rng.random() < 0.5:
+            h["grade"] = rng.choice(["標準", "下限"])
+        holes.append(h)
+    if rng.random() < 0.01:
+        holes.append({"type": "角穴", "count": 1})
+    if rng.random() < 0.01:
+        holes.append({"type": "丸穴", "count": rng.choice([2.0, 2.7, True])})
+    return holes
+
+
+@check("穴ごとの指定: 小数・bool の個数はエラー")
+def _hole_count_rejects_non_integral() -> Optional[str]:
+    for count in (2.7, "2.7", True, False):
+        try:
+            calc_bending._hole_lines(3.2, [{"type": "丸穴", "count": count}], None, "error")
+        except ValueError:
+            continue
+        return f"count={count!r} がエラーになりません"
+    for count, n in ((2.0, 2), ("3", 3), (4, 4)):
+        lines = calc_bending._hole_lines(3.2, [{"type": "丸穴", "count": count}], None, "error")
+        if [x["count"] for x in lines] != [n]:
+            return f"count={count!r}: 期待={n} 実際={lines!r}"
+    return None
+
+
+@check("hole_lines_many と穴ごとの明細（1件ずつ）の一致")
+def _hole_lines_many_matches_scalar() -> Optional[str]:
+    import random
+    rng = random.Random(SEED + 2)
+    # 表の隙間（7.0・13.0）、単価が null の行（14.0）、表の外（0.3・40.0）も混ぜる
+    thicknesses = [0.3, 1.6, 2.3, 3.2, 4.5, 6.0, 7.0, 9.0, 12.0, 13.0, 14.0, 16.0, 19.0, 40.0]
+    t = [rng.choice(thicknesses) for _ in range(N_PARTS)]
+    holes = [None if rng.random() < 0.1 else _random_holes(rng) for _ in range(N_PARTS)]
+    for gap in calc_bending.HOLE_GAP_POLICIES:
+        lines, totals, errors = calc_bending.hole_lines_many(t, holes, None, gap)
+        for i in range(N_PARTS):
+            if holes[i] is None:
+                expected = (None, 0, None)
+            else:
+                try:
+                    ls = calc_bending._hole_lines(t[i], holes[i], None, gap)
+                    expected = (ls, sum(x["total"] for x in ls), None)
+                except ValueError as e:
+                    expected = (None, 0, str(e))
+            got = (lines[i], int(totals[i]), errors.get(i))
+            if got != expected:
+                return f"hole_gap={gap} {i} 番目: 期待={expected!r} 実際={got!r} 板厚={t[i]} 穴={holes[i]!r}"
+    return None
+
+
+def _float_estimate(table, p: Dict[str, Any], tax_rate: float = 0.1) -> Dict[str, int]:
+    """整数化する前の浮動小数の式（曲げ工賃・税抜・税込）。fixed_point の経路がこれと同じ金額になること。"""
+    base = table.lookup(p["shape"], p["weight_kg"], p["length_mm"])[0]
+    subtotal = base * calc_bending.quantity_factor(p["lot"])
+    complexity = 1.0
+    addons = 0
+    if p["nakagoshi"]:
+        complexity *= 1.5
+    if p["reverse_bend"]:
+        complexity *= 1.2
+    if p["meoshi_long"] and p["length_mm"] >= 1000:
+        addons += 2500
+    if p["fukabend"]:
+        addons += 3000
+    subtotal = subtotal * complexity + addons
+    if p["long_side_mm"] <= 300 and p["weight_kg"] <= 1.0:
+        subtotal = subtotal * calc_bending.SMALL_PART_DISCOUNT
+    bending = max(calc_bending.BENDING_FLOOR, round(subtotal))
+    hole = p["punch_count"] * calc_bending.PUNCH_PRICE + p["pierce_count"] * calc_bending.pierce_price_for_thickness(p["thickness_mm"])
+    excluded = bending + hole
+    return {"bending_total": bending, "tax_excluded": excluded, "tax_included": int(round(excluded * (1 + tax_rate)))}
+
+
+@check("整数（fixed_point）の金額と従来の浮動小数の式の一致")
+def _fixed_point_matches_float() -> Optional[str]:
+    parts = workload.generate_parts(N_PARTS * 4, SEED + 3)
+    table = calc_bending.get_price_table()
+    many = calc_bending.estimate_many(**workload.to_columns(parts))
+    for i, p in enumerate(parts):
+        expected = _float_estimate(table, p)
+        r = calc_bending.estimate(**p)
+        got = {
+            "bending_total": r["breakdown"]["bending_cost"]["total"],
+            "tax_excluded": r["total_estimate"]["processing_cost_tax_excluded"],
+            "tax_included": r["total_estimate"]["processing_cost_tax_included"],
+        }
+        got_many = {
+            "bending_total": int(many["bending_total"][i]),
+            "tax_excluded": int(many["processing_cost_tax_excluded"][i]),
+            "tax_included": int(many["processing_cost_tax_included"][i]),
+        }
+        for label, g in (("estimate()", got), ("estimate_many()", got_many)):
+            if g != expected:
+                return f"{label} {i} 番目: 期待={expected!r} 実際={g!r} 入力={p!r}"
+    return None
+
+
+@check("実績ストア: 1件編集して配列で保存すると差分は1件")
+def _records_delta_after_legacy_save() -> Optional[str]:
+    rng = random.Random(SEED)
+    with tempfile.TemporaryDirectory(prefix="records_check_") as tmp:
+        store = records_store.RecordsStore(os.path.join(tmp, "records.sqlite3"))
+        try:
+            store.put_many(records_store._synthetic_record(i, rng) for i in range(100))
+            head = store.head()
+            records = store.all_records()
+            records[42]["note"] = "編集"
+            store.replace_all(records, since=head)
+            changes = store.changes_since(head)["changes"]
+            if [c["_id"] for c in changes] != [records[42]["_id"]]:
+                return f"配列で保存したあとの差分: 期待=1件（{records[42]['_id']}） 実際={len(changes)}件"
+            head = store.head()
+            store.put_many(store.all_records())
+            store.put(store.get(records[0]["_id"]))
+            n = len(store.changes_since(head)["changes"])
+            if n:
+                return f"同じ内容で書き直したあとの差分: 期待=0件 実際={n}件"
+            # 型だけが変わったもの（10 → 10.0 → "10"）は変更として書く
+            head = store.head()
+            rec = store.get(records[1]["_id"])
+            for value in (float(rec["qty"]), str(rec["qty"])):
+                store.put(dict(rec, qty=value))
+            n = len(store.changes_since(head)["changes"])
+            if n != 1 or store.get(rec["_id"])["_version"] != rec["_version"] + 2:
+                return f"型だけを変えた書き込みが反映されていません: 版 {rec['_version']} → {store.get(rec['_id'])['_version']}"
+        finally:
+            store.close()
+    return None
+
+
+@check("実績ストア: 古い配列で保存しても、取得後に他の端末が追加したレコードは消えない")
+def _records_legacy_save_keeps_concurrent_add() -> Optional[str]:
+    rng = random.Random(SEED + 1)
+    with tempfile.TemporaryDirectory(prefix="records_check_") as tmp:
+        store = records_store.RecordsStore(os.path.join(tmp, "records.sqlite3"))
+        server = records_stub_server.serve_in_thread(store)
+        url = f"http://127.0.0.1:{server.server_address[1]}/"
+        try:
+            store.put_many(records_store._synthetic_record(i, rng) for i in range(10))
+            # 端末 A が一覧を取得する
+            with urllib.request.urlopen(url) as r:
+                cursor = r.headers["X-Records-Cursor"]
+                records = json.loads(r.read())
+            # 端末 B がそのあとで1件追加する
+            added = store.put(records_store._synthetic_record(10, rng), expected_version=0)["_id"]
+            # 端末 A は1件消した古い配列を全件として保存する
+            removed = records.pop(3)["_id"]
+            req = urllib.request.Request(
+                f"{url}?since={cursor}", data=json.dumps(records).encode("utf-8"), method="POST",
+            )
+            with urllib.request.urlopen(req) as r:
+                res = json.loads(r.read())
+            if store.get(added) is None:
+                return f"取得後に追加された {added} が削除されました（応答 {res!r}）"
+            if store.get(removed) is not None or res.get("deleted") != 1:
+                return f"配列から外した {removed} が削除されていません（応答 {res!r}）"
+        finally:
+            server.shutdown()
+            store.close()
+    return None
+
+
+@check("calc_bending_v3_many のスカラー入力と calc_bending_v3 の一致")
+def _bending_v3_many_scalar() -> Optional[str]:
+    # 板厚が表に無い（3.0）・長さが範囲外（99999）も含める
+    for shape, t, w, length in (("L曲げ", 3.2, 5.0, 500), ("ハット曲げ", 2.3, 25.0, 800), ("L曲げ", 3.0, 5.0, 500), ("L曲げ", 3.2, 5.0, 99999)):
+        try:
+            expected = (True, bending_logic.calc_bending_v3(shape, t, w, length)["total"])
+        except ValueError:
+            expected = (False, 0)
+        r = bending_logic.calc_bending_v3_many(t, w, length, shape=shape)
+        if r["total"].shape != (1,):
+            return f"形状={shape} 板厚={t}: 長さ1の配列になっていません: {r['total']!r}"
+        got = (bool(r["valid"][0]), int(r["total"][0]))
+        if got != expected:
+            return f"形状={shape} 板厚={t} 重量={w} 長さ={length}: 期待={expected!r} 実際={got!r}"
+    return None
@@ -1,121 +1,299 @@
 #!/usr/bin/env python3
 """
-曲げ見積り evals 実行: evals.json の各ケースで計算し、期待値と比較する。
+曲げ見積り evals 実行: ケースを本体と同じ計算エンジンで計算し、期待値と比較する。
+- evals.json と evals/cases/*.json（社長見積り）は計算書方式（src/calc_sheet.py）で計算
+- evals/generated/*.json（gen で作るスナップショット）は計算書方式か v2.1（src/calc_bending.py の estimate()）
+- evals/checks.py の同値性チェック（速い経路と基準の経路が同じ結果になるか）は1チェック1ケース
+期待値の項目を計算順に比べ、最初に食い違った項目と中間値をレポートする。
+
 実行: python3 run_evals.py（evals/ から）または python3 evals/run_evals.py（スキルルートから）
+  --workers N       プロセス数（既定: CPU 数）
+  --report FILE     結果を JSON で保存（NG・ERR・参考差分のみ。--report-all で全件）
+  --strict          社長見積り（参考ケース）との差も失敗に数える
+  gen --n 20000     現在の価格表で入力と結果のスナップショットを evals/generated/ に作る
+                    （価格表を変えたあとに run_evals.py を流すと、変わったケースが NG として出る）
 """
+import glob
 import json
 import os
+import random
+import sys
+import unicodedata
+from typing import Any, Dict, Iterable, List, Optional
 
 EVALS_DIR = os.path.dirname(os.path.abspath(__file__))
 SKILL_DIR = os.path.dirname(EVALS_DIR)
-DATA_DIR = os.path.join(SKILL_DIR, "data")
-
-
-def load_data():
-    with open(os.path.join(DATA_DIR, "prices.json"), encoding="utf-8") as f:
-        prices = json.load(f)
-    with open(os.path.join(DATA_DIR, "rates.json"), encoding="utf-8") as f:
-        rates = json.load(f)
-    return prices, rates
-
-
-def calc_weight(展開幅_mm, 製品長さ_mm, 板厚_mm, 比重):
-    return (展開幅_mm / 1000) * (製品長さ_mm / 1000) * (板厚_mm / 1000) * (比重 * 1000)
-
-
-def get_base_price(重量_kg, 製品長さ_mm, prices):
-    """estimate_bending.py と同じ: 重量・長さそれぞれ「最初に値以上になる区分」を使う"""
-    w = prices["重量区分"]
-    l = prices["長さ区分"]
-    # 重量: 最初の w[i] で 重量_kg <= w[i] となる行
-    row = len(w) - 1
-    for i, t in enumerate(w):
-        if 重量_kg <= t:
-            row = i
-            break
-    # 長さ: 最初の l[j] で 製品長さ_mm <= l[j] となる列
-    col = len(l) - 1
-    for j, t in enumerate(l):
-        if 製品長さ_mm <= t:
-            col = j
-            break
-    row = min(row, len(prices["基準価格"]) - 1)
-    col = min(col, len(prices["基準価格"][0]) - 1)
-    return prices["基準価格"][row][col]
-
-
-def get_qty_rate(数量, rates):
-    for row in rates["数量調整"]:
-        if row["min"] <= 数量 and (row["max"] is None or 数量 <= row["max"]):
-            return row["rate"]
-    return 1.0
-
-
-def calc_見積り_税抜(input_data, prices, rates):
-    """穴あけ加算なしで単価×数量を返す（evals の expected と比較用）"""
-    shape = input_data["形状"]
-    thickness = input_data["板厚_mm"]
-    width = input_data["展開幅_mm"]
-    length = input_data["製品長さ_mm"]
-    material = input_data["材質"]
-    qty = input_data["数量"]
-
-    gravity = rates["比重"].get(material)
-    if gravity is None:
-        raise ValueError(f"未知の材質: {material}")
-
-    weight = calc_weight(width, length, thickness, gravity)
-    base = get_base_price(weight, length, prices)
-    shape_rate = rates["形状乗率"].get(shape)
-    if shape_rate is None:
-        raise ValueError(f"未知の形状: {shape}")
-    qty_rate = get_qty_rate(qty, rates)
-
-    raw = base * shape_rate * qty_rate
-    # 100円単位に丸め（計算書と同じ）
-    if int(raw) % 50 == 0:
-        unit_price = int(raw)
+SRC_DIR = os.path.join(SKILL_DIR, "src")
+CASES_DIR = os.path.join(EVALS_DIR, "cases")
+GENERATED_DIR = os.path.join(EVALS_DIR, "generated")
+
+if SRC_DIR not in sys.path:
+    sys.path.insert(0, SRC_DIR)
+
+import calc_bending  # noqa: E402
+import calc_sheet  # noqa: E402
+
+ENGINE_SHEET = "sheet"
+ENGINE_V21 = "v2.1"
+ENGINE_CHECK = "check"
+
+
+# ===== ケースの読み込み =====
+
+def load_cases(generated: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    """全ケースを共通形式 {name, source, engine, input, expected, reference} で返す。"""
+    cases = []
+    with open(os.path.join(EVALS_DIR, "evals.json"), encoding="utf-8") as f:
+        for c in json.load(f):
+            cases.append({
+                "name": c["name"], "source": "evals.json", "engine": ENGINE_SHEET,
+                "input": c["input"], "expected": c["expected"], "reference": False,
+            })
+
+    # cases/ には同じ名前の NFC/NFD 違いのファイルがあるので正規化して重複を除く
+    seen = set()
+    for path in sorted(glob.glob(os.path.join(CASES_DIR, "*.json"))):
+        key = unicodedata.normalize("NFC", os.path.basename(path))
+        if key in seen:
+            continue
+        seen.add(key)
+        with open(path, encoding="utf-8") as f:
+            c = json.load(f)
+        cases.append({
+            "name": os.path.splitext(key)[0], "source": "cases/" + key, "engine": ENGINE_SHEET,
+            "input": c["入力"], "expected": {"見積り_税抜": c["社長見積り_税抜"]}, "reference": True,
+        })
+
+    import checks
+    for name in checks.CHECKS:
+        cases.append({
+            "name": name, "source": "checks.py", "engine": ENGINE_CHECK,
+            "input": {"check": name}, "expected": {"result": "ok"}, "reference": False,
+        })
+
+    if generated is None:
+        generated = sorted(glob.glob(os.path.join(GENERATED_DIR, "*.json")))
+    for path in generated:
+        with open(path, encoding="utf-8") as f:
+            g = json.load(f)
+        src = os.path.relpath(path, EVALS_DIR)
+        for c in g["cases"]:
+            cases.append({
+                "name": c["name"], "source": src, "engine": g["engine"],
+                "input": c["input"], "expected": c["expected"], "reference": False,
+            })
+    return cases
+
+
+# ===== 計算と比較 =====
+
+_SHEET_DATA = None
+
+
+def evaluate(engine: str, input_data: Dict[str, Any]) -> Dict[str, Any]:
+    """ケース入力を本体のエンジンで計算する。"""
+    global _SHEET_DATA
+    if engine == ENGINE_SHEET:
+        if _SHEET_DATA is None:
+            _SHEET_DATA = calc_sheet.load_data()
+        return calc_sheet.calc_見積り_税抜(input_data, *_SHEET_DATA)
+    if engine == ENGINE_V21:
+        return calc_bending.estimate(**input_data)
+    if engine == ENGINE_CHECK:
+        import checks
+        return checks.run(input_data["check"])
+    raise ValueError(f"未知のエンジン: {engine}")
+
+
+def flatten(d: Dict[str, Any], prefix: str = "") -> Dict[str, Any]:
+    out = {}
+    for k, v in d.items():
+        key = f"{prefix}{k}"
+        if isinstance(v, dict):
+            out.update(flatten(v, key + "."))
+        else:
+            out[key] = v
+    return out
+
+
+def _same(a: Any, b: Any) -> bool:
+    if isinstance(a, float) or isinstance(b, float):
+        try:
+            return abs(float(a) - float(b)) <= 1e-9
+        except (TypeError, ValueError):
+            return False
+    return a == b
+
+
+def first_divergence(expected: Dict[str, Any], got: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """期待値の項目順（= 計算順）に見て、最初に一致しない項目を返す。"""
+    flat_got = flatten(got)
+    for field, exp in flatten(expected).items():
+        g = flat_got.get(field)
+        if not _same(exp, g):
+            return {"field": field, "expected": exp, "got": g}
+    return None
+
+
+def check_properties(engine: str, got: Dict[str, Any]) -> Optional[str]:
+    """入力によらず成り立つはずの性質。破れていればその説明を返す。"""
+    if engine == ENGINE_SHEET:
+        if got["単価_税抜"] % 50 != 0:
+            return f"単価が50円単位でない: {got['単価_税抜']}"
+        if got["単価_税抜"] < 0:
+            return f"単価が負: {got['単価_税抜']}"
+    elif engine == ENGINE_V21:
+        b = got["breakdown"]
+        if b["bending_cost"]["total"] < calc_bending.BENDING_FLOOR:
+            return f"曲げ工賃が下限未満: {b['bending_cost']['total']}"
+        if got["total_estimate"]["processing_cost_tax_excluded"] != b["bending_cost"]["total"] + b["hole_cost"]["total"]:
+            return "税抜合計が曲げ＋穴あけと一致しない"
+    return None
+
+
+def run_case(case: Dict[str, Any]) -> Dict[str, Any]:
+    res = {"name": case["name"], "source": case["source"], "engine": case["engine"], "reference": case["reference"]}
+    try:
+        got = evaluate(case["engine"], case["input"])
+    except Exception as e:
+        res.update(status="ERR", error=str(e), input=case["input"])
+        return res
+    diff = first_divergence(case["expected"], got)
+    prop = check_properties(case["engine"], got)
+    if diff is None and prop is None:
+        res["status"] = "OK"
+    else:
+        res["status"] = "REF" if case["reference"] and prop is None else "NG"
+        res.update(first_diverging=diff, property_violation=prop, input=case["input"],
+                   expected=case["expected"], got=got)
+    return res
+
+
+def _run_chunk(chunk: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    return [run_case(c) for c in chunk]
+
+
+def run_all(cases: List[Dict[str, Any]], workers: int = 0, chunk_size: int = 2000) -> List[Dict[str, Any]]:
+    """ケースをチャンクに分けてプロセスプールで計算する（件数が少なければ直列）。結果は入力順。"""
+    workers = workers or os.cpu_count() or 1
+    if workers <= 1 or len(cases) <= chunk_size:
+        return _run_chunk(cases)
+    from concurrent.futures import ProcessPoolExecutor
+    chunks = [cases[i:i + chunk_size] for i in range(0, len(cases), chunk_size)]
+    results: List[Dict[str, Any]] = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for part in pool.map(_run_chunk, chunks):
+            results.extend(part)
+    return results
+
+
+# ===== スナップショット生成（property-based） =====
+
+def _sheet_inputs(n: int, seed: int) -> Iterable[Dict[str, Any]]:
+    rng = random.Random(seed)
+    _, rates = calc_sheet.load_data()
+    shapes = list(rates["形状乗率"])
+    materials = [m for m, g in rates["比重"].items() if g is not None]
+    thicknesses = [1.6, 2.3, 3.2, 4.5, 6.0, 9.0, 12.0]
+    for _ in range(n):
+        yield {
+            "形状": rng.choice(shapes),
+            "板厚_mm": rng.choice(thicknesses),
+            "展開幅_mm": rng.randint(20, 1500),
+            "製品長さ_mm": rng.choice([rng.randint(20, 4000), rng.choice([835, 1670, 2505, 3048])]),
+            "材質": rng.choice(materials),
+            "数量": rng.choice([1, 2, 5, 9, 10, 20, 29, 30, 100]),
+        }
+
+
+def generate(engine: str, n: int, seed: int) -> Dict[str, Any]:
+    """現在のエンジン・価格表で n 件の入力と結果を記録する。"""
+    if engine == ENGINE_SHEET:
+        inputs = list(_sheet_inputs(n, seed))
+    elif engine == ENGINE_V21:
+        from workload import generate_parts
+        inputs = generate_parts(n, seed)
     else:
-        unit_price = round(raw / 100) * 100
-    見積り_税抜 = unit_price * qty
-
-    return {
-        "重量_kg": round(weight, 3),
-        "基準価格": base,
-        "形状乗率": shape_rate,
-        "数量調整": qty_rate,
-        "単価_税抜": unit_price,
-        "見積り_税抜": 見積り_税抜,
-    }
-
-
-def main():
-    prices, rates = load_data()
-    evals_path = os.path.join(EVALS_DIR, "evals.json")
-    with open(evals_path, encoding="utf-8") as f:
-        cases = json.load(f)
-
-    ok = 0
-    ng = 0
-    for c in cases:
-        name = c["name"]
+        raise ValueError(f"未知のエンジン: {engine}")
+    cases = []
+    for i, inp in enumerate(inputs):
         try:
-            got = calc_見積り_税抜(c["input"], prices, rates)
-            exp = c["expected"]
-            # 見積り_税抜が一致すればOK（中間値は参考表示）
-            if got["見積り_税抜"] == exp["見積り_税抜"]:
-                print(f"OK  {name}")
-                ok += 1
-            else:
-                print(f"NG  {name}  期待={exp['見積り_税抜']}  実際={got['見積り_税抜']}")
-                ng += 1
-        except Exception as e:
-            print(f"ERR {name}  {e}")
-            ng += 1
+            expected = evaluate(engine, inp)
+        except ValueError:
+            continue
+        cases.append({"name": f"gen_{engine}_{seed}_{i:06d}", "input": inp, "expected": expected})
+    return {"engine": engine, "seed": seed, "cases": cases}
+
+
+# ===== main =====
+
+def summarize(results: List[Dict[str, Any]]) -> Dict[str, int]:
+    s = {"OK": 0, "NG": 0, "ERR": 0, "REF": 0}
+    for r in results:
+        s[r["status"]] += 1
+    return s
+
+
+def print_result(r: Dict[str, Any]) -> None:
+    if r["status"] == "OK":
+        print(f"OK  {r['name']}")
+    elif r["status"] == "ERR":
+        print(f"ERR {r['name']}  {r['error']}")
+    else:
+        d = r.get("first_diverging")
+        msg = f"{d['field']} 期待={d['expected']}  実際={d['got']}" if d else ""
+        if r.get("property_violation"):
+            msg = (msg + "  " if msg else "") + r["property_violation"]
+        print(f"{r['status']:3s} {r['name']}  {msg}")
+
+
+def main(argv: Optional[List[str]] = None):
+    import argparse
+    p = argparse.ArgumentParser(description="曲げ見積り evals")
+    p.add_argument("--workers", type=int, default=0, help="プロセス数（0 = CPU 数）")
+    p.add_argument("--report", default=None, help="結果を JSON で保存するパス")
+    p.add_argument("--report-all", action="store_true", help="OK のケースもレポートに含める")
+    p.add_argument("--generated", nargs="*", default=None, help="読み込むスナップショット（既定: evals/generated/*.json）")
+    p.add_argument("--strict", action="store_true", help="参考ケース（社長見積り）との差も失敗にする")
+    p.add_argument("--quiet", action="store_true", help="OK の行を表示しない")
+    sub = p.add_subparsers(dest="cmd")
+    g = sub.add_parser("gen", help="現在の結果をスナップショットとして保存")
+    g.add_argument("--engine", choices=[ENGINE_SHEET, ENGINE_V21, "both"], default="both")
+    g.add_argument("--n", type=int, default=20000)
+    g.add_argument("--seed", type=int, default=1)
+    g.add_argument("--out-dir", default=GENERATED_DIR)
+    args = p.parse_args(argv)
+
+    if args.cmd == "gen":
+        os.makedirs(args.out_dir, exist_ok=True)
+        engines = [ENGINE_SHEET, ENGINE_V21] if args.engine == "both" else [args.engine]
+        for engine in engines:
+            snap = generate(engine, args.n, args.seed)
+            path = os.path.join(args.out_dir, f"{engine}_seed{args.seed}.json")
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(snap, f, ensure_ascii=False)
+            print(f"作成しました: {path}（{len(snap['cases'])} 件）")
+        return 0
+
+    cases = load_cases(args.generated)
+    results = run_all(cases, args.workers)
+    for r in results:
+        if r["status"] != "OK" or not (args.quiet or r["source"].startswith("generated")):
+            print_result(r)
+    s = summarize(results)
+    failed = s["NG"] + s["ERR"] + (s["REF"] if args.strict else 0)
+
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump({
+                "summary": s,
+                "results": [r for r in results if args.report_all or r["status"] != "OK"],
+            }, f, ensure_ascii=False, indent=2)
 
     print("---")
-    print(f"合計: {ok} 成功, {ng} 失敗")
-    return 0 if ng == 0 else 1
+    print(f"合計: {s['OK']} 成功, {failed} 失敗"
+          + (f", 社長見積りとの差 {s['REF']} 件（参考）" if s["REF"] and not args.strict else ""))
+    return 0 if failed == 0 else 1
 
 
 if __name__ == "__main__":
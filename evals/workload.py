@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+見積り入力の合成ワークロード生成（シード固定）。ベンチマークと property-based の evals で共用する。
+形状・重量・長さの分布は bending_price_table.csv の区分、板厚は data/bending_logic.json の板厚グループから取る。
+"""
+import json
+import os
+import random
+import sys
+from typing import Any, Dict, List
+
+EVALS_DIR = os.path.dirname(os.path.abspath(__file__))
+SKILL_DIR = os.path.dirname(EVALS_DIR)
+SRC_DIR = os.path.join(SKILL_DIR, "src")
+DATA_DIR = os.path.join(SKILL_DIR, "data")
+
+if SRC_DIR not in sys.path:
+    sys.path.insert(0, SRC_DIR)
+
+import calc_bending  # noqa: E402
+
+# 数量は小ロットが多い（実績の傾向）
+LOT_CHOICES = [1, 1, 1, 2, 2, 3, 4, 5, 5, 10, 10, 15, 20, 30, 50, 100]
+
+
+def _thicknesses() -> List[float]:
+    with open(os.path.join(DATA_DIR, "bending_logic.json"), encoding="utf-8") as f:
+        logic = json.load(f)
+    return sorted(float(t) for t in logic["板厚グループ"])
+
+
+def _draw_in_class(rng: random.Random, limits: List[float], cap: float) -> float:
+    """区分を一様に選び、その区分の (前の上限, 上限] から値を取る。最後の区分は cap で打ち切る。"""
+    i = rng.randrange(len(limits))
+    lo = limits[i - 1] if i > 0 else 0.0
+    hi = min(limits[i], cap)
+    if hi <= lo:
+        hi = lo * 1.5
+    # 境界ちょうどの値も一定割合で混ぜる
+    if rng.random() < 0.05:
+        return float(hi)
+    return rng.uniform(lo, hi)
+
+
+def generate_parts(n: int, seed: int = 1, table_path: str = None) -> List[Dict[str, Any]]:
+    """estimate() のキーワード引数の辞書を n 件返す。"""
+    rng = random.Random(seed)
+    table = calc_bending.get_price_table(table_path)
+    shapes = table.shapes
+    weights = sorted({r["重量範囲"] for r in table.rows})
+    thicknesses = _thicknesses()
+    parts = []
+    for _ in range(n):
+        weight = round(_draw_in_class(rng, [0.5, 1.0] + weights, 300.0), 3)
+        length = round(_draw_in_class(rng, calc_bending.LENGTH_THRESHOLDS, 4200.0), 1)
+        parts.append({
+            "shape": rng.choice(shapes),
+            "weight_kg": weight,
+            "length_mm": length,
+            "long_side_mm": round(max(length, rng.uniform(30, 1500)) if rng.random() < 0.7 else rng.uniform(30, 400), 1),
+            "lot": rng.choice(LOT_CHOICES),
+            "thickness_mm": rng.choice(thicknesses),
+            "punch_count": rng.choice([0, 0, 0, 2, 4]),
+            "pierce_count": rng.choice([0, 0, 1, 2, 4, 8]),
+            "nakagoshi": rng.random() < 0.1,
+            "reverse_bend": rng.random() < 0.1,
+            "meoshi_long": rng.random() < 0.05,
+            "fukabend": rng.random() < 0.05,
+        })
+    return parts
+
+
+def to_columns(parts: List[Dict[str, Any]]) -> Dict[str, List[Any]]:
+    """estimate_many() に渡す列形式に変換する（オプションは flags ビットにまとめる）。"""
+    cols: Dict[str, List[Any]] = {k: [] for k in (
+        "shape", "weight_kg", "length_mm", "long_side_mm", "lot", "thickness_mm",
+        "punch_count", "pierce_count", "flags",
+    )}
+    for p in parts:
+        for k in cols:
+            if k != "flags":
+                cols[k].append(p[k])
+        cols["flags"].append(
+            (calc_bending.FLAG_NAKAGOSHI if p["nakagoshi"] else 0)
+            | (calc_bending.FLAG_REVERSE_BEND if p["reverse_bend"] else 0)
+            | (calc_bending.FLAG_MEOSHI_LONG if p["meoshi_long"] else 0)
+            | (calc_bending.FLAG_FUKABEND if p["fukabend"] else 0)
+        )
+    return cols
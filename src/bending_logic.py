@@ -0,0 +1,295 @@
+# -*- coding: utf-8 -*-
+"""
+曲げ加工費 v3 — data/bending_logic.json（価格計算用_4.xlsm 準拠、20kg で方式が分岐）の計算エンジン。
+見積り計算書.html の calcM1() と同じ規則を Python で計算する。
+
+- 板厚 → 板厚グループ（A〜E）
+- 20kg 未満: 箇所単価方式。長さ区分の [min, max] を 長さ/区分上限 で線形補間し、四捨五入 × 曲げ回数
+- 20kg 以上: 重量単価方式。(1曲げ円/kg + 長さ加算) × 重量 + (追加円/kg + 長さ加算) × (曲げ回数-1) × 重量 を四捨五入
+- 形状 → 曲げ回数
+
+JSON は compile_logic() で一度だけ平たい配列（区分上限・係数をグループごとに連結し、開始・終了位置で引く）に
+変換し、calc_bending_v3()（1件）と calc_bending_v3_many()（numpy 列）はその配列だけを見る。
+"""
+
+import json
+import math
+import os
+from bisect import bisect_left
+from typing import Any, Dict, List, Optional, Tuple
+
+SKILL_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_LOGIC_PATH = os.path.join(SKILL_DIR, "data", "bending_logic.json")
+
+METHOD_UNDER = "箇所単価"
+METHOD_OVER = "重量単価"
+
+
+def _round_half_up(x: float) -> int:
+    """JavaScript の Math.round と同じ（.5 は +∞ 方向）。"""
+    return int(math.floor(x + 0.5))
+
+
+class CompiledLogic:
+    """
+    bending_logic.json をコンパイルした平たい表。
+    under_* / over_* はグループごとの区分を連結したリストで、グループ g の区分は [offset[g], offset[g+1])。
+    """
+
+    def __init__(self, logic: Dict[str, Any], version: Optional[str] = None):
+        self.version = version or logic.get("_version")
+        self.groups: List[str] = sorted(set(logic["板厚グループ"].values()))
+        gidx = {g: i for i, g in enumerate(self.groups)}
+
+        pairs = sorted((float(t), gidx[g]) for t, g in logic["板厚グループ"].items())
+        self.thickness_keys: List[float] = [t for t, _ in pairs]
+        self.thickness_group: List[int] = [g for _, g in pairs]
+
+        self.weight_split_kg: float = float(logic["重量分岐_kg"])
+
+        under = logic["20kg未満"]
+        self.under_limits: List[float] = []
+        self.under_min: List[float] = []
+        self.under_max: List[float] = []
+        self.under_offset: List[int] = [0]
+        over = logic["20kg以上"]
+        self.over_first: List[float] = []
+        self.over_add: List[float] = []
+        self.over_limits: List[float] = []
+        self.over_len_add: List[float] = []
+        self.over_offset: List[int] = [0]
+        for g in self.groups:
+            for lim, (mn, mx) in sorted((float(k), v) for k, v in under.get(g, {}).items()):
+                self.under_limits.append(lim)
+                self.under_min.append(float(mn))
+                self.under_max.append(float(mx))
+            self.under_offset.append(len(self.under_limits))
+            o = over[g]
+            self.over_first.append(float(o["1曲げ_円perkg"]))
+            self.over_add.append(float(o["追加_円perkg"]))
+            for lim, la in sorted((float(k), v) for k, v in o["長さ加算_円perkg"].items()):
+                self.over_limits.append(lim)
+                self.over_len_add.append(float(la))
+            self.over_offset.append(len(self.over_limits))
+
+        self.bends: Dict[str, int] = dict(logic["形状→曲げ回数"])
+        self.setup_yen_per_hour: Optional[float] = logic.get("段取り費_円per時")
+
+    # ----- 検索 -----
+
+    def group_index(self, thickness_mm: float) -> int:
+        """板厚（表にある値のみ）→ グループ番号。"""
+        i = bisect_left(self.thickness_keys, thickness_mm - 1e-9)
+        if i < len(self.thickness_keys) and abs(self.thickness_keys[i] - thickness_mm) <= 1e-9:
+            return self.thickness_group[i]
+        raise ValueError(f"板厚グループが見つかりません: {thickness_mm}")
+
+    def bend_count(self, shape: str) -> int:
+        n = self.bends.get(shape)
+        if n is None:
+            raise ValueError(f"形状の曲げ回数が見つかりません: {shape}")
+        return n
+
+    # ----- numpy 用 -----
+
+    def arrays(self, np) -> Dict[str, Any]:
+        """calc_bending_v3_many() 用に numpy 配列へ変換したもの（初回だけ作って保持）。"""
+        a = getattr(self, "_arrays", None)
+        if a is None:
+            a = {
+                name: np.asarray(getattr(self, name), dtype=np.float64)
+                for name in ("thickness_keys", "under_limits", "under_min", "under_max",
+                             "over_first", "over_add", "over_limits", "over_len_add")
+            }
+            a["thickness_group"] = np.asarray(self.thickness_group, dtype=np.int64)
+            self._arrays = a
+        return a
+
+
+def compile_logic(path: Optional[str] = None) -> CompiledLogic:
+    with open(path or DEFAULT_LOGIC_PATH, encoding="utf-8") as f:
+        return CompiledLogic(json.load(f))
+
+
+# プロセス内キャッシュ: 絶対パス → (mtime_ns, size, CompiledLogic)
+_LOGIC_CACHE: Dict[str, Tuple[int, int, CompiledLogic]] = {}
+
+
+def get_logic(path: Optional[str] = None) -> CompiledLogic:
+    """compile_logic() の結果をプロセス内で使い回す。ファイルの mtime・サイズが変われば作り直す。"""
+    path = os.path.abspath(path or DEFAULT_LOGIC_PATH)
+    st = os.stat(path)
+    cached = _LOGIC_CACHE.get(path)
+    if cached is not None and cached[0] == st.st_mtime_ns and cached[1] == st.st_size:
+        return cached[2]
+    logic = compile_logic(path)
+    _LOGIC_CACHE[path] = (st.st_mtime_ns, st.st_size, logic)
+    return logic
+
+
+def calc_bending_v3(
+    shape: Optional[str],
+    thickness_mm: float,
+    weight_kg: float,
+    length_mm: float,
+    bends: Optional[int] = None,
+    logic: Optional[CompiledLogic] = None,
+) -> Dict[str, Any]:
+    """
+    曲げ加工費（v3, 20kg 分岐）。bends を渡すと形状の曲げ回数の代わりに使う（手入力）。
+    長さが区分の上限を超える場合は ValueError（見積り計算書.html の「長さ範囲外」）。
+    """
+    if logic is None:
+        logic = get_logic()
+    g = logic.group_index(thickness_mm)
+    if bends is None:
+        bends = logic.bend_count(shape)
+
+    if weight_kg < logic.weight_split_kg:
+        lo, hi = logic.under_offset[g], logic.under_offset[g + 1]
+        i = bisect_left(logic.under_limits, length_mm, lo, hi)
+        if i >= hi:
+            raise ValueError(f"長さ範囲外: {length_mm}mm（グループ{logic.groups[g]}）")
+        cat = logic.under_limits[i]
+        mn, mx = logic.under_min[i], logic.under_max[i]
+        per = _round_half_up(mn + (mx - mn) * min(length_mm / cat, 1))
+        return {
+            "group": logic.groups[g],
+            "method": METHOD_UNDER,
+            "length_class": int(cat),
+            "bends": bends,
+            "per_bend_yen": per,
+            "total": per * bends,
+        }
+
+    lo, hi = logic.over_offset[g], logic.over_offset[g + 1]
+    i = bisect_left(logic.over_limits, length_mm, lo, hi)
+    if i >= hi:
+        raise ValueError(f"長さ範囲外: {length_mm}mm（グループ{logic.groups[g]}）")
+    la = logic.over_len_add[i]
+    r1 = logic.over_first[g] + la
+    ra = logic.over_add[g] + la
+    total = _round_half_up(r1 * weight_kg + ra * (bends - 1) * weight_kg)
+    return {
+        "group": logic.groups[g],
+        "method": METHOD_OVER,
+        "length_class": int(logic.over_limits[i]),
+        "bends": bends,
+        "rate_first_yen_per_kg": r1,
+        "rate_add_yen_per_kg": ra,
+        "total": total,
+    }
+
+
+def calc_bending_v3_many(
+    thickness_mm,
+    weight_kg,
+    length_mm,
+    shape=None,
+    bends=None,
+    logic: Optional[CompiledLogic] = None,
+) -> Dict[str, Any]:
+    """
+    calc_bending_v3() の列指向版（numpy）。shape（形状名の配列）か bends（曲げ回数の配列）のどちらかを渡す。
+    戻り値の valid が False の行（板厚・長さが範囲外）は total が 0。それ以外は calc_bending_v3() と同じ値。
+    スカラーを渡すと長さ1の配列として計算する（戻り値も長さ1の配列）。
+    """
+    try:
+        import numpy as np
+    except ImportError:
+        raise ImportError("calc_bending_v3_many() には numpy が必要です: pip install numpy") from None
+    if logic is None:
+        logic = get_logic()
+    a = logic.arrays(np)
+
+    # 0 次元だと valid[s] = ok などの代入ができないので、1次元にそろえる
+    t = np.asarray(thickness_mm, dtype=np.float64).reshape(-1)
+    w, length = (np.broadcast_to(np.asarray(x, dtype=np.float64).reshape(-1), t.shape) for x in (weight_kg, length_mm))
+    if bends is None:
+        if shape is None:
+            raise ValueError("shape か bends が必要です")
+        names = np.asarray(shape).reshape(-1)
+        uniq, inv = np.unique(names.astype(str), return_inverse=True)
+        n = np.asarray([logic.bend_count(u) for u in uniq.tolist()], dtype=np.int64)[inv.reshape(names.shape)]
+        n = np.broadcast_to(n, t.shape)
+    else:
+        n = np.broadcast_to(np.asarray(bends, dtype=np.int64).reshape(-1), t.shape)
+
+    # 板厚 → グループ（表にある板厚だけ有効）
+    keys = a["thickness_keys"]
+    ti = np.minimum(np.searchsorted(keys, t - 1e-9, side="left"), len(keys) - 1)
+    valid = np.abs(keys[ti] - t) <= 1e-9
+    g = np.where(valid, a["thickness_group"][ti], 0)
+
+    under = w < logic.weight_split_kg
+    total = np.zeros(t.shape, dtype=np.int64)
+    length_class = np.zeros(t.shape, dtype=np.int64)
+    for gi in range(len(logic.groups)):
+        sel = valid & (g == gi)
+        if not sel.any():
+            continue
+        # 20kg 未満
+        lo, hi = logic.under_offset[gi], logic.under_offset[gi + 1]
+        s = sel & under
+        if s.any() and hi > lo:
+            lims = a["under_limits"][lo:hi]
+            k = np.searchsorted(lims, length[s], side="left")
+            ok = k < (hi - lo)
+            kc = np.minimum(k, hi - lo - 1)
+            cat = lims[kc]
+            mn, mx = a["under_min"][lo:hi][kc], a["under_max"][lo:hi][kc]
+            per = np.floor(mn + (mx - mn) * np.minimum(length[s] / cat, 1) + 0.5).astype(np.int64)
+            total[s] = np.where(ok, per * n[s], 0)
+            length_class[s] = np.where(ok, cat.astype(np.int64), 0)
+            valid[s] = ok
+        elif s.any():
+            valid[s] = False
+        # 20kg 以上
+        lo, hi = logic.over_offset[gi], logic.over_offset[gi + 1]
+        s = sel & ~under
+        if s.any():
+            lims = a["over_limits"][lo:hi]
+            k = np.searchsorted(lims, length[s], side="left")
+            ok = k < (hi - lo)
+            kc = np.minimum(k, hi - lo - 1)
+            la = a["over_len_add"][lo:hi][kc]
+            r1 = a["over_first"][gi] + la
+            ra = a["over_add"][gi] + la
+            ws = w[s]
+            cost = np.floor(r1 * ws + ra * (n[s] - 1) * ws + 0.5).astype(np.int64)
+            total[s] = np.where(ok, cost, 0)
+            length_class[s] = np.where(ok, lims[kc].astype(np.int64), 0)
+            valid[s] = ok
+
+    return {
+        "group_index": g,
+        "under_split": under,
+        "length_class": length_class,
+        "bends": n,
+        "total": total,
+        "valid": valid,
+    }
+
+
+def main():
+    import argparse
+    p = argparse.ArgumentParser(description="曲げ加工費 v3（bending_logic.json, 20kg 分岐）")
+    p.add_argument("--shape", default=None, help="形状（--bends 指定時は不要）")
+    p.add_argument("--bends", type=int, default=None, help="曲げ回数（手入力）")
+    p.add_argument("--thickness", type=float, required=True, help="板厚 mm")
+    p.add_argument("--weight", type=float, required=True, help="重量 kg")
+    p.add_argument("--length", type=float, required=True, help="長さ mm")
+    p.add_argument("--logic", default=None, help="bending_logic.json のパス")
+    args = p.parse_args()
+    if args.shape is None and args.bends is None:
+        p.error("--shape か --bends が必要です")
+    result = calc_bending_v3(
+        args.shape, args.thickness, args.weight, args.length, args.bends,
+        logic=get_logic(args.logic),
+    )
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
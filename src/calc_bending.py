@@ -2,60 +2,389 @@
 """
 曲げ加工見積もりシステム v2.1 — 加工工賃のみの計算ロジック
 bending_price_table.csv と板厚別ピアス単価を使用。
+compile-tables で価格表をバイナリのスナップショット（bending_price_table.snap）にしておくと、
+CLI の起動時に CSV を解析せず mmap で読む（CSV が更新されていれば CSV を読む）。
 """
+from __future__ import annotations
 
-import csv
 import json
 import os
-from typing import Any, List, Dict, Optional
+from bisect import bisect_left
+from collections import OrderedDict
+from time import perf_counter
+from typing import Any, List, Dict, Optional, Tuple
+
+import fixed_point
+from fixed_point import SEN_PER_YEN, apply_rate, per_mille
+
+# 1件だけの CLI 起動を速くするため、csv / hashlib は使うときに読み込む
 
 # 長さ列の上限 (mm)。ヘッダー 〜835mm, 〜1670mm, 〜2505mm, 〜3048mm, 3048mm超
 LENGTH_COLUMNS = ["〜835mm", "〜1670mm", "〜2505mm", "〜3048mm", "3048mm超"]
 LENGTH_THRESHOLDS = [835, 1670, 2505, 3048, 99999]
 
-# ピアス単価: 板厚 t (mm) → 円/個
+# ピアス単価: 板厚 t (mm) → 円/個（t <= 帯の上限 となる最初の帯、どれにも入らなければ最後）
+PIERCE_THICKNESS_BANDS = [2.3, 4.5, 9.0, 12.0]
+PIERCE_PRICES = [30, 60, 100, 150, 200]
+
+
 def pierce_price_for_thickness(t: float) -> int:
-    if t <= 2.3:
-        return 30
-    if t <= 4.5:
-        return 60
-    if t <= 9.0:
-        return 100
-    if t <= 12.0:
-        return 150
-    return 200
+    for limit, price in zip(PIERCE_THICKNESS_BANDS, PIERCE_PRICES):
+        if t <= limit:
+            return price
+    return PIERCE_PRICES[-1]
 
 # レーザーポンチ単価
 PUNCH_PRICE = 30
 
 # 数量スライド: 1-4 → 1.5, 5-19 → 1.0, 20+ → 0.8
+QUANTITY_BANDS = [4, 19]
+QUANTITY_FACTORS = [1.5, 1.0, 0.8]
+
+
 def quantity_factor(lot: int) -> float:
-    if lot <= 4:
-        return 1.5
-    if lot <= 19:
-        return 1.0
-    return 0.8
+    for limit, factor in zip(QUANTITY_BANDS, QUANTITY_FACTORS):
+        if lot <= limit:
+            return factor
+    return QUANTITY_FACTORS[-1]
 
 # 小物割引: 長辺<=300 かつ 重量<=1.0 → 0.8、曲げ工賃下限300円
 BENDING_FLOOR = 300
 SMALL_PART_DISCOUNT = 0.8
+SMALL_PART_MAX_LONG_SIDE_MM = 300
+SMALL_PART_MAX_WEIGHT_KG = 1.0
+
+# 難易度・オプション
+NAKAGOSHI_FACTOR = 1.5
+REVERSE_BEND_FACTOR = 1.2
+MEOSHI_LONG_MIN_LENGTH_MM = 1000
+MEOSHI_LONG_ADDON = 2500
+FUKABEND_ADDON = 3000
+
+# 丸め（fixed_point.ROUNDING_POLICIES の名前）。曲げ工賃は銭で計算して最後に円へ。
+# 税込は従来どおり round(税抜 × (1 + 税率))（fixed_point.LEGACY_TAX）で、見積りの金額を変えない
+BENDING_ROUNDING = "half_even"
+TAX_ROUNDING = fixed_point.LEGACY_TAX
+
+# estimate_many() の flags ビット
+FLAG_NAKAGOSHI = 1
+FLAG_REVERSE_BEND = 2
+FLAG_MEOSHI_LONG = 4
+FLAG_FUKABEND = 8
 
 
 def load_price_table(path: str) -> List[Dict]:
     """CSV を読み込み、形状・重量範囲で検索可能な行リストを返す。"""
-    rows = []
     with open(path, encoding="utf-8") as f:
-        r = csv.DictReader(f)
-        for row in r:
-            row["重量範囲"] = int(row["重量範囲"])
-            for col in LENGTH_COLUMNS:
-                row[col] = int(row[col])
-            rows.append(row)
+        return _parse_price_rows(f)
+
+
+def _parse_price_rows(lines) -> List[Dict]:
+    import csv
+    rows = []
+    for row in csv.DictReader(lines):
+        row["重量範囲"] = int(row["重量範囲"])
+        for col in LENGTH_COLUMNS:
+            row[col] = int(row[col])
+        rows.append(row)
     return rows
 
 
+class ResultCache:
+    """
+    上限付きの LRU。calc_bending() の結果を区分キー（生の寸法ではなく、価格に効く区分の組）で持つ。
+    PriceTable ごとに1つなので、価格表が読み直されれば新しい空のキャッシュになる。
+    """
+
+    def __init__(self, maxsize: int = 8192):
+        self.maxsize = maxsize
+        self._data: "OrderedDict[tuple, Dict[str, Any]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: tuple) -> Optional[Dict[str, Any]]:
+        value = self._data.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        try:
+            self._data.move_to_end(key)
+        except KeyError:
+            # 別スレッドが直前に追い出した（値はそのまま使える）。読む側はロックを取らない
+            pass
+        self.hits += 1
+        return value
+
+    def put(self, key: tuple, value: Dict[str, Any]) -> None:
+        self._data[key] = value
+        self._data.move_to_end(key)
+        if len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self) -> None:
+        self._data.clear()
+        self.hits = self.misses = self.evictions = 0
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "size": len(self._data), "maxsize": self.maxsize,
+            "hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+        }
+
+
+class PriceTable:
+    """
+    読み込み済みの価格表。形状ごとに重量しきい値を一度だけソートして保持し、
+    重量・長さの区分を bisect で引く（検索時にファイル I/O もソートもしない）。
+    rows には load_price_table() と同じ行リストをそのまま持つ。
+    """
+
+    def __init__(self, rows: List[Dict], source_hash: Optional[str] = None):
+        self.rows = rows
+        self.source_hash = source_hash
+        self.bending_cache = ResultCache()
+        # 形状 → (重量しきい値の昇順リスト, 同順の行リスト)
+        self._by_shape: Dict[str, Tuple[List[int], List[Dict]]] = {}
+        grouped: Dict[str, List[Dict]] = {}
+        for r in rows:
+            grouped.setdefault(r["形状"], []).append(r)
+        for shape, shape_rows in grouped.items():
+            # 安定ソートなので同じ重量範囲が複数あればファイル上で先の行が採用される（従来と同じ）
+            shape_rows.sort(key=lambda r: r["重量範囲"])
+            self._by_shape[shape] = ([r["重量範囲"] for r in shape_rows], shape_rows)
+
+    @property
+    def shapes(self) -> List[str]:
+        return list(self._by_shape)
+
+    def weight_thresholds(self, shape: str) -> List[int]:
+        """形状の重量範囲（昇順）。"""
+        entry = self._by_shape.get(shape)
+        if entry is None:
+            raise ValueError(f"形状が見つかりません: {shape}")
+        return list(entry[0])
+
+    def classify(self, shape: str, weight_kg: float, length_mm: float) -> Tuple[int, int]:
+        """(形状内の行番号, 長さ列番号)。lookup() と calc_bending() のキャッシュキーが使う。"""
+        entry = self._by_shape.get(shape)
+        if entry is None:
+            raise ValueError(f"形状が見つかりません: {shape}")
+        weights = entry[0]
+        i = bisect_left(weights, weight_kg)
+        j = bisect_left(LENGTH_THRESHOLDS, length_mm)
+        return (i if i < len(weights) else len(weights) - 1), (j if j < len(LENGTH_COLUMNS) else len(LENGTH_COLUMNS) - 1)
+
+    def lookup(self, shape: str, weight_kg: float, length_mm: float) -> tuple:
+        """get_base_price() と同じ規則で (価格, 重量クラス, 長さクラス) を返す。"""
+        i, j = self.classify(shape, weight_kg, length_mm)
+        row = self._by_shape[shape][1][i]
+        col_name = LENGTH_COLUMNS[j]
+        return row[col_name], f"{row['重量範囲']}kg", col_name
+
+    def shape_arrays(self, np) -> Dict[str, Tuple[Any, Any]]:
+        """
+        estimate_many() 用: 形状 → (重量しきい値 float64[行], 価格 int64[行, 長さ列])。
+        numpy モジュールを受け取り、初回だけ作ってインスタンスに保持する。
+        """
+        arrays = getattr(self, "_arrays", None)
+        if arrays is None:
+            arrays = {}
+            for shape, (weights, shape_rows) in self._by_shape.items():
+                prices = [[r[c] for c in LENGTH_COLUMNS] for r in shape_rows]
+                arrays[shape] = (np.asarray(weights, dtype=np.float64), np.asarray(prices, dtype=np.int64))
+            self._arrays = arrays
+        return arrays
+
+
+DEFAULT_TABLE_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "data", "bending_price_table.csv"
+)
+
+# プロセス内キャッシュ: 絶対パス → (mtime_ns, size, PriceTable)
+_TABLE_CACHE: Dict[str, Tuple[int, int, PriceTable]] = {}
+# get_price_table() の結果の内訳（hit: 読み直し不要, snapshot / parsed: 読み込んだ, touched: mtime だけ変わっていた）
+_TABLE_STATS = {"hit": 0, "snapshot": 0, "parsed": 0, "touched": 0}
+
+# 段階ごとの計測フック。None なら計測しない（instrumentation.enable() が (段階名, 秒) を受け取る関数を入れる）
+_stage_hook = None
+
+
+def set_stage_hook(hook) -> None:
+    global _stage_hook
+    _stage_hook = hook
+
+
+def get_price_table(path: Optional[str] = None) -> PriceTable:
+    """
+    価格表をプロセス内で一度だけ読み込んで返す。
+    mtime・サイズが変わったときだけ中身のハッシュを取り直し、内容が変わっていれば読み直す。
+    """
+    path = os.path.abspath(path or DEFAULT_TABLE_PATH)
+    st = os.stat(path)
+    cached = _TABLE_CACHE.get(path)
+    if cached is not None and cached[0] == st.st_mtime_ns and cached[1] == st.st_size:
+        _TABLE_STATS["hit"] += 1
+        return cached[2]
+
+    table = load_snapshot(path, st)
+    if table is not None:
+        _TABLE_STATS["snapshot"] += 1
+    else:
+        import hashlib
+        with open(path, "rb") as f:
+            raw = f.read()
+        digest = hashlib.sha256(raw).hexdigest()
+        if cached is not None and cached[2].source_hash == digest:
+            # touch されただけ（内容は同じ）
+            table = cached[2]
+            _TABLE_STATS["touched"] += 1
+        else:
+            table = PriceTable(_parse_price_rows(raw.decode("utf-8").splitlines()), digest)
+            _TABLE_STATS["parsed"] += 1
+    _TABLE_CACHE[path] = (st.st_mtime_ns, st.st_size, table)
+    return table
+
+
+def clear_price_table_cache() -> None:
+    """get_price_table() のキャッシュを捨てる。"""
+    _TABLE_CACHE.clear()
+
+
+def price_table_cache_stats() -> Dict[str, int]:
+    """get_price_table() の呼び出し回数の内訳（プロセス起動からの累計）。"""
+    return dict(_TABLE_STATS)
+
+
+# ===== バイナリスナップショット =====
+# 形式（リトルエンディアン）:
+#   ヘッダー SNAPSHOT_HEADER: マジック, 形式バージョン, 長さ列数, 元CSVのサイズ・mtime_ns・sha256,
+#                            行数, 文字列数, 文字列領域のバイト数, crc32（ヘッダーの残り＋本体）
+#   本体: 文字列オフセット uint32[文字列数+1]
+#         行 int32[行数 × (3 + 長さ列数)] = 形状(文字列番号), No.(文字列番号), 重量範囲, 価格…（CSV の行順）
+#         文字列 UTF-8
+# 元の CSV とサイズ・mtime が一致するときだけ使う。合わなければ CSV を読む。
+
+SNAPSHOT_MAGIC = b"MTBS"
+SNAPSHOT_VERSION = 1
+SNAPSHOT_HEADER = "<4sHHQq32sIIII"
+_PRICE_COLUMNS = ["No.", "形状", "重量範囲"] + LENGTH_COLUMNS
+
+
+def snapshot_path_for(csv_path: str) -> str:
+    return os.path.splitext(csv_path)[0] + ".snap"
+
+
+def _int32_bytes(values: List[int]) -> bytes:
+    import sys
+    from array import array
+    arr = array("i", values)
+    if sys.byteorder == "big":
+        arr.byteswap()
+    return arr.tobytes()
+
+
+def compile_tables(csv_path: Optional[str] = None, out_path: Optional[str] = None) -> str:
+    """価格表 CSV をスナップショットに書き出し、そのパスを返す。"""
+    import hashlib
+    import struct
+    import zlib
+    csv_path = os.path.abspath(csv_path or DEFAULT_TABLE_PATH)
+    out_path = out_path or snapshot_path_for(csv_path)
+    st = os.stat(csv_path)  # 読む前に stat（読んでいる間に書き換わればスナップショットは古い扱いになる）
+    with open(csv_path, "rb") as f:
+        raw = f.read()
+    text = raw.decode("utf-8").splitlines()
+    header = text[0].lstrip("\ufeff").split(",") if text else []
+    if header != _PRICE_COLUMNS:
+        raise ValueError(f"スナップショットにできない列構成です: {header}")
+    rows = _parse_price_rows(text)
+
+    strings: List[str] = []
+    index: Dict[str, int] = {}
+
+    def intern(s: str) -> int:
+        if s not in index:
+            index[s] = len(strings)
+            strings.append(s)
+        return index[s]
+
+    cells: List[int] = []
+    for r in rows:
+        cells += [intern(r["形状"]), intern(r["No."]), r["重量範囲"]] + [r[c] for c in LENGTH_COLUMNS]
+    encoded = [s.encode("utf-8") for s in strings]
+    offsets = [0]
+    for b in encoded:
+        offsets.append(offsets[-1] + len(b))
+    blob = b"".join(encoded)
+    body = _int32_bytes(offsets) + _int32_bytes(cells) + blob
+
+    head = struct.pack(
+        SNAPSHOT_HEADER[:-1], SNAPSHOT_MAGIC, SNAPSHOT_VERSION, len(LENGTH_COLUMNS),
+        st.st_size, st.st_mtime_ns, hashlib.sha256(raw).digest(), len(rows), len(strings), len(blob),
+    )
+    crc = zlib.crc32(body, zlib.crc32(head))
+    tmp = out_path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(head + struct.pack("<I", crc) + body)
+    os.replace(tmp, out_path)
+    return out_path
+
+
+def load_snapshot(csv_path: str, st: Optional[os.stat_result] = None) -> Optional[PriceTable]:
+    """
+    csv_path のスナップショットを mmap で読んで PriceTable を返す。
+    無い・壊れている・形式が違う・CSV の方が新しい（サイズか mtime が違う）ときは None。
+    """
+    import mmap
+    import struct
+    import sys
+    import zlib
+    snap_path = snapshot_path_for(csv_path)
+    try:
+        if st is None:
+            st = os.stat(csv_path)
+        with open(snap_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            hsize = struct.calcsize(SNAPSHOT_HEADER)
+            (magic, version, n_cols, src_size, src_mtime, src_sha, n_rows, n_strings, blob_len,
+             crc) = struct.unpack_from(SNAPSHOT_HEADER, mm)
+            if (magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION or n_cols != len(LENGTH_COLUMNS)
+                    or src_size != st.st_size or src_mtime != st.st_mtime_ns):
+                return None
+            width = 3 + n_cols
+            body_len = 4 * (n_strings + 1) + 4 * n_rows * width + blob_len
+            if len(mm) != hsize + body_len or zlib.crc32(mm[hsize:], zlib.crc32(mm[:hsize - 4])) != crc:
+                return None
+            view = memoryview(mm)
+            try:
+                ints = view[hsize:hsize + body_len - blob_len].cast("i")
+                values = ints.tolist()
+                ints.release()
+            finally:
+                view.release()
+            if sys.byteorder == "big":
+                from array import array
+                arr = array("i", values)
+                arr.byteswap()
+                values = arr.tolist()
+            blob = mm[hsize + body_len - blob_len:]
+    except (OSError, ValueError, struct.error):
+        return None
+
+    offsets, cells = values[:n_strings + 1], values[n_strings + 1:]
+    strings = [blob[offsets[i]:offsets[i + 1]].decode("utf-8") for i in range(n_strings)]
+    rows = []
+    for k in range(0, len(cells), width):
+        shape_i, no_i, weight = cells[k:k + 3]
+        row = {"No.": strings[no_i], "形状": strings[shape_i], "重量範囲": weight}
+        row.update(zip(LENGTH_COLUMNS, cells[k + 3:k + width]))
+        rows.append(row)
+    return PriceTable(rows, src_sha.hex())
+
+
 def get_base_price(
-    table: list[dict],
+    table: "list[dict] | PriceTable",
     shape: str,
     weight_kg: float,
     length_mm: float,
@@ -65,7 +394,11 @@ def get_base_price(
     戻り値: (価格, 採用した重量クラス, 採用した長さクラス)
     重量: 入力重量 <= テーブル重量 となる最小の行
     長さ: 入力長さ <= テーブル長さ となる最小の列
+    table が PriceTable なら索引で引く。行リストの場合は従来どおり線形に探す。
     """
+    if isinstance(table, PriceTable):
+        return table.lookup(shape, weight_kg, length_mm)
+
     # 形状でフィルタ
     by_shape = [r for r in table if r["形状"] == shape]
     if not by_shape:
@@ -93,8 +426,218 @@ def get_base_price(
     return price, weight_class, length_class
 
 
+# ===== 結果の型 =====
+# 1件ごとに文字列キーの辞書を作らないよう、計算結果は __slots__ のオブジェクトで持つ。
+# to_dict() はこれまでの辞書と同じキー・同じ順番・同じ値を返す（JSON にしたときバイト単位で同じ）。
+
+def _json_num(v) -> str:
+    """json.dumps() と同じ数値の表記。"""
+    t = type(v)
+    if t is int or t is float:
+        return repr(v)
+    return json.dumps(v)
+
+
+class BendingResult:
+    """calc_bending() の結果。キャッシュで共有するので作った後は書き換えない。"""
+
+    __slots__ = ("base_price", "quantity_adjustment", "complexity_adjustment", "small_part_adjustment",
+                 "addons_yen", "weight_class", "length_class", "total")
+
+    def __init__(self, base_price, quantity_adjustment, complexity_adjustment, small_part_adjustment,
+                 addons_yen, weight_class, length_class, total):
+        self.base_price = base_price
+        self.quantity_adjustment = quantity_adjustment
+        self.complexity_adjustment = complexity_adjustment
+        self.small_part_adjustment = small_part_adjustment
+        self.addons_yen = addons_yen
+        self.weight_class = weight_class
+        self.length_class = length_class
+        self.total = total
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "base_price": self.base_price,
+            "quantity_adjustment": self.quantity_adjustment,
+            "complexity_adjustment": self.complexity_adjustment,
+            "small_part_adjustment": self.small_part_adjustment,
+            "addons_yen": self.addons_yen,
+            "weight_class": self.weight_class,
+            "length_class": self.length_class,
+            "total": self.total,
+        }
+
+
+class HoleResult:
+    """calc_hole_cost() の結果。lines は穴ごとの指定（holes）の明細（指定が無ければ None）。"""
+
+    __slots__ = ("punch_count", "punch_price", "pierce_count", "pierce_price", "total", "lines")
+
+    def __init__(self, punch_count, punch_price, pierce_count, pierce_price, total, lines=None):
+        self.punch_count = punch_count
+        self.punch_price = punch_price
+        self.pierce_count = pierce_count
+        self.pierce_price = pierce_price
+        self.total = total
+        self.lines = lines
+
+    def to_dict(self) -> Dict[str, Any]:
+        d = {
+            "punch_count": self.punch_count,
+            "punch_price": self.punch_price,
+            "pierce_count": self.pierce_count,
+            "pierce_price": self.pierce_price,
+            "total": self.total,
+        }
+        if self.lines is not None:
+            d["holes"] = [dict(line) for line in self.lines]
+        return d
+
+
+class Estimate:
+    """estimate() の結果（曲げ・穴あけ・税抜/税込の合計）。"""
+
+    __slots__ = ("bending", "hole", "tax_excluded", "tax_included")
+
+    def __init__(self, bending: BendingResult, hole: HoleResult, tax_rate: float = 0.1):
+        self.bending = bending
+        self.hole = hole
+        self.tax_excluded = bending.total + hole.total
+        self.tax_included = fixed_point.tax_included(self.tax_excluded, tax_rate, TAX_ROUNDING)
+
+    def to_dict(self) -> Dict[str, Any]:
+        b = self.bending
+        return {
+            "total_estimate": {
+                "processing_cost_tax_excluded": self.tax_excluded,
+                "processing_cost_tax_included": self.tax_included,
+            },
+            "breakdown": {
+                "bending_cost": {
+                    "base_price": b.base_price,
+                    "quantity_adjustment": b.quantity_adjustment,
+                    "complexity_adjustment": b.complexity_adjustment,
+                    "small_part_adjustment": b.small_part_adjustment,
+                    "total": b.total,
+                },
+                "hole_cost": self.hole.to_dict(),
+            },
+        }
+
+    def json_body(self) -> str:
+        """json.dumps(to_dict()) の外側の {} を除いた部分（辞書を作らずに書く）。"""
+        b, h = self.bending, self.hole
+        if h.lines is not None:
+            return json.dumps(self.to_dict(), ensure_ascii=False)[1:-1]
+        return (
+            f'"total_estimate": {{"processing_cost_tax_excluded": {_json_num(self.tax_excluded)}, '
+            f'"processing_cost_tax_included": {_json_num(self.tax_included)}}}, '
+            f'"breakdown": {{"bending_cost": {{"base_price": {_json_num(b.base_price)}, '
+            f'"quantity_adjustment": {_json_num(b.quantity_adjustment)}, '
+            f'"complexity_adjustment": {_json_num(b.complexity_adjustment)}, '
+            f'"small_part_adjustment": {_json_num(b.small_part_adjustment)}, "total": {_json_num(b.total)}}}, '
+            f'"hole_cost": {{"punch_count": {_json_num(h.punch_count)}, "punch_price": {_json_num(h.punch_price)}, '
+            f'"pierce_count": {_json_num(h.pierce_count)}, "pierce_price": {_json_num(h.pierce_price)}, '
+            f'"total": {_json_num(h.total)}}}}}'
+        )
+
+    def to_json(self) -> str:
+        """json.dumps(self.to_dict(), ensure_ascii=False) と同じ文字列。"""
+        return "{" + self.json_body() + "}"
+
+
+class EstimateBatch:
+    """
+    Estimate を列（array）で持つ。件数が多いときに1件ずつオブジェクトや辞書を残さない。
+    エラーの行は errors（行番号 → メッセージ）に入り、数値の列は 0。
+    """
+
+    INT_COLUMNS = ("base_price", "addons_yen", "bending_total", "punch_count", "punch_price",
+                   "pierce_count", "pierce_price", "hole_total", "tax_excluded", "tax_included")
+    FLOAT_COLUMNS = ("quantity_adjustment", "complexity_adjustment", "small_part_adjustment")
+
+    def __init__(self):
+        from array import array
+        self.columns: Dict[str, Any] = {c: array("q") for c in self.INT_COLUMNS}
+        self.columns.update((c, array("d")) for c in self.FLOAT_COLUMNS)
+        self.weight_class: List[str] = []
+        self.length_class: List[str] = []
+        self.errors: Dict[int, str] = {}
+        # 穴ごとの明細がある行だけ（行番号 → HoleResult.lines）
+        self.hole_lines: Dict[int, Any] = {}
+
+    def __len__(self) -> int:
+        return len(self.weight_class)
+
+    def append(self, est: Estimate) -> None:
+        b, h, c = est.bending, est.hole, self.columns
+        if h.lines is not None:
+            self.hole_lines[len(self)] = h.lines
+        c["base_price"].append(b.base_price)
+        c["addons_yen"].append(b.addons_yen)
+        c["bending_total"].append(b.total)
+        c["punch_count"].append(h.punch_count)
+        c["punch_price"].append(h.punch_price)
+        c["pierce_count"].append(h.pierce_count)
+        c["pierce_price"].append(h.pierce_price)
+        c["hole_total"].append(h.total)
+        c["tax_excluded"].append(est.tax_excluded)
+        c["tax_included"].append(est.tax_included)
+        c["quantity_adjustment"].append(b.quantity_adjustment)
+        c["complexity_adjustment"].append(b.complexity_adjustment)
+        c["small_part_adjustment"].append(b.small_part_adjustment)
+        self.weight_class.append(b.weight_class)
+        self.length_class.append(b.length_class)
+
+    def append_error(self, message: str) -> None:
+        self.errors[len(self)] = message
+        for col in self.columns.values():
+            col.append(0)
+        self.weight_class.append("")
+        self.length_class.append("")
+
+    def __getitem__(self, i: int) -> Optional[Estimate]:
+        """i 行目の Estimate（エラーの行は None）。"""
+        if i in self.errors:
+            return None
+        c = self.columns
+        est = Estimate.__new__(Estimate)
+        est.bending = BendingResult(
+            c["base_price"][i], c["quantity_adjustment"][i], c["complexity_adjustment"][i],
+            c["small_part_adjustment"][i], c["addons_yen"][i], self.weight_class[i], self.length_class[i],
+            c["bending_total"][i],
+        )
+        est.hole = HoleResult(
+            c["punch_count"][i], c["punch_price"][i], c["pierce_count"][i], c["pierce_price"][i], c["hole_total"][i],
+            self.hole_lines.get(i),
+        )
+        est.tax_excluded = c["tax_excluded"][i]
+        est.tax_included = c["tax_included"][i]
+        return est
+
+    def to_dicts(self) -> List[Optional[Dict[str, Any]]]:
+        return [None if i in self.errors else self[i].to_dict() for i in range(len(self))]
+
+    def json_body(self, i: int) -> str:
+        """Estimate.json_body() と同じ文字列を列から直接作る。"""
+        if i in self.hole_lines:
+            return self[i].json_body()
+        c = self.columns
+        return (
+            f'"total_estimate": {{"processing_cost_tax_excluded": {c["tax_excluded"][i]}, '
+            f'"processing_cost_tax_included": {c["tax_included"][i]}}}, '
+            f'"breakdown": {{"bending_cost": {{"base_price": {c["base_price"][i]}, '
+            f'"quantity_adjustment": {c["quantity_adjustment"][i]!r}, '
+            f'"complexity_adjustment": {c["complexity_adjustment"][i]!r}, '
+            f'"small_part_adjustment": {c["small_part_adjustment"][i]!r}, "total": {c["bending_total"][i]}}}, '
+            f'"hole_cost": {{"punch_count": {c["punch_count"][i]}, "punch_price": {c["punch_price"][i]}, '
+            f'"pierce_count": {c["pierce_count"][i]}, "pierce_price": {c["pierce_price"][i]}, '
+            f'"total": {c["hole_total"][i]}}}}}'
+        )
+
+
 def calc_bending(
-    table: list[dict],
+    table: "list[dict] | PriceTable",
     shape: str,
     weight_kg: float,
     length_mm: float,
@@ -105,61 +648,308 @@ def calc_bending(
     meoshi_long: bool = False,  # 長尺目押し（長さ>=1000 かつ目押し指定）
     fukabend: bool = False,     # 深曲げ・干渉回避
 ) -> Dict[str, Any]:
+    """曲げ加工費を計算。戻り値は breakdown.bending_cost 用の辞書（bending_result().to_dict()）。"""
+    return bending_result(
+        table, shape, weight_kg, length_mm, long_side_mm, lot,
+        nakagoshi=nakagoshi, reverse_bend=reverse_bend, meoshi_long=meoshi_long, fukabend=fukabend,
+    ).to_dict()
+
+
+def bending_result(
+    table: "list[dict] | PriceTable",
+    shape: str,
+    weight_kg: float,
+    length_mm: float,
+    long_side_mm: float,
+    lot: int,
+    nakagoshi: bool = False,
+    reverse_bend: bool = False,
+    meoshi_long: bool = False,
+    fukabend: bool = False,
+) -> BendingResult:
     """
-    曲げ加工費を計算。戻り値は breakdown.bending_cost 用の辞書。
+    calc_bending() の本体。BendingResult を返す（書き換えないこと）。
+    table が PriceTable なら、結果を区分キー（形状・重量クラス・長さクラス・数量係数・オプション・
+    小物判定）で table.bending_cache に持ち、同じ区分の2回目以降は計算しない。
     """
-    base, weight_class, length_class = get_base_price(table, shape, weight_kg, length_mm)
     qty_f = quantity_factor(lot)
-    subtotal = base * qty_f
+    meoshi = bool(meoshi_long) and length_mm >= MEOSHI_LONG_MIN_LENGTH_MM
+    small = long_side_mm <= SMALL_PART_MAX_LONG_SIDE_MM and weight_kg <= SMALL_PART_MAX_WEIGHT_KG
+
+    cache = table.bending_cache if isinstance(table, PriceTable) else None
+    if cache is not None:
+        # 重量・長さは区分の番号で持つ（クラス名の文字列を作るより安い）
+        key = (shape, *table.classify(shape, weight_kg, length_mm), qty_f,
+               bool(nakagoshi), bool(reverse_bend), meoshi, bool(fukabend), small)
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+
+    hook = _stage_hook
+    if hook is None:
+        base, weight_class, length_class = get_base_price(table, shape, weight_kg, length_mm)
+    else:
+        t0 = perf_counter()
+        base, weight_class, length_class = get_base_price(table, shape, weight_kg, length_mm)
+        hook("base_price", perf_counter() - t0)
+    # 金額は銭、係数は千分率の整数で掛ける（complexity / small_f は表示用の係数）
+    sen = apply_rate(base * SEN_PER_YEN, per_mille(qty_f))
 
     complexity = 1.0
     addons = 0
     if nakagoshi:
-        complexity *= 1.5
+        complexity *= NAKAGOSHI_FACTOR
+        sen = apply_rate(sen, per_mille(NAKAGOSHI_FACTOR))
     if reverse_bend:
-        complexity *= 1.2
-    if meoshi_long and length_mm >= 1000:
-        addons += 2500
+        complexity *= REVERSE_BEND_FACTOR
+        sen = apply_rate(sen, per_mille(REVERSE_BEND_FACTOR))
+    if meoshi:
+        addons += MEOSHI_LONG_ADDON
     if fukabend:
-        addons += 3000
+        addons += FUKABEND_ADDON
+    sen += addons * SEN_PER_YEN
 
-    subtotal = subtotal * complexity + addons
+    small_f = SMALL_PART_DISCOUNT if small else 1.0
+    if small:
+        sen = apply_rate(sen, per_mille(SMALL_PART_DISCOUNT))
+    subtotal = max(BENDING_FLOOR, fixed_point.round_yen(sen, BENDING_ROUNDING))
 
-    small_f = 1.0
-    if long_side_mm <= 300 and weight_kg <= 1.0:
-        small_f = SMALL_PART_DISCOUNT
-    subtotal = subtotal * small_f
-    subtotal = max(BENDING_FLOOR, round(subtotal))
+    result = BendingResult(base, qty_f, complexity, small_f, addons, weight_class, length_class, subtotal)
+    if cache is not None:
+        cache.put(key, result)
+    return result
 
-    return {
-        "base_price": base,
-        "quantity_adjustment": qty_f,
-        "complexity_adjustment": complexity,
-        "small_part_adjustment": small_f,
-        "addons_yen": addons,
-        "weight_class": weight_class,
-        "length_class": length_class,
-        "total": int(subtotal),
-    }
+
+def bending_cache_stats(table_path: Optional[str] = None) -> Dict[str, int]:
+    """現在の価格表の calc_bending() キャッシュの件数・ヒット・ミス・追い出し回数。"""
+    return get_price_table(table_path).bending_cache.stats()
 
 
 def calc_hole_cost(
     thickness_mm: float,
     punch_count: int = 0,
     pierce_count: int = 0,
+    holes: Optional[List[Dict[str, Any]]] = None,
+    hole_prices: Any = None,
+    hole_gap: str = "error",
 ) -> Dict[str, Any]:
-    """穴あけコスト。レーザーポンチ 30円/個、ピアスは板厚別。"""
+    """
+    穴あけコスト。レーザーポンチ 30円/個、ピアスは板厚別。
+    holes を渡すと穴ごとの指定も計算して "holes"（明細）を付け、total に足す（_parse_hole() を参照）。
+    丸穴 φ30 以上と長穴は穴あけ単価表（data/hole_prices.json。hole_prices で HoleTable を渡せる）を引く。
+    表に無い板厚は hole_gap="error" なら ValueError、"next" なら次に厚い行の単価。
+    """
+    return hole_result(thickness_mm, punch_count, pierce_count, holes, hole_prices, hole_gap).to_dict()
+
+
+def hole_result(
+    thickness_mm: float,
+    punch_count: int = 0,
+    pierce_count: int = 0,
+    holes: Optional[List[Dict[str, Any]]] = None,
+    hole_prices: Any = None,
+    hole_gap: str = "error",
+) -> HoleResult:
+    """calc_hole_cost() の本体。HoleResult を返す。"""
     pierce_unit = pierce_price_for_thickness(thickness_mm)
     punch_total = punch_count * PUNCH_PRICE
     pierce_total = pierce_count * pierce_unit
-    total = punch_total + pierce_total
-    return {
-        "punch_count": punch_count,
-        "punch_price": PUNCH_PRICE,
-        "pierce_count": pierce_count,
-        "pierce_price": pierce_unit,
-        "total": int(total),
-    }
+    total = int(punch_total + pierce_total)
+    lines = None
+    if holes is not None:
+        lines = _hole_lines(thickness_mm, holes, hole_prices, hole_gap)
+        total += sum(line["total"] for line in lines)
+    return HoleResult(punch_count, PUNCH_PRICE, pierce_count, pierce_unit, total, lines)
+
+
+# ===== 穴ごとの指定（calc_hole_cost(holes=...)）=====
+# 1件は {"type": "丸穴" | "長穴" | "ポンチ" | "ピアス", "diameter_mm": 径, "count": 個数(省略時 1), "grade": "標準" | "下限"}
+
+HOLE_TYPES = {
+    "丸穴": "丸穴", "長穴": "長穴", "ポンチ": "ポンチ", "ピアス": "ピアス",
+    "round": "丸穴", "slot": "長穴", "punch": "ポンチ", "pierce": "ピアス",
+}
+# 丸穴は径がこの値未満ならピアス1回として数え、以上（径の指定なしを含む）は穴あけ単価表を引く
+ROUND_HOLE_TABLE_MIN_DIAMETER_MM = 30
+# 明細の区分（この順に並べる）: (種類, 単価の出どころ)
+HOLE_LINE_CATEGORIES = (
+    ("ポンチ", "ポンチ"),
+    ("ピアス", "ピアス"),
+    ("丸穴", "ピアス"),
+    ("丸穴", "穴あけ単価表"),
+    ("長穴", "穴あけ単価表"),
+)
+HOLE_GRADES = ("標準", "下限")
+HOLE_GAP_POLICIES = ("error", "next")
+
+
+# 種類 → 明細の区分（丸穴は径で 2 / 3 に分かれる）
+_HOLE_KIND_CATEGORY = {"ポンチ": 0, "ピアス": 1, "丸穴": 3, "長穴": 4}
+
+
+def _parse_hole(hole: Any) -> Tuple[int, int, int]:
+    """
+    穴1件の指定 → (明細の区分, 0=標準 / 1=下限, 個数)。丸穴は径が φ30 未満ならピアス、φ30 以上か
+    径の指定が無ければ穴あけ単価表。標準/下限は表を引くものだけ区別する。
+    """
+    if not isinstance(hole, dict):
+        raise ValueError(f"穴の指定はオブジェクトで渡してください: {hole!r}")
+    t = hole.get("type", "")
+    kind = HOLE_TYPES.get(t if t.__class__ is str else str(t))
+    if kind is None:
+        raise ValueError(f"穴の種類が不正です: {hole.get('type')!r}（丸穴・長穴・ポンチ・ピアス）")
+    count = hole.get("count", 1)
+    diameter = hole.get("diameter_mm")
+    # 穴の数だけ呼ばれるので、よくある型（int の個数、数値か省略の径）は変換を飛ばす
+    if count.__class__ is not int or (diameter is not None and diameter.__class__ is not int and diameter.__class__ is not float):
+        try:
+            count = _parse_count(count)
+            diameter = None if diameter in (None, "") else float(diameter)
+        except (TypeError, ValueError):
+            raise ValueError(f"穴の個数・径が不正です: {hole!r}") from None
+    if count < 0:
+        raise ValueError(f"穴の個数が負です: {hole!r}")
+    cat = _HOLE_KIND_CATEGORY[kind]
+    if cat == 3 and diameter is not None and diameter < ROUND_HOLE_TABLE_MIN_DIAMETER_MM:
+        cat = 2
+    grade = hole.get("grade")
+    if not grade or grade == "標準":
+        return cat, 0, count
+    if grade != "下限":
+        raise ValueError(f"穴の区分が不正です: {grade!r}（標準・下限）")
+    return cat, 1 if cat >= 3 else 0, count
+
+
+def _count_holes(holes: Any) -> Dict[Tuple[int, int], int]:
+    """穴の指定のリスト → {(明細の区分, 標準/下限): 個数の合計}。"""
+    if not isinstance(holes, (list, tuple)):
+        raise ValueError("holes は穴の指定のリストで渡してください")
+    counts: Dict[Tuple[int, int], int] = {}
+    for h in holes:
+        cat, grade, n = _parse_hole(h)
+        key = (cat, grade)
+        counts[key] = counts.get(key, 0) + n
+    return counts
+
+
+def _hole_line(cat: int, grade: int, count: int, unit: int, row: Optional[Tuple[float, float]]) -> Dict[str, Any]:
+    kind, basis = HOLE_LINE_CATEGORIES[cat]
+    line: Dict[str, Any] = {"type": kind, "basis": basis}
+    if row is not None:
+        line["grade"] = HOLE_GRADES[grade]
+    line["count"] = count
+    line["unit_price"] = unit
+    line["total"] = count * unit
+    if row is not None:
+        line["table_row_mm"] = [row[0], row[1]]
+    return line
+
+
+def _hole_lines(thickness_mm: float, holes: List[Dict[str, Any]], hole_prices: Any, hole_gap: str) -> Tuple[Dict[str, Any], ...]:
+    """穴ごとの指定を（区分, 標準/下限）ごとの明細にまとめる。個数 0 の明細は出さない。"""
+    if hole_gap not in HOLE_GAP_POLICIES:
+        raise ValueError(f"hole_gap は {' / '.join(HOLE_GAP_POLICIES)} のどれか: {hole_gap!r}")
+    counts = _count_holes(holes)
+    lines = []
+    table = None
+    for (cat, grade), n in sorted(counts.items()):
+        if n == 0:
+            continue
+        row = None
+        if cat == 0:
+            unit = PUNCH_PRICE
+        elif cat <= 2:
+            unit = pierce_price_for_thickness(thickness_mm)
+        else:
+            import hole_table
+            if table is None:
+                table = hole_prices if hole_prices is not None else hole_table.load_hole_table()
+            kind = HOLE_LINE_CATEGORIES[cat][0]
+            rate = table.lookup(kind, thickness_mm, HOLE_GRADES[grade], hole_gap)
+            if rate.price is None:
+                raise hole_table.HolePriceUnavailable(kind, HOLE_GRADES[grade], thickness_mm, rate)
+            unit, row = rate.price, (rate.row_min_mm, rate.row_max_mm)
+        lines.append(_hole_line(cat, grade, n, unit, row))
+    return tuple(lines)
+
+
+def hole_lines_many(thickness_mm, holes, hole_prices: Any = None, hole_gap: str = "error"):
+    """
+    _hole_lines() の一括版。holes[i] は部品 i の穴の指定のリスト（None なら指定なし）。
+    穴の読み取りと（区分, 標準/下限）ごとの個数の集計は部品ごとに Python で行い、明細（部品ごとに最大7行）を
+    1本の配列に並べて、板厚の区間検索・単価の割り当て・部品ごとの合計を numpy で行う。
+    戻り値: (部品ごとの明細 or None, 部品ごとの明細の合計（numpy 配列）, {部品番号: エラー})
+    """
+    np = _import_numpy()
+    import hole_table
+    if hole_gap not in HOLE_GAP_POLICIES:
+        raise ValueError(f"hole_gap は {' / '.join(HOLE_GAP_POLICIES)} のどれか: {hole_gap!r}")
+    table = hole_prices if hole_prices is not None else hole_table.load_hole_table()
+    n = len(holes)
+    t_part = np.broadcast_to(np.asarray(thickness_mm, dtype=np.float64), (n,))
+    errors: Dict[int, str] = {}
+    lines: List[Any] = [None] * n
+    part: List[int] = []
+    key: List[int] = []
+    count: List[int] = []
+    for i, hs in enumerate(holes):
+        if hs is None:
+            continue
+        try:
+            counts = _count_holes(hs)
+        except ValueError as e:
+            errors[i] = str(e)
+            continue
+        lines[i] = []
+        for (c, g), k in sorted(counts.items()):
+            if k:
+                part.append(i)
+                key.append(c * 2 + g)
+                count.append(k)
+
+    totals = np.zeros(n, dtype=np.int64)
+    if part:
+        u_part = np.asarray(part, dtype=np.int64)
+        u_key = np.asarray(key, dtype=np.int64)
+        u_cat, u_grade = u_key // 2, u_key % 2
+        cnt = np.asarray(count, dtype=np.int64)
+        t = t_part[u_part]
+
+        unit = np.full(len(cnt), -1, dtype=np.int64)
+        row = np.full(len(cnt), -1, dtype=np.int64)
+        unit[u_cat == 0] = PUNCH_PRICE
+        pierce = (u_cat == 1) | (u_cat == 2)
+        unit[pierce] = np.asarray(PIERCE_PRICES, dtype=np.int64)[
+            np.searchsorted(np.asarray(PIERCE_THICKNESS_BANDS), t[pierce], side="left")
+        ]
+        arrays = table.arrays(np)
+        for c in (3, 4):
+            kind = HOLE_LINE_CATEGORIES[c][0]
+            for g, gname in enumerate(HOLE_GRADES):
+                sel = (u_cat == c) & (u_grade == g)
+                if sel.any():
+                    r = table.rows_many(np, kind, t[sel], gname, hole_gap)
+                    row[sel] = r
+                    unit[sel] = arrays[(kind, gname)][r]
+
+        # 単価が決まらない明細がある部品はエラー（理由は lookup() で1件目について出す）
+        for j in np.flatnonzero(unit < 0).tolist():
+            i = int(u_part[j])
+            if i not in errors:
+                kind, gname = HOLE_LINE_CATEGORIES[int(u_cat[j])][0], HOLE_GRADES[int(u_grade[j])]
+                rate = table.lookup(kind, float(t_part[i]), gname, hole_gap)
+                errors[i] = str(hole_table.HolePriceUnavailable(kind, gname, float(t_part[i]), rate))
+        sub = cnt * unit
+        ok = unit >= 0
+        totals = np.bincount(u_part[ok], weights=sub[ok], minlength=n).astype(np.int64)
+        mins, maxs = table.mins, table.maxs
+        for i, c, g, k, u, r in zip(u_part.tolist(), u_cat.tolist(), u_grade.tolist(), cnt.tolist(), unit.tolist(), row.tolist()):
+            if i not in errors:
+                lines[i].append(_hole_line(c, g, k, u, (mins[r], maxs[r]) if c >= 3 else None))
+    for i in errors:
+        lines[i] = None
+        totals[i] = 0
+    return [None if x is None else tuple(x) for x in lines], totals, errors
 
 
 def estimate(
@@ -177,24 +967,80 @@ def estimate(
     fukabend: bool = False,
     table_path: Optional[str] = None,
     tax_rate: float = 0.1,
+    holes: Optional[List[Dict[str, Any]]] = None,
+    hole_gap: str = "error",
 ) -> Dict[str, Any]:
     """
     見積もりを一括計算。加工工賃のみ（材料費含まない）。
+    holes / hole_gap は calc_hole_cost() の穴ごとの指定。
+    計測フック（set_stage_hook）があれば、段階ごとの所要時間を渡す。
     """
-    if table_path is None:
-        base_dir = os.path.dirname(os.path.abspath(__file__))
-        table_path = os.path.join(base_dir, "data", "bending_price_table.csv")
+    hook = _stage_hook
+    if hook is not None:
+        t0 = perf_counter()
+        table = get_price_table(table_path)
+        t1 = perf_counter()
+        hook("table_load", t1 - t0)
+        bending = bending_result(
+            table, shape, weight_kg, length_mm, long_side_mm, lot,
+            nakagoshi=nakagoshi, reverse_bend=reverse_bend,
+            meoshi_long=meoshi_long, fukabend=fukabend,
+        )
+        t2 = perf_counter()
+        hook("calc_bending", t2 - t1)
+        hole = hole_result(thickness_mm, punch_count, pierce_count, holes, None, hole_gap)
+        t3 = perf_counter()
+        hook("calc_hole_cost", t3 - t2)
+        result = Estimate(bending, hole, tax_rate).to_dict()
+        t4 = perf_counter()
+        hook("build_result", t4 - t3)
+        hook("estimate", t4 - t0)
+        return result
+
+    return estimate_result(
+        shape, weight_kg, length_mm, long_side_mm, lot, thickness_mm, punch_count, pierce_count,
+        nakagoshi, reverse_bend, meoshi_long, fukabend, table_path, tax_rate, holes=holes, hole_gap=hole_gap,
+    ).to_dict()
+
 
-    table = load_price_table(table_path)
-    bending = calc_bending(
+def estimate_result(
+    shape: str,
+    weight_kg: float,
+    length_mm: float,
+    long_side_mm: float,
+    lot: int,
+    thickness_mm: float,
+    punch_count: int = 0,
+    pierce_count: int = 0,
+    nakagoshi: bool = False,
+    reverse_bend: bool = False,
+    meoshi_long: bool = False,
+    fukabend: bool = False,
+    table_path: Optional[str] = None,
+    tax_rate: float = 0.1,
+    table: Optional[PriceTable] = None,
+    holes: Optional[List[Dict[str, Any]]] = None,
+    hole_gap: str = "error",
+    hole_prices: Any = None,
+) -> Estimate:
+    """
+    estimate() と同じ計算で Estimate を返す（辞書は作らない）。table を渡すと table_path は使わない。
+    hole_prices は穴あけ単価表（hole_table.HoleTable。省略時は data/hole_prices.json）。
+    """
+    if table is None:
+        table = get_price_table(table_path)
+    bending = bending_result(
         table, shape, weight_kg, length_mm, long_side_mm, lot,
         nakagoshi=nakagoshi, reverse_bend=reverse_bend,
         meoshi_long=meoshi_long, fukabend=fukabend,
     )
-    hole = calc_hole_cost(thickness_mm, punch_count, pierce_count)
+    return Estimate(bending, hole_result(thickness_mm, punch_count, pierce_count, holes, hole_prices, hole_gap), tax_rate)
 
+
+def build_estimate(bending: Dict[str, Any], hole: Dict[str, Any], tax_rate: float = 0.1) -> Dict[str, Any]:
+    """calc_bending() と calc_hole_cost() の結果（辞書）から estimate() の戻り値を組み立てる。"""
     processing_ex = bending["total"] + hole["total"]
-    processing_in = int(round(processing_ex * (1 + tax_rate)))
+    processing_in = fixed_point.tax_included(processing_ex, tax_rate, TAX_ROUNDING)
 
     return {
         "total_estimate": {
@@ -208,15 +1054,421 @@ def estimate(
     }
 
 
+def _import_numpy():
+    try:
+        import numpy as np
+    except ImportError:
+        raise ImportError("estimate_many() には numpy が必要です: pip install numpy") from None
+    return np
+
+
+def estimate_many(
+    shape,
+    weight_kg,
+    length_mm,
+    long_side_mm,
+    lot,
+    thickness_mm,
+    punch_count=0,
+    pierce_count=0,
+    flags=0,
+    table_path: Optional[str] = None,
+    tax_rate: float = 0.1,
+    table: Optional[PriceTable] = None,
+    holes=None,
+    hole_gap: str = "error",
+    hole_prices: Any = None,
+) -> Dict[str, Any]:
+    """
+    estimate() の列指向版。各引数は同じ長さの配列（スカラーはブロードキャスト）。
+    shape は形状名の配列か、PriceTable.shapes の添字の配列。
+    flags は FLAG_NAKAGOSHI | FLAG_REVERSE_BEND | FLAG_MEOSHI_LONG | FLAG_FUKABEND のビット和。
+    table を渡すと table_path の代わりにその価格表で計算する（新旧の表を比べるとき用）。
+    holes は部品ごとの穴の指定のリスト（hole_lines_many()）。明細の合計を hole_total に足し、
+    "hole_spec_total" 列に入れる。単価が決まらない部品があれば ValueError。
+    戻り値は列名 → numpy 配列。各行は calc_bending() / estimate() と同じ値になる。
+    """
+    np = _import_numpy()
+    if table is None:
+        table = get_price_table(table_path)
+
+    shape = np.asarray(shape)
+    weight_kg, length_mm, long_side_mm, lot, thickness_mm = np.broadcast_arrays(
+        *(np.asarray(a, dtype=np.float64) for a in (weight_kg, length_mm, long_side_mm, lot, thickness_mm)),
+        np.empty(shape.shape),
+    )[:5]
+    punch_count, pierce_count, flags = (
+        np.broadcast_to(np.asarray(a, dtype=np.int64), shape.shape) for a in (punch_count, pierce_count, flags)
+    )
+
+    # 形状 → PriceTable.shapes の添字
+    names = table.shapes
+    if shape.dtype.kind in "iu":
+        codes = shape.astype(np.int64)
+        bad = (codes < 0) | (codes >= len(names))
+        if bad.any():
+            raise ValueError(f"形状コードが範囲外です: {codes[bad][0]}")
+    else:
+        uniq, codes = np.unique(shape.astype(str), return_inverse=True)
+        index = {name: i for i, name in enumerate(names)}
+        missing = [u for u in uniq.tolist() if u not in index]
+        if missing:
+            raise ValueError(f"形状が見つかりません: {missing[0]}")
+        codes = np.asarray([index[u] for u in uniq.tolist()], dtype=np.int64)[codes.reshape(shape.shape)]
+
+    # 基準価格: 形状ごとに重量しきい値を searchsorted（bisect_left と同じ）
+    length_idx = np.minimum(
+        np.searchsorted(np.asarray(LENGTH_THRESHOLDS, dtype=np.float64), length_mm, side="left"),
+        len(LENGTH_COLUMNS) - 1,
+    )
+    base = np.zeros(shape.shape, dtype=np.int64)
+    weight_class = np.zeros(shape.shape, dtype=np.int64)
+    arrays = table.shape_arrays(np)
+    for code in np.unique(codes).tolist():
+        weights, prices = arrays[names[code]]
+        sel = codes == code
+        wi = np.minimum(np.searchsorted(weights, weight_kg[sel], side="left"), len(weights) - 1)
+        base[sel] = prices[wi, length_idx[sel]]
+        weight_class[sel] = weights[wi].astype(np.int64)
+
+    qty_i = np.searchsorted(np.asarray(QUANTITY_BANDS, dtype=np.float64), lot, side="left")
+    qty_f = np.asarray(QUANTITY_FACTORS)[qty_i]
+
+    nakagoshi = (flags & FLAG_NAKAGOSHI) != 0
+    reverse_bend = (flags & FLAG_REVERSE_BEND) != 0
+    meoshi_long = ((flags & FLAG_MEOSHI_LONG) != 0) & (length_mm >= MEOSHI_LONG_MIN_LENGTH_MM)
+    fukabend = (flags & FLAG_FUKABEND) != 0
+
+    # calc_bending() と同じ順序・同じ整数の式（銭 × 千分率）で計算する。complexity / small_f は表示用
+    complexity = np.ones(shape.shape)
+    complexity = np.where(nakagoshi, complexity * NAKAGOSHI_FACTOR, complexity)
+    complexity = np.where(reverse_bend, complexity * REVERSE_BEND_FACTOR, complexity)
+    addons = np.where(meoshi_long, MEOSHI_LONG_ADDON, 0) + np.where(fukabend, FUKABEND_ADDON, 0)
+
+    small = (long_side_mm <= SMALL_PART_MAX_LONG_SIDE_MM) & (weight_kg <= SMALL_PART_MAX_WEIGHT_KG)
+    small_f = np.where(small, SMALL_PART_DISCOUNT, 1.0)
+
+    sen = apply_rate(base * SEN_PER_YEN, np.asarray([per_mille(f) for f in QUANTITY_FACTORS], dtype=np.int64)[qty_i])
+    sen = np.where(nakagoshi, apply_rate(sen, per_mille(NAKAGOSHI_FACTOR)), sen)
+    sen = np.where(reverse_bend, apply_rate(sen, per_mille(REVERSE_BEND_FACTOR)), sen)
+    sen = sen + addons * SEN_PER_YEN
+    sen = np.where(small, apply_rate(sen, per_mille(SMALL_PART_DISCOUNT)), sen)
+    bending_total = np.maximum(BENDING_FLOOR, fixed_point.round_yen(sen, BENDING_ROUNDING)).astype(np.int64)
+
+    pierce_unit = np.asarray(PIERCE_PRICES, dtype=np.int64)[
+        np.searchsorted(np.asarray(PIERCE_THICKNESS_BANDS), thickness_mm, side="left")
+    ]
+    hole_total = punch_count * PUNCH_PRICE + pierce_count * pierce_unit
+    spec_total = None
+    if holes is not None:
+        if len(holes) != shape.size:
+            raise ValueError(f"holes の件数が部品数と違います: {len(holes)} != {shape.size}")
+        _, spec_total, errors = hole_lines_many(thickness_mm.reshape(-1), holes, hole_prices, hole_gap)
+        if errors:
+            i = min(errors)
+            raise ValueError(f"{i} 番目の部品: {errors[i]}")
+        spec_total = spec_total.reshape(shape.shape)
+        hole_total = hole_total + spec_total
+
+    processing_ex = bending_total + hole_total
+    processing_in = fixed_point.tax_included(processing_ex, tax_rate, TAX_ROUNDING)
+
+    out = {
+        "shape_code": codes,
+        "base_price": base,
+        "quantity_adjustment": qty_f,
+        "complexity_adjustment": complexity,
+        "small_part_adjustment": small_f,
+        "addons_yen": addons.astype(np.int64),
+        "weight_class_kg": weight_class,
+        "length_class_index": length_idx,
+        "bending_total": bending_total,
+        "pierce_price": pierce_unit,
+        "hole_total": hole_total,
+        "processing_cost_tax_excluded": processing_ex,
+        "processing_cost_tax_included": processing_in,
+    }
+    if spec_total is not None:
+        out["hole_spec_total"] = spec_total
+    return out
+
+
+# ===== バッチ（JSONL / CSV → JSONL）=====
+
+def _parse_flag(v) -> bool:
+    if isinstance(v, str):
+        return v.strip().lower() in ("1", "true", "yes", "on", "○")
+    return bool(v)
+
+
+def _parse_count(v) -> int:
+    """個数（lot・穴数・穴ごとの指定の count）。2.7 のような小数や True は数えずにエラーにする（2.0 は 2）。"""
+    if v.__class__ is bool or (isinstance(v, float) and not v.is_integer()):
+        raise ValueError(v)
+    return int(v)
+
+
+def _parse_holes_field(v) -> List[Dict[str, Any]]:
+    """穴ごとの指定。JSONL ではリストのまま、CSV では JSON 文字列。"""
+    if isinstance(v, str):
+        v = json.loads(v)
+    if not isinstance(v, list):
+        raise ValueError("holes はリストで指定してください")
+    return v
+
+
+# バッチ入力の列名 → 変換関数。estimate() の引数名と同じ。
+BATCH_FIELDS = {
+    "shape": str,
+    "weight_kg": float,
+    "length_mm": float,
+    "long_side_mm": float,
+    "lot": _parse_count,
+    "thickness_mm": float,
+    "punch_count": _parse_count,
+    "pierce_count": _parse_count,
+    "nakagoshi": _parse_flag,
+    "reverse_bend": _parse_flag,
+    "meoshi_long": _parse_flag,
+    "fukabend": _parse_flag,
+    "holes": _parse_holes_field,
+    "hole_gap": str,
+}
+BATCH_REQUIRED = ("shape", "weight_kg", "length_mm", "long_side_mm", "thickness_mm")
+
+
+def parse_batch_part(record: Dict[str, Any]) -> Dict[str, Any]:
+    """バッチ入力の1件を estimate() のキーワード引数に変換する。未知の列は無視。lot 省略時は 1。"""
+    if not isinstance(record, dict):
+        raise ValueError("1行に1つの JSON オブジェクトが必要です")
+    kwargs = {"lot": 1}
+    for key, conv in BATCH_FIELDS.items():
+        v = record.get(key)
+        if v is None or v == "":
+            if key in BATCH_REQUIRED:
+                raise ValueError(f"{key} がありません")
+            continue
+        try:
+            kwargs[key] = conv(v)
+        except (TypeError, ValueError):
+            raise ValueError(f"{key} の値が不正です: {v!r}") from None
+    return kwargs
+
+
+def estimate_batch(parts, table_path: Optional[str] = None, tax_rate: float = 0.1) -> EstimateBatch:
+    """
+    estimate() のキーワード引数（parse_batch_part() の結果）の並びをまとめて見積もり、列で返す。
+    不正な部品はエラーとして記録して続ける。価格表は最初に1回だけ引く。
+    穴ごとの指定（holes）は numpy があれば hole_lines_many() で全部品分をまとめて計算する。
+    """
+    table = get_price_table(table_path)
+    batch = EstimateBatch()
+    parts = list(parts)
+    spec = _batch_hole_lines(parts)
+    for i, kw in enumerate(parts):
+        try:
+            if spec is not None and kw.get("holes") is not None:
+                lines, total, error = spec[i]
+                if error is not None:
+                    raise ValueError(error)
+                kw = {k: v for k, v in kw.items() if k not in ("holes", "hole_gap")}
+                est = estimate_result(table=table, tax_rate=tax_rate, **kw)
+                h = est.hole
+                est = Estimate(est.bending, HoleResult(
+                    h.punch_count, h.punch_price, h.pierce_count, h.pierce_price, h.total + total, lines,
+                ), tax_rate)
+            else:
+                est = estimate_result(table=table, tax_rate=tax_rate, **kw)
+            batch.append(est)
+        except Exception as e:
+            batch.append_error(str(e))
+    return batch
+
+
+def _batch_hole_lines(parts: List[Dict[str, Any]]) -> Optional[Dict[int, Tuple[Any, int, Optional[str]]]]:
+    """
+    holes のある部品をまとめて hole_lines_many() に渡す（hole_gap ごとに1回）。
+    部品番号 → (明細, 明細の合計, エラー or None)。holes が無い・numpy が無いときは None（1件ずつ計算する）。
+    """
+    groups: Dict[str, List[int]] = {}
+    for i, kw in enumerate(parts):
+        if kw.get("holes") is not None:
+            groups.setdefault(kw.get("hole_gap", "error"), []).append(i)
+    if not groups:
+        return None
+    try:
+        _import_numpy()
+    except ImportError:
+        return None
+    out: Dict[int, Tuple[Any, int, Optional[str]]] = {}
+    for gap, idx in groups.items():
+        if gap not in HOLE_GAP_POLICIES:
+            for i in idx:
+                out[i] = (None, 0, f"hole_gap は {' / '.join(HOLE_GAP_POLICIES)} のどれか: {gap!r}")
+            continue
+        lines, totals, errors = hole_lines_many([parts[i]["thickness_mm"] for i in idx], [parts[i]["holes"] for i in idx], None, gap)
+        for j, i in enumerate(idx):
+            out[i] = (lines[j], int(totals[j]), errors.get(j))
+    return out
+
+
+def _price_batch_chunk(chunk: List[Tuple[int, Any]], table_path: Optional[str]) -> Tuple[List[str], int]:
+    """(行番号, JSON文字列 or CSV行の辞書) のリストを見積もり、(出力行(JSON)のリスト, エラー件数) を返す。"""
+    if _stage_hook is None:
+        return _price_batch_chunk_fast(chunk, table_path)
+    out = []
+    errors = 0
+    for line_no, payload in chunk:
+        rec = {"line": line_no}
+        try:
+            record = json.loads(payload) if isinstance(payload, str) else payload
+            if isinstance(record, dict) and record.get("id") not in (None, ""):
+                rec["id"] = record["id"]
+            rec.update(estimate(table_path=table_path, **parse_batch_part(record)))
+        except Exception as e:
+            rec["error"] = str(e)
+            errors += 1
+        out.append(json.dumps(rec, ensure_ascii=False))
+    return out, errors
+
+
+def _price_batch_chunk_fast(chunk: List[Tuple[int, Any]], table_path: Optional[str]) -> Tuple[List[str], int]:
+    """
+    _price_batch_chunk() と同じ出力を、結果の辞書を作らずに書く。見積もりは estimate_batch() で列に貯め、
+    成功した行は EstimateBatch.json_body() を、エラーの行は従来どおり json.dumps() を使う。
+    """
+    heads = []
+    parts = []
+    failed: Dict[int, Dict[str, Any]] = {}
+    for line_no, payload in chunk:
+        rec = {"line": line_no}
+        try:
+            record = json.loads(payload) if isinstance(payload, str) else payload
+            if isinstance(record, dict) and record.get("id") not in (None, ""):
+                rec["id"] = record["id"]
+            parts.append(parse_batch_part(record))
+            heads.append(rec)
+        except Exception as e:
+            rec["error"] = str(e)
+            failed[len(heads) + len(failed)] = rec
+    batch = estimate_batch(parts, table_path)
+
+    out = []
+    it = iter(range(len(parts)))
+    for k in range(len(parts) + len(failed)):
+        rec = failed.get(k)
+        if rec is None:
+            i = next(it)
+            rec = heads[i]
+            if i not in batch.errors:
+                head = json.dumps(rec, ensure_ascii=False)
+                out.append(head[:-1] + ", " + batch.json_body(i) + "}")
+                continue
+            rec["error"] = batch.errors[i]
+        out.append(json.dumps(rec, ensure_ascii=False))
+    return out, len(failed) + len(batch.errors)
+
+
+def iter_batch_input(stream, fmt: str = "auto"):
+    """
+    入力ストリームから (行番号, payload) を1件ずつ返す。全体は読み込まない。
+    fmt: "jsonl" / "csv" / "auto"（最初の空でない行が "{" で始まれば JSONL）。
+    """
+    first = ""
+    first_no = 0
+    if fmt == "auto":
+        for first in stream:
+            first_no += 1
+            if first.strip():
+                break
+        fmt = "jsonl" if first.lstrip().startswith("{") else "csv"
+
+    def lines():
+        if first:
+            yield first
+        yield from stream
+
+    if fmt == "jsonl":
+        for n, line in enumerate(lines(), start=max(first_no, 1)):
+            if line.strip():
+                yield n, line
+    elif fmt == "csv":
+        import csv
+        reader = csv.DictReader(lines())
+        # 先頭の空行を読み飛ばした分だけ行番号をずらす
+        offset = max(first_no - 1, 0)
+        for row in reader:
+            yield reader.line_num + offset, row
+    else:
+        raise ValueError(f"未知の入力形式: {fmt}")
+
+
+def _chunked(items, size: int):
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def run_batch(
+    in_stream,
+    out_stream,
+    fmt: str = "auto",
+    workers: int = 1,
+    table_path: Optional[str] = None,
+    chunk_size: int = 500,
+) -> Tuple[int, int]:
+    """
+    バッチ見積もり。1行ごとに結果(JSON)を入力順に書き出す。戻り値: (成功件数, エラー件数)。
+    workers > 1 のときはチャンク単位でプロセスプールに投げる。
+    先読みするチャンクは workers の2倍までなので、入力の大きさに関わらずメモリは一定。
+    """
+    chunks = _chunked(iter_batch_input(in_stream, fmt), chunk_size)
+    ok = ng = 0
+
+    def emit(priced):
+        nonlocal ok, ng
+        lines, errors = priced
+        for line in lines:
+            out_stream.write(line)
+            out_stream.write("\n")
+        out_stream.flush()
+        ok += len(lines) - errors
+        ng += errors
+
+    if workers <= 1:
+        for chunk in chunks:
+            emit(_price_batch_chunk(chunk, table_path))
+        return ok, ng
+
+    from collections import deque
+    from concurrent.futures import ProcessPoolExecutor
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(pool.submit(_price_batch_chunk, chunk, table_path))
+            if len(pending) >= workers * 2:
+                emit(pending.popleft().result())
+        while pending:
+            emit(pending.popleft().result())
+    return ok, ng
+
+
 def main():
     import argparse
+    import sys
     p = argparse.ArgumentParser(description="曲げ加工見積もり v2.1")
-    p.add_argument("--shape", required=True, help="形状 (L曲げ, コの字曲げ, Z曲げ, C型曲げ, ハット曲げ)")
-    p.add_argument("--weight", type=float, required=True, help="重量 kg")
-    p.add_argument("--length", type=float, required=True, help="長さ mm")
-    p.add_argument("--long-side", type=float, required=True, help="長辺 mm（小物割引判定用）")
+    p.add_argument("--shape", help="形状 (L曲げ, コの字曲げ, Z曲げ, C型曲げ, ハット曲げ)")
+    p.add_argument("--weight", type=float, help="重量 kg")
+    p.add_argument("--length", type=float, help="長さ mm")
+    p.add_argument("--long-side", type=float, help="長辺 mm（小物割引判定用）")
     p.add_argument("--lot", type=int, default=1, help="製造個数")
-    p.add_argument("--thickness", type=float, required=True, help="板厚 mm")
+    p.add_argument("--thickness", type=float, help="板厚 mm")
     p.add_argument("--punch", type=int, default=0, help="レーザーポンチ数")
     p.add_argument("--pierce", type=int, default=0, help="ピアス数")
     p.add_argument("--nakagoshi", action="store_true", help="中押し")
@@ -224,8 +1476,65 @@ def main():
     p.add_argument("--meoshi-long", action="store_true", help="長尺目押し")
     p.add_argument("--fukabend", action="store_true", help="深曲げ・干渉回避")
     p.add_argument("--csv", default=None, help="bending_price_table.csv のパス")
+    p.add_argument("--batch", metavar="FILE|-", default=None,
+                   help="JSONL/CSV の部品リストを1行ずつ見積もり、JSONL で出力（- は標準入力）")
+    p.add_argument("--format", choices=["auto", "jsonl", "csv"], default="auto", help="--batch の入力形式")
+    p.add_argument("--workers", type=int, default=1, help="--batch の並列プロセス数")
+    p.add_argument("--profile", nargs="?", const="-", default=None, metavar="FILE",
+                   help="cProfile で計測し、統計を標準エラーに表示（FILE を指定すると pstats 形式で保存）。--workers 1 のときだけ計算部分が入る")
+    p.add_argument("--metrics", metavar="FILE|-", default=None,
+                   help="段階別の所要時間とキャッシュ統計を Prometheus テキスト形式で書き出す")
+    sub = p.add_subparsers(dest="cmd")
+    c = sub.add_parser("compile-tables", help="価格表 CSV をバイナリのスナップショットに変換（起動を速くする）")
+    c.add_argument("--csv", default=None, help="bending_price_table.csv のパス")
+    c.add_argument("--out", default=None, help="出力パス（既定: CSV と同じ場所の .snap）")
     args = p.parse_args()
 
+    if args.cmd == "compile-tables":
+        out = compile_tables(args.csv, args.out)
+        print(f"作成しました: {out}", file=sys.stderr)
+        return 0
+
+    if args.metrics:
+        # スクリプトとして実行すると本モジュールは __main__ なので、instrumentation が同じものを参照するよう登録する
+        sys.modules.setdefault("calc_bending", sys.modules[__name__])
+        import instrumentation
+        instrumentation.enable()
+    profiler = None
+    if args.profile:
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+    try:
+        return _run_cli(p, args)
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            if args.profile == "-":
+                import pstats
+                pstats.Stats(profiler, stream=sys.stderr).sort_stats("cumulative").print_stats(30)
+            else:
+                profiler.dump_stats(args.profile)
+        if args.metrics:
+            instrumentation.write_prometheus(args.metrics, table_path=args.csv)
+
+
+def _run_cli(p, args) -> int:
+    import sys
+    if args.batch is not None:
+        if args.batch == "-":
+            ok, ng = run_batch(sys.stdin, sys.stdout, args.format, args.workers, args.csv)
+        else:
+            with open(args.batch, encoding="utf-8", newline="") as f:
+                ok, ng = run_batch(f, sys.stdout, args.format, args.workers, args.csv)
+        print(f"合計: {ok} 成功, {ng} 失敗", file=sys.stderr)
+        return 0 if ng == 0 else 1
+
+    missing = [opt for opt, v in (("--shape", args.shape), ("--weight", args.weight), ("--length", args.length),
+                                  ("--long-side", args.long_side), ("--thickness", args.thickness)) if v is None]
+    if missing:
+        p.error("次の引数が必要です: " + ", ".join(missing))
+
     result = estimate(
         shape=args.shape,
         weight_kg=args.weight,
@@ -242,7 +1551,8 @@ def main():
         table_path=args.csv,
     )
     print(json.dumps(result, ensure_ascii=False, indent=2))
+    return 0
 
 
 if __name__ == "__main__":
-    main()
+    exit(main())
@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+"""
+計算書方式の曲げ工賃 — data/prices.json（L曲げ基準価格）× data/rates.json（形状乗率・数量調整・比重）。
+build_calc_sheet.py が Excel の数式で組んでいる計算と同じもの。evals/run_evals.py もこれを使う。
+
+実行: python3 src/calc_sheet.py --shape ハット曲げ --thickness 1.6 --width 570 --length 40 --material SS400 --qty 1
+"""
+
+import json
+import os
+import sys
+from typing import Any, Dict, Optional, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import fixed_point  # noqa: E402
+
+SKILL_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_DIR = os.path.join(SKILL_DIR, "data")
+
+
+def load_data(data_dir: Optional[str] = None) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    data_dir = data_dir or DATA_DIR
+    with open(os.path.join(data_dir, "prices.json"), encoding="utf-8") as f:
+        prices = json.load(f)
+    with open(os.path.join(data_dir, "rates.json"), encoding="utf-8") as f:
+        rates = json.load(f)
+    return prices, rates
+
+
+def calc_weight(展開幅_mm, 製品長さ_mm, 板厚_mm, 比重):
+    return (展開幅_mm / 1000) * (製品長さ_mm / 1000) * (板厚_mm / 1000) * (比重 * 1000)
+
+
+def get_base_price(重量_kg, 製品長さ_mm, prices):
+    """重量・長さそれぞれ「最初に値以上になる区分」を使う"""
+    w = prices["重量区分"]
+    l = prices["長さ区分"]
+    # 重量: 最初の w[i] で 重量_kg <= w[i] となる行
+    row = len(w) - 1
+    for i, t in enumerate(w):
+        if 重量_kg <= t:
+            row = i
+            break
+    # 長さ: 最初の l[j] で 製品長さ_mm <= l[j] となる列
+    col = len(l) - 1
+    for j, t in enumerate(l):
+        if 製品長さ_mm <= t:
+            col = j
+            break
+    row = min(row, len(prices["基準価格"]) - 1)
+    col = min(col, len(prices["基準価格"][0]) - 1)
+    return prices["基準価格"][row][col]
+
+
+def get_qty_rate(数量, rates):
+    for row in rates["数量調整"]:
+        if row["min"] <= 数量 and (row["max"] is None or 数量 <= row["max"]):
+            return row["rate"]
+    return 1.0
+
+
+def round_unit_price(raw_sen: int) -> int:
+    """計算書と同じ: 50円の倍数ちょうどならそのまま、それ以外は100円単位に四捨五入（raw_sen は銭）。"""
+    return fixed_point.round_yen(raw_sen, "keep50")
+
+
+def calc_見積り_税抜(input_data, prices, rates):
+    """穴あけ加算なしで単価×数量を返す（evals の expected と比較用）"""
+    shape = input_data["形状"]
+    thickness = input_data["板厚_mm"]
+    width = input_data["展開幅_mm"]
+    length = input_data["製品長さ_mm"]
+    material = input_data["材質"]
+    qty = input_data["数量"]
+
+    gravity = rates["比重"].get(material)
+    if gravity is None:
+        raise ValueError(f"未知の材質: {material}")
+
+    weight = calc_weight(width, length, thickness, gravity)
+    base = get_base_price(weight, length, prices)
+    shape_rate = rates["形状乗率"].get(shape)
+    if shape_rate is None:
+        raise ValueError(f"未知の形状: {shape}")
+    qty_rate = get_qty_rate(qty, rates)
+
+    # 銭 × 千分率の整数で掛けてから単価に丸める（計算書と同じ規則）
+    raw_sen = fixed_point.apply_rate(
+        fixed_point.apply_rate(base * fixed_point.SEN_PER_YEN, fixed_point.per_mille(shape_rate)),
+        fixed_point.per_mille(qty_rate),
+    )
+    unit_price = round_unit_price(raw_sen)
+    見積り_税抜 = unit_price * qty
+
+    return {
+        "重量_kg": round(weight, 3),
+        "基準価格": base,
+        "形状乗率": shape_rate,
+        "数量調整": qty_rate,
+        "単価_税抜": unit_price,
+        "見積り_税抜": 見積り_税抜,
+    }
+
+
+def main():
+    import argparse
+    p = argparse.ArgumentParser(description="計算書方式の曲げ工賃（prices.json × rates.json）")
+    p.add_argument("--shape", required=True, help="形状")
+    p.add_argument("--thickness", type=float, required=True, help="板厚 mm")
+    p.add_argument("--width", type=float, required=True, help="展開幅 mm")
+    p.add_argument("--length", type=float, required=True, help="製品長さ mm")
+    p.add_argument("--material", default="SS400", help="材質")
+    p.add_argument("--qty", type=int, default=1, help="数量")
+    args = p.parse_args()
+    prices, rates = load_data()
+    result = calc_見積り_税抜({
+        "形状": args.shape, "板厚_mm": args.thickness, "展開幅_mm": args.width,
+        "製品長さ_mm": args.length, "材質": args.material, "数量": args.qty,
+    }, prices, rates)
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
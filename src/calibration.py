@@ -0,0 +1,768 @@
+# -*- coding: utf-8 -*-
+"""
+価格表の校正 — 過去の見積り（evals/cases/ の社長見積り、実績一覧の実績単価）に合うように
+価格表・係数を最小二乗で合わせ直し、変更案（パラメータごとの 現在値 → 提案値）と残差のレポートを出す。
+
+モデル（--model）:
+  table  bending_price_table.csv のセル（v2.1）。単価 ≈ セル × 数量係数 × 小物割引 + 穴あけ
+  logic  bending_logic.json の係数（v3）。20kg 未満は 曲げ回数 × 区分の [min, max] の補間、
+         20kg 以上は 1曲げ円/kg × 重量 + 追加円/kg × (曲げ回数-1) × 重量 + 長さ加算 × 曲げ回数 × 重量、に穴あけを足す
+  sheet  data/prices.json の基準価格 × data/rates.json の形状乗率 × 数量調整（計算書方式）。
+         両方に掛かるので、片方を固定してもう片方を解くのを交互に繰り返す（L曲げの乗率は 1 に固定）
+
+どのモデルも「単価 = offset + Σ 係数 × パラメータ」の疎な計画行列（1行の非ゼロは3個まで）にして、
+正規方程式を np.bincount で作り（パラメータは数百個なので行列は小さい）、
+制約（非負・重量や長さの区分が大きいほど高い・min ≤ max など、x[a] ≤ x[b] の形）付きの最小二乗を ADMM で解く。
+見積りの無いセルが決まるように、現在値を prior 件分の見積りとして足す（リッジ）。
+提案値は丸め単位（円のセルは10円、円/kg は1円、乗率は0.01）に丸めてから制約を満たすように直す。
+残差は線形モデルの予測値（端数の丸め・曲げ工賃の下限は入れない）で、現在値と提案値の両方について出す。
+要 numpy。
+
+実行:
+  python3 src/calibration.py --model table --records data/records.sqlite3
+  python3 src/calibration.py --model sheet --out /tmp/proposal     # 提案した表を書き出す
+  python3 src/calibration.py --bench 100000 --model logic            # 合成データで時間と復元の精度
+"""
+
+import copy
+import csv
+import io
+import json
+import os
+import sys
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import calc_bending  # noqa: E402
+import comparables  # noqa: E402
+import nesting  # noqa: E402
+from calc_bending import LENGTH_COLUMNS, LENGTH_THRESHOLDS  # noqa: E402
+
+MODELS = ("table", "logic", "sheet")
+# sheet モデルの交互最適化の回数
+SHEET_ROUNDS = 8
+
+
+# ===== 見積りの読み込み =====
+
+def load_quotes(records_path: Optional[str] = None, cases: bool = True) -> List[Dict[str, Any]]:
+    """evals/cases/ の社長見積りと、records.json / records.sqlite3 の実績（comparables の見積りの形式）。"""
+    rates = nesting.load_rates()
+    quotes = comparables.load_case_quotes(rates=rates) if cases else []
+    if records_path:
+        import repricing
+        for rec in repricing.load_records(records_path):
+            q = comparables.quote_from_record(rec, rates)
+            if q is not None:
+                quotes.append(q)
+    return quotes
+
+
+def quote_columns(quotes: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """見積りのリスト → 列（numpy 配列）。price は1個あたりの税抜単価。"""
+    np = calc_bending._import_numpy()
+    price = np.asarray([float(q["price"]) for q in quotes], dtype=np.float64)
+    lot = np.asarray([max(int(q["lot"]), 1) for q in quotes], dtype=np.float64)
+    # 社長見積りは 単価 × 数量 の合計、実績一覧の actual は単価
+    per_lot = np.asarray([q.get("source") == "evals/cases" for q in quotes], dtype=bool)
+    return {
+        "id": [q.get("id") for q in quotes],
+        "shape": np.asarray([str(q["shape"]) for q in quotes], dtype=str),
+        "thickness": np.asarray([float(q["thickness_mm"]) for q in quotes], dtype=np.float64),
+        "weight": np.asarray([float(q["weight_kg"]) for q in quotes], dtype=np.float64),
+        "length": np.asarray([float(q["length_mm"]) for q in quotes], dtype=np.float64),
+        "width": np.asarray([float(q.get("width_mm", q["length_mm"])) for q in quotes], dtype=np.float64),
+        "long_side": np.asarray([float(q["long_side_mm"]) for q in quotes], dtype=np.float64),
+        "lot": lot,
+        "punch": np.asarray([int(q.get("punch_count") or 0) for q in quotes], dtype=np.float64),
+        "pierce": np.asarray([int(q.get("pierce_count") or 0) for q in quotes], dtype=np.float64),
+        "price": np.where(per_lot, price / lot, price),
+    }
+
+
+def _hole_cost(np, q):
+    """calc_hole_cost() と同じ（パンチ × 30円 + ピアス × 板厚別単価）。"""
+    band = np.searchsorted(np.asarray(calc_bending.PIERCE_THICKNESS_BANDS, dtype=np.float64), q["thickness"], side="left")
+    return q["punch"] * calc_bending.PUNCH_PRICE + q["pierce"] * np.asarray(calc_bending.PIERCE_PRICES, dtype=np.float64)[band]
+
+
+# ===== パラメータと計画行列 =====
+
+class Params:
+    """パラメータの並び（名前・現在値・丸め単位・書き戻し先）と、大小関係の制約 x[a] <= x[b]。どれも非負。"""
+
+    def __init__(self):
+        self.names: List[str] = []
+        self.values: List[float] = []
+        self.steps: List[float] = []
+        self.paths: List[Tuple[Any, ...]] = []
+        self.fixed: List[bool] = []
+        self.pairs: List[Tuple[int, int]] = []
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def add(self, name: str, value: float, step: float, path: Tuple[Any, ...], fixed: bool = False) -> int:
+        self.names.append(name)
+        self.values.append(float(value))
+        self.steps.append(step)
+        self.paths.append(path)
+        self.fixed.append(fixed)
+        return len(self.names) - 1
+
+    def order(self, a: int, b: int) -> None:
+        """x[a] <= x[b] を制約に足す。"""
+        self.pairs.append((a, b))
+
+    def rounded(self, np, x):
+        """提案値を丸め単位に丸め、制約を満たすまで大きい側を引き上げる（固定の側は動かさない）。"""
+        x0 = np.asarray(self.values)
+        fixed = np.asarray(self.fixed)
+        step = np.asarray(self.steps)
+        x = np.where(fixed, x0, np.maximum(np.round(x / step) * step, 0.0))
+        for _ in range(len(self.pairs) + 1):
+            changed = False
+            for a, b in self.pairs:
+                if x[a] > x[b] + 1e-9:
+                    if fixed[b]:
+                        x[a] = x[b]
+                    else:
+                        x[b] = x[a]
+                    changed = True
+            if not changed:
+                break
+        return x
+
+    def value(self, i: int, x) -> Any:
+        """書き戻す値（円は int、乗率は小数2桁）。"""
+        v = float(x[i])
+        return int(round(v)) if self.steps[i] >= 1 else round(v, 2)
+
+
+class Design:
+    """
+    疎な計画行列。行 r の予測 = offset[r] + Σ_k vals[r, k] × x[cols[r, k]]（使わない欄は vals = 0）。
+    rows は見積りの列（quote_columns()）の行番号。
+    """
+
+    def __init__(self, rows, cols, vals, offset):
+        self.rows = rows
+        self.cols = cols
+        self.vals = vals
+        self.offset = offset
+
+    def predict(self, x):
+        return self.offset + (self.vals * x[self.cols]).sum(axis=1)
+
+    def counts(self, np, p: int):
+        """パラメータごとの見積り件数（係数が 0 でない行）。"""
+        nz = self.vals != 0
+        return np.bincount(self.cols[nz], minlength=p)
+
+
+def solve(
+    np,
+    params: Params,
+    design: Design,
+    y,
+    w,
+    x=None,
+    free=None,
+    prior: float = 1.0,
+    rho: float = 1.0,
+    max_iter: int = 20000,
+    tol: float = 1e-7,
+) -> Tuple[Any, Dict[str, Any]]:
+    """
+    min Σ w (y - 予測)² + prior の項 を、非負と params.pairs の制約の下で解く。
+    free（bool 配列）の外のパラメータは x（既定は現在値）のまま。戻り値は (全パラメータの値, 解の情報)。
+    """
+    p = len(params)
+    x0 = np.asarray(params.values, dtype=np.float64)
+    x = x0.copy() if x is None else np.asarray(x, dtype=np.float64).copy()
+    free = ~np.asarray(params.fixed) if free is None else free & ~np.asarray(params.fixed)
+    fi = np.flatnonzero(free)
+    if not len(fi):
+        return x, {"iterations": 0, "active": 0, "max_violation": 0.0}
+
+    # 正規方程式 G = Xᵀ W X、g = Xᵀ W (y - offset)。非ゼロの欄の組ごとに bincount で足す
+    t = y - design.offset
+    k = design.cols.shape[1]
+    G = np.zeros(p * p)
+    g = np.zeros(p)
+    for a in range(k):
+        ca, va = design.cols[:, a], design.vals[:, a] * w
+        g += np.bincount(ca, weights=va * t, minlength=p)
+        for b in range(k):
+            G += np.bincount(ca * p + design.cols[:, b], weights=va * design.vals[:, b], minlength=p * p)
+    G = G.reshape(p, p)
+
+    # 現在値へのリッジ: 見積り1件あたりの係数の二乗の平均 × prior（見積りの無いパラメータは全体の中央値）
+    n = design.counts(np, p)
+    scale = np.where(n > 0, np.diag(G) / np.maximum(n, 1), 0.0)
+    seen = scale[fi][n[fi] > 0]
+    scale = np.where(n > 0, scale, float(np.median(seen)) if len(seen) else 1.0)
+    lam = prior * scale[fi]
+
+    H = G[np.ix_(fi, fi)] + np.diag(lam)
+    c = g[fi] - G[np.ix_(fi, ~free)] @ x[~free] + lam * x0[fi]
+
+    # 制約 D x_free >= h（非負 + 大小関係。片方が固定なら上限・下限になる）
+    pos = -np.ones(p, dtype=np.int64)
+    pos[fi] = np.arange(len(fi))
+    rows, h = [], []
+    for j in range(len(fi)):
+        rows.append({j: 1.0})
+        h.append(0.0)
+    for a, b in params.pairs:
+        ia, ib = pos[a], pos[b]
+        if ia < 0 and ib < 0:
+            continue
+        if ia < 0:
+            rows.append({ib: 1.0})
+            h.append(x[a])
+        elif ib < 0:
+            rows.append({ia: -1.0})
+            h.append(-x[b])
+        else:
+            rows.append({ib: 1.0, ia: -1.0})
+            h.append(0.0)
+    D = np.zeros((len(rows), len(fi)))
+    for r, coef in enumerate(rows):
+        for j, v in coef.items():
+            D[r, j] = v
+    h = np.asarray(h)
+
+    # 対角が 1 になるように変数をスケールし、制約の行を正規化してから ADMM
+    d = np.diag(H)
+    s = 1.0 / np.sqrt(np.maximum(d, 1e-12 * max(float(d.max()), 1.0)))
+    Ht = H * s[:, None] * s[None, :]
+    ct = c * s
+    Dt = D * s[None, :]
+    norm = np.linalg.norm(Dt, axis=1)
+    Dt /= norm[:, None]
+    ht = h / norm
+    K = np.linalg.inv(Ht + rho * Dt.T @ Dt)
+
+    z = np.maximum(Dt @ (K @ ct), ht)
+    u = np.zeros_like(z)
+    it = 0
+    for it in range(1, max_iter + 1):
+        v = K @ (ct + rho * Dt.T @ (z - u))
+        Dv = Dt @ v
+        z_prev = z
+        z = np.maximum(Dv + u, ht)
+        u += Dv - z
+        if it % 10 == 0:
+            primal = float(np.abs(Dv - z).max())
+            dual = rho * float(np.abs(Dt.T @ (z - z_prev)).max())
+            if primal < tol * max(1.0, float(np.abs(v).max())) and dual < tol * max(1.0, float(np.abs(ct).max())):
+                break
+    x[fi] = v * s
+    slack = D @ x[fi] - h
+    return x, {
+        "iterations": it,
+        "active": int((slack <= 1e-6 * max(1.0, float(np.abs(h).max()))).sum()),
+        "max_violation": round(float(max(-slack.min(), 0.0)), 6),
+    }
+
+
+# ===== モデル =====
+
+class _LinearModel:
+    """計画行列が1つで、1回解けば済むモデル（table / logic）。prepare() で self.design を作る。"""
+
+    def __init__(self):
+        self.np = calc_bending._import_numpy()
+        self.params = Params()
+        self.design: Optional[Design] = None
+
+    def fit(self, y, w, prior: float) -> Tuple[Any, Dict[str, Any]]:
+        return solve(self.np, self.params, self.design, y[self.design.rows], w[self.design.rows], prior=prior)
+
+    def predict(self, x):
+        return self.design.predict(x)
+
+    @property
+    def rows(self):
+        return self.design.rows
+
+    def counts(self):
+        return self.design.counts(self.np, len(self.params))
+
+
+class TableModel(_LinearModel):
+    """bending_price_table.csv のセル。重量区分・長さ区分が大きいほど高い（同じ形状の中で）。"""
+
+    name = "table"
+
+    def __init__(self, table: Optional[calc_bending.PriceTable] = None):
+        super().__init__()
+        np = self.np
+        self.table = table if table is not None else calc_bending.get_price_table()
+        pos = {id(r): i for i, r in enumerate(self.table.rows)}
+        # 形状 → (重量しきい値 float64[行], パラメータ番号 int64[行, 長さ列])
+        self.cells: Dict[str, Tuple[Any, Any]] = {}
+        P = self.params
+        for shape in self.table.shapes:
+            weights, rows = self.table._by_shape[shape]
+            idx = np.asarray([
+                [P.add(f"{shape}/{r['重量範囲']}kg/{col}", r[col], 10, (pos[id(r)], col)) for col in LENGTH_COLUMNS]
+                for r in rows
+            ], dtype=np.int64)
+            for i in range(len(rows)):
+                for j in range(len(LENGTH_COLUMNS)):
+                    if i + 1 < len(rows):
+                        P.order(idx[i, j], idx[i + 1, j])
+                    if j + 1 < len(LENGTH_COLUMNS):
+                        P.order(idx[i, j], idx[i, j + 1])
+            self.cells[shape] = (np.asarray(weights, dtype=np.float64), idx)
+
+    def prepare(self, q) -> Dict[str, int]:
+        np = self.np
+        n = len(q["price"])
+        col = np.zeros(n, dtype=np.int64)
+        ok = np.zeros(n, dtype=bool)
+        skipped: Dict[str, int] = {}
+        length_idx = np.minimum(
+            np.searchsorted(np.asarray(LENGTH_THRESHOLDS, dtype=np.float64), q["length"], side="left"),
+            len(LENGTH_COLUMNS) - 1,
+        )
+        uniq, inv = np.unique(q["shape"], return_inverse=True)
+        for code, shape in enumerate(uniq.tolist()):
+            sel = inv == code
+            entry = self.cells.get(shape)
+            if entry is None:
+                skipped["価格表に無い形状"] = skipped.get("価格表に無い形状", 0) + int(sel.sum())
+                continue
+            weights, idx = entry
+            wi = np.minimum(np.searchsorted(weights, q["weight"][sel], side="left"), len(weights) - 1)
+            col[sel] = idx[wi, length_idx[sel]]
+            ok |= sel
+
+        qty_i = np.searchsorted(np.asarray(calc_bending.QUANTITY_BANDS, dtype=np.float64), q["lot"], side="left")
+        small = (q["long_side"] <= calc_bending.SMALL_PART_MAX_LONG_SIDE_MM) & (q["weight"] <= calc_bending.SMALL_PART_MAX_WEIGHT_KG)
+        mult = np.asarray(calc_bending.QUANTITY_FACTORS)[qty_i] * np.where(small, calc_bending.SMALL_PART_DISCOUNT, 1.0)
+        rows = np.flatnonzero(ok)
+        self.design = Design(rows, col[rows, None], mult[rows, None], _hole_cost(np, q)[rows])
+        return skipped
+
+    def documents(self, x) -> Dict[str, str]:
+        """提案値で書き直した bending_price_table.csv。"""
+        rows = [dict(r) for r in self.table.rows]
+        for i, (r, col) in enumerate(self.params.paths):
+            rows[r][col] = self.params.value(i, x)
+        buf = io.StringIO()
+        writer = csv.DictWriter(buf, fieldnames=list(self.table.rows[0]), lineterminator="\n")
+        writer.writeheader()
+        writer.writerows(rows)
+        return {"bending_price_table.csv": buf.getvalue()}
+
+
+class LogicModel(_LinearModel):
+    """
+    bending_logic.json の係数。20kg 未満の [min, max]（10円単位、min ≤ max、長さ区分が大きいほど高い）、
+    20kg 以上の 1曲げ円/kg・追加円/kg（追加 ≤ 1曲げ）・長さ加算（長さ区分が大きいほど高い、最初の区分は固定）。
+    1曲げ目と長さ加算は最初の長さ区分では区別できないので、最初の区分の長さ加算を固定にしている。
+    """
+
+    name = "logic"
+
+    def __init__(self, path: Optional[str] = None):
+        super().__init__()
+        import bending_logic
+        self.path = path or bending_logic.DEFAULT_LOGIC_PATH
+        with open(self.path, encoding="utf-8") as f:
+            self.doc = json.load(f)
+        self.logic = bending_logic.CompiledLogic(self.doc)
+        P = self.params
+        # CompiledLogic と同じ並び（グループ順、区分上限の昇順）
+        self.under_min: List[int] = []
+        self.under_max: List[int] = []
+        self.over_first: List[int] = []
+        self.over_add: List[int] = []
+        self.over_len_add: List[int] = []
+        for g in self.logic.groups:
+            prev = None
+            for lim, key in sorted((float(k), k) for k in self.doc["20kg未満"].get(g, {})):
+                mn, mx = self.doc["20kg未満"][g][key]
+                a = P.add(f"20kg未満/{g}/{key}/min", mn, 10, ("20kg未満", g, key, 0))
+                b = P.add(f"20kg未満/{g}/{key}/max", mx, 10, ("20kg未満", g, key, 1))
+                P.order(a, b)
+                if prev is not None:
+                    P.order(prev[0], a)
+                    P.order(prev[1], b)
+                prev = (a, b)
+                self.under_min.append(a)
+                self.under_max.append(b)
+            o = self.doc["20kg以上"][g]
+            first = P.add(f"20kg以上/{g}/1曲げ_円perkg", o["1曲げ_円perkg"], 1, ("20kg以上", g, "1曲げ_円perkg"))
+            add = P.add(f"20kg以上/{g}/追加_円perkg", o["追加_円perkg"], 1, ("20kg以上", g, "追加_円perkg"))
+            P.order(add, first)
+            self.over_first.append(first)
+            self.over_add.append(add)
+            prev_la = None
+            for lim, key in sorted((float(k), k) for k in o["長さ加算_円perkg"]):
+                la = P.add(f"20kg以上/{g}/長さ加算/{key}", o["長さ加算_円perkg"][key], 1,
+                           ("20kg以上", g, "長さ加算_円perkg", key), fixed=prev_la is None)
+                if prev_la is not None:
+                    P.order(prev_la, la)
+                prev_la = la
+                self.over_len_add.append(la)
+
+    def prepare(self, q) -> Dict[str, int]:
+        np = self.np
+        L = self.logic
+        a = L.arrays(np)
+        n = len(q["price"])
+        skipped: Dict[str, int] = {}
+
+        keys = a["thickness_keys"]
+        ti = np.minimum(np.searchsorted(keys, q["thickness"] - 1e-9, side="left"), len(keys) - 1)
+        valid = np.abs(keys[ti] - q["thickness"]) <= 1e-9
+        skipped["板厚グループに無い板厚"] = int((~valid).sum())
+        g = np.where(valid, a["thickness_group"][ti], 0)
+        uniq, inv = np.unique(q["shape"], return_inverse=True)
+        bends_u = np.asarray([L.bends.get(u, 0) for u in uniq.tolist()], dtype=np.float64)
+        bends = bends_u[inv]
+        no_bends = valid & (bends == 0)
+        skipped["曲げ回数の無い形状"] = int(no_bends.sum())
+        valid &= ~no_bends
+
+        cols = np.zeros((n, 3), dtype=np.int64)
+        vals = np.zeros((n, 3), dtype=np.float64)
+        under = q["weight"] < L.weight_split_kg
+        w, length = q["weight"], q["length"]
+        out_of_range = np.zeros(n, dtype=bool)
+        for gi in range(len(L.groups)):
+            sel = valid & (g == gi)
+            # 20kg 未満: 曲げ回数 × (min × (1 - r) + max × r)、r = min(長さ / 区分上限, 1)
+            lo, hi = L.under_offset[gi], L.under_offset[gi + 1]
+            s = sel & under
+            if s.any() and hi == lo:
+                out_of_range |= s
+            elif s.any():
+                k = np.searchsorted(a["under_limits"][lo:hi], length[s], side="left")
+                ok = k < hi - lo
+                kc = np.minimum(k, hi - lo - 1) + lo
+                r = np.minimum(length[s] / a["under_limits"][kc], 1.0)
+                rs = np.flatnonzero(s)
+                cols[rs, 0] = np.asarray(self.under_min, dtype=np.int64)[kc]
+                cols[rs, 1] = np.asarray(self.under_max, dtype=np.int64)[kc]
+                vals[rs, 0] = bends[s] * (1 - r)
+                vals[rs, 1] = bends[s] * r
+                out_of_range[rs[~ok]] = True
+            # 20kg 以上: 1曲げ × 重量 + 追加 × (曲げ回数-1) × 重量 + 長さ加算 × 曲げ回数 × 重量
+            lo, hi = L.over_offset[gi], L.over_offset[gi + 1]
+            s = sel & ~under
+            if s.any():
+                k = np.searchsorted(a["over_limits"][lo:hi], length[s], side="left")
+                ok = k < hi - lo
+                kc = np.minimum(k, hi - lo - 1) + lo
+                rs = np.flatnonzero(s)
+                cols[rs, 0] = self.over_first[gi]
+                cols[rs, 1] = self.over_add[gi]
+                cols[rs, 2] = np.asarray(self.over_len_add, dtype=np.int64)[kc]
+                vals[rs, 0] = w[s]
+                vals[rs, 1] = (bends[s] - 1) * w[s]
+                vals[rs, 2] = bends[s] * w[s]
+                out_of_range[rs[~ok]] = True
+        skipped["長さ範囲外"] = int(out_of_range.sum())
+        rows = np.flatnonzero(valid & ~out_of_range)
+        self.design = Design(rows, cols[rows], vals[rows], _hole_cost(np, q)[rows])
+        return {k: v for k, v in skipped.items() if v}
+
+    def documents(self, x) -> Dict[str, str]:
+        """提案値で書き直した bending_logic.json。"""
+        return _json_documents(self.params, x, {"bending_logic.json": self.doc}, lambda path: ("bending_logic.json",) + path)
+
+
+class SheetModel:
+    """
+    計算書方式: 基準価格（prices.json、重量区分・長さ区分が大きいほど高い）× 形状乗率（rates.json、L曲げは 1 に固定）× 数量調整。
+    重量区分は重量、長さ区分は 製品長さ（見積りの width_mm）で引く（calc_sheet.get_base_price() と同じ）。
+    """
+
+    name = "sheet"
+
+    def __init__(self, data_dir: Optional[str] = None):
+        import calc_sheet
+        self.np = np = calc_bending._import_numpy()
+        self.prices, self.rates = calc_sheet.load_data(data_dir)
+        P = self.params = Params()
+        grid = self.prices["基準価格"]
+        wl, ll = self.prices["重量区分"], self.prices["長さ区分"]
+        self.base = np.asarray([
+            [P.add(f"基準価格/{wl[r]}kg/{ll[c]}mm", v, 10, ("prices.json", "基準価格", r, c)) for c, v in enumerate(row)]
+            for r, row in enumerate(grid)
+        ], dtype=np.int64)
+        for r in range(self.base.shape[0]):
+            for c in range(self.base.shape[1]):
+                if r + 1 < self.base.shape[0]:
+                    P.order(self.base[r, c], self.base[r + 1, c])
+                if c + 1 < self.base.shape[1]:
+                    P.order(self.base[r, c], self.base[r, c + 1])
+        self.shape_rate = {
+            shape: P.add(f"形状乗率/{shape}", v, 0.01, ("rates.json", "形状乗率", shape), fixed=shape == "L曲げ")
+            for shape, v in self.rates["形状乗率"].items()
+        }
+        self.is_base = np.zeros(len(P), dtype=bool)
+        self.is_base[self.base.ravel()] = True
+
+    def prepare(self, q) -> Dict[str, int]:
+        np = self.np
+        n = len(q["price"])
+        uniq, inv = np.unique(q["shape"], return_inverse=True)
+        rate_u = np.asarray([self.shape_rate.get(u, -1) for u in uniq.tolist()], dtype=np.int64)
+        rate_col = rate_u[inv]
+        ok = rate_col >= 0
+        skipped = {"形状乗率の無い形状": int((~ok).sum())} if (~ok).any() else {}
+
+        nr, nc = self.base.shape
+        r = np.minimum(np.searchsorted(np.asarray(self.prices["重量区分"], dtype=np.float64), q["weight"], side="left"), nr - 1)
+        c = np.minimum(np.searchsorted(np.asarray(self.prices["長さ区分"], dtype=np.float64), q["width"], side="left"), nc - 1)
+        qty_rate = np.ones(n)
+        for band in reversed(self.rates["数量調整"]):
+            hi = np.inf if band["max"] is None else band["max"]
+            qty_rate = np.where((q["lot"] >= band["min"]) & (q["lot"] <= hi), band["rate"], qty_rate)
+
+        self.rows = np.flatnonzero(ok)
+        self.base_col = self.base[r, c][self.rows]
+        self.rate_col = rate_col[self.rows]
+        self.qty_rate = qty_rate[self.rows]
+        return skipped
+
+    def _design(self, x, block: str) -> Design:
+        """片方を x に固定したときの計画行列（block = "base" なら基準価格、"rate" なら形状乗率が変数）。"""
+        np = self.np
+        if block == "base":
+            cols, vals = self.base_col, x[self.rate_col] * self.qty_rate
+        else:
+            cols, vals = self.rate_col, x[self.base_col] * self.qty_rate
+        return Design(self.rows, cols[:, None], vals[:, None], np.zeros(len(self.rows)))
+
+    def fit(self, y, w, prior: float) -> Tuple[Any, Dict[str, Any]]:
+        np = self.np
+        y, w = y[self.rows], w[self.rows]
+        x = np.asarray(self.params.values, dtype=np.float64)
+        info: Dict[str, Any] = {"rounds": 0, "iterations": 0}
+        for rnd in range(SHEET_ROUNDS):
+            prev = x.copy()
+            for block, free in (("base", self.is_base), ("rate", ~self.is_base)):
+                x, step = solve(np, self.params, self._design(x, block), y, w, x=x, free=free, prior=prior)
+                info["iterations"] += step["iterations"]
+                info["max_violation"] = max(info.get("max_violation", 0.0), step["max_violation"])
+            info["rounds"] = rnd + 1
+            if np.abs(x - prev).max() <= 1e-6 * max(1.0, float(np.abs(prev).max())):
+                break
+        return x, info
+
+    def predict(self, x):
+        return x[self.base_col] * x[self.rate_col] * self.qty_rate
+
+    def counts(self):
+        np = self.np
+        p = len(self.params)
+        return np.bincount(self.base_col, minlength=p) + np.bincount(self.rate_col, minlength=p)
+
+    def documents(self, x) -> Dict[str, str]:
+        """提案値で書き直した prices.json と rates.json。"""
+        return _json_documents(self.params, x, {"prices.json": self.prices, "rates.json": self.rates}, lambda path: path)
+
+
+def _json_documents(params: Params, x, docs: Dict[str, Any], full_path) -> Dict[str, str]:
+    """docs（ファイル名 → JSON）を複製し、各パラメータの書き戻し先（先頭がファイル名）に提案値を入れる。"""
+    docs = copy.deepcopy(docs)
+    for i, path in enumerate(params.paths):
+        path = full_path(path)
+        node = docs[path[0]]
+        for key in path[1:-1]:
+            node = node[key]
+        node[path[-1]] = params.value(i, x)
+    return {name: json.dumps(doc, ensure_ascii=False, indent=2) + "\n" for name, doc in docs.items()}
+
+
+def make_model(name: str):
+    if name == "table":
+        return TableModel()
+    if name == "logic":
+        return LogicModel()
+    if name == "sheet":
+        return SheetModel()
+    raise ValueError(f"モデルは {' / '.join(MODELS)} のどれか: {name!r}")
+
+
+# ===== 校正 =====
+
+def _residual_stats(np, resid, y) -> Dict[str, Any]:
+    if not len(resid):
+        return {"rmse": None, "mae": None, "bias": None, "mape_pct": None}
+    return {
+        "rmse": round(float(np.sqrt((resid ** 2).mean())), 1),
+        "mae": round(float(np.abs(resid).mean()), 1),
+        "bias": round(float(resid.mean()), 1),
+        "mape_pct": round(float((np.abs(resid) / np.maximum(y, 1.0)).mean() * 100), 2),
+    }
+
+
+def calibrate(
+    quotes: List[Dict[str, Any]],
+    model: Any = "table",
+    prior: float = 1.0,
+    relative: bool = False,
+    top: int = 20,
+) -> Tuple[Dict[str, Any], Dict[str, str]]:
+    """
+    見積りにモデルを合わせる。戻り値は (レポート, 提案したファイル名 → 内容)。
+    relative=True なら誤差を単価に対する比で測る（重み 1/単価²。安い部品の誤差も同じように効く）。
+    レポート:
+      changes   変わるパラメータ [{"param", "old", "new", "delta", "quotes"}]
+      before / after  現在値・提案値での残差（予測 - 見積り）の rmse・mae・bias・mape_pct
+      by_shape  形状ごとの件数と残差、worst  提案値で残差の大きい見積り top 件
+    """
+    np = calc_bending._import_numpy()
+    m = make_model(model) if isinstance(model, str) else model
+    t0 = time.perf_counter()
+    q = quote_columns(quotes)
+    skipped = m.prepare(q)
+    rows = m.rows
+    y_all = q["price"]
+    w_all = 1.0 / np.maximum(y_all, 1.0) ** 2 if relative else np.ones(len(y_all))
+    t1 = time.perf_counter()
+    x, info = m.fit(y_all, w_all, prior)
+    t2 = time.perf_counter()
+
+    P = m.params
+    x0 = np.asarray(P.values, dtype=np.float64)
+    proposed = P.rounded(np, x)
+    m.proposed = proposed  # bench() が正解と比べる
+    y = y_all[rows]
+    before = m.predict(x0) - y
+    after = m.predict(proposed) - y
+    n = m.counts()
+
+    changes = []
+    for i in np.flatnonzero(np.abs(proposed - x0) > 1e-9).tolist():
+        old, new = P.value(i, x0), P.value(i, proposed)
+        changes.append({"param": P.names[i], "old": old, "new": new, "delta": round(new - old, 2), "quotes": int(n[i])})
+
+    shapes = q["shape"][rows]
+    by_shape = {}
+    for shape in np.unique(shapes).tolist():
+        sel = shapes == shape
+        by_shape[shape] = {
+            "quotes": int(sel.sum()),
+            "mae_before": round(float(np.abs(before[sel]).mean()), 1),
+            "mae_after": round(float(np.abs(after[sel]).mean()), 1),
+            "bias_after": round(float(after[sel].mean()), 1),
+        }
+    worst = []
+    for r in np.argsort(-np.abs(after))[:top].tolist():
+        worst.append({
+            "id": q["id"][rows[r]], "shape": shapes[r], "price": round(float(y[r]), 1),
+            "predicted_before": round(float(y[r] + before[r]), 1), "predicted_after": round(float(y[r] + after[r]), 1),
+        })
+
+    report = {
+        "model": m.name,
+        "quotes": len(quotes),
+        "used": int(len(rows)),
+        "skipped": skipped,
+        "params": len(P),
+        "params_with_quotes": int((n > 0).sum()),
+        "prior": prior,
+        "relative": relative,
+        "prepare_s": round(t1 - t0, 3),
+        "fit_s": round(t2 - t1, 3),
+        "solver": info,
+        "before": _residual_stats(np, before, y),
+        "after": _residual_stats(np, after, y),
+        "by_shape": by_shape,
+        "changes": changes,
+        "worst": worst,
+    }
+    return report, m.documents(proposed)
+
+
+# ===== ベンチマーク =====
+
+def bench(n: int = 100000, model: str = "table", noise: float = 0.05, seed: int = 1) -> Dict[str, Any]:
+    """
+    合成データで校正の時間と精度を見る。現在値を 0.8〜1.25 倍に崩して制約を満たすように直した「正解」から
+    見積り n 件の単価を作り（相対誤差 noise のばらつき）、校正した提案値が正解にどれだけ戻るかを測る。
+    """
+    import random
+    from records_store import _synthetic_record
+
+    np = calc_bending._import_numpy()
+    rng = random.Random(seed)
+    nprng = np.random.default_rng(seed)
+    rates = nesting.load_rates()
+    t0 = time.perf_counter()
+    quotes = []
+    for i in range(n):
+        qt = comparables.quote_from_record(_synthetic_record(i, rng), rates)
+        if qt is not None:
+            quotes.append(qt)
+    result: Dict[str, Any] = {"n": n, "model": model, "generate_s": round(time.perf_counter() - t0, 2)}
+
+    m = make_model(model)
+    P = m.params
+    x0 = np.asarray(P.values, dtype=np.float64)
+    truth = P.rounded(np, x0 * nprng.uniform(0.8, 1.25, len(P)))
+    q = quote_columns(quotes)
+    m.prepare(q)
+    price = m.predict(truth) * (1 + noise * nprng.standard_normal(len(m.rows)))
+    for r, v in zip(m.rows.tolist(), np.maximum(np.round(price / 10) * 10, 10).tolist()):
+        quotes[r]["price"] = v
+
+    t0 = time.perf_counter()
+    report, _ = calibrate(quotes, m, top=0)
+    result["calibrate_s"] = round(time.perf_counter() - t0, 3)
+    result.update({k: report[k] for k in ("used", "params", "params_with_quotes", "prepare_s", "fit_s", "solver", "before", "after")})
+
+    proposed = m.proposed
+    well = (m.counts() >= 30) & ~np.asarray(P.fixed)
+    err = np.abs(proposed - truth)[well] / np.maximum(truth[well], 1e-9)
+    result["params_checked"] = int(well.sum())
+    result["param_error_mean_pct"] = round(float(err.mean() * 100), 2) if well.any() else None
+    result["param_error_max_pct"] = round(float(err.max() * 100), 2) if well.any() else None
+    drift = np.abs(x0 - truth)[well] / np.maximum(truth[well], 1e-9)
+    result["current_error_mean_pct"] = round(float(drift.mean() * 100), 2) if well.any() else None
+    return result
+
+
+def main():
+    import argparse
+    p = argparse.ArgumentParser(description="過去の見積りに合わせて価格表・係数を校正する（変更案と残差のレポート）")
+    p.add_argument("--model", choices=MODELS, default="table", help="校正する表（既定: table）")
+    p.add_argument("--records", help="records.json または records.sqlite3（実績単価も使う）")
+    p.add_argument("--no-cases", action="store_true", help="evals/cases/ の社長見積りを使わない")
+    p.add_argument("--prior", type=float, default=1.0, help="現在値を何件分の見積りとして足すか（既定: 1）")
+    p.add_argument("--relative", action="store_true", help="誤差を単価に対する比で測る")
+    p.add_argument("--top", type=int, default=20, help="残差の大きい見積りを何件出すか")
+    p.add_argument("--out", help="提案した表を書き出すディレクトリ")
+    p.add_argument("--bench", type=int, default=None, metavar="N", help="合成データ N 件でベンチマーク")
+    args = p.parse_args()
+
+    if args.bench is not None:
+        print(json.dumps(bench(args.bench, args.model), ensure_ascii=False, indent=2))
+        return 0
+    quotes = load_quotes(args.records, cases=not args.no_cases)
+    if not quotes:
+        p.error("見積りがありません（--records を指定するか、evals/cases/ を使ってください）")
+    report, docs = calibrate(quotes, args.model, prior=args.prior, relative=args.relative, top=args.top)
+    if args.out:
+        os.makedirs(args.out, exist_ok=True)
+        for name, text in docs.items():
+            with open(os.path.join(args.out, name), "w", encoding="utf-8") as f:
+                f.write(text)
+        report["written"] = [os.path.join(args.out, name) for name in docs]
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,417 @@
+# -*- coding: utf-8 -*-
+"""
+類似見積りの検索 — 新しい部品に近い過去の見積り（evals/cases/ の社長見積り、実績一覧のレコード）を
+k 件返す。各件に実際の見積り単価と、v2.1 エンジン（estimate_many）の単価・その差を付ける。
+
+特徴量（形状ごとに分けた行列。距離は重み付きのユークリッド）:
+  板厚帯（PIERCE_THICKNESS_BANDS の区分）、重量・長さ・長辺・数量・穴数は log2 で、
+  FEATURE_SCALES の量だけ違うと距離 1（重量なら2倍、数量なら4倍）。
+形状が違うものは同じ形状を探すときは対象外、all_shapes=True のときは SHAPE_PENALTY を足して混ぜる。
+行列は容量を倍々に確保して後ろに足していくので、add() は1件ずつでも速い。検索は numpy の全件比較
+（10万件で 1ms 未満）。要 numpy。
+
+  index = ComparableIndex()
+  index.add_many(load_case_quotes() + [quote_from_record(r) for r in records])
+  index.query("L曲げ", thickness_mm=3.2, weight_kg=2.0, length_mm=800, long_side_mm=800, lot=10, k=5)
+
+実行:
+  python3 src/comparables.py --shape L曲げ --thickness 3.2 --length 800 --width 100 --qty 10
+  python3 src/comparables.py --bench 100000
+"""
+
+import glob
+import json
+import math
+import os
+import sys
+import time
+import unicodedata
+from typing import Any, Dict, Iterable, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import calc_bending  # noqa: E402
+import nesting  # noqa: E402
+from calc_bending import PIERCE_THICKNESS_BANDS  # noqa: E402
+
+CASES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "evals", "cases")
+
+FEATURES = ("thickness_group", "weight", "length", "long_side", "lot", "punch", "pierce")
+# この量だけ違うと距離 1（板厚帯は1区分、ほかは log2 の差）
+FEATURE_SCALES = {
+    "thickness_group": 1.0,
+    "weight": 1.0,      # 2倍
+    "length": 1.0,      # 2倍
+    "long_side": 1.0,   # 2倍
+    "lot": 2.0,         # 4倍
+    "punch": 2.0,       # (1+穴数) が4倍
+    "pierce": 2.0,
+}
+# all_shapes=True のとき、形状が違うものに足す距離（二乗）
+SHAPE_PENALTY = 4.0
+
+
+def _thickness_group(thickness_mm: float) -> int:
+    for i, t in enumerate(PIERCE_THICKNESS_BANDS):
+        if thickness_mm <= t:
+            return i
+    return len(PIERCE_THICKNESS_BANDS)
+
+
+def features(thickness_mm: float, weight_kg: float, length_mm: float, long_side_mm: float, lot: int, punch_count: int = 0, pierce_count: int = 0) -> List[float]:
+    """FEATURES の順の特徴量（FEATURE_SCALES で割ったもの）。"""
+    raw = (
+        _thickness_group(thickness_mm),
+        math.log2(max(weight_kg, 0.01)),
+        math.log2(max(length_mm, 1.0)),
+        math.log2(max(long_side_mm, 1.0)),
+        math.log2(max(lot, 1)),
+        math.log2(1 + max(punch_count, 0)),
+        math.log2(1 + max(pierce_count, 0)),
+    )
+    return [v / FEATURE_SCALES[name] for v, name in zip(raw, FEATURES)]
+
+
+# ===== 見積りの読み込み（共通形式にそろえる） =====
+
+def quote_from_record(rec: Dict[str, Any], rates: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+    """
+    実績一覧のレコード → 見積り1件。展開L（length）を長さ、展開L・W の大きい方を長辺、重量は比重から。
+    形状・板厚・展開寸法・実績単価（actual）が無ければ None。
+    """
+    rates = rates if rates is not None else nesting.load_rates()
+    try:
+        shape = str(rec["shape"])
+        thickness = float(rec["thickness"])
+        length = float(rec["length"])
+        width = float(rec["width"])
+        price = float(rec["actual"])
+    except (KeyError, TypeError, ValueError):
+        return None
+    if not shape or price <= 0:
+        return None
+    material = str(rec.get("material") or "SS400")
+    return {
+        "source": "records",
+        "id": rec.get("id") or rec.get("_id"),
+        "shape": shape,
+        "thickness_mm": thickness,
+        "material": material,
+        "weight_kg": nesting.weight_kg(length * width, thickness, material, rates),
+        "length_mm": length,
+        "width_mm": width,
+        "long_side_mm": max(length, width),
+        "lot": int(rec.get("qty") or 1),
+        "punch_count": int(rec.get("punch_count") or 0),
+        "pierce_count": int(rec.get("pierce_count") or 0),
+        "price": price,
+        "date": rec.get("date"),
+        "customer": rec.get("customer"),
+    }
+
+
+def quote_from_case(case: Dict[str, Any], name: str, rates: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    evals/cases/ の社長見積り → 見積り1件。実績一覧に入れるときと同じく 展開幅 = 展開L、製品長さ = 展開W として扱う。
+    丸穴はパンチ、長穴はピアスに数える。
+    """
+    rates = rates if rates is not None else nesting.load_rates()
+    inp = case["入力"]
+    length, width, thickness = float(inp["展開幅_mm"]), float(inp["製品長さ_mm"]), float(inp["板厚_mm"])
+    material = str(inp.get("材質") or "SS400")
+    return {
+        "source": "evals/cases",
+        "id": name,
+        "shape": str(inp["形状"]),
+        "thickness_mm": thickness,
+        "material": material,
+        "weight_kg": nesting.weight_kg(length * width, thickness, material, rates),
+        "length_mm": length,
+        "width_mm": width,
+        "long_side_mm": max(length, width),
+        "lot": int(inp.get("数量") or 1),
+        "punch_count": int(inp.get("丸穴数") or 0),
+        "pierce_count": int(inp.get("長穴数") or 0),
+        "price": float(case["社長見積り_税抜"]),
+        "memo": case.get("メモ"),
+    }
+
+
+def load_case_quotes(cases_dir: str = CASES_DIR, rates: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+    """evals/cases/*.json（NFC/NFD 違いの同名ファイルは1つにまとめる）。"""
+    rates = rates if rates is not None else nesting.load_rates()
+    out = []
+    seen = set()
+    for path in sorted(glob.glob(os.path.join(cases_dir, "*.json"))):
+        key = unicodedata.normalize("NFC", os.path.basename(path))
+        if key in seen:
+            continue
+        seen.add(key)
+        with open(path, encoding="utf-8") as f:
+            out.append(quote_from_case(json.load(f), os.path.splitext(key)[0], rates))
+    return out
+
+
+# ===== 索引 =====
+
+class _Partition:
+    """
+    1形状分の特徴量行列（容量を倍々に確保して後ろに足す）、各行の |x|^2、ComparableIndex.quotes の行番号。
+    距離の二乗は |x|^2 - 2 x・q + |q|^2 で出す（差の行列を作らないので行列1回の掛け算で済む）。
+    """
+
+    def __init__(self, np):
+        self.np = np
+        self.X = np.empty((16, len(FEATURES)), dtype=np.float32)
+        self.norms = np.empty(16, dtype=np.float32)
+        self.rows = np.empty(16, dtype=np.int64)
+        self.n = 0
+
+    def extend(self, X, rows) -> None:
+        np = self.np
+        need = self.n + len(rows)
+        if need > len(self.rows):
+            cap = max(need, len(self.rows) * 2)
+            X2 = np.empty((cap, len(FEATURES)), dtype=np.float32)
+            X2[: self.n] = self.X[: self.n]
+            n2 = np.empty(cap, dtype=np.float32)
+            n2[: self.n] = self.norms[: self.n]
+            r2 = np.empty(cap, dtype=np.int64)
+            r2[: self.n] = self.rows[: self.n]
+            self.X, self.norms, self.rows = X2, n2, r2
+        self.X[self.n: need] = X
+        self.norms[self.n: need] = np.einsum("ij,ij->i", X, X)
+        self.rows[self.n: need] = rows
+        self.n = need
+
+    def nearest(self, q, k: int, penalty: float = 0.0):
+        """(距離の二乗, 行番号) を近い順に最大 k 件。"""
+        np = self.np
+        d = self.norms[: self.n] - 2.0 * (self.X[: self.n] @ q)
+        d += float(q @ q) + penalty
+        if k < self.n:
+            top = np.argpartition(d, k)[:k]
+        else:
+            top = np.arange(self.n)
+        top = top[np.argsort(d[top], kind="stable")]
+        return d[top], self.rows[: self.n][top]
+
+
+class ComparableIndex:
+    """
+    過去の見積りの類似検索。quotes は追加順の見積り（engine = その時点の価格表での v2.1 単価、
+    表に無い形状は None）。形状ごとの _Partition に特徴量を持つ。
+    """
+
+    def __init__(self, table_path: Optional[str] = None, tax_rate: float = 0.1):
+        self.np = calc_bending._import_numpy()
+        self.table_path = table_path
+        self.tax_rate = tax_rate
+        self.quotes: List[Dict[str, Any]] = []
+        self._parts: Dict[str, _Partition] = {}
+
+    def __len__(self) -> int:
+        return len(self.quotes)
+
+    def _engine_prices(self, quotes: List[Dict[str, Any]]) -> List[Optional[int]]:
+        """estimate_many() でまとめて計算した税抜単価（価格表に無い形状は None）。"""
+        np = self.np
+        table = calc_bending.get_price_table(self.table_path)
+        known = set(table.shapes)
+        sel = [i for i, q in enumerate(quotes) if q["shape"] in known]
+        out: List[Optional[int]] = [None] * len(quotes)
+        if sel:
+            cols = {k: np.asarray([quotes[i][k] for i in sel]) for k in ("shape", "weight_kg", "length_mm", "long_side_mm", "lot", "thickness_mm", "punch_count", "pierce_count")}
+            res = calc_bending.estimate_many(
+                cols["shape"], cols["weight_kg"], cols["length_mm"], cols["long_side_mm"], cols["lot"], cols["thickness_mm"],
+                cols["punch_count"], cols["pierce_count"], table=table, tax_rate=self.tax_rate,
+            )
+            for i, v in zip(sel, res["processing_cost_tax_excluded"].tolist()):
+                out[i] = v
+        return out
+
+    def add_many(self, quotes: Iterable[Dict[str, Any]]) -> int:
+        """見積り（quote_from_record() / quote_from_case() の形）を追加する。None は飛ばす。追加した件数を返す。"""
+        np = self.np
+        quotes = [q for q in quotes if q is not None]
+        if not quotes:
+            return 0
+        start = len(self.quotes)
+        by_shape: Dict[str, List[int]] = {}
+        for i, (q, engine) in enumerate(zip(quotes, self._engine_prices(quotes))):
+            q = dict(q, engine=engine)
+            self.quotes.append(q)
+            by_shape.setdefault(q["shape"], []).append(start + i)
+        for shape, rows in by_shape.items():
+            X = np.asarray([
+                features(
+                    self.quotes[r]["thickness_mm"], self.quotes[r]["weight_kg"], self.quotes[r]["length_mm"],
+                    self.quotes[r]["long_side_mm"], self.quotes[r]["lot"], self.quotes[r]["punch_count"], self.quotes[r]["pierce_count"],
+                )
+                for r in rows
+            ], dtype=np.float32)
+            part = self._parts.get(shape)
+            if part is None:
+                part = self._parts[shape] = _Partition(np)
+            part.extend(X, np.asarray(rows, dtype=np.int64))
+        return len(quotes)
+
+    def add(self, quote: Dict[str, Any]) -> bool:
+        return self.add_many([quote]) == 1
+
+    def query(
+        self,
+        shape: str,
+        thickness_mm: float,
+        weight_kg: float,
+        length_mm: float,
+        long_side_mm: float,
+        lot: int = 1,
+        punch_count: int = 0,
+        pierce_count: int = 0,
+        k: int = 5,
+        all_shapes: bool = False,
+    ) -> List[Dict[str, Any]]:
+        """
+        近い順に最大 k 件。各件は見積りの内容に distance、engine（v2.1 単価）、
+        deviation（単価 − engine）、deviation_rate（deviation / engine）を付けたもの。
+        all_shapes=False で同じ形状が無いときは全形状から探す。
+        """
+        np = self.np
+        q = np.asarray(features(thickness_mm, weight_kg, length_mm, long_side_mm, lot, punch_count, pierce_count), dtype=np.float32)
+        if not all_shapes and shape in self._parts:
+            d, rows = self._parts[shape].nearest(q, k)
+        else:
+            found = [p.nearest(q, k, 0.0 if s == shape else SHAPE_PENALTY) for s, p in self._parts.items()]
+            if not found:
+                return []
+            d = np.concatenate([f[0] for f in found])
+            rows = np.concatenate([f[1] for f in found])
+            order = np.argsort(d, kind="stable")[:k]
+            d, rows = d[order], rows[order]
+        out = []
+        for dist2, r in zip(d.tolist(), rows.tolist()):
+            quote = self.quotes[r]
+            engine = quote["engine"]
+            # 展開した式なので、同じ点でも丸め誤差でわずかに負になることがある
+            hit = dict(quote, distance=round(math.sqrt(max(dist2, 0.0)), 4))
+            if engine:
+                hit["deviation"] = quote["price"] - engine
+                hit["deviation_rate"] = round((quote["price"] - engine) / engine, 4)
+            else:
+                hit["deviation"] = hit["deviation_rate"] = None
+            out.append(hit)
+        return out
+
+    def stats(self) -> Dict[str, Any]:
+        return {"quotes": len(self.quotes), "shapes": {s: p.n for s, p in sorted(self._parts.items())}}
+
+
+def build_default_index(records_path: Optional[str] = None, table_path: Optional[str] = None) -> ComparableIndex:
+    """evals/cases/ と実績（records_path、省略時は data/records.sqlite3 があれば）から索引を作る。"""
+    rates = nesting.load_rates()
+    index = ComparableIndex(table_path)
+    index.add_many(load_case_quotes(rates=rates))
+    if records_path is None:
+        from records_store import DEFAULT_DB_PATH
+        records_path = DEFAULT_DB_PATH if os.path.exists(DEFAULT_DB_PATH) else None
+    if records_path:
+        from repricing import load_records
+        index.add_many(quote_from_record(r, rates) for r in load_records(records_path))
+    return index
+
+
+# ===== ベンチマーク =====
+
+def bench(n: int = 100000, queries: int = 1000, k: int = 5, seed: int = 0) -> Dict[str, Any]:
+    """合成レコード n 件で索引を作り、検索時間と全件ソートとの一致を確かめる。"""
+    import random
+
+    from records_store import _synthetic_record
+
+    np = calc_bending._import_numpy()
+    rng = random.Random(seed)
+    rates = nesting.load_rates()
+    records = [_synthetic_record(i, rng) for i in range(n)]
+    t0 = time.perf_counter()
+    index = ComparableIndex()
+    index.add_many(quote_from_record(r, rates) for r in records)
+    build_s = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    extra = [quote_from_record(_synthetic_record(n + i, rng), rates) for i in range(1000)]
+    for q in extra:
+        index.add(q)
+    add_us = (time.perf_counter() - t0) / len(extra) * 1e6
+
+    probes = [quote_from_record(_synthetic_record(-1 - i, rng), rates) for i in range(queries)]
+    timings = {"same_shape": [], "all_shapes": []}
+    for p in probes:
+        args = (p["shape"], p["thickness_mm"], p["weight_kg"], p["length_mm"], p["long_side_mm"], p["lot"])
+        for mode in timings:
+            t0 = time.perf_counter()
+            index.query(*args, k=k, all_shapes=(mode == "all_shapes"))
+            timings[mode].append(time.perf_counter() - t0)
+
+    # 全件を距離でソートしたものと同じ k 件が返るか（同じ形状）
+    mismatches = 0
+    for p in probes[:50]:
+        hits = index.query(p["shape"], p["thickness_mm"], p["weight_kg"], p["length_mm"], p["long_side_mm"], p["lot"], k=k)
+        q = np.asarray(features(p["thickness_mm"], p["weight_kg"], p["length_mm"], p["long_side_mm"], p["lot"]), dtype=np.float32)
+        rows = [i for i, x in enumerate(index.quotes) if x["shape"] == p["shape"]]
+        X = np.asarray([features(index.quotes[i]["thickness_mm"], index.quotes[i]["weight_kg"], index.quotes[i]["length_mm"], index.quotes[i]["long_side_mm"], index.quotes[i]["lot"]) for i in rows], dtype=np.float32)
+        d = ((X - q) ** 2).sum(axis=1)
+        ref = sorted(d.tolist())[:k]
+        got = [h["distance"] ** 2 for h in hits]
+        if any(abs(a - b) > 1e-3 for a, b in zip(ref, got)):
+            mismatches += 1
+
+    def pct(xs, q):
+        xs = sorted(xs)
+        return round(xs[min(len(xs) - 1, int(len(xs) * q))] * 1e6, 1)
+
+    return {
+        "n": len(index), "k": k, "build_s": round(build_s, 2), "add_one_us": round(add_us, 1),
+        **{f"{m}_us": {"p50": pct(t, 0.5), "p99": pct(t, 0.99)} for m, t in timings.items()},
+        "mismatches": mismatches,
+    }
+
+
+def main():
+    import argparse
+    p = argparse.ArgumentParser(description="過去の見積りから似た部品を探す")
+    p.add_argument("--shape", help="形状")
+    p.add_argument("--thickness", type=float, help="板厚 mm")
+    p.add_argument("--length", type=float, help="展開L mm")
+    p.add_argument("--width", type=float, help="展開W mm")
+    p.add_argument("--material", default="SS400")
+    p.add_argument("--qty", type=int, default=1)
+    p.add_argument("--punch", type=int, default=0, help="パンチ穴数")
+    p.add_argument("--pierce", type=int, default=0, help="ピアス数")
+    p.add_argument("-k", type=int, default=5)
+    p.add_argument("--all-shapes", action="store_true", help="ほかの形状も混ぜて探す")
+    p.add_argument("--records", default=None, help="実績（records.json / records.sqlite3）")
+    p.add_argument("--csv", default=None, help="価格表 CSV")
+    p.add_argument("--bench", type=int, default=None, metavar="N", help="合成データ N 件でベンチマーク")
+    args = p.parse_args()
+
+    if args.bench:
+        print(json.dumps(bench(args.bench), ensure_ascii=False, indent=2))
+        return 0
+    if not (args.shape and args.thickness and args.length and args.width):
+        p.error("--shape, --thickness, --length, --width が必要です")
+    index = build_default_index(args.records, args.csv)
+    part = quote_from_record({
+        "shape": args.shape, "thickness": args.thickness, "length": args.length, "width": args.width,
+        "material": args.material, "qty": args.qty, "punch_count": args.punch, "pierce_count": args.pierce, "actual": 1,
+    })
+    hits = index.query(
+        part["shape"], part["thickness_mm"], part["weight_kg"], part["length_mm"], part["long_side_mm"], part["lot"],
+        part["punch_count"], part["pierce_count"], k=args.k, all_shapes=args.all_shapes,
+    )
+    print(json.dumps({"index": index.stats(), "comparables": hits}, ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
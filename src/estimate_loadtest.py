@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+見積もりサーバーの負荷試験。keep-alive 接続を並列に張って POST し、スループットと p99 を表示する。
+実行: python3 src/estimate_loadtest.py --spawn --requests 20000 --connections 32
+  --spawn を付けると estimate_server.py を子プロセスで起動してから測る。
+  --batch-size N で /estimate/batch に N 件ずつ送る。
+"""
+
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from typing import Dict, List, Tuple
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+
+SHAPES = ["L曲げ", "コの字曲げ", "Z曲げ", "C型曲げ", "ハット曲げ"]
+THICKNESSES = [1.6, 2.3, 3.2, 4.5, 6.0, 9.0, 12.0]
+
+
+def random_part(rng: random.Random) -> Dict:
+    return {
+        "shape": rng.choice(SHAPES),
+        "weight_kg": round(rng.uniform(0.2, 120), 2),
+        "length_mm": rng.randint(40, 3500),
+        "long_side_mm": rng.randint(40, 1500),
+        "lot": rng.choice([1, 2, 5, 10, 20, 50]),
+        "thickness_mm": rng.choice(THICKNESSES),
+        "pierce_count": rng.randint(0, 8),
+    }
+
+
+async def read_response(reader: asyncio.StreamReader) -> Tuple[int, bytes]:
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError("接続が閉じられました")
+    status = int(status_line.split()[1])
+    length = 0
+    while True:
+        h = await reader.readline()
+        if h in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = h.decode("latin-1").partition(":")
+        if name.strip().lower() == "content-length":
+            length = int(value.strip())
+    body = await reader.readexactly(length) if length else b""
+    return status, body
+
+
+async def _client(host: str, port: int, path: str, bodies: List[bytes], counter, latencies: List[float], errors: List[int]):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        while True:
+            i = counter[0]
+            if i >= len(bodies):
+                break
+            counter[0] += 1
+            body = bodies[i]
+            req = (
+                f"POST {path} HTTP/1.1\r\nHost: {host}\r\nContent-Type: application/json\r\n"
+                f"Content-Length: {len(body)}\r\n\r\n"
+            ).encode("latin-1") + body
+            t0 = time.perf_counter()
+            writer.write(req)
+            await writer.drain()
+            status, _ = await read_response(reader)
+            latencies.append((time.perf_counter() - t0) * 1000.0)
+            if status != 200:
+                errors.append(status)
+    finally:
+        writer.close()
+
+
+async def run_load(host: str, port: int, requests: int, connections: int, batch_size: int, seed: int) -> Dict:
+    rng = random.Random(seed)
+    if batch_size > 0:
+        path = "/estimate/batch"
+        bodies = [
+            json.dumps({"parts": [random_part(rng) for _ in range(batch_size)]}, ensure_ascii=False).encode("utf-8")
+            for _ in range(requests)
+        ]
+    else:
+        path = "/estimate"
+        bodies = [json.dumps(random_part(rng), ensure_ascii=False).encode("utf-8") for _ in range(requests)]
+
+    counter = [0]
+    latencies: List[float] = []
+    errors: List[int] = []
+    t0 = time.perf_counter()
+    await asyncio.gather(*(
+        _client(host, port, path, bodies, counter, latencies, errors) for _ in range(connections)
+    ))
+    elapsed = time.perf_counter() - t0
+
+    latencies.sort()
+
+    def pct(p: float) -> float:
+        return round(latencies[min(len(latencies) - 1, int(p / 100.0 * len(latencies)))], 3)
+
+    parts = len(latencies) * max(batch_size, 1)
+    return {
+        "requests": len(latencies),
+        "errors": len(errors),
+        "elapsed_s": round(elapsed, 3),
+        "requests_per_s": round(len(latencies) / elapsed, 1),
+        "parts_per_s": round(parts / elapsed, 1),
+        "latency_ms": {"p50": pct(50), "p90": pct(90), "p99": pct(99), "max": round(latencies[-1], 3)},
+    }
+
+
+async def _wait_port(host: str, port: int, timeout_s: float = 10.0) -> None:
+    deadline = time.time() + timeout_s
+    while True:
+        try:
+            _, w = await asyncio.open_connection(host, port)
+            w.close()
+            return
+        except OSError:
+            if time.time() > deadline:
+                raise
+            await asyncio.sleep(0.05)
+
+
+def main():
+    import argparse
+    p = argparse.ArgumentParser(description="見積もりサーバーの負荷試験")
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--port", type=int, default=8765)
+    p.add_argument("--requests", type=int, default=10000, help="送るリクエスト数")
+    p.add_argument("--connections", type=int, default=16, help="同時接続数（keep-alive）")
+    p.add_argument("--batch-size", type=int, default=0, help="0 なら /estimate、N>0 なら /estimate/batch に N 件ずつ")
+    p.add_argument("--seed", type=int, default=1)
+    p.add_argument("--spawn", action="store_true", help="サーバーを子プロセスで起動して測る")
+    args = p.parse_args()
+
+    proc = None
+    if args.spawn:
+        proc = subprocess.Popen(
+            [sys.executable, os.path.join(SRC_DIR, "estimate_server.py"), "--host", args.host, "--port", str(args.port)],
+            stderr=subprocess.DEVNULL,
+        )
+    try:
+        asyncio.run(_wait_port(args.host, args.port))
+        result = asyncio.run(run_load(args.host, args.port, args.requests, args.connections, args.batch_size, args.seed))
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait()
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+    return 0 if result["errors"] == 0 else 1
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,366 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+見積もりサーバー — calc_bending の見積もりを常駐プロセスで返す（標準ライブラリのみ）。
+価格表は起動時に TableSnapshot として読み込み、裏のスレッドがファイルの変更を見て差し替える（--reload-interval）。
+1リクエスト（バッチは全体）は受け付けた時点の表で計算し、結果の _version にその版を入れる。
+
+実行: python3 src/estimate_server.py [--port 8765]
+  POST /estimate        1部品（estimate() の引数名の JSON）→ 見積レスポンス（data/見積レスポンス例.json の形）
+  POST /estimate/batch  {"parts": [...]} または部品の配列 → {"results": [...]}
+  GET  /metrics         処理件数・キュー長・レイテンシ分位点・calc_bending キャッシュ・価格表の版（JSON）
+ループバック（127.0.0.1）で待ち受ける。HTTP/1.1 keep-alive 対応。
+計算はイベントループのスレッドで1件ずつ行う（シングルスレッド。並列に計算したいときはプロセスを複数立てる）。
+"""
+
+import asyncio
+import json
+import math
+import os
+import sys
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from calc_bending import (  # noqa: E402
+    Estimate,
+    bending_result,
+    get_price_table,
+    hole_result,
+    parse_batch_part,
+)
+from table_snapshot import TableSnapshot, TableStore  # noqa: E402
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+MAX_BODY_BYTES = 8 * 1024 * 1024
+MAX_HEADER_LINES = 100
+KEEPALIVE_TIMEOUT_S = 15.0
+
+REASONS = {
+    200: "OK", 204: "No Content", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+    413: "Payload Too Large", 500: "Internal Server Error", 503: "Service Unavailable",
+}
+
+
+class HttpError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+def estimate_response(part: Dict[str, Any], table_path: Optional[str] = None, snapshot: Optional[TableSnapshot] = None) -> Dict[str, Any]:
+    """
+    1部品を見積もり、見積レスポンス例.json の形で返す。
+    unit_price は1個あたりの加工工賃（税抜）、total_price は unit_price × lot。
+    v2.1 エンジンは加工工賃のみなので material_cost は null。estimate() の結果もそのまま含める。
+    snapshot を渡すとその表で計算し、_version を付ける（table_path は使わない）。
+    """
+    kw = parse_batch_part(part)
+    v = part.get("tax_rate", 0.1)
+    try:
+        tax_rate = float(v)
+    except (TypeError, ValueError):
+        raise ValueError(f"tax_rate の値が不正です: {v!r}") from None
+    if isinstance(v, bool) or not math.isfinite(tax_rate) or tax_rate < 0:
+        raise ValueError(f"tax_rate の値が不正です: {v!r}")
+    table = snapshot.price if snapshot is not None else get_price_table(table_path)
+    bending = bending_result(
+        table, kw["shape"], kw["weight_kg"], kw["length_mm"], kw["long_side_mm"], kw["lot"],
+        nakagoshi=kw.get("nakagoshi", False), reverse_bend=kw.get("reverse_bend", False),
+        meoshi_long=kw.get("meoshi_long", False), fukabend=kw.get("fukabend", False),
+    )
+    hole = hole_result(
+        kw["thickness_mm"], kw.get("punch_count", 0), kw.get("pierce_count", 0), kw.get("holes"),
+        snapshot.holes if snapshot is not None else None, kw.get("hole_gap", "error"),
+    )
+    est = Estimate(bending, hole, tax_rate)
+    result = est.to_dict()
+    if snapshot is not None:
+        result["_version"] = snapshot.version
+    return {
+        "unit_price": est.tax_excluded,
+        "material_cost": None,
+        "total_price": est.tax_excluded * kw["lot"],
+        "details": {
+            "base_price": bending.base_price,
+            "quantity_factor": bending.quantity_adjustment,
+            "complexity_factor": bending.complexity_adjustment,
+            "weight_class": bending.weight_class,
+            "length_class": bending.length_class.lstrip("〜"),
+        },
+        **result,
+    }
+
+
+class Metrics:
+    """処理件数と直近のレイテンシ（リングバッファ）。分位点は /metrics 要求時に計算する。"""
+
+    def __init__(self, window: int = 10000):
+        self.started = time.time()
+        self.requests = 0
+        self.errors = 0
+        self.rejected = 0
+        self.parts = 0
+        self.latencies_ms = deque(maxlen=window)
+
+    def observe(self, elapsed_s: float, ok: bool, parts: int = 1) -> None:
+        self.requests += 1
+        self.parts += parts
+        if not ok:
+            self.errors += 1
+        self.latencies_ms.append(elapsed_s * 1000.0)
+
+    def snapshot(self, queue_depth: int, queue_size: int) -> Dict[str, Any]:
+        lat = sorted(self.latencies_ms)
+
+        def pct(p: float) -> Optional[float]:
+            if not lat:
+                return None
+            return round(lat[min(len(lat) - 1, int(p / 100.0 * len(lat)))], 3)
+
+        return {
+            "uptime_s": round(time.time() - self.started, 1),
+            "requests": self.requests,
+            "parts": self.parts,
+            "errors": self.errors,
+            "rejected": self.rejected,
+            "queue_depth": queue_depth,
+            "queue_size": queue_size,
+            "latency_ms": {
+                "window": len(lat),
+                "p50": pct(50), "p90": pct(90), "p99": pct(99),
+                "max": round(lat[-1], 3) if lat else None,
+            },
+        }
+
+
+class EstimateServer:
+    """
+    見積もり HTTP サーバー。計算要求は上限付きキューに積み、1つのワーカータスクが順に処理する。
+    キューが満杯のときは 503（Retry-After 付き）を返して呼び出し側に待たせる。
+    """
+
+    def __init__(
+        self,
+        host: str = DEFAULT_HOST,
+        port: int = DEFAULT_PORT,
+        table_path: Optional[str] = None,
+        queue_size: int = 1024,
+        reload_interval: Optional[float] = 2.0,
+    ):
+        self.host = host
+        self.port = port
+        self.table_path = table_path
+        self.queue_size = queue_size
+        self.reload_interval = reload_interval
+        self.tables: Optional[TableStore] = None
+        self.metrics = Metrics()
+        self._queue: Optional[asyncio.Queue] = None
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        self.tables = TableStore(self.table_path)  # 起動時に読み込んでおく
+        if self.reload_interval:
+            self.tables.start_polling(self.reload_interval)
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._task = asyncio.create_task(self._worker())
+        self._server = await asyncio.start_server(self._handle_conn, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def serve_forever(self) -> None:
+        await self.start()
+        print(f"見積もりサーバー: http://{self.host}:{self.port}", file=sys.stderr)
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def close(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        if self._task is not None:
+            self._task.cancel()
+        if self.tables is not None:
+            self.tables.stop_polling()
+
+    # ----- 計算キュー -----
+
+    async def _worker(self) -> None:
+        while True:
+            fn, arg, fut = await self._queue.get()
+            try:
+                if not fut.cancelled():
+                    fut.set_result(fn(arg))
+            except Exception as e:
+                if not fut.cancelled():
+                    fut.set_exception(e)
+            finally:
+                self._queue.task_done()
+            # 長いバッチが続いても接続処理が止まらないよう制御を返す
+            await asyncio.sleep(0)
+
+    async def _submit(self, fn, arg):
+        fut = asyncio.get_running_loop().create_future()
+        try:
+            self._queue.put_nowait((fn, arg, fut))
+        except asyncio.QueueFull:
+            self.metrics.rejected += 1
+            raise HttpError(503, "混雑しています。しばらくしてから再送してください") from None
+        return await fut
+
+    def _price_one(self, part: Any) -> Dict[str, Any]:
+        if not isinstance(part, dict):
+            raise HttpError(400, "JSON オブジェクトが必要です")
+        try:
+            return estimate_response(part, snapshot=self.tables.current())
+        except ValueError as e:
+            raise HttpError(400, str(e)) from None
+
+    def _price_batch(self, parts: List[Any]) -> Dict[str, Any]:
+        snapshot = self.tables.current()  # 途中で表が差し替わってもバッチ全体を同じ版で計算する
+        results = []
+        for part in parts:
+            try:
+                if not isinstance(part, dict):
+                    raise ValueError("JSON オブジェクトが必要です")
+                results.append(estimate_response(part, snapshot=snapshot))
+            except Exception as e:
+                results.append({"error": str(e)})
+        return {"results": results}
+
+    # ----- HTTP -----
+
+    async def _route(self, method: str, path: str, body: bytes) -> Tuple[int, Any, int]:
+        """(ステータス, レスポンス本体, 部品数) を返す。"""
+        path = path.split("?", 1)[0]
+        if path == "/metrics":
+            if method != "GET":
+                raise HttpError(405, "GET のみ")
+            snap = self.metrics.snapshot(self._queue.qsize(), self.queue_size)
+            snap["bending_cache"] = self.tables.current().price.bending_cache.stats()
+            snap["tables"] = self.tables.stats()
+            return 200, snap, 0
+        if path not in ("/estimate", "/estimate/batch"):
+            raise HttpError(404, f"見つかりません: {path}")
+        if method != "POST":
+            raise HttpError(405, "POST のみ")
+        try:
+            data = json.loads(body.decode("utf-8"))
+        except (UnicodeDecodeError, ValueError):
+            raise HttpError(400, "JSON が不正です") from None
+        if path == "/estimate":
+            return 200, await self._submit(self._price_one, data), 1
+        parts = data.get("parts") if isinstance(data, dict) else data
+        if not isinstance(parts, list):
+            raise HttpError(400, '{"parts": [...]} または配列が必要です')
+        return 200, await self._submit(self._price_batch, parts), len(parts)
+
+    async def _read_request(self, reader: asyncio.StreamReader):
+        line = await asyncio.wait_for(reader.readline(), KEEPALIVE_TIMEOUT_S)
+        if not line:
+            return None
+        try:
+            method, target, version = line.decode("latin-1").split()
+        except ValueError:
+            raise HttpError(400, "リクエスト行が不正です") from None
+        headers: Dict[str, str] = {}
+        for _ in range(MAX_HEADER_LINES):
+            h = await reader.readline()
+            if h in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = h.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        else:
+            raise HttpError(400, "ヘッダーが多すぎます")
+        length = int(headers.get("content-length") or 0)
+        if length > MAX_BODY_BYTES:
+            raise HttpError(413, "本文が大きすぎます")
+        body = await reader.readexactly(length) if length else b""
+        keep_alive = headers.get("connection", "").lower() != "close" and version != "HTTP/1.0"
+        if version == "HTTP/1.0" and headers.get("connection", "").lower() == "keep-alive":
+            keep_alive = True
+        return method.upper(), target, body, keep_alive
+
+    @staticmethod
+    def _encode(status: int, payload: Any, keep_alive: bool, extra: Tuple[str, ...] = ()) -> bytes:
+        body = b"" if payload is None else json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        head = [
+            f"HTTP/1.1 {status} {REASONS.get(status, '')}",
+            "Content-Type: application/json; charset=utf-8",
+            f"Content-Length: {len(body)}",
+            "Access-Control-Allow-Origin: *",
+            "Access-Control-Allow-Methods: GET, POST, OPTIONS",
+            "Access-Control-Allow-Headers: Content-Type",
+            "Connection: " + ("keep-alive" if keep_alive else "close"),
+            *extra,
+        ]
+        return ("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + body
+
+    async def _handle_conn(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                try:
+                    req = await self._read_request(reader)
+                except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+                    break
+                except (HttpError, ValueError) as e:
+                    status = e.status if isinstance(e, HttpError) else 400
+                    writer.write(self._encode(status, {"error": str(e)}, False))
+                    await writer.drain()
+                    break
+                if req is None:
+                    break
+                method, target, body, keep_alive = req
+                if method == "OPTIONS":
+                    writer.write(self._encode(204, None, keep_alive))
+                    await writer.drain()
+                    continue
+
+                t0 = time.perf_counter()
+                extra: Tuple[str, ...] = ()
+                parts = 0
+                try:
+                    status, payload, parts = await self._route(method, target, body)
+                except HttpError as e:
+                    status, payload = e.status, {"error": str(e)}
+                    if e.status == 503:
+                        extra = ("Retry-After: 1",)
+                except Exception as e:
+                    status, payload = 500, {"error": str(e)}
+                if target.split("?", 1)[0] != "/metrics":
+                    self.metrics.observe(time.perf_counter() - t0, status == 200, parts)
+                writer.write(self._encode(status, payload, keep_alive, extra))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+
+def main():
+    import argparse
+    p = argparse.ArgumentParser(description="曲げ加工見積もりサーバー（常駐）")
+    p.add_argument("--host", default=DEFAULT_HOST, help="待ち受けアドレス（既定: ループバック）")
+    p.add_argument("--port", type=int, default=DEFAULT_PORT, help="ポート")
+    p.add_argument("--csv", default=None, help="bending_price_table.csv のパス")
+    p.add_argument("--queue-size", type=int, default=1024, help="計算待ちキューの上限（超えたら 503）")
+    p.add_argument("--reload-interval", type=float, default=2.0, help="価格表の変更を確認する間隔（秒、0 で確認しない）")
+    args = p.parse_args()
+
+    server = EstimateServer(args.host, args.port, args.csv, args.queue_size, args.reload_interval)
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
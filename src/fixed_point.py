@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+"""
+整数の固定小数点による価格計算 — 金額は銭（1円 = 100銭）の整数、係数は千分率（1.5 → 1500）の整数で持つ。
+
+  apply_rate(銭, 千分率)    係数を掛けて 1銭単位に丸める（偶数丸め）
+  round_yen(銭, 方式)       銭 → 円。丸め方は名前で選ぶ（ROUNDING_POLICIES、register_rounding() で追加）
+  tax_included(税抜, 税率)  税込 = 税抜 + 税額（税抜 × 税率 を銭にせず、そのまま 方式で1回だけ丸める）
+                           方式が LEGACY_TAX なら v2.1 の従来の式 round(税抜 × (1 + 税率))
+
+関数は int でも numpy の int64 配列でも同じ式で計算する（//・%・比較だけを使う）ので、
+1件ずつの計算と estimate_many() の結果は必ず同じになり、途中で浮動小数を通らない。
+
+丸めの方式（円単位の結果を返す）:
+  half_up    1円単位に四捨五入
+  half_even  1円単位に偶数丸め（Python の round() と同じ規則）
+  floor      1円未満切り捨て
+  yen10      10円単位に四捨五入
+  yen100     100円単位に四捨五入
+  keep50     50円の倍数ちょうどならそのまま、それ以外は100円単位に四捨五入（計算書の単価）
+"""
+
+from typing import Any, Callable, Dict, Union
+
+SEN_PER_YEN = 100
+PER_MILLE = 1000
+
+
+def per_mille(rate: float) -> int:
+    """係数（1.5 など）→ 千分率の整数。0.001 単位で表せない係数は ValueError。"""
+    pm = _PER_MILLE_CACHE.get(rate)
+    if pm is None:
+        pm = round(rate * PER_MILLE)
+        if abs(pm - rate * PER_MILLE) > 1e-6:
+            raise ValueError(f"係数は 0.001 単位で指定してください: {rate!r}")
+        _PER_MILLE_CACHE[rate] = pm
+    return pm
+
+
+_PER_MILLE_CACHE: Dict[float, int] = {}
+
+
+def yen_to_sen(yen):
+    return yen * SEN_PER_YEN
+
+
+def div_half_up(num, den):
+    """num / den を四捨五入した整数（den > 0）。"""
+    return (2 * num + den) // (2 * den)
+
+
+def div_half_even(num, den):
+    """num / den を偶数丸めした整数（den > 0）。"""
+    q, r = num // den, num % den
+    return q + ((2 * r > den) | ((2 * r == den) & (q % 2 == 1)))
+
+
+def apply_rate(sen, rate_pm):
+    """銭 × 千分率 → 銭（1銭未満は偶数丸め）。"""
+    return div_half_even(sen * rate_pm, PER_MILLE)
+
+
+# 丸めの方式: (num, den) → 円。金額は num / den 銭（den > 0）で受け取り、途中で丸めずに1回だけ丸める
+def _keep50(num, den):
+    # 50円の倍数ちょうどならそのまま（条件を掛け算で使い、配列でも同じ式にする）
+    exact = num % (50 * SEN_PER_YEN * den) == 0
+    return exact * (num // (SEN_PER_YEN * den)) + (1 - exact) * (div_half_up(num, 100 * SEN_PER_YEN * den) * 100)
+
+
+ROUNDING_POLICIES: Dict[str, Callable[[Any, Any], Any]] = {
+    "half_up": lambda num, den: div_half_up(num, SEN_PER_YEN * den),
+    "half_even": lambda num, den: div_half_even(num, SEN_PER_YEN * den),
+    "floor": lambda num, den: num // (SEN_PER_YEN * den),
+    "yen10": lambda num, den: div_half_up(num, 10 * SEN_PER_YEN * den) * 10,
+    "yen100": lambda num, den: div_half_up(num, 100 * SEN_PER_YEN * den) * 100,
+    "keep50": _keep50,
+}
+
+Policy = Union[str, Callable[[Any, Any], Any]]
+
+
+def register_rounding(name: str, fn: Callable[[Any, Any], Any]) -> None:
+    """丸めの方式を追加する。fn(num, den) は num / den 銭（int / int64 配列）→ 円。"""
+    ROUNDING_POLICIES[name] = fn
+
+
+def rounding_policy(policy: Policy) -> Callable[[Any, Any], Any]:
+    """名前（ROUNDING_POLICIES のキー）か関数 → 丸めの関数。"""
+    if callable(policy):
+        return policy
+    fn = ROUNDING_POLICIES.get(policy)
+    if fn is None:
+        raise ValueError(f"丸めの方式は {' / '.join(ROUNDING_POLICIES)} のどれか: {policy!r}")
+    return fn
+
+
+def round_yen(sen, policy: Policy = "half_even"):
+    """銭 → 円（policy の丸め）。"""
+    return rounding_policy(policy)(sen, 1)
+
+
+# v2.1 の estimate() の従来の税込: 浮動小数の積 税抜 × (1 + 税率) を偶数丸め（round()）する。
+# ちょうど .5 円になる税抜の丸めの向きは積の誤差で決まり、整数の方式では再現できないので、出力を変えないためにこの式のまま残す
+LEGACY_TAX = "legacy_float"
+
+
+def tax_included(tax_excluded, tax_rate: float = 0.1, policy: Policy = "half_up"):
+    """税抜（円）→ 税込（円）。税額 = 税抜 × 税率 を policy で1回だけ丸めて足す（LEGACY_TAX は上の従来の式）。"""
+    if policy == LEGACY_TAX:
+        total = tax_excluded * (1 + tax_rate)
+        # numpy の配列の round() も偶数丸めなので、1件ずつの round() と同じ値になる
+        return total.round().astype(tax_excluded.dtype) if hasattr(total, "dtype") else int(round(total))
+    return tax_excluded + rounding_policy(policy)(yen_to_sen(tax_excluded) * per_mille(tax_rate), PER_MILLE)
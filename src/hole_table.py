@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+"""
+穴あけ単価表（data/hole_prices.json）の区間索引。
+
+表は板厚の閉区間 [板厚min_mm, 板厚max_mm] ごとに 丸穴・長穴 の 標準/下限 単価を持ち、
+区間の間には隙間がある（6 < t < 8 など）。値が null のセルは「対象外」。
+HoleTable は行を板厚順に並べて列ごとの配列にしておき、板厚の検索を二分探索1回で行う
+（t が入る行 = 板厚max_mm >= t となる最初の行。その行の板厚min_mm <= t なら区間内、そうでなければ隙間）。
+
+検索結果は HoleRate で、単価が決まらない理由を status で返す:
+  ok       区間内で単価あり
+  null     区間内だが表の値が null（対象外）
+  gap      区間と区間の間（表に無い板厚）
+  below    表の最初の区間より薄い
+  above    表の最後の区間より厚い
+  next     gap="next" のとき、隙間・null の代わりに次に厚い行の単価を使った
+"""
+
+import bisect
+import json
+import os
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+DEFAULT_HOLE_PRICES_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "hole_prices.json")
+
+# 表の列: (穴の種類, 区分)
+KINDS = ("丸穴", "長穴")
+GRADES = ("標準", "下限")
+# 隙間・null の扱い
+GAP_POLICIES = ("error", "next")
+
+_CACHE: Dict[str, Tuple[int, int, "HoleTable"]] = {}
+
+
+class HoleRate(NamedTuple):
+    """板厚1つに対する単価の検索結果。price が None なら単価なし（status が理由）。"""
+
+    price: Optional[int]
+    status: str
+    row_min_mm: Optional[float]
+    row_max_mm: Optional[float]
+
+
+class HolePriceUnavailable(ValueError):
+    """穴あけ単価表で単価が決まらない（隙間・対象外・範囲外）。"""
+
+    def __init__(self, kind: str, grade: str, thickness_mm: float, rate: HoleRate):
+        reasons = {"null": "対象外（表の値が null）", "gap": "表に無い板厚（区間の隙間）", "below": "表の範囲より薄い", "above": "表の範囲より厚い"}
+        super().__init__(f"{kind}_{grade} の単価がありません: 板厚 {thickness_mm:g}mm は{reasons.get(rate.status, rate.status)}")
+        self.kind = kind
+        self.grade = grade
+        self.thickness_mm = thickness_mm
+        self.rate = rate
+
+
+class HoleTable:
+    """
+    hole_prices.json の「穴あけ単価」を列にしたもの（読み取り専用）。
+    mins / maxs は板厚の区間、prices[(種類, 区分)] は行ごとの単価（null は None）。
+    next_row[(種類, 区分)][i] は i 行目以降で単価のある最初の行（無ければ -1）。
+    """
+
+    def __init__(self, rows: List[Dict[str, Any]], source_hash: Optional[str] = None):
+        rows = sorted(rows, key=lambda r: float(r["板厚min_mm"]))
+        self.mins: List[float] = [float(r["板厚min_mm"]) for r in rows]
+        self.maxs: List[float] = [float(r["板厚max_mm"]) for r in rows]
+        for i, (lo, hi) in enumerate(zip(self.mins, self.maxs)):
+            if lo > hi:
+                raise ValueError(f"板厚min_mm > 板厚max_mm の行があります: {lo} > {hi}")
+            if i and lo <= self.maxs[i - 1]:
+                raise ValueError(f"板厚の区間が重なっています: {self.maxs[i - 1]} と {lo}")
+        self.prices: Dict[Tuple[str, str], List[Optional[int]]] = {}
+        self.next_row: Dict[Tuple[str, str], List[int]] = {}
+        for kind in KINDS:
+            for grade in GRADES:
+                col = [None if r.get(f"{kind}_{grade}") is None else int(r[f"{kind}_{grade}"]) for r in rows]
+                nxt = [-1] * (len(col) + 1)
+                for i in range(len(col) - 1, -1, -1):
+                    nxt[i] = i if col[i] is not None else nxt[i + 1]
+                self.prices[(kind, grade)] = col
+                self.next_row[(kind, grade)] = nxt
+        self.source_hash = source_hash
+        self._arrays = None
+
+    def __len__(self) -> int:
+        return len(self.mins)
+
+    def row_index(self, thickness_mm: float) -> Tuple[int, bool]:
+        """(板厚max_mm >= t となる最初の行（無ければ行数）, その行の区間に t が入っているか)。"""
+        i = bisect.bisect_left(self.maxs, thickness_mm)
+        return i, i < len(self.mins) and self.mins[i] <= thickness_mm
+
+    def lookup(self, kind: str, thickness_mm: float, grade: str = "標準", gap: str = "error") -> HoleRate:
+        """
+        種類（丸穴/長穴）・区分（標準/下限）・板厚の単価。単価が無いときは price=None と理由の status。
+        gap="next" なら隙間・null・表より薄いときに次に厚い行の単価を使う（status="next"）。
+        """
+        col = self.prices.get((kind, grade))
+        if col is None:
+            raise ValueError(f"穴の種類・区分が不正です: {kind}_{grade}")
+        i, inside = self.row_index(thickness_mm)
+        if inside and col[i] is not None:
+            return HoleRate(col[i], "ok", self.mins[i], self.maxs[i])
+        if i >= len(self.mins):
+            return HoleRate(None, "above", None, None)
+        if gap == "next":
+            j = self.next_row[(kind, grade)][i]
+            if j >= 0:
+                return HoleRate(col[j], "next", self.mins[j], self.maxs[j])
+        if inside:
+            return HoleRate(None, "null", self.mins[i], self.maxs[i])
+        return HoleRate(None, "below" if i == 0 else "gap", None, None)
+
+    def price(self, kind: str, thickness_mm: float, grade: str = "標準", gap: str = "error") -> int:
+        """lookup() の単価。決まらなければ HolePriceUnavailable。"""
+        rate = self.lookup(kind, thickness_mm, grade, gap)
+        if rate.price is None:
+            raise HolePriceUnavailable(kind, grade, thickness_mm, rate)
+        return rate.price
+
+    # ----- 配列版 -----
+
+    def arrays(self, np) -> Dict[str, Any]:
+        """
+        numpy 配列（初回に作って持つ）。"mins" / "maxs"、(種類, 区分) → 単価の列（null は -1。
+        行 -1 で引けるよう末尾に -1 を1つ足す）、("next", 種類, 区分) → next_row。
+        """
+        if self._arrays is None:
+            out = {"mins": np.asarray(self.mins, dtype=np.float64), "maxs": np.asarray(self.maxs, dtype=np.float64)}
+            for key, col in self.prices.items():
+                out[key] = np.asarray([-1 if v is None else v for v in col] + [-1], dtype=np.int64)
+                out[("next",) + key] = np.asarray(self.next_row[key], dtype=np.int64)
+            self._arrays = out
+        return self._arrays
+
+    def rows_many(self, np, kind: str, thickness_mm, grade: str = "標準", gap: str = "error"):
+        """
+        板厚の配列 → 単価を取る行の配列（lookup() と同じ規則。単価が決まらないところは -1）。
+        単価は arrays(np)[(種類, 区分)][行]（-1 の行は末尾の -1 になる）。
+        """
+        a = self.arrays(np)
+        t = np.asarray(thickness_mm, dtype=np.float64)
+        n = len(self.mins)
+        i = np.searchsorted(a["maxs"], t, side="left")
+        if gap == "next":
+            return a[("next", kind, grade)][i]
+        inside = (i < n) & (a["mins"][np.minimum(i, n - 1)] <= t)
+        rows = np.where(inside, i, -1)
+        return np.where(a[(kind, grade)][rows] >= 0, rows, -1)
+
+
+def load_hole_table(path: Optional[str] = None) -> HoleTable:
+    """hole_prices.json を読み込んで HoleTable にする（mtime・サイズが変わるまでプロセス内で使い回す）。"""
+    path = os.path.abspath(path or DEFAULT_HOLE_PRICES_PATH)
+    st = os.stat(path)
+    cached = _CACHE.get(path)
+    if cached is not None and cached[0] == st.st_mtime_ns and cached[1] == st.st_size:
+        return cached[2]
+    with open(path, "rb") as f:
+        raw = f.read()
+    table = parse_hole_table(raw)
+    _CACHE[path] = (st.st_mtime_ns, st.st_size, table)
+    return table
+
+
+def parse_hole_table(raw: bytes) -> HoleTable:
+    import hashlib
+    return HoleTable(json.loads(raw.decode("utf-8"))["穴あけ単価"], hashlib.sha256(raw).hexdigest())
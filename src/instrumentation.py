@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+"""
+estimate() の段階別計測 — 価格表の読み込み・基準価格の検索・calc_bending・calc_hole_cost・結果の組み立てに
+かかった時間をヒストグラムに貯め、Prometheus のテキスト形式で書き出す。
+
+既定では何もしない（calc_bending のフックは None）。enable() したときだけ計測する。
+    import instrumentation
+    rec = instrumentation.enable()
+    ...  # estimate() を呼ぶ
+    instrumentation.write_prometheus("-", rec)
+    instrumentation.disable()
+"""
+
+import sys
+from typing import Dict, List, Optional, Tuple
+
+import calc_bending
+
+# 段階名（estimate() が呼ぶ順）。"estimate" は全体
+STAGES = ("table_load", "base_price", "calc_bending", "calc_hole_cost", "build_result", "estimate")
+
+
+class Histogram:
+    """
+    HDR 形式のヒストグラム（ナノ秒の整数）。2のべき乗ごとの区間を SUB_BUCKETS 個に等分するので、
+    相対誤差はおよそ 1/SUB_BUCKETS 以内。値を足すのは O(1)、メモリは区間の数だけ。
+    """
+
+    SUB_BITS = 5
+    SUB_BUCKETS = 1 << SUB_BITS
+
+    def __init__(self):
+        self.counts: Dict[int, int] = {}
+        self.count = 0
+        self.total = 0
+        self.min: Optional[int] = None
+        self.max: Optional[int] = None
+
+    def _index(self, v: int) -> int:
+        if v < self.SUB_BUCKETS:
+            return v
+        shift = v.bit_length() - self.SUB_BITS - 1
+        return ((shift + 1) << self.SUB_BITS) + (v >> shift) - self.SUB_BUCKETS
+
+    def bucket_upper(self, index: int) -> int:
+        """区間 index に入る最大の値。"""
+        if index < self.SUB_BUCKETS:
+            return index
+        shift = (index >> self.SUB_BITS) - 1
+        mantissa = (index & (self.SUB_BUCKETS - 1)) + self.SUB_BUCKETS
+        return ((mantissa + 1) << shift) - 1
+
+    def record(self, v: int) -> None:
+        i = self._index(v)
+        self.counts[i] = self.counts.get(i, 0) + 1
+        self.count += 1
+        self.total += v
+        if self.min is None or v < self.min:
+            self.min = v
+        if self.max is None or v > self.max:
+            self.max = v
+
+    def percentile(self, q: float) -> Optional[int]:
+        """q (0〜100) 分位点の値（区間の上限。実際の最大値を超えない）。"""
+        if not self.count:
+            return None
+        rank = max(1, int(round(q / 100.0 * self.count)))
+        seen = 0
+        for i in sorted(self.counts):
+            seen += self.counts[i]
+            if seen >= rank:
+                return min(self.bucket_upper(i), self.max)
+        return self.max
+
+    def cumulative(self, step: int = 1) -> List[Tuple[int, int]]:
+        """
+        (区間の上限, その値以下の件数) の昇順リスト。step 個ずつの区間をまとめて粗くできる
+        （step は SUB_BUCKETS の約数。区切りが元の区間の境目と揃うので件数は正確なまま）。
+        """
+        out: List[Tuple[int, int]] = []
+        seen = 0
+        for i in sorted(self.counts):
+            seen += self.counts[i]
+            upper = self.bucket_upper((i // step) * step + step - 1)
+            if out and out[-1][0] == upper:
+                out[-1] = (upper, seen)
+            else:
+                out.append((upper, seen))
+        return out
+
+
+class StageRecorder:
+    """calc_bending.set_stage_hook() に渡すフック。段階ごとの件数とヒストグラムを持つ。"""
+
+    def __init__(self):
+        self.histograms: Dict[str, Histogram] = {}
+
+    def __call__(self, stage: str, seconds: float) -> None:
+        h = self.histograms.get(stage)
+        if h is None:
+            h = self.histograms[stage] = Histogram()
+        h.record(int(seconds * 1e9))
+
+    def summary(self) -> Dict[str, Dict[str, Optional[float]]]:
+        """段階 → 件数・合計・p50/p90/p99・最大（マイクロ秒）。"""
+        out = {}
+        for stage in sorted(self.histograms, key=lambda s: STAGES.index(s) if s in STAGES else len(STAGES)):
+            h = self.histograms[stage]
+
+            def us(v):
+                return None if v is None else round(v / 1000, 3)
+
+            out[stage] = {
+                "count": h.count, "sum_us": us(h.total),
+                "p50_us": us(h.percentile(50)), "p90_us": us(h.percentile(90)), "p99_us": us(h.percentile(99)),
+                "max_us": us(h.max),
+            }
+        return out
+
+
+_current: Optional[StageRecorder] = None
+
+
+def enable(recorder: Optional[StageRecorder] = None) -> StageRecorder:
+    """計測を始める。recorder を省略すると新しく作る。"""
+    global _current
+    _current = recorder or StageRecorder()
+    calc_bending.set_stage_hook(_current)
+    return _current
+
+
+def disable() -> None:
+    global _current
+    _current = None
+    calc_bending.set_stage_hook(None)
+
+
+def current() -> Optional[StageRecorder]:
+    return _current
+
+
+# ===== Prometheus テキスト形式 =====
+
+# 書き出すときは 2 のべき乗ごとに 4 区間へまとめる（le の数を抑える）
+EXPORT_STEP = Histogram.SUB_BUCKETS // 4
+
+
+def _fmt(v: float) -> str:
+    return repr(float(v)) if isinstance(v, float) else str(v)
+
+
+def prometheus_text(recorder: Optional[StageRecorder] = None, table_path: Optional[str] = None) -> str:
+    """段階別ヒストグラム、価格表キャッシュと calc_bending キャッシュの統計。"""
+    recorder = recorder or _current
+    lines = []
+    if recorder is not None and recorder.histograms:
+        lines.append("# HELP estimate_stage_seconds estimate() の段階別の所要時間")
+        lines.append("# TYPE estimate_stage_seconds histogram")
+        for stage, h in recorder.histograms.items():
+            for upper, n in h.cumulative(EXPORT_STEP):
+                lines.append(f'estimate_stage_seconds_bucket{{stage="{stage}",le="{upper / 1e9:.9g}"}} {n}')
+            lines.append(f'estimate_stage_seconds_bucket{{stage="{stage}",le="+Inf"}} {h.count}')
+            lines.append(f'estimate_stage_seconds_sum{{stage="{stage}"}} {h.total / 1e9:.9g}')
+            lines.append(f'estimate_stage_seconds_count{{stage="{stage}"}} {h.count}')
+
+    table = calc_bending.price_table_cache_stats()
+    lines.append("# HELP price_table_loads_total get_price_table() の呼び出し（result=hit は読み直しなし）")
+    lines.append("# TYPE price_table_loads_total counter")
+    for result, n in table.items():
+        lines.append(f'price_table_loads_total{{result="{result}"}} {n}')
+    calls = sum(table.values())
+    lines.append("# TYPE price_table_cache_hit_ratio gauge")
+    lines.append(f"price_table_cache_hit_ratio {_fmt(table['hit'] / calls if calls else 0.0)}")
+
+    bc = calc_bending.bending_cache_stats(table_path)
+    lines.append("# HELP bending_cache_events_total calc_bending() の結果キャッシュ")
+    lines.append("# TYPE bending_cache_events_total counter")
+    for event in ("hits", "misses", "evictions"):
+        lines.append(f'bending_cache_events_total{{event="{event}"}} {bc[event]}')
+    lines.append("# TYPE bending_cache_entries gauge")
+    lines.append(f"bending_cache_entries {bc['size']}")
+    lookups = bc["hits"] + bc["misses"]
+    lines.append("# TYPE bending_cache_hit_ratio gauge")
+    lines.append(f"bending_cache_hit_ratio {_fmt(bc['hits'] / lookups if lookups else 0.0)}")
+    return "\n".join(lines) + "\n"
+
+
+def write_prometheus(path: str, recorder: Optional[StageRecorder] = None, table_path: Optional[str] = None) -> None:
+    """path が "-" なら標準出力へ（node_exporter の textfile collector 用にファイルへも書ける）。"""
+    text = prometheus_text(recorder, table_path)
+    if path == "-":
+        sys.stdout.write(text)
+        return
+    import os
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp, path)
@@ -0,0 +1,281 @@
+# -*- coding: utf-8 -*-
+"""
+板取り（ネスティング）— 複数部品の展開寸法を定尺板に割り付け、使用枚数・歩留り・切断長を出す。
+見積り計算書（見積り計算書_仕様まとめ.md §4.1〜4.3）は部品ごとに (L+余長)×(W+余長) で材料を、
+外周 2×(L+余長)＋2×(W+余長) で切断長を見積もる。ここでは同じ余長で部品を板に並べ、
+板の枚数で材料を、共通の切断線を1回と数えた長さで切断費を出す。
+
+割り付けは棚詰め（高さの降順に並べ、板幅方向の棚に先頭から詰める FFDH）。切断はすべてギロチン
+（棚を板幅いっぱいに切り離し、棚の中で部品を切り分ける）でできる並びになる。
+材質・板厚が違う部品は同じ板に載せない。
+
+実行: python3 src/nesting.py parts.jsonl [--sheet 4×8]   # 1行1部品: length_mm, width_mm, thickness_mm, material, qty, bonde, yocho_mm, id
+      python3 src/nesting.py --bench [--n 5000]           # 乱数の部品で時間と部品ごとの概算との比較
+"""
+
+import json
+import os
+import sys
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+SKILL_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_DIR = os.path.join(SKILL_DIR, "data")
+
+# 余長（縦横とも加算）: 板厚 t <= 帯の上限 となる最初の帯、どれにも入らなければ最後。ボンデは 100mm
+YOCHO_THICKNESS_BANDS = [2.3, 3.2]
+YOCHO_MM = [50, 30, 20]
+BONDE_YOCHO_MM = 100
+
+# 定尺（短辺 × 長辺 mm）
+STANDARD_SHEETS = {
+    "3×6": (914, 1829),
+    "4×8": (1219, 2438),
+    "5×10": (1524, 3048),
+}
+
+CUT_RATE_YEN_PER_M = 150
+DEFAULT_GRAVITY = 7.85
+
+
+def yocho_mm(thickness_mm: float, bonde: bool = False) -> int:
+    if bonde:
+        return BONDE_YOCHO_MM
+    for limit, y in zip(YOCHO_THICKNESS_BANDS, YOCHO_MM):
+        if thickness_mm <= limit:
+            return y
+    return YOCHO_MM[-1]
+
+
+def load_rates(data_dir: Optional[str] = None) -> Dict[str, Any]:
+    with open(os.path.join(data_dir or DATA_DIR, "rates.json"), encoding="utf-8") as f:
+        return json.load(f)
+
+
+def weight_kg(area_mm2: float, thickness_mm: float, material: str, rates: Dict[str, Any]) -> float:
+    """面積・板厚・材質から重量。縞板（CP400）は板厚別の単位重量、無ければ SS400 の比重。"""
+    if material == "CP400":
+        unit = rates.get("縞板_単位重量", {}).get(f"{thickness_mm:.1f}")
+        if unit is not None:
+            return area_mm2 / 1e6 * unit
+    gravity = rates.get("比重", {}).get(material) or DEFAULT_GRAVITY
+    return thickness_mm * area_mm2 * gravity / 1e6
+
+
+# ===== 棚詰め =====
+
+def pack_shelves(rects: List[Tuple[int, int, Any]], sheet_w: int, sheet_l: int) -> Dict[str, Any]:
+    """
+    rects: (幅方向, 長さ方向, 付帯情報) の寸法。回転は呼び出し側で決めておく。
+    戻り値: {"sheets": 板ごとの棚 [(y, 棚高さ, [(x, w, h, 付帯情報), ...]), ...], "cut_length_mm": 共通線を1回と数えた切断長}
+    """
+    order = sorted(rects, key=lambda r: (-r[1], -r[0]))
+    min_w = min((r[0] for r in rects), default=0)
+    sheets: List[List[list]] = []   # 板 → 棚 [y, 高さ, 使用幅, 部品リスト]
+    sheet_used: List[int] = []      # 板 → 棚で使った長さ
+    open_shelves: List[list] = []   # まだ部品が入りうる棚（先に作ったものから順）
+    first_sheet_with_room = 0
+
+    for w, h, info in order:
+        placed = False
+        for k, shelf in enumerate(open_shelves):
+            # 高さの降順に置くので、既存の棚の高さは必ず足りる。幅だけ見る
+            if shelf[2] + w <= sheet_w:
+                shelf[3].append((shelf[2], w, h, info))
+                shelf[2] += w
+                if sheet_w - shelf[2] < min_w:
+                    del open_shelves[k]
+                placed = True
+                break
+        if placed:
+            continue
+        # 新しい棚: 残りの長さが足りる最初の板（棚の高さも降順なので、一度入らなかった板には以後も入らない）
+        s = first_sheet_with_room
+        while s < len(sheets) and sheet_used[s] + h > sheet_l:
+            s += 1
+        first_sheet_with_room = s
+        if s == len(sheets):
+            sheets.append([])
+            sheet_used.append(0)
+        shelf = [sheet_used[s], h, w, [(0, w, h, info)]]
+        sheets[s].append(shelf)
+        sheet_used[s] += h
+        if sheet_w - w >= min_w:
+            open_shelves.append(shelf)
+
+    cut = 0
+    for s, shelves in enumerate(sheets):
+        for y, sh, used_w, parts in shelves:
+            if y + sh < sheet_l:
+                cut += sheet_w          # 棚の上を板幅いっぱいに切り離す（次の棚・端材と共通）
+            for x, w, h, _ in parts:
+                if x + w < sheet_w:
+                    cut += sh           # 右隣の部品・端材との境（棚の高さ分）
+                if h < sh:
+                    cut += w            # 棚より低い部品の上側
+    return {
+        "sheets": [[(y, sh, [p for p in parts]) for y, sh, _, parts in shelves] for shelves in sheets],
+        "cut_length_mm": cut,
+    }
+
+
+def _orient(a: int, b: int, sheet_w: int, sheet_l: int) -> Optional[Tuple[int, int]]:
+    """板に載る向き (幅方向, 長さ方向)。棚を低くするため短辺を長さ方向にできればそうする。"""
+    short, long_ = (a, b) if a <= b else (b, a)
+    if long_ <= sheet_w and short <= sheet_l:
+        return long_, short
+    if short <= sheet_w and long_ <= sheet_l:
+        return short, long_
+    return None
+
+
+def expand_parts(parts: Iterable[Dict[str, Any]]) -> Dict[Tuple[str, float], List[Tuple[int, int, Any]]]:
+    """部品（数量つき）を余長込みの矩形に展開し、(材質, 板厚) ごとにまとめる。"""
+    groups: Dict[Tuple[str, float], List[Tuple[int, int, Any]]] = {}
+    for i, p in enumerate(parts):
+        t = float(p["thickness_mm"])
+        y = p.get("yocho_mm")
+        if y is None:
+            y = yocho_mm(t, bool(p.get("bonde", False)))
+        a = int(round(float(p["length_mm"]) + y))
+        b = int(round(float(p["width_mm"]) + y))
+        pid = p.get("id", i)
+        rects = groups.setdefault((p.get("material", "SS400"), t), [])
+        for _ in range(int(p.get("qty", 1))):
+            rects.append((a, b, pid))
+    return groups
+
+
+def nest(
+    parts: Iterable[Dict[str, Any]],
+    sheets: Optional[List[str]] = None,
+    rates: Optional[Dict[str, Any]] = None,
+    cut_rate_yen_per_m: float = CUT_RATE_YEN_PER_M,
+) -> Dict[str, Any]:
+    """
+    parts: {length_mm, width_mm, thickness_mm, material="SS400", qty=1, bonde=False, yocho_mm=None, id}。
+    (材質, 板厚) ごとに定尺（sheets で指定、既定は STANDARD_SHEETS 全部）を試し、板の総面積が最小のものを採る。
+    結果には部品ごとの概算（見積り計算書の方式）も並べて返す。
+    """
+    rates = rates if rates is not None else load_rates()
+    material_rate = rates.get("材料単価_円_per_kg", 150)
+    names = sheets or list(STANDARD_SHEETS)
+    groups_out = []
+    for (material, t), rects in expand_parts(parts).items():
+        parts_area = sum(a * b for a, b, _ in rects)
+        perimeter = sum(2 * (a + b) for a, b, _ in rects)
+        best = None
+        for name in names:
+            sw, sl = STANDARD_SHEETS[name]
+            placed, unplaced = [], []
+            for a, b, pid in rects:
+                o = _orient(a, b, sw, sl)
+                if o is None:
+                    unplaced.append(pid)
+                else:
+                    placed.append((o[0], o[1], pid))
+            packed = pack_shelves(placed, sw, sl)
+            n_sheets = len(packed["sheets"])
+            cand = (len(unplaced), n_sheets * sw * sl, name, packed, unplaced)
+            if best is None or cand[:2] < best[:2]:
+                best = cand
+        _, sheet_area_total, name, packed, unplaced = best
+        sw, sl = STANDARD_SHEETS[name]
+        n_sheets = len(packed["sheets"])
+        placed_area = sum(w * h for shelves in packed["sheets"] for _, _, ps in shelves for _, w, h, _ in ps)
+        nested_kg = weight_kg(sheet_area_total, t, material, rates)
+        per_part_kg = weight_kg(parts_area, t, material, rates)
+        groups_out.append({
+            "material": material,
+            "thickness_mm": t,
+            "sheet": name,
+            "sheet_size_mm": [sw, sl],
+            "parts": len(rects),
+            "sheets_used": n_sheets,
+            "yield": round(placed_area / sheet_area_total, 4) if sheet_area_total else None,
+            "unplaced": unplaced,
+            "nested": {
+                "material_kg": round(nested_kg, 3),
+                "material_cost": round(nested_kg * material_rate),
+                "cut_length_mm": packed["cut_length_mm"],
+                "cut_cost": round(packed["cut_length_mm"] / 1000 * cut_rate_yen_per_m),
+            },
+            "per_part": {
+                "material_kg": round(per_part_kg, 3),
+                "material_cost": round(per_part_kg * material_rate),
+                "cut_length_mm": perimeter,
+                "cut_cost": round(perimeter / 1000 * cut_rate_yen_per_m),
+            },
+            "layout": packed["sheets"],
+        })
+    return {"groups": groups_out}
+
+
+# ===== CLI =====
+
+def random_parts(n: int, seed: int = 1) -> List[Dict[str, Any]]:
+    """ベンチ用の部品（板金の小物〜中物、数量1〜4）。矩形の総数がおよそ n になる。"""
+    import random
+    rng = random.Random(seed)
+    out = []
+    total = 0
+    while total < n:
+        qty = min(rng.choice([1, 1, 1, 2, 4]), n - total)
+        out.append({
+            "id": f"p{len(out)}",
+            "length_mm": rng.randint(50, 1500),
+            "width_mm": rng.randint(30, 600),
+            "thickness_mm": rng.choice([1.6, 2.3, 3.2]),
+            "material": "SS400",
+            "qty": qty,
+            "bonde": rng.random() < 0.05,
+        })
+        total += qty
+    return out
+
+
+def _summary(result: Dict[str, Any]) -> List[Dict[str, Any]]:
+    return [{k: v for k, v in g.items() if k != "layout"} for g in result["groups"]]
+
+
+def main():
+    import argparse
+    import time
+    p = argparse.ArgumentParser(description="板取り（ネスティング）: 使用枚数・歩留り・切断長")
+    p.add_argument("parts", nargs="?", help="部品の JSONL（- は標準入力）")
+    p.add_argument("--sheet", action="append", choices=list(STANDARD_SHEETS), help="使う定尺（複数可、既定: 全部）")
+    p.add_argument("--layout", action="store_true", help="板ごとの配置も出力する")
+    p.add_argument("--bench", action="store_true", help="乱数の部品で計測し、部品ごとの概算と比べる")
+    p.add_argument("--n", type=int, default=5000, help="--bench の矩形数")
+    p.add_argument("--seed", type=int, default=1)
+    args = p.parse_args()
+
+    if args.bench:
+        parts = random_parts(args.n, args.seed)
+        rates = load_rates()
+        t0 = time.perf_counter()
+        result = nest(parts, args.sheet, rates)
+        dt = time.perf_counter() - t0
+        rows = _summary(result)
+        for g in rows:
+            n, pp = g["nested"], g["per_part"]
+            print(f"{g['material']} t{g['thickness_mm']}  {g['parts']} 個 → {g['sheet']} {g['sheets_used']} 枚  歩留り {g['yield']:.1%}\n"
+                  f"  材料 {pp['material_kg']:,.1f} → {n['material_kg']:,.1f} kg（板で買う分）  "
+                  f"切断長 {pp['cut_length_mm'] / 1000:,.1f} → {n['cut_length_mm'] / 1000:,.1f} m（共通線を1回）")
+        print(f"矩形 {sum(g['parts'] for g in rows)} 個: {dt * 1000:.0f} ms", file=sys.stderr)
+        return 0
+
+    if not args.parts:
+        p.error("部品の JSONL を指定してください（または --bench）")
+    f = sys.stdin if args.parts == "-" else open(args.parts, encoding="utf-8")
+    try:
+        parts = [json.loads(line) for line in f if line.strip()]
+    finally:
+        if f is not sys.stdin:
+            f.close()
+    result = nest(parts, args.sheet)
+    print(json.dumps(result if args.layout else {"groups": _summary(result)}, ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
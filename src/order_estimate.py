@@ -0,0 +1,294 @@
+# -*- coding: utf-8 -*-
+"""
+注文（部品表・BOM）単位の見積もり — 部品の並びをまとめて estimate() の計算をし、
+段取り費を部品に配って、注文全体で消費税を1回だけかける。
+
+  1. 各行を parse_batch_part() で読み、価格が同じになる区分キー（曲げ工賃のキャッシュキー
+     ＝形状・重量区分・長さ区分・数量係数・オプション・長尺目押しの 1000mm 判定・小物判定、
+     ピアスの板厚帯、ポンチ・ピアス数、穴ごとの指定の（区分, 標準/下限）別の個数、
+     穴あけ単価表を引く穴があればその板厚の表の行と hole_gap）にする。
+  2. 区分キーごとに estimate_result() を1回だけ計算し、同じキーの行はその結果を使う。
+     数千行でも部品の種類が少なければ計算は数回で済む。
+  3. 段取りは（板厚グループ, 金型）ごとに1回。段取り費 = 段取り費_円per時（data/bending_logic.json）× 段取り時間
+     （呼び出し側が必ず渡す。表に決まった値は無い）を、同じ段取りの行に個数の比で円単位に配る
+     （最大剰余法。合計は必ず段取り費）。
+     板厚グループ表に無い板厚は板厚ごとに別の段取りにする。金型は行の "tooling"（省略時は区別しない）。
+  4. 行の金額は税抜（単価 × 個数 + 段取り費の配分）。消費税は注文の税抜合計に1回だけかける。
+
+各行は自分の lot（個数）で数量係数を決める（同じ部品が複数行にあっても個数は合算しない）。
+不正な行（lot が1未満・整数でない、tooling が文字列・整数以外など）は "error" を付けて合計から外し、
+残りを計算する（complete が False になる）。
+
+実行:
+  python3 src/order_estimate.py order.jsonl --setup-hours 1.0    # 入力はバッチ CLI と同じ JSONL / CSV（- で標準入力）
+  python3 src/order_estimate.py --bench 5000 --setup-hours 1.0   # 合成の BOM で1行ずつの estimate() と比べる
+"""
+
+import json
+import os
+import sys
+import time
+from bisect import bisect_left
+from typing import Any, Dict, List, Optional, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import calc_bending  # noqa: E402
+import fixed_point  # noqa: E402
+from calc_bending import (  # noqa: E402
+    MEOSHI_LONG_MIN_LENGTH_MM,
+    PIERCE_THICKNESS_BANDS,
+    SMALL_PART_MAX_LONG_SIDE_MM,
+    SMALL_PART_MAX_WEIGHT_KG,
+    PriceTable,
+    quantity_factor,
+)
+
+
+def class_key(table: PriceTable, kw: Dict[str, Any], hole_prices: Any) -> Tuple[Any, ...]:
+    """
+    estimate_result(**kw) の結果が同じになる行に同じキーを返す（parse_batch_part() の結果を渡す）。
+    形状が無い・穴の指定が不正なときは ValueError。
+    """
+    weight, length = kw["weight_kg"], kw["length_mm"]
+    t = kw["thickness_mm"]
+    key: Tuple[Any, ...] = (
+        kw["shape"], *table.classify(kw["shape"], weight, length), quantity_factor(kw["lot"]),
+        bool(kw.get("nakagoshi")), bool(kw.get("reverse_bend")),
+        bool(kw.get("meoshi_long")) and length >= MEOSHI_LONG_MIN_LENGTH_MM, bool(kw.get("fukabend")),
+        kw["long_side_mm"] <= SMALL_PART_MAX_LONG_SIDE_MM and weight <= SMALL_PART_MAX_WEIGHT_KG,
+        bisect_left(PIERCE_THICKNESS_BANDS, t), kw.get("punch_count", 0), kw.get("pierce_count", 0),
+    )
+    holes = kw.get("holes")
+    if holes is None:
+        return key
+    counts = tuple(sorted((k, n) for k, n in calc_bending._count_holes(holes).items() if n))
+    # 穴あけ単価表を引く穴（区分 3・4）は、単価が板厚の入る行（と区間内かどうか）だけで決まる
+    row = hole_prices.row_index(t) if any(cat >= 3 for (cat, _), _ in counts) else None
+    return key + (counts, row, kw.get("hole_gap", "error"))
+
+
+def setup_group(kw: Dict[str, Any], tooling: Any, logic) -> Tuple[str, Any]:
+    """段取りの単位 (板厚グループ, 金型)。グループ表に無い板厚は板厚ごとに "1mm" などの別グループにする。"""
+    t = kw["thickness_mm"]
+    try:
+        group = logic.groups[logic.group_index(t)]
+    except ValueError:
+        group = f"{t:g}mm"
+    return group, tooling
+
+
+def allocate(total: int, weights: List[int]) -> List[int]:
+    """total 円を weights の比で整数に分ける（最大剰余法。端数は剰余の大きい順、同じなら先の行に1円ずつ）。weights は 0 以上。"""
+    if any(w < 0 for w in weights):
+        raise ValueError(f"weights に負の値があります: {weights!r}")
+    s = sum(weights)
+    if s == 0:
+        weights, s = [1] * len(weights), len(weights)
+    shares = [total * w // s for w in weights]
+    rest = total - sum(shares)
+    order = sorted(range(len(weights)), key=lambda i: (-(total * weights[i] % s), i))
+    for i in order[:rest]:
+        shares[i] += 1
+    return shares
+
+
+def estimate_order(
+    lines,
+    setup_hours: float,
+    table_path: Optional[str] = None,
+    tax_rate: float = 0.1,
+    setup_yen_per_hour: Optional[float] = None,
+    table: Optional[PriceTable] = None,
+    hole_prices: Any = None,
+    logic: Any = None,
+) -> Dict[str, Any]:
+    """
+    部品表（バッチ入力と同じ形の辞書の並び。"tooling"（金型）・"id" は任意）を見積もる。
+    setup_hours は段取り1回の時間（必須。0 なら段取り費なし）。setup_yen_per_hour の省略時は bending_logic.json の 段取り費_円per時。
+    戻り値: {"lines": 行ごとの結果, "setups": 段取りごとの費用, "order": 注文の合計, "evaluations": 計算回数, "complete": エラー行なし}
+    """
+    import bending_logic
+    import hole_table
+    if table is None:
+        table = calc_bending.get_price_table(table_path)
+    if hole_prices is None:
+        hole_prices = hole_table.load_hole_table()
+    if logic is None:
+        logic = bending_logic.get_logic()
+    if setup_yen_per_hour is None:
+        setup_yen_per_hour = logic.setup_yen_per_hour or 0
+    setup_cost = fixed_point.round_yen(
+        fixed_point.apply_rate(round(setup_yen_per_hour * fixed_point.SEN_PER_YEN), fixed_point.per_mille(setup_hours)), "half_up",
+    )
+
+    # 区分キー → (税抜単価, 内訳)。同じ区分の行は同じ内訳の辞書を共有する
+    results: Dict[Tuple[Any, ...], Tuple[int, Dict[str, Any]]] = {}
+    out: List[Dict[str, Any]] = []
+    groups: Dict[Tuple[str, Any], List[int]] = {}
+    evaluations = 0
+    for n, record in enumerate(lines):
+        line: Dict[str, Any] = {"line": n}
+        if isinstance(record, dict) and record.get("id") is not None:
+            line["id"] = record["id"]
+        out.append(line)
+        try:
+            kw = calc_bending.parse_batch_part(record)
+            if kw["lot"] < 1:
+                raise ValueError(f"lot は1以上で指定してください: {kw['lot']!r}")
+            tooling = record.get("tooling") or None
+            if tooling is not None and (not isinstance(tooling, (str, int)) or isinstance(tooling, bool)):
+                raise ValueError(f"tooling の値が不正です: {tooling!r}")
+            key = class_key(table, kw, hole_prices)
+            hit = results.get(key)
+            if hit is None:
+                evaluations += 1
+                # エラーはキーで使い回さない（文言が行の板厚などを含む）
+                est = calc_bending.estimate_result(table=table, tax_rate=tax_rate, hole_prices=hole_prices, **kw)
+                hit = results[key] = (est.tax_excluded, est.to_dict()["breakdown"])
+        except ValueError as e:
+            line["error"] = str(e)
+            continue
+        g = setup_group(kw, tooling, logic)
+        groups.setdefault(g, []).append(n)
+        line.update({
+            "shape": kw["shape"],
+            "lot": kw["lot"],
+            "unit_price": hit[0],
+            "subtotal": hit[0] * kw["lot"],
+            "setup_group": g[0],
+            "tooling": tooling,
+            "setup_cost": 0,
+            "breakdown": hit[1],
+        })
+
+    setups = []
+    for (group, tooling), idx in groups.items():
+        shares = allocate(setup_cost, [out[i]["lot"] for i in idx])
+        for i, s in zip(idx, shares):
+            out[i]["setup_cost"] = s
+        setups.append({
+            "setup_group": group, "tooling": tooling, "hours": setup_hours, "cost": setup_cost,
+            "lines": len(idx), "pieces": sum(out[i]["lot"] for i in idx),
+        })
+
+    subtotal = setup_total = pieces = 0
+    errors = 0
+    for line in out:
+        if "error" in line:
+            errors += 1
+            continue
+        line["total"] = line["subtotal"] + line["setup_cost"]
+        subtotal += line["subtotal"]
+        setup_total += line["setup_cost"]
+        pieces += line["lot"]
+    excluded = subtotal + setup_total
+    included = fixed_point.tax_included(excluded, tax_rate, calc_bending.TAX_ROUNDING)
+    return {
+        "lines": out,
+        "setups": setups,
+        "order": {
+            "lines": len(out) - errors,
+            "pieces": pieces,
+            "parts_subtotal": subtotal,
+            "setup_cost": setup_total,
+            "tax_excluded": excluded,
+            "tax": included - excluded,
+            "tax_included": included,
+        },
+        "evaluations": evaluations,
+        "errors": errors,
+        "complete": errors == 0,
+    }
+
+
+# ===== CLI =====
+
+def _synthetic_bom(n: int, distinct: int = 20, seed: int = 0) -> List[Dict[str, Any]]:
+    """distinct 種類の部品を n 行に繰り返した合成の部品表（行ごとに個数と金型が違う）。"""
+    import random
+    rng = random.Random(seed)
+    shapes = ("L曲げ", "コの字曲げ", "Z曲げ", "ハット曲げ", "C型曲げ")
+    thicknesses = (1.6, 2.3, 3.2, 4.5, 6.0, 9.0)
+    parts = []
+    for k in range(distinct):
+        part = {
+            "id": f"P{k:03d}",
+            "shape": rng.choice(shapes),
+            "weight_kg": round(rng.uniform(0.3, 40), 1),
+            "length_mm": rng.choice((150, 400, 900, 1500, 2500)),
+            "thickness_mm": rng.choice(thicknesses),
+            "pierce_count": rng.choice((0, 2, 4)),
+        }
+        part["long_side_mm"] = part["length_mm"]
+        if rng.random() < 0.3:
+            part["holes"] = [{"type": "丸穴", "diameter_mm": 40, "count": rng.randint(1, 4)}]
+        parts.append(part)
+    return [dict(rng.choice(parts), lot=rng.choice((1, 2, 5, 10, 30)), tooling=rng.choice(("T1", "T2"))) for _ in range(n)]
+
+
+def bench(n: int, setup_hours: float) -> Dict[str, Any]:
+    """合成の部品表を estimate_order() と1行ずつの estimate() で計算し、時間と単価・内訳の一致を比べる。"""
+    bom = _synthetic_bom(n)
+    t0 = time.perf_counter()
+    result = estimate_order(bom, setup_hours)
+    t1 = time.perf_counter()
+    per_line = []
+    for record in bom:
+        try:
+            per_line.append(calc_bending.estimate(**calc_bending.parse_batch_part(record)))
+        except ValueError as e:
+            per_line.append(str(e))
+    t2 = time.perf_counter()
+    mismatched = 0
+    for line, est in zip(result["lines"], per_line):
+        if isinstance(est, str):
+            mismatched += line.get("error") != est
+        else:
+            mismatched += (line.get("unit_price") != est["total_estimate"]["processing_cost_tax_excluded"]
+                           or line.get("breakdown") != est["breakdown"])
+    return {
+        "lines": n,
+        "evaluations": result["evaluations"],
+        "order_seconds": round(t1 - t0, 4),
+        "per_line_seconds": round(t2 - t1, 4),
+        "mismatched": mismatched,
+        "order": result["order"],
+    }
+
+
+def main():
+    import argparse
+    p = argparse.ArgumentParser(description="注文（部品表）単位の見積もり（同じ区分の部品は1回だけ計算し、段取り費を配る）")
+    p.add_argument("input", nargs="?", help="部品表（JSONL / CSV、- で標準入力）")
+    p.add_argument("--format", choices=("auto", "jsonl", "csv"), default="auto")
+    p.add_argument("--csv", default=None, help="bending_price_table.csv のパス")
+    p.add_argument("--tax-rate", type=float, default=0.1)
+    p.add_argument("--setup-hours", type=float, required=True, help="段取り1回の時間（時）")
+    p.add_argument("--summary", action="store_true", help="行ごとの結果を出さず、合計と段取りだけ出す")
+    p.add_argument("--bench", type=int, default=None, metavar="N", help="合成の部品表 N 行で1行ずつの計算と比べる")
+    args = p.parse_args()
+    if args.bench:
+        print(json.dumps(bench(args.bench, args.setup_hours), ensure_ascii=False, indent=2))
+        return 0
+    if not args.input:
+        p.error("入力ファイルを指定してください（または --bench）")
+    stream = sys.stdin if args.input == "-" else open(args.input, encoding="utf-8-sig", newline="")
+    with stream:
+        records = []
+        for _, payload in calc_bending.iter_batch_input(stream, args.format):
+            if isinstance(payload, str):
+                try:
+                    payload = json.loads(payload)
+                except ValueError:
+                    pass  # 文字列のままなら estimate_order() がその行をエラーにする
+            records.append(payload)
+    result = estimate_order(records, args.setup_hours, table_path=args.csv, tax_rate=args.tax_rate)
+    if args.summary:
+        result = {k: v for k, v in result.items() if k != "lines"}
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+    return 0 if result["complete"] else 1
+
+
+if __name__ == "__main__":
+    exit(main())
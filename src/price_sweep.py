@@ -0,0 +1,248 @@
+# -*- coding: utf-8 -*-
+"""
+価格の what-if スイープ — 数量・長さ・重量・板厚を範囲で振ったときの見積もり（v2.1）を、
+価格が一定の領域ごとに1回だけ計算して区分定数の表にする。
+
+区分の境目は calc_bending の定義からそのまま取る:
+  長さ   LENGTH_THRESHOLDS、長尺目押し 1000mm（meoshi_long 指定時）、小物の長辺 300mm（long_side_mm 省略時は長さ＝長辺）
+  重量   価格表の形状ごとの重量範囲、小物の 1.0kg
+  数量   QUANTITY_BANDS
+  板厚   PIERCE_THICKNESS_BANDS
+境目のうち、どの組み合わせでも価格が変わらないものは結果から除く（隣の領域とまとめる）。
+
+実行: python3 src/price_sweep.py --shape L曲げ --lot 1 100 --length 100 4000 --weight 0.5 150 --thickness 1.6 12 --pierce 4
+"""
+
+import json
+import os
+import sys
+from itertools import product
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import calc_bending  # noqa: E402
+from calc_bending import (  # noqa: E402
+    LENGTH_THRESHOLDS,
+    MEOSHI_LONG_MIN_LENGTH_MM,
+    PIERCE_THICKNESS_BANDS,
+    QUANTITY_BANDS,
+    SMALL_PART_MAX_LONG_SIDE_MM,
+    SMALL_PART_MAX_WEIGHT_KG,
+)
+
+AXES = ("lot", "length_mm", "weight_kg", "thickness_mm")
+
+# 境目の向き: LE は「x <= t」で区切る（t は下側に入る）、GE は「x >= t」で区切る（t は上側に入る）
+LE = "le"
+GE = "ge"
+
+Range = Union[float, Tuple[float, float]]
+
+
+def _as_range(v: Range) -> Tuple[float, float]:
+    if isinstance(v, (tuple, list)):
+        lo, hi = v
+    else:
+        lo = hi = v
+    if lo > hi:
+        raise ValueError(f"範囲の下限が上限より大きい: {v}")
+    return lo, hi
+
+
+def split_range(lo: float, hi: float, cuts: Sequence[Tuple[float, str]]) -> List[Dict[str, Any]]:
+    """
+    [lo, hi] を境目で区間に分ける。区間は {"lo", "hi", "lo_closed", "hi_closed"}。
+    範囲の外や端にあって区間を分けない境目は無視する。
+    """
+    inside = sorted(
+        {(t, kind) for t, kind in cuts if (lo <= t < hi if kind == LE else lo < t <= hi)},
+        key=lambda c: (c[0], 0 if c[1] == GE else 1),
+    )
+    pieces = []
+    start, start_closed = lo, True
+    for t, kind in inside:
+        if kind == GE:
+            pieces.append({"lo": start, "hi": t, "lo_closed": start_closed, "hi_closed": False})
+            start, start_closed = t, True
+        else:
+            pieces.append({"lo": start, "hi": t, "lo_closed": start_closed, "hi_closed": True})
+            start, start_closed = t, False
+    pieces.append({"lo": start, "hi": hi, "lo_closed": start_closed, "hi_closed": True})
+    return pieces
+
+
+def representative(piece: Dict[str, Any]) -> float:
+    """区間内の1点（閉じている端を優先）。"""
+    if piece["hi_closed"]:
+        return piece["hi"]
+    if piece["lo_closed"]:
+        return piece["lo"]
+    return (piece["lo"] + piece["hi"]) / 2
+
+
+def contains(piece: Dict[str, Any], x: float) -> bool:
+    lo_ok = x >= piece["lo"] if piece["lo_closed"] else x > piece["lo"]
+    hi_ok = x <= piece["hi"] if piece["hi_closed"] else x < piece["hi"]
+    return lo_ok and hi_ok
+
+
+def axis_cuts(table: "calc_bending.PriceTable", shape: str, meoshi_long: bool, long_side_tracks_length: bool) -> Dict[str, List[Tuple[float, str]]]:
+    """各軸で価格が変わりうる境目。"""
+    length = [(t, LE) for t in LENGTH_THRESHOLDS]
+    if meoshi_long:
+        length.append((MEOSHI_LONG_MIN_LENGTH_MM, GE))
+    if long_side_tracks_length:
+        length.append((SMALL_PART_MAX_LONG_SIDE_MM, LE))
+    weight = [(t, LE) for t in table.weight_thresholds(shape)]
+    weight.append((SMALL_PART_MAX_WEIGHT_KG, LE))
+    return {
+        "lot": [(t, LE) for t in QUANTITY_BANDS],
+        "length_mm": length,
+        "weight_kg": weight,
+        "thickness_mm": [(t, LE) for t in PIERCE_THICKNESS_BANDS],
+    }
+
+
+def _merge_axis(pieces: List[List[Dict[str, Any]]], grid: Dict[tuple, Tuple[int, int]], axis: int) -> Tuple[List[List[Dict[str, Any]]], Dict[tuple, Tuple[int, int]]]:
+    """axis 方向に隣り合う区間で、他の軸のどの組み合わせでも価格が同じものをまとめる。"""
+    others = [range(len(p)) for i, p in enumerate(pieces) if i != axis]
+
+    def slice_at(k: int) -> List[Tuple[int, int]]:
+        out = []
+        for rest in product(*others):
+            idx = list(rest)
+            idx.insert(axis, k)
+            out.append(grid[tuple(idx)])
+        return out
+
+    keep = [0]  # まとめた後の各区間の先頭になる元の番号
+    prev = slice_at(0)
+    for k in range(1, len(pieces[axis])):
+        cur = slice_at(k)
+        if cur != prev:
+            keep.append(k)
+        prev = cur
+
+    merged = []
+    for n, k in enumerate(keep):
+        last = (keep[n + 1] if n + 1 < len(keep) else len(pieces[axis])) - 1
+        first_p, last_p = pieces[axis][k], pieces[axis][last]
+        merged.append({"lo": first_p["lo"], "hi": last_p["hi"], "lo_closed": first_p["lo_closed"], "hi_closed": last_p["hi_closed"]})
+
+    new_grid = {}
+    for idx, v in grid.items():
+        if idx[axis] in keep:
+            new_idx = list(idx)
+            new_idx[axis] = keep.index(idx[axis])
+            new_grid[tuple(new_idx)] = v
+    new_pieces = list(pieces)
+    new_pieces[axis] = merged
+    return new_pieces, new_grid
+
+
+def sweep(
+    shape: str,
+    lot: Range = (1, 100),
+    length_mm: Range = (1, 6000),
+    weight_kg: Range = (0.1, 200),
+    thickness_mm: Range = (0.5, 25),
+    long_side_mm: Optional[float] = None,
+    punch_count: int = 0,
+    pierce_count: int = 0,
+    nakagoshi: bool = False,
+    reverse_bend: bool = False,
+    meoshi_long: bool = False,
+    fukabend: bool = False,
+    table_path: Optional[str] = None,
+    tax_rate: float = 0.1,
+) -> Dict[str, Any]:
+    """
+    lot / length_mm / weight_kg / thickness_mm は (下限, 上限) か固定値。
+    long_side_mm を省略すると長辺＝長さとして小物判定する。
+    戻り値:
+      axes        軸名 → 区間のリスト（価格が変わる境目だけで区切ったもの）
+      breakpoints 軸名 → 価格が変わる境目 [{"at", "upper_includes"}]（upper_includes: 境目の値が上側の区間に入る）
+      tax_excluded / tax_included  区間の組み合わせごとの価格。AXES の順の入れ子リスト
+      evaluations 実際に計算した回数
+    """
+    table = calc_bending.get_price_table(table_path)
+    ranges = {"lot": lot, "length_mm": length_mm, "weight_kg": weight_kg, "thickness_mm": thickness_mm}
+    cuts = axis_cuts(table, shape, meoshi_long, long_side_mm is None)
+    pieces = [split_range(*_as_range(ranges[a]), cuts[a]) for a in AXES]
+
+    grid: Dict[tuple, Tuple[int, int]] = {}
+    for idx in product(*(range(len(p)) for p in pieces)):
+        lot_v, length_v, weight_v, thick_v = (representative(pieces[i][k]) for i, k in enumerate(idx))
+        bending = calc_bending.bending_result(
+            table, shape, weight_v, length_v, length_v if long_side_mm is None else long_side_mm, lot_v,
+            nakagoshi=nakagoshi, reverse_bend=reverse_bend, meoshi_long=meoshi_long, fukabend=fukabend,
+        )
+        est = calc_bending.Estimate(bending, calc_bending.hole_result(thick_v, punch_count, pierce_count), tax_rate)
+        grid[idx] = (est.tax_excluded, est.tax_included)
+    evaluations = len(grid)
+
+    for axis in range(len(AXES)):
+        pieces, grid = _merge_axis(pieces, grid, axis)
+
+    def nested(which: int, prefix: tuple = ()) -> Any:
+        depth = len(prefix)
+        if depth == len(AXES):
+            return grid[prefix][which]
+        return [nested(which, prefix + (k,)) for k in range(len(pieces[depth]))]
+
+    return {
+        "shape": shape,
+        "axes": {a: p for a, p in zip(AXES, pieces)},
+        "breakpoints": {
+            a: [{"at": piece["hi"], "upper_includes": not piece["hi_closed"]} for piece in p[:-1]]
+            for a, p in zip(AXES, pieces)
+        },
+        "tax_excluded": nested(0),
+        "tax_included": nested(1),
+        "evaluations": evaluations,
+    }
+
+
+def sweep_lookup(result: Dict[str, Any], lot: float, length_mm: float, weight_kg: float, thickness_mm: float, tax_included: bool = False) -> int:
+    """sweep() の結果から1点の価格を引く。"""
+    node = result["tax_included" if tax_included else "tax_excluded"]
+    for axis, x in zip(AXES, (lot, length_mm, weight_kg, thickness_mm)):
+        for k, piece in enumerate(result["axes"][axis]):
+            if contains(piece, x):
+                node = node[k]
+                break
+        else:
+            raise ValueError(f"{axis}={x} はスイープの範囲外です")
+    return node
+
+
+def main():
+    import argparse
+    p = argparse.ArgumentParser(description="見積もり価格の what-if スイープ（区分定数の価格表を出力）")
+    p.add_argument("--shape", required=True, help="形状")
+    p.add_argument("--lot", type=float, nargs=2, default=[1, 100], metavar=("MIN", "MAX"))
+    p.add_argument("--length", type=float, nargs=2, default=[1, 6000], metavar=("MIN", "MAX"), help="長さ mm")
+    p.add_argument("--weight", type=float, nargs=2, default=[0.1, 200], metavar=("MIN", "MAX"), help="重量 kg")
+    p.add_argument("--thickness", type=float, nargs=2, default=[0.5, 25], metavar=("MIN", "MAX"), help="板厚 mm")
+    p.add_argument("--long-side", type=float, default=None, help="長辺 mm（省略時は長さと同じとして小物判定）")
+    p.add_argument("--punch", type=int, default=0, help="レーザーポンチ数")
+    p.add_argument("--pierce", type=int, default=0, help="ピアス数")
+    p.add_argument("--nakagoshi", action="store_true", help="中押し")
+    p.add_argument("--reverse-bend", action="store_true", help="逆曲げ")
+    p.add_argument("--meoshi-long", action="store_true", help="長尺目押し")
+    p.add_argument("--fukabend", action="store_true", help="深曲げ・干渉回避")
+    p.add_argument("--csv", default=None, help="bending_price_table.csv のパス")
+    args = p.parse_args()
+    result = sweep(
+        args.shape, tuple(args.lot), tuple(args.length), tuple(args.weight), tuple(args.thickness),
+        long_side_mm=args.long_side, punch_count=args.punch, pierce_count=args.pierce,
+        nakagoshi=args.nakagoshi, reverse_bend=args.reverse_bend, meoshi_long=args.meoshi_long,
+        fukabend=args.fukabend, table_path=args.csv,
+    )
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,662 @@
+# -*- coding: utf-8 -*-
+"""
+見積り実績のアーカイブ — 実績を月ごとのパーティションに分け、圧縮した列形式のセグメント（gzip / lzma）に置き、
+パーティションごとの集計（rollup）を取り込みのたびに更新しておく。月別の合計や形状・板厚別の平均は
+集計だけから答え、元のレコードはドリルダウン（records()）のときだけ読む。
+
+置き場所（root、既定は data/records_archive/）:
+  catalog.sqlite3        セグメントの一覧、レコードの位置（rows）、集計（rollup）、同期のカーソル
+  <YYYY-MM>/<番号>.json.gz  セグメント。1回の取り込みで触ったパーティションごとに1つ。書いた後は変えない
+
+  rows    レコード1件 = 1行: _id → (セグメント, 行) と集計の軸・値（更新・削除のときセグメントを読まずに引き算する）
+  rollup  （月, 形状, 板厚, 数量帯）ごとの件数と、値（MEASURES）ごとの件数・合計・最小・最大
+          更新・削除で最小・最大の値が抜けたセルだけ rows から数え直す
+
+集計の軸（DIMENSIONS）: month, year, shape, thickness, thickness_group（bending_logic の板厚グループ）,
+lot_band（数量スライドの帯 1-4 / 5-19 / 20+）。値: qty, actual（実績）, calc（計算）,
+diff（actual - calc。実績一覧.html の分析と同じく両方あるレコードだけ）。
+
+実行:
+  python3 src/records_archive.py sync                          # data/records.sqlite3 の差分を取り込む
+  python3 src/records_archive.py ingest records.json           # 配列形式の JSON を取り込む
+  python3 src/records_archive.py query --group-by month shape --from 2025-01 --to 2025-12
+  python3 src/records_archive.py drill --month 2025-03 --shape L曲げ
+  python3 src/records_archive.py compact                       # パーティションのセグメントを1つにまとめる
+  python3 src/records_archive.py bench --n 200000              # records.json の全件走査と比べる
+"""
+
+import gzip
+import json
+import lzma
+import os
+import sqlite3
+import sys
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from calc_bending import QUANTITY_BANDS  # noqa: E402
+
+SKILL_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_ARCHIVE_DIR = os.path.join(SKILL_DIR, "data", "records_archive")
+
+# 圧縮形式 → (拡張子, 圧縮, 展開)
+CODECS = {
+    "gzip": (".json.gz", lambda b: gzip.compress(b, 6), gzip.decompress),
+    "lzma": (".json.xz", lzma.compress, lzma.decompress),
+}
+# セグメントの列（ほかのキーは "rest" 列に1件ごとの辞書でまとめる）
+COLUMNS = ("_id", "_version", "date", "shape", "thickness", "material", "length", "width", "qty", "actual", "calc", "customer")
+MEASURES = ("qty", "actual", "calc", "diff")
+DIMENSIONS = ("month", "year", "shape", "thickness", "thickness_group", "lot_band")
+# 日付の無いレコードのパーティション
+NO_DATE = "nodate"
+
+_CELL = ("partition", "shape", "thickness", "lot_band")
+# 軸 → rows / rollup の列の式（thickness_group は thickness から Python で引く）
+_SQL_DIMS = {
+    "month": "partition",
+    "year": f"CASE WHEN partition = '{NO_DATE}' THEN partition ELSE substr(partition, 1, 4) END",
+    "shape": "shape",
+    "thickness": "thickness",
+    "thickness_group": "thickness",
+    "lot_band": "lot_band",
+}
+_STATS = tuple(f"{m}_{s}" for m in MEASURES for s in ("n", "sum", "min", "max"))
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS segments (
+    seg       INTEGER PRIMARY KEY,
+    partition TEXT NOT NULL,
+    file      TEXT NOT NULL,
+    rows      INTEGER NOT NULL,
+    bytes     INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_segments_partition ON segments(partition);
+CREATE TABLE IF NOT EXISTS rows (
+    rid TEXT PRIMARY KEY, seg INTEGER NOT NULL, row INTEGER NOT NULL,
+    partition TEXT NOT NULL, shape TEXT NOT NULL, thickness TEXT NOT NULL, lot_band TEXT NOT NULL,
+    {", ".join(f"{m} NUMERIC" for m in MEASURES)}
+);
+CREATE INDEX IF NOT EXISTS idx_rows_seg ON rows(seg);
+CREATE INDEX IF NOT EXISTS idx_rows_cell ON rows(partition, shape, thickness, lot_band);
+CREATE TABLE IF NOT EXISTS rollup (
+    partition TEXT NOT NULL, shape TEXT NOT NULL, thickness TEXT NOT NULL, lot_band TEXT NOT NULL,
+    n INTEGER NOT NULL, {", ".join(f"{c} NUMERIC" for c in _STATS)},
+    PRIMARY KEY (partition, shape, thickness, lot_band)
+);
+"""
+
+
+def lot_band(qty: Any) -> str:
+    """数量 → 数量スライドの帯（calc_bending.QUANTITY_BANDS。1-4 / 5-19 / 20+）。"""
+    lo = 1
+    for limit in QUANTITY_BANDS:
+        if qty <= limit:
+            return f"{lo}-{limit}"
+        lo = limit + 1
+    return f"{lo}+"
+
+
+def _num(v: Any) -> Optional[float]:
+    if v is None or v == "":
+        return None
+    try:
+        x = float(v)
+    except (TypeError, ValueError):
+        return None
+    return int(x) if x.is_integer() else x
+
+
+def _thickness_key(v: Any) -> str:
+    """板厚の表記をそろえる（"6" / 6 / "6.0" → "6.0"）。無ければ ""。"""
+    x = _num(v)
+    if x is None:
+        return ""
+    return f"{x:.1f}" if round(x, 1) == x else f"{x:g}"
+
+
+def partition_of(record: Dict[str, Any]) -> str:
+    """日付（YYYY-MM-DD）→ パーティション YYYY-MM。日付が無い・読めなければ NO_DATE。"""
+    d = str(record.get("date") or "")
+    if len(d) >= 7 and d[:4].isdigit() and d[4] == "-" and d[5:7].isdigit():
+        return d[:7]
+    return NO_DATE
+
+
+def record_facts(record: Dict[str, Any]) -> Tuple[Tuple[str, str, str, str], Tuple[Optional[float], ...]]:
+    """レコード → (セル（パーティション, 形状, 板厚, 数量帯）, MEASURES の値)。"""
+    qty = _num(record.get("qty")) or 1
+    actual, calc = _num(record.get("actual")), _num(record.get("calc"))
+    diff = actual - calc if actual and calc else None
+    cell = (partition_of(record), str(record.get("shape") or ""), _thickness_key(record.get("thickness")), lot_band(qty))
+    return cell, (qty, actual, calc, diff)
+
+
+def _filters(filters: Dict[str, Any]) -> Dict[str, List[Any]]:
+    """絞り込みの値をリストにし、板厚は集計と同じ表記にそろえる。"""
+    out = {}
+    for k, v in filters.items():
+        vals = list(v) if isinstance(v, (list, tuple, set)) else [v]
+        out[k] = [_thickness_key(x) for x in vals] if k == "thickness" else vals
+    return out
+
+
+class _Cell:
+    """rollup の1行（件数と値ごとの件数・合計・最小・最大）。"""
+
+    __slots__ = ("n", "stats", "stale")
+
+    def __init__(self, n: int = 0, stats: Optional[List[Any]] = None):
+        self.n = n
+        self.stats = stats if stats is not None else [0, 0, None, None] * len(MEASURES)
+        self.stale = False
+
+    def add(self, values: Sequence[Optional[float]], sign: int) -> None:
+        self.n += sign
+        s = self.stats
+        for i, v in enumerate(values):
+            if v is None:
+                continue
+            j = 4 * i
+            s[j] += sign
+            s[j + 1] += sign * v
+            if sign > 0:
+                s[j + 2] = v if s[j + 2] is None or v < s[j + 2] else s[j + 2]
+                s[j + 3] = v if s[j + 3] is None or v > s[j + 3] else s[j + 3]
+            elif v == s[j + 2] or v == s[j + 3]:
+                # 最小・最大の値が抜けた（合計と違って引き算できない）→ rows から数え直す
+                self.stale = True
+
+
+class RecordsArchive:
+    """月パーティション・圧縮セグメント・集計のアーカイブ。書き込みは1プロセスから行う。"""
+
+    def __init__(self, root: str = DEFAULT_ARCHIVE_DIR, codec: str = "gzip"):
+        if codec not in CODECS:
+            raise ValueError(f"codec は {' / '.join(CODECS)} のどれか: {codec!r}")
+        self.root = root
+        self.codec = codec
+        os.makedirs(root, exist_ok=True)
+        self.db = sqlite3.connect(os.path.join(root, "catalog.sqlite3"), isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.executescript(SCHEMA)
+        self._groups: Dict[str, str] = {}
+
+    def close(self) -> None:
+        self.db.close()
+
+    @contextmanager
+    def _tx(self):
+        self.db.execute("BEGIN IMMEDIATE")
+        try:
+            yield self.db
+        except BaseException:
+            self.db.execute("ROLLBACK")
+            raise
+        self.db.execute("COMMIT")
+
+    # ----- セグメント -----
+
+    def _write_segment(self, db: sqlite3.Connection, partition: str, records: List[Dict[str, Any]]) -> int:
+        """records を列形式で圧縮して書き、セグメント番号を返す。"""
+        ext, compress, _ = CODECS[self.codec]
+        cols = {c: [r.get(c) for r in records] for c in COLUMNS}
+        rest = [{k: v for k, v in r.items() if k not in COLUMNS} or None for r in records]
+        body = compress(json.dumps({"columns": cols, "rest": rest}, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+        seg = db.execute(
+            "INSERT INTO segments (partition, file, rows, bytes) VALUES (?, '', ?, ?)", (partition, len(records), len(body)),
+        ).lastrowid
+        name = f"{partition}/{seg:06d}{ext}"
+        path = os.path.join(self.root, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + ".tmp", "wb") as f:
+            f.write(body)
+        os.replace(path + ".tmp", path)
+        db.execute("UPDATE segments SET file = ? WHERE seg = ?", (name, seg))
+        return seg
+
+    def _read_segment(self, name: str) -> List[Dict[str, Any]]:
+        """セグメント → レコードのリスト（行番号順）。"""
+        decompress = next(c[2] for c in CODECS.values() if name.endswith(c[0]))
+        with open(os.path.join(self.root, name), "rb") as f:
+            data = json.loads(decompress(f.read()).decode("utf-8"))
+        cols, rest = data["columns"], data["rest"]
+        out = []
+        for i, extra in enumerate(rest):
+            rec = {c: cols[c][i] for c in COLUMNS if cols[c][i] is not None}
+            if extra:
+                rec.update(extra)
+            out.append(rec)
+        return out
+
+    # ----- 取り込み -----
+
+    def apply(self, upserts: Iterable[Dict[str, Any]] = (), deletes: Iterable[Any] = (), cursor: Optional[int] = None) -> Dict[str, int]:
+        """
+        追加・更新（_id 必須。同じ _id は後のものが勝つ）と削除（_id か {"_id": …}）を1トランザクションで反映する。
+        更新・削除されたレコードの分は rows の値で集計から引き、セグメントの行は使わなくなる（compact() で消える）。
+        cursor を渡すと同期のカーソルとして保存する。
+        """
+        latest: Dict[str, Optional[Dict[str, Any]]] = {}
+        for rec in upserts:
+            rid = rec.get("_id")
+            if not rid:
+                raise ValueError(f"_id の無いレコードは取り込めません: {rec.get('id')!r}")
+            latest[str(rid)] = rec
+        for d in deletes:
+            latest[str(d["_id"] if isinstance(d, dict) else d)] = None
+
+        cells: Dict[Tuple[str, str, str, str], _Cell] = {}
+        touched_segs = set()
+        written = removed = 0
+        with self._tx() as db:
+            def cell(key):
+                c = cells.get(key)
+                if c is None:
+                    row = db.execute(
+                        f"SELECT n, {', '.join(_STATS)} FROM rollup WHERE partition = ? AND shape = ? AND thickness = ? AND lot_band = ?", key,
+                    ).fetchone()
+                    c = cells[key] = _Cell() if row is None else _Cell(row[0], list(row[1:]))
+                return c
+
+            # 前の版を集計から引く
+            rids = list(latest)
+            for i in range(0, len(rids), 500):
+                chunk = rids[i:i + 500]
+                for row in db.execute(
+                    f"SELECT rid, seg, {', '.join(_CELL)}, {', '.join(MEASURES)} FROM rows WHERE rid IN ({','.join('?' * len(chunk))})", chunk,
+                ):
+                    cell(row[2:6]).add(row[6:], -1)
+                    touched_segs.add(row[1])
+                    removed += 1
+                db.execute(f"DELETE FROM rows WHERE rid IN ({','.join('?' * len(chunk))})", chunk)
+
+            # 新しい版をパーティションごとに1セグメントへ
+            by_part: Dict[str, List[Tuple[str, Dict[str, Any]]]] = {}
+            for rid, rec in latest.items():
+                if rec is not None:
+                    by_part.setdefault(partition_of(rec), []).append((rid, rec))
+            for partition, items in sorted(by_part.items()):
+                seg = self._write_segment(db, partition, [rec for _, rec in items])
+                rows = []
+                for i, (rid, rec) in enumerate(items):
+                    key, values = record_facts(rec)
+                    cell(key).add(values, +1)
+                    rows.append((rid, seg, i) + key + values)
+                db.executemany(f"INSERT INTO rows VALUES ({','.join('?' * (7 + len(MEASURES)))})", rows)
+                written += len(items)
+
+            for key, c in cells.items():
+                if c.n <= 0:
+                    db.execute("DELETE FROM rollup WHERE partition = ? AND shape = ? AND thickness = ? AND lot_band = ?", key)
+                    continue
+                if c.stale:
+                    c = self._recount(db, key)
+                db.execute(f"INSERT OR REPLACE INTO rollup VALUES ({','.join('?' * (5 + len(_STATS)))})", key + (c.n,) + tuple(c.stats))
+            if cursor is not None:
+                db.execute("INSERT OR REPLACE INTO meta VALUES ('cursor', ?)", (str(cursor),))
+            dropped = self._drop_empty_segments(db, touched_segs)
+        for name in dropped:
+            self._unlink(name)
+        return {"written": written, "replaced_or_deleted": removed, "segments_dropped": len(dropped)}
+
+    @staticmethod
+    def _recount(db: sqlite3.Connection, key: Tuple[str, str, str, str]) -> _Cell:
+        """rows からセル1つの集計を数え直す。"""
+        agg = ", ".join(f"COUNT({m}), SUM({m}), MIN({m}), MAX({m})" for m in MEASURES)
+        row = db.execute(
+            f"SELECT COUNT(*), {agg} FROM rows WHERE partition = ? AND shape = ? AND thickness = ? AND lot_band = ?", key,
+        ).fetchone()
+        stats = [v if v is not None or i % 4 >= 2 else 0 for i, v in enumerate(row[1:])]
+        return _Cell(row[0], [int(v) if isinstance(v, float) and v.is_integer() else v for v in stats])
+
+    @staticmethod
+    def _drop_empty_segments(db: sqlite3.Connection, segs: Iterable[int]) -> List[str]:
+        dropped = []
+        for seg in segs:
+            if db.execute("SELECT 1 FROM rows WHERE seg = ? LIMIT 1", (seg,)).fetchone() is None:
+                row = db.execute("SELECT file FROM segments WHERE seg = ?", (seg,)).fetchone()
+                if row is not None:
+                    dropped.append(row[0])
+                    db.execute("DELETE FROM segments WHERE seg = ?", (seg,))
+        return dropped
+
+    def _unlink(self, name: str) -> None:
+        try:
+            os.remove(os.path.join(self.root, name))
+        except FileNotFoundError:
+            pass
+
+    def ingest_json(self, path: str, batch: int = 50000) -> int:
+        """records.json（配列）を取り込む。"""
+        with open(path, encoding="utf-8") as f:
+            records = json.load(f)
+        for i in range(0, len(records), batch):
+            self.apply(records[i:i + batch])
+        return len(records)
+
+    @property
+    def cursor(self) -> int:
+        row = self.db.execute("SELECT value FROM meta WHERE key = 'cursor'").fetchone()
+        return int(row[0]) if row else 0
+
+    def sync(self, store, limit: int = 5000) -> Dict[str, int]:
+        """
+        RecordsStore（records_store.py）の changes_since() で前回のカーソルより後の変更だけを取り込む。
+        カーソルが古すぎる（CursorExpired）ときはアーカイブを空にして最初から取り直す。
+        """
+        from records_store import CursorExpired
+        total = {"changes": 0, "written": 0, "replaced_or_deleted": 0, "segments_dropped": 0, "reset": 0}
+        while True:
+            try:
+                res = store.changes_since(self.cursor, limit)
+            except CursorExpired:
+                self.reset()
+                total["reset"] = 1
+                continue
+            ups = [c for c in res["changes"] if not c.get("_deleted")]
+            dels = [c for c in res["changes"] if c.get("_deleted")]
+            if res["changes"]:
+                for k, v in self.apply(ups, dels, cursor=res["cursor"]).items():
+                    total[k] += v
+                total["changes"] += len(res["changes"])
+            if not res["more"]:
+                return total
+
+    def reset(self) -> None:
+        """アーカイブを空にする（セグメントのファイルも消す）。"""
+        with self._tx() as db:
+            files = [r[0] for r in db.execute("SELECT file FROM segments")]
+            for table in ("segments", "rows", "rollup", "meta"):
+                db.execute(f"DELETE FROM {table}")
+        for name in files:
+            self._unlink(name)
+
+    def compact(self, partition: Optional[str] = None) -> Dict[str, int]:
+        """
+        パーティションのセグメントを1つにまとめ、使われなくなった行（更新・削除の前の版）を捨てる。
+        セグメントが1つで捨てる行も無いパーティションはそのまま。集計は変わらない。
+        """
+        parts = [partition] if partition else [r[0] for r in self.db.execute("SELECT DISTINCT partition FROM segments")]
+        out = {"partitions": 0, "segments_before": 0, "rows_dropped": 0}
+        for part in parts:
+            segs = self.db.execute("SELECT seg, file, rows FROM segments WHERE partition = ? ORDER BY seg", (part,)).fetchall()
+            live = self.db.execute(
+                "SELECT COUNT(*) FROM rows WHERE seg IN (SELECT seg FROM segments WHERE partition = ?)", (part,),
+            ).fetchone()[0]
+            total = sum(s[2] for s in segs)
+            if len(segs) <= 1 and live == total:
+                continue
+            records: List[Dict[str, Any]] = []
+            for seg, name, _ in segs:
+                rows = self._read_segment(name)
+                keep = {r for (r,) in self.db.execute("SELECT row FROM rows WHERE seg = ?", (seg,))}
+                records.extend(rows[i] for i in sorted(keep))
+            with self._tx() as db:
+                seg_new = self._write_segment(db, part, records)
+                db.executemany("UPDATE rows SET seg = ?, row = ? WHERE rid = ?", [(seg_new, i, r["_id"]) for i, r in enumerate(records)])
+                db.execute("DELETE FROM segments WHERE partition = ? AND seg != ?", (part, seg_new))
+            for _, name, _ in segs:
+                self._unlink(name)
+            out["partitions"] += 1
+            out["segments_before"] += len(segs)
+            out["rows_dropped"] += total - live
+        return out
+
+    # ----- 集計・ドリルダウン -----
+
+    def thickness_group(self, thickness: str) -> str:
+        """板厚 → bending_logic の板厚グループ（表に無い板厚は ""）。"""
+        g = self._groups.get(thickness)
+        if g is None:
+            import bending_logic
+            logic = bending_logic.get_logic()
+            try:
+                g = logic.groups[logic.group_index(float(thickness))]
+            except ValueError:
+                g = ""
+            self._groups[thickness] = g
+        return g
+
+    def _dims(self, partition: str, shape: str, thickness: str, band: str) -> Dict[str, str]:
+        return {
+            "month": partition, "year": partition[:4] if partition != NO_DATE else NO_DATE, "shape": shape,
+            "thickness": thickness, "thickness_group": self.thickness_group(thickness), "lot_band": band,
+        }
+
+    def _where(self, table: str, month_from: Optional[str], month_to: Optional[str], filters: Dict[str, Any]) -> Tuple[str, List[Any]]:
+        """rows / rollup（どちらも partition・shape・thickness・lot_band の列を持つ）の絞り込みの WHERE。"""
+        cond, args = ["1"], []
+        if month_from:
+            cond.append("partition >= ? AND partition != ?")
+            args += [month_from, NO_DATE]
+        if month_to:
+            cond.append("partition <= ?")
+            args.append(month_to)
+        for k, vals in _filters(filters).items():
+            if k not in DIMENSIONS:
+                raise ValueError(f"集計の軸は {' / '.join(DIMENSIONS)} のどれか: {k!r}")
+            if k == "thickness_group":
+                k, vals = "thickness", [t for (t,) in self.db.execute(f"SELECT DISTINCT thickness FROM {table}") if self.thickness_group(t) in vals]
+            cond.append(f"{_SQL_DIMS[k]} IN ({','.join('?' * len(vals))})")
+            args += vals
+        return " AND ".join(cond), args
+
+    def rollup(
+        self,
+        group_by: Sequence[str] = ("month",),
+        month_from: Optional[str] = None,
+        month_to: Optional[str] = None,
+        **filters: Any,
+    ) -> List[Dict[str, Any]]:
+        """
+        集計（rollup）だけから group_by の軸ごとの件数と値の件数・合計・平均・最小・最大を返す（セグメントは読まない）。
+        month_from / month_to は "YYYY-MM"（両端を含む。指定すると日付の無いレコードは外れる）。
+        filters は軸 = 値（shape="L曲げ"、thickness_group="B" など。値のリスト・タプルも可）。
+        """
+        for d in group_by:
+            if d not in DIMENSIONS:
+                raise ValueError(f"集計の軸は {' / '.join(DIMENSIONS)} のどれか: {d!r}")
+        where, args = self._where("rollup", month_from, month_to, filters)
+        # 板厚グループ以外は SQL でまとめる（板厚グループは板厚でまとめてから Python で足す）
+        exprs = list(dict.fromkeys(_SQL_DIMS[d] for d in group_by)) or ["''"]
+        agg = ", ".join(f"SUM({m}_n), SUM({m}_sum), MIN({m}_min), MAX({m}_max)" for m in MEASURES)
+        sql = f"SELECT {', '.join(exprs)}, SUM(n), {agg} FROM rollup WHERE {where} GROUP BY {', '.join(exprs)}"
+        pos = {e: i for i, e in enumerate(exprs)}
+        groups: Dict[Tuple[str, ...], _Cell] = {}
+        for row in self.db.execute(sql, args):
+            key = tuple(
+                self.thickness_group(row[pos["thickness"]]) if d == "thickness_group" else row[pos[_SQL_DIMS[d]]] for d in group_by
+            )
+            k = len(exprs)
+            g = groups.get(key)
+            if g is None:
+                groups[key] = _Cell(row[k], list(row[k + 1:]))
+                continue
+            g.n += row[k]
+            s, t = g.stats, row[k + 1:]
+            for j in range(0, len(s), 4):
+                s[j] += t[j]
+                s[j + 1] += t[j + 1]
+                if t[j + 2] is not None:
+                    s[j + 2] = t[j + 2] if s[j + 2] is None else min(s[j + 2], t[j + 2])
+                    s[j + 3] = t[j + 3] if s[j + 3] is None else max(s[j + 3], t[j + 3])
+        out = []
+        for key in sorted(groups):
+            g = groups[key]
+            item: Dict[str, Any] = dict(zip(group_by, key))
+            item["n"] = g.n
+            for i, m in enumerate(MEASURES):
+                n, total, lo, hi = g.stats[4 * i:4 * i + 4]
+                item[m] = {"n": n, "sum": total, "avg": total / n if n else None, "min": lo, "max": hi}
+            out.append(item)
+        return out
+
+    def records(self, month_from: Optional[str] = None, month_to: Optional[str] = None, **filters: Any) -> List[Dict[str, Any]]:
+        """
+        ドリルダウン: 条件に合う現在のレコード（日付・_id 順）。rows で該当する（セグメント, 行）を引き、
+        そのセグメントだけを読む。絞り込みは rollup() と同じ。
+        """
+        where, args = self._where("rows", month_from, month_to, filters)
+        by_seg: Dict[int, List[int]] = {}
+        for seg, row in self.db.execute(f"SELECT seg, row FROM rows WHERE {where} ORDER BY seg, row", args):
+            by_seg.setdefault(seg, []).append(row)
+        out = []
+        for seg, rows in by_seg.items():
+            (name,) = self.db.execute("SELECT file FROM segments WHERE seg = ?", (seg,)).fetchone()
+            recs = self._read_segment(name)
+            out.extend(recs[i] for i in rows)
+        out.sort(key=lambda r: (str(r.get("date") or ""), str(r["_id"])))
+        return out
+
+    def stats(self) -> Dict[str, Any]:
+        db = self.db
+        segs, nbytes = db.execute("SELECT COUNT(*), COALESCE(SUM(bytes), 0) FROM segments").fetchone()
+        return {
+            "codec": self.codec,
+            "partitions": db.execute("SELECT COUNT(DISTINCT partition) FROM segments").fetchone()[0],
+            "segments": segs,
+            "segment_bytes": nbytes,
+            "records": db.execute("SELECT COUNT(*) FROM rows").fetchone()[0],
+            "rollup_cells": db.execute("SELECT COUNT(*) FROM rollup").fetchone()[0],
+            "cursor": self.cursor,
+        }
+
+
+# ===== ベンチマーク =====
+
+def _scan_rollup(records: List[Dict[str, Any]], group_by: Sequence[str], archive: RecordsArchive) -> Dict[Tuple[str, ...], Tuple[int, Any]]:
+    """全件を走査して (件数, diff の合計) を出す（rollup() の確認用・比較用）。"""
+    out: Dict[Tuple[str, ...], List[Any]] = {}
+    for r in records:
+        key, values = record_facts(r)
+        dims = archive._dims(*key)
+        g = out.setdefault(tuple(dims[d] for d in group_by), [0, 0])
+        g[0] += 1
+        if values[3] is not None:
+            g[1] += values[3]
+    return {k: tuple(v) for k, v in out.items()}
+
+
+def bench(n: int = 200000, codec: str = "gzip") -> Dict[str, Any]:
+    """n 件の合成実績で、records.json の全件走査とアーカイブの集計・差分取り込み・ドリルダウンを比べる。"""
+    import random
+    import shutil
+    import tempfile
+    from records_store import _synthetic_record
+
+    rng = random.Random(1)
+    records = [_synthetic_record(i, rng) for i in range(n)]
+    tmp = tempfile.mkdtemp(prefix="records_archive_bench_")
+    try:
+        json_path = os.path.join(tmp, "records.json")
+        with open(json_path, "w", encoding="utf-8") as f:
+            json.dump(records, f, ensure_ascii=False, indent=4)
+        result: Dict[str, Any] = {"n": n, "json_bytes": os.path.getsize(json_path)}
+        archive = RecordsArchive(os.path.join(tmp, "archive"), codec)
+
+        t0 = time.perf_counter()
+        archive.ingest_json(json_path)
+        result["ingest_s"] = round(time.perf_counter() - t0, 2)
+
+        views = (("month",), ("shape", "thickness"), ("year", "thickness_group", "lot_band"))
+        t0 = time.perf_counter()
+        with open(json_path, encoding="utf-8") as f:
+            data = json.load(f)
+        for v in views:
+            _scan_rollup(data, v, archive)
+        result["json_scan_ms"] = round((time.perf_counter() - t0) * 1000, 1)
+        t0 = time.perf_counter()
+        for v in views:
+            archive.rollup(v)
+        result["rollup_ms"] = round((time.perf_counter() - t0) * 1000, 1)
+
+        # 差分: 100件更新・10件削除
+        changed = [dict(records[i], actual=records[i]["actual"] + 1000, date="2026-12-01") for i in rng.sample(range(n), 100)]
+        gone = [records[i]["_id"] for i in rng.sample(range(n), 10)]
+        t0 = time.perf_counter()
+        archive.apply(changed, gone)
+        result["apply_110_changes_ms"] = round((time.perf_counter() - t0) * 1000, 1)
+        current = {r["_id"]: r for r in records}
+        current.update((r["_id"], r) for r in changed)
+        for rid in gone:
+            current.pop(rid, None)
+        current_list = list(current.values())
+
+        mismatched = 0
+        for v in views:
+            expect = _scan_rollup(current_list, v, archive)
+            got = {tuple(g[d] for d in v): (g["n"], g["diff"]["sum"]) for g in archive.rollup(v)}
+            mismatched += got != expect
+        result["rollup_mismatched_views"] = mismatched
+
+        t0 = time.perf_counter()
+        drill = archive.records(month_from="2024-03", month_to="2024-03", shape="L曲げ")
+        result["drill_ms"] = round((time.perf_counter() - t0) * 1000, 1)
+        expect_ids = sorted(r["_id"] for r in current_list if str(r["date"]).startswith("2024-03") and r["shape"] == "L曲げ")
+        result["drill_rows"] = len(drill)
+        result["drill_ok"] = sorted(r["_id"] for r in drill) == expect_ids and all(r == current[r["_id"]] for r in drill)
+
+        t0 = time.perf_counter()
+        result["compact"] = archive.compact()
+        result["compact_s"] = round(time.perf_counter() - t0, 2)
+        result["archive"] = archive.stats()
+        archive.close()
+        return result
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def main():
+    import argparse
+    p = argparse.ArgumentParser(description="見積り実績のアーカイブ（月パーティション・圧縮セグメント・集計）")
+    p.add_argument("--archive", default=DEFAULT_ARCHIVE_DIR, help="アーカイブのディレクトリ")
+    p.add_argument("--codec", choices=tuple(CODECS), default="gzip", help="新しく書くセグメントの圧縮形式")
+    sub = p.add_subparsers(dest="cmd", required=True)
+    s = sub.add_parser("sync", help="実績ストア（SQLite）の差分を取り込む")
+    s.add_argument("--db", default=None, help="records.sqlite3（省略時は data/records.sqlite3）")
+    i = sub.add_parser("ingest", help="records.json（配列）を取り込む")
+    i.add_argument("json_path")
+    q = sub.add_parser("query", help="集計")
+    q.add_argument("--group-by", nargs="+", default=["month"], choices=DIMENSIONS)
+    d = sub.add_parser("drill", help="条件に合うレコード")
+    for a in (q, d):
+        a.add_argument("--from", dest="month_from", default=None, help="YYYY-MM")
+        a.add_argument("--to", dest="month_to", default=None, help="YYYY-MM")
+        for dim in DIMENSIONS:
+            a.add_argument(f"--{dim.replace('_', '-')}", dest=dim, default=None)
+    sub.add_parser("compact", help="パーティションのセグメントを1つにまとめる")
+    sub.add_parser("stats", help="件数・セグメント数・サイズ")
+    b = sub.add_parser("bench", help="ベンチマーク（一時ディレクトリで実行）")
+    b.add_argument("--n", type=int, default=200000)
+    args = p.parse_args()
+
+    if args.cmd == "bench":
+        print(json.dumps(bench(args.n, args.codec), ensure_ascii=False, indent=2))
+        return 0
+    archive = RecordsArchive(args.archive, args.codec)
+    if args.cmd == "sync":
+        from records_store import DEFAULT_DB_PATH, RecordsStore
+        result: Any = archive.sync(RecordsStore(args.db or DEFAULT_DB_PATH))
+    elif args.cmd == "ingest":
+        result = {"ingested": archive.ingest_json(args.json_path)}
+    elif args.cmd in ("query", "drill"):
+        filters = {dim: getattr(args, dim) for dim in DIMENSIONS if getattr(args, dim) is not None}
+        if args.cmd == "query":
+            result = archive.rollup(args.group_by, args.month_from, args.month_to, **filters)
+        else:
+            result = archive.records(args.month_from, args.month_to, **filters)
+    elif args.cmd == "compact":
+        result = archive.compact()
+    else:
+        result = archive.stats()
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,427 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+見積り実績 API（api/records.php）の差分同期クライアント（標準ライブラリのみ）。
+手元の SQLite（ミラー）に全件の写しとカーソルを持ち、pull() で ?since=<カーソル> の差分だけを取ってくる。
+push() は変更したレコードだけを {"upserts", "deletes"} でまとめて送り、版が合わないものは conflicts で返す。
+通信量・時間は履歴の件数ではなく変更の件数に比例する。
+
+  client = RecordsClient("http://localhost/mitumori/api/records.php", "data/records_mirror.sqlite3")
+  client.pull()                                   # 差分を取り込む（変更が無ければ 304 で本文なし）
+  rec = client.get(rid); rec["qty"] = 20
+  res = client.push(upserts=[rec])                # rec["_version"] は編集元の版 → 楽観ロック
+  for c in res["conflicts"]: ...                  # c["record"] がサーバーの現在の内容
+
+接続は keep-alive のプールで使い回し、応答は gzip で受け取り、大きい書き込みは gzip で送る。
+GET は ETag を覚えておき If-None-Match を付ける。
+
+実行:
+  python3 src/records_client.py --url URL --mirror data/records_mirror.sqlite3 pull
+  python3 src/records_client.py --url URL push changes.json    # {"upserts": [...], "deletes": [...]}
+  python3 src/records_client.py --mirror data/records_mirror.sqlite3 export > records.json
+  python3 src/records_client.py bench --n 100000               # 確認用サーバーを立てて全件 GET と比較
+"""
+
+import gzip
+import http.client
+import json
+import os
+import queue
+import sqlite3
+import sys
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+GZIP_MIN_BYTES = 1024
+PULL_LIMIT = 5000  # サーバーの1回の上限（records_store.MAX_CHANGES）
+
+# 再利用した接続がサーバー側で閉じられていたときに出る例外（新しい接続で1回だけやり直す）
+_STALE_ERRORS = (http.client.RemoteDisconnected, http.client.CannotSendRequest, ConnectionResetError, BrokenPipeError)
+
+
+class RecordsApiError(Exception):
+    """API がエラー（4xx/5xx）を返した。"""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(f"HTTP {status}: {message}")
+        self.status = status
+        self.message = message
+
+
+class ConnectionPool:
+    """
+    1つのホストへの keep-alive 接続のプール。最大 size 本まで同時に使い、使い終わった接続は
+    最後に返したものから再利用する（LIFO。長く使われない接続ほど閉じられやすいため）。
+    """
+
+    def __init__(self, url: str, size: int = 4, timeout: float = 30.0):
+        parts = urlsplit(url)
+        if parts.scheme not in ("http", "https"):
+            raise ValueError(f"http/https の URL を指定してください: {url}")
+        self.scheme = parts.scheme
+        self.host = parts.hostname or "localhost"
+        self.port = parts.port
+        self.path = parts.path or "/"
+        self.timeout = timeout
+        self._idle: "queue.LifoQueue[http.client.HTTPConnection]" = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self.created = 0
+        self.requests = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    def _connect(self) -> http.client.HTTPConnection:
+        cls = http.client.HTTPSConnection if self.scheme == "https" else http.client.HTTPConnection
+        self.created += 1
+        return cls(self.host, self.port, timeout=self.timeout)
+
+    def request(self, method: str, query: str = "", body: Optional[bytes] = None, headers: Optional[Dict[str, str]] = None) -> Tuple[int, Dict[str, str], bytes]:
+        """(status, ヘッダー（小文字のキー）, 本文（圧縮されたまま）) を返す。"""
+        target = self.path + ("?" + query if query else "")
+        with self._slots:
+            for attempt in (0, 1):
+                try:
+                    conn, reused = self._idle.get_nowait(), True
+                except queue.Empty:
+                    conn, reused = self._connect(), False
+                try:
+                    conn.request(method, target, body=body, headers=headers or {})
+                    resp = conn.getresponse()
+                    data = resp.read()
+                except _STALE_ERRORS:
+                    conn.close()
+                    if reused and attempt == 0:
+                        continue
+                    raise
+                except BaseException:
+                    conn.close()
+                    raise
+                if resp.will_close:
+                    conn.close()
+                else:
+                    self._idle.put(conn)
+                self.requests += 1
+                self.bytes_in += len(data)
+                self.bytes_out += len(body or b"")
+                return resp.status, {k.lower(): v for k, v in resp.getheaders()}, data
+        raise AssertionError("unreachable")
+
+    def close(self) -> None:
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+class Mirror:
+    """
+    手元の写し。records（rid → 版・削除済み・JSON）と meta（カーソル・ETag）の2表。
+    削除済みも版ごと残すので、push の結果と pull の差分がどちらの順で届いても新しい版が勝つ。
+    """
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS records (
+        rid     TEXT PRIMARY KEY,
+        version INTEGER NOT NULL,
+        deleted INTEGER NOT NULL DEFAULT 0,
+        data    TEXT
+    );
+    CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+    """
+
+    def __init__(self, path: str = ":memory:"):
+        self.path = path
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        if path != ":memory:":
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(self.SCHEMA)
+
+    def _meta(self, key: str) -> Optional[str]:
+        row = self._db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    @property
+    def cursor(self) -> int:
+        return int(self._meta("cursor") or 0)
+
+    def etag(self, query: str) -> Optional[str]:
+        """前回 query を GET したときの ETag（同じ query で変更が無ければ 304 になる）。"""
+        return self._meta("etag") if self._meta("etag_query") == query else None
+
+    def apply(
+        self, changes: Iterable[Dict[str, Any]], cursor: Optional[int] = None, etag: Optional[Tuple[str, str]] = None
+    ) -> int:
+        """
+        変更を取り込む（手元より古い版は捨てる）。cursor を渡すと一緒に進め、etag=(query, ETag) も覚える。
+        取り込んだ件数を返す。
+        """
+        rows = []
+        for c in changes:
+            if c.get("_deleted"):
+                rows.append((str(c["_id"]), int(c["_version"]), 1, None))
+            else:
+                data = {k: v for k, v in c.items() if k not in ("_version", "_deleted")}
+                rows.append((str(c["_id"]), int(c["_version"]), 0, json.dumps(data, ensure_ascii=False)))
+        with self._lock:
+            db = self._db
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                before = db.total_changes
+                db.executemany(
+                    "INSERT INTO records (rid, version, deleted, data) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT(rid) DO UPDATE SET version = excluded.version, deleted = excluded.deleted, data = excluded.data "
+                    "WHERE excluded.version >= records.version",
+                    rows,
+                )
+                n = db.total_changes - before
+                if cursor is not None:
+                    db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('cursor', ?)", (str(cursor),))
+                    db.execute("DELETE FROM meta WHERE key IN ('etag_query', 'etag')")
+                    if etag:
+                        db.executemany(
+                            "INSERT INTO meta (key, value) VALUES (?, ?)", (("etag_query", etag[0]), ("etag", etag[1]))
+                        )
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+        return n
+
+    def reset(self) -> None:
+        """全部消してカーソルを 0 に戻す（サーバーが古いカーソルを受け付けなくなったとき）。"""
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            self._db.execute("DELETE FROM records")
+            self._db.execute("DELETE FROM meta")
+            self._db.execute("COMMIT")
+
+    def get(self, rid: str) -> Optional[Dict[str, Any]]:
+        row = self._db.execute("SELECT data, version FROM records WHERE rid = ? AND deleted = 0", (rid,)).fetchone()
+        if row is None:
+            return None
+        rec = json.loads(row[0])
+        rec["_version"] = row[1]
+        return rec
+
+    def version(self, rid: str) -> int:
+        row = self._db.execute("SELECT version FROM records WHERE rid = ?", (rid,)).fetchone()
+        return row[0] if row else 0
+
+    def records(self) -> List[Dict[str, Any]]:
+        """削除されていない全レコード（_version 付き）。"""
+        out = []
+        for data, version in self._db.execute("SELECT data, version FROM records WHERE deleted = 0 ORDER BY rowid"):
+            rec = json.loads(data)
+            rec["_version"] = version
+            out.append(rec)
+        return out
+
+    def count(self) -> int:
+        return self._db.execute("SELECT COUNT(*) FROM records WHERE deleted = 0").fetchone()[0]
+
+    def close(self) -> None:
+        self._db.close()
+
+
+class RecordsClient:
+    """api/records.php の差分同期。mirror_path を省略するとメモリ上の写し（プロセス終了で消える）。"""
+
+    def __init__(self, url: str, mirror_path: Optional[str] = None, pool_size: int = 4, timeout: float = 30.0):
+        self.url = url
+        self.pool = ConnectionPool(url, pool_size, timeout)
+        self.mirror = Mirror(mirror_path or ":memory:")
+
+    def _call(self, method: str, query: str = "", payload: Any = None, etag: Optional[str] = None) -> Tuple[int, Dict[str, str], Any]:
+        headers = {"Accept": "application/json", "Accept-Encoding": "gzip"}
+        body = None
+        if payload is not None:
+            body = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+            headers["Content-Type"] = "application/json; charset=utf-8"
+            if len(body) > GZIP_MIN_BYTES:
+                body = gzip.compress(body, 6)
+                headers["Content-Encoding"] = "gzip"
+        if etag:
+            headers["If-None-Match"] = etag
+        status, resp_headers, data = self.pool.request(method, query, body, headers)
+        if resp_headers.get("content-encoding", "").lower() == "gzip":
+            data = gzip.decompress(data)
+        obj = json.loads(data.decode("utf-8")) if data else None
+        if status >= 400 and status not in (409, 410):
+            message = obj.get("error", "") if isinstance(obj, dict) else data[:200].decode("utf-8", "replace")
+            raise RecordsApiError(status, message)
+        return status, resp_headers, obj
+
+    def pull(self, limit: int = PULL_LIMIT) -> Dict[str, Any]:
+        """
+        カーソル以降の差分を more が false になるまで取り込む。
+        戻り値: {"changes": 取り込んだ件数, "requests": 往復数, "not_modified": 変更なし(304), "reset": 最初から取り直した, "cursor"}
+        """
+        stats = {"changes": 0, "requests": 0, "not_modified": False, "reset": False}
+        while True:
+            query = f"since={self.mirror.cursor}&limit={limit}"
+            status, headers, obj = self._call("GET", query, etag=self.mirror.etag(query))
+            stats["requests"] += 1
+            if status == 304:
+                stats["not_modified"] = stats["requests"] == 1
+                break
+            if status == 410:
+                # サーバーが削除済みを物理削除したので、そのカーソルからの差分は出せない
+                if stats["reset"]:
+                    raise RecordsApiError(status, "cursor expired after reset")
+                self.mirror.reset()
+                stats["reset"] = True
+                continue
+            more = bool(obj.get("more"))
+            # ETag はこの query のもの。カーソルが進まなかったとき（変更なし）の次の pull で 304 になる
+            etag = (query, headers["etag"]) if "etag" in headers else None
+            stats["changes"] += self.mirror.apply(obj["changes"], int(obj["cursor"]), etag)
+            if not more:
+                break
+        stats["cursor"] = self.mirror.cursor
+        return stats
+
+    def push(self, upserts: Iterable[Dict[str, Any]] = (), deletes: Iterable[Any] = ()) -> Dict[str, Any]:
+        """
+        まとめて書く。upserts の _version は編集元の版（無ければ上書き、新規は 0）。deletes は _id か
+        {"_id", "_version"}（_version を省くと手元の写しの版で照合する）。
+        書けたものは手元の写しにも反映する（カーソルは進めない。次の pull で同じ版が届いても害はない）。
+        戻り値はサーバーの {"applied", "conflicts", "cursor"}。
+        """
+        upserts = [dict(r) for r in upserts]
+        dels = []
+        for d in deletes:
+            d = {"_id": d} if isinstance(d, str) else dict(d)
+            d.setdefault("_version", self.mirror.version(d["_id"]))
+            dels.append(d)
+        if not upserts and not dels:
+            return {"applied": [], "conflicts": [], "cursor": str(self.mirror.cursor)}
+        status, _, obj = self._call("POST", "", {"upserts": upserts, "deletes": dels})
+        conflicted = {c["_id"] for c in obj["conflicts"]}
+        applied = iter(obj["applied"])
+        changes = []
+        # applied は送った順（upserts → deletes）に、衝突したものを飛ばして並ぶ
+        for rec in upserts:
+            if rec.get("_id") in conflicted:
+                continue
+            a = next(applied)
+            changes.append({**rec, "_id": a["_id"], "_version": a["_version"]})
+        changes.extend(a for a in applied)
+        self.mirror.apply(changes)
+        return obj
+
+    def records(self) -> List[Dict[str, Any]]:
+        return self.mirror.records()
+
+    def get(self, rid: str) -> Optional[Dict[str, Any]]:
+        return self.mirror.get(rid)
+
+    def close(self) -> None:
+        self.pool.close()
+        self.mirror.close()
+
+
+# ===== ベンチマーク（確認用サーバー相手） =====
+
+def bench(n: int = 100000, changed: int = 100) -> Dict[str, Any]:
+    """
+    n 件のストアを確認用サーバーで公開し、(1) 従来の全件 GET、(2) 初回 pull、(3) changed 件を変えた後の pull、
+    (4) 変更なしの pull（304）の受信バイト数と時間を比べる。
+    """
+    import random
+    import tempfile
+
+    import records_stub_server
+    from records_store import RecordsStore, _synthetic_record
+
+    rng = random.Random(0)
+    out: Dict[str, Any] = {"n": n, "changed": changed}
+    with tempfile.TemporaryDirectory() as tmp:
+        store = RecordsStore(os.path.join(tmp, "records.sqlite3"))
+        store.put_many(_synthetic_record(i, rng) for i in range(n))
+        server = records_stub_server.serve_in_thread(store)
+        url = f"http://127.0.0.1:{server.server_address[1]}/api/records.php"
+        client = RecordsClient(url, os.path.join(tmp, "mirror.sqlite3"))
+        try:
+            def measure(label, fn):
+                b0, r0, t0 = client.pool.bytes_in, client.pool.requests, time.perf_counter()
+                fn()
+                out[label] = {
+                    "bytes": client.pool.bytes_in - b0, "requests": client.pool.requests - r0,
+                    "ms": round((time.perf_counter() - t0) * 1000, 1),
+                }
+
+            measure("full_get", lambda: client._call("GET"))
+            measure("initial_pull", client.pull)
+            rids = [r["_id"] for r in rng.sample(client.records(), changed)]
+            for rid in rids[: changed // 2]:
+                rec = store.get(rid)
+                rec["qty"] = int(rec.get("qty") or 0) + 1
+                store.put(rec)
+            for rid in rids[changed // 2:]:
+                store.delete(rid)
+            measure("delta_pull", client.pull)
+            measure("idle_pull", client.pull)
+            assert client.mirror.count() == n - (changed - changed // 2)
+            out["connections"] = client.pool.created
+        finally:
+            client.close()
+            server.shutdown()
+            server.server_close()
+            store.close()
+    return out
+
+
+def main():
+    import argparse
+    p = argparse.ArgumentParser(description="見積り実績 API の差分同期クライアント")
+    p.add_argument("--url", default=None, help="api/records.php の URL")
+    p.add_argument("--mirror", default=None, help="手元の写し（SQLite）のパス")
+    sub = p.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("pull", help="差分を取り込む")
+    sp = sub.add_parser("push", help='{"upserts": [...], "deletes": [...]} の JSON を送る')
+    sp.add_argument("json_path")
+    sub.add_parser("export", help="手元の写しを配列形式で出力")
+    sb = sub.add_parser("bench", help="確認用サーバーで全件 GET と差分同期を比べる")
+    sb.add_argument("--n", type=int, default=100000)
+    sb.add_argument("--changed", type=int, default=100)
+    args = p.parse_args()
+
+    if args.cmd == "bench":
+        print(json.dumps(bench(args.n, args.changed), ensure_ascii=False, indent=2))
+        return 0
+    if args.cmd == "export":
+        mirror = Mirror(args.mirror or ":memory:")
+        json.dump(mirror.records(), sys.stdout, ensure_ascii=False, indent=2)
+        print()
+        return 0
+    if not args.url:
+        p.error("--url が必要です")
+    client = RecordsClient(args.url, args.mirror)
+    try:
+        if args.cmd == "pull":
+            res = client.pull()
+            res["records"] = client.mirror.count()
+        else:
+            with open(args.json_path, encoding="utf-8") as f:
+                data = json.load(f)
+            res = client.push(data.get("upserts") or [], data.get("deletes") or [])
+        print(json.dumps(res, ensure_ascii=False, indent=2))
+    except RecordsApiError as e:
+        print(f"エラー: {e}", file=sys.stderr)
+        return 1
+    finally:
+        client.close()
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,545 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+見積り実績ストア — records.json（配列を丸ごと書き直す方式）の置き換え。
+SQLite（WAL）に1レコード1行で保存し、レコードごとに id（_id）と版（_version）を持つ。
+書き込みは1件ずつトランザクションで行い、版を指定した更新は楽観ロックで衝突を検出する。
+一覧は日付・形状・得意先の索引を使ってページ単位で返す。
+変更のたびに seq（DB 全体で増え続ける番号）を振り直すので、changes_since(seq) で差分だけを取り出せる。
+
+api/records.php も同じ DB ファイル（data/records.sqlite3）・同じスキーマを使う。
+
+実行:
+  python3 src/records_store.py migrate data/records.json   # 既存の配列形式から移行
+  python3 src/records_store.py export > records.json       # 配列形式で書き出し
+  python3 src/records_store.py bench --n 100000            # 10万件ベンチマーク
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+SKILL_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_DB_PATH = os.path.join(SKILL_DIR, "data", "records.sqlite3")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS records (
+    rid        TEXT PRIMARY KEY,
+    version    INTEGER NOT NULL,
+    seq        INTEGER NOT NULL,
+    deleted    INTEGER NOT NULL DEFAULT 0,
+    date       TEXT NOT NULL DEFAULT '',
+    shape      TEXT NOT NULL DEFAULT '',
+    customer   TEXT NOT NULL DEFAULT '',
+    updated_at TEXT NOT NULL,
+    data       TEXT NOT NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_records_seq ON records(seq);
+CREATE INDEX IF NOT EXISTS idx_records_date ON records(deleted, date, rid);
+CREATE INDEX IF NOT EXISTS idx_records_shape ON records(shape, deleted, date, rid);
+CREATE INDEX IF NOT EXISTS idx_records_customer ON records(customer, deleted, date, rid);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+"""
+
+# changes_since() の1回の上限
+MAX_CHANGES = 5000
+
+# 最後に振った seq。compact() で最後の行が消えても番号を使い回さないよう、物理削除した位置も見る
+HEAD_SQL = (
+    "SELECT MAX(COALESCE((SELECT MAX(seq) FROM records), 0), "
+    "COALESCE((SELECT CAST(value AS INTEGER) FROM meta WHERE key = 'purged_seq'), 0))"
+)
+
+# 保存時に data から外し、読み出し時に付け直すキー
+META_KEYS = ("_version", "_deleted")
+
+
+class CursorExpired(Exception):
+    """差分の起点が compact() で消えた削除より前（全件を取り直す必要がある）。"""
+
+    def __init__(self, since: int, purged: int):
+        super().__init__(f"カーソルが古すぎます: {since}（{purged} まで削除済みを物理削除）")
+        self.since = since
+        self.purged = purged
+
+
+class VersionConflict(Exception):
+    """指定した版と保存されている版が違う（他の人が先に更新した）。"""
+
+    def __init__(self, rid: str, expected: Optional[int], current: Optional[int]):
+        super().__init__(f"版が一致しません: {rid}（指定 {expected}, 現在 {current}）")
+        self.rid = rid
+        self.expected = expected
+        self.current = current
+
+
+def new_record_id() -> str:
+    """実績一覧.html の genId() と同じ形式（r_<ミリ秒>_<4文字>）。"""
+    return f"r_{int(time.time() * 1000)}_{uuid.uuid4().hex[:4]}"
+
+
+def _same_data(stored: str, record: Dict[str, Any]) -> bool:
+    """
+    保存済みの data（JSON）と record が同じ内容か。== は 10 と 10.0、1 と True を同じとみなすので、
+    両方を JSON にし直して文字列で比べる（型が変わっただけでも別の内容。api/records.php の same_data() と同じ）。
+    """
+    return json.dumps(json.loads(stored), ensure_ascii=False) == json.dumps(record, ensure_ascii=False)
+
+
+def _now() -> str:
+    return time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime())
+
+
+class RecordsStore:
+    """
+    実績ストア。スレッドごとに接続を持つので、同じインスタンスを複数スレッドから使ってよい。
+    複数プロセスからの同時書き込みは SQLite のロック（BEGIN IMMEDIATE）で直列化される。
+    """
+
+    def __init__(self, path: str = DEFAULT_DB_PATH):
+        self.path = path
+        self._local = threading.local()
+        d = os.path.dirname(os.path.abspath(path))
+        os.makedirs(d, exist_ok=True)
+        self._conn().executescript(SCHEMA)
+
+    # ----- 接続・トランザクション -----
+
+    def _conn(self) -> sqlite3.Connection:
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=30.0, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    @contextmanager
+    def _tx(self):
+        """書き込みトランザクション。開始時に書き込みロックを取る（BEGIN IMMEDIATE）。"""
+        db = self._conn()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            yield db
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        db.execute("COMMIT")
+
+    def close(self) -> None:
+        db = getattr(self._local, "db", None)
+        if db is not None:
+            db.close()
+            self._local.db = None
+
+    # ----- 読み出し -----
+
+    @staticmethod
+    def _decode(row: Tuple) -> Dict[str, Any]:
+        data, version, deleted = row
+        rec = json.loads(data)
+        rec["_version"] = version
+        if deleted:
+            rec["_deleted"] = True
+        return rec
+
+    def get(self, rid: str, include_deleted: bool = False) -> Optional[Dict[str, Any]]:
+        row = self._conn().execute(
+            "SELECT data, version, deleted FROM records WHERE rid = ?", (rid,)
+        ).fetchone()
+        if row is None or (row[2] and not include_deleted):
+            return None
+        return self._decode(row)
+
+    @staticmethod
+    def _where(date_from, date_to, shape, customer) -> Tuple[str, List[Any]]:
+        cond = ["deleted = 0"]
+        args: List[Any] = []
+        if shape is not None:
+            cond.append("shape = ?")
+            args.append(shape)
+        if customer is not None:
+            cond.append("customer = ?")
+            args.append(customer)
+        if date_from is not None:
+            cond.append("date >= ?")
+            args.append(date_from)
+        if date_to is not None:
+            cond.append("date <= ?")
+            args.append(date_to)
+        return " AND ".join(cond), args
+
+    def query(
+        self,
+        date_from: Optional[str] = None,
+        date_to: Optional[str] = None,
+        shape: Optional[str] = None,
+        customer: Optional[str] = None,
+        limit: int = 100,
+        cursor: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """
+        日付の新しい順に1ページ分を返す。{"records": [...], "next_cursor": str or None}
+        next_cursor を次の呼び出しの cursor に渡すと続きを返す（キーセット方式なので深いページも速い）。
+        """
+        where, args = self._where(date_from, date_to, shape, customer)
+        if cursor:
+            c_date, _, c_rid = cursor.partition("\t")
+            where += " AND (date, rid) < (?, ?)"
+            args += [c_date, c_rid]
+        rows = self._conn().execute(
+            f"SELECT data, version, deleted, date, rid FROM records WHERE {where} "
+            "ORDER BY date DESC, rid DESC LIMIT ?",
+            args + [limit + 1],
+        ).fetchall()
+        more = len(rows) > limit
+        rows = rows[:limit]
+        next_cursor = f"{rows[-1][3]}\t{rows[-1][4]}" if more and rows else None
+        return {"records": [self._decode(r[:3]) for r in rows], "next_cursor": next_cursor}
+
+    def count(
+        self,
+        date_from: Optional[str] = None,
+        date_to: Optional[str] = None,
+        shape: Optional[str] = None,
+        customer: Optional[str] = None,
+    ) -> int:
+        where, args = self._where(date_from, date_to, shape, customer)
+        return self._conn().execute(f"SELECT COUNT(*) FROM records WHERE {where}", args).fetchone()[0]
+
+    # ----- 差分 -----
+
+    def head(self) -> int:
+        """最後の変更の seq（変更が無ければ 0）。"""
+        return self._conn().execute(HEAD_SQL).fetchone()[0]
+
+    def purged_seq(self) -> int:
+        """compact() で物理削除した行の seq の最大値。これより前のカーソルからは差分を出せない。"""
+        row = self._conn().execute("SELECT value FROM meta WHERE key = 'purged_seq'").fetchone()
+        return int(row[0]) if row else 0
+
+    def changes_since(self, since: int = 0, limit: int = 1000) -> Dict[str, Any]:
+        """
+        seq が since より後の変更を seq 順に返す。{"changes": [...], "cursor": 最後の seq, "more": bool}
+        削除は {"_id", "_version", "_deleted": true} だけを返す。since=0 なら全件（削除済みを含む）。
+        変更が無ければ cursor は since のまま。
+        """
+        limit = max(1, min(MAX_CHANGES, limit))
+        db = self._conn()
+        if since:
+            purged = self.purged_seq()
+            if since < purged:
+                raise CursorExpired(since, purged)
+        rows = db.execute(
+            "SELECT rid, version, deleted, seq, data FROM records WHERE seq > ? ORDER BY seq LIMIT ?",
+            (since, limit + 1),
+        ).fetchall()
+        more = len(rows) > limit
+        rows = rows[:limit]
+        changes = []
+        for rid, version, deleted, _seq, data in rows:
+            if deleted:
+                changes.append({"_id": rid, "_version": version, "_deleted": True})
+            else:
+                changes.append(self._decode((data, version, 0)))
+        return {"changes": changes, "cursor": rows[-1][3] if rows else since, "more": more}
+
+    def all_records(self) -> List[Dict[str, Any]]:
+        """削除されていない全レコード（登録順）。records.json 互換の配列を作るとき用。"""
+        rows = self._conn().execute(
+            "SELECT data, version, deleted FROM records WHERE deleted = 0 ORDER BY seq"
+        ).fetchall()
+        return [self._decode(r) for r in rows]
+
+    # ----- 書き込み -----
+
+    @staticmethod
+    def _next_seq(db: sqlite3.Connection) -> int:
+        return db.execute(HEAD_SQL).fetchone()[0] + 1
+
+    def _put(self, db: sqlite3.Connection, record: Dict[str, Any], expected_version: Optional[int]) -> Dict[str, Any]:
+        rec = {k: v for k, v in record.items() if k not in META_KEYS}
+        rid = rec.get("_id") or new_record_id()
+        rec["_id"] = rid
+        row = db.execute("SELECT data, version, deleted FROM records WHERE rid = ?", (rid,)).fetchone()
+        current = row[1] if row else None
+        if expected_version is not None and expected_version != (current or 0):
+            raise VersionConflict(rid, expected_version, current)
+        if row is not None and not row[2] and _same_data(row[0], rec):
+            # 内容が同じなら書かない（版・seq を上げると差分同期で変更として配られてしまう）
+            rec["_version"] = current
+            return rec
+        version = (current or 0) + 1
+        db.execute(
+            "INSERT OR REPLACE INTO records (rid, version, seq, deleted, date, shape, customer, updated_at, data) "
+            "VALUES (?, ?, ?, 0, ?, ?, ?, ?, ?)",
+            (
+                rid, version, self._next_seq(db),
+                str(rec.get("date") or ""), str(rec.get("shape") or ""), str(rec.get("customer") or ""),
+                _now(), json.dumps(rec, ensure_ascii=False),
+            ),
+        )
+        rec["_version"] = version
+        return rec
+
+    def put(self, record: Dict[str, Any], expected_version: Optional[int] = None) -> Dict[str, Any]:
+        """
+        1件を追加・更新し、_id・_version を付けて返す。_id が無ければ採番する。
+        内容が保存済みと同じなら何も書かない（版・seq はそのまま）。
+        expected_version を渡すと、保存済みの版と一致するときだけ書く（新規は 0）。
+        """
+        with self._tx() as db:
+            return self._put(db, record, expected_version)
+
+    def put_many(self, records: Iterable[Dict[str, Any]]) -> int:
+        """版を確認せずにまとめて書く（移行・取り込み用）。1トランザクション。"""
+        n = 0
+        with self._tx() as db:
+            for rec in records:
+                self._put(db, rec, None)
+                n += 1
+        return n
+
+    def replace_all(self, records: List[Dict[str, Any]], since: Optional[int] = None) -> Dict[str, Any]:
+        """
+        従来の配列 POST（records.json を丸ごと書き直す方式）: records を全件とみなして1トランザクションで書く。
+        内容が保存済みと同じレコードは書かない（版・seq はそのまま）。
+        配列に無い _id は、since（配列を取得した時点の head()）以前に変わったものだけ論理削除する
+        （計算書の deleteRecord() は消したいレコードを除いた配列を送ってくる）。取得後に他の端末が追加・更新した
+        レコードはクライアントが見ていないので消さない。since が無ければ何も削除しない。
+        _version があれば照合し、1件でも合わなければ VersionConflict で何も書かない。
+        戻り値: {"records": [{"_id", "_version"}], "deleted": 論理削除した件数}
+        """
+        saved: List[Dict[str, Any]] = []
+        keep = set()
+        with self._tx() as db:
+            for rec in records:
+                rid = rec.get("_id")
+                version = self._unchanged_version(db, rec) if rid else None
+                if version is None:
+                    expected = rec.get("_version")
+                    r = self._put(db, rec, None if expected is None else int(expected))
+                    rid, version = r["_id"], r["_version"]
+                keep.add(rid)
+                saved.append({"_id": rid, "_version": version})
+            gone = [] if since is None else [
+                r for (r,) in db.execute("SELECT rid FROM records WHERE deleted = 0 AND seq <= ?", (since,)) if r not in keep
+            ]
+            for rid in gone:
+                db.execute(
+                    "UPDATE records SET version = version + 1, seq = ?, deleted = 1, updated_at = ? WHERE rid = ?",
+                    (self._next_seq(db), _now(), rid),
+                )
+        return {"records": saved, "deleted": len(gone)}
+
+    @staticmethod
+    def _unchanged_version(db: sqlite3.Connection, record: Dict[str, Any]) -> Optional[int]:
+        """保存済み（削除されていない）の内容が record と同じならその版、違えば None。"""
+        row = db.execute("SELECT data, version, deleted FROM records WHERE rid = ?", (record["_id"],)).fetchone()
+        if row is None or row[2]:
+            return None
+        rec = {k: v for k, v in record.items() if k not in META_KEYS}
+        return row[1] if _same_data(row[0], rec) else None
+
+    def delete(self, rid: str, expected_version: Optional[int] = None) -> bool:
+        """論理削除（版を上げて削除済みにする）。見つからなければ False。"""
+        with self._tx() as db:
+            row = db.execute("SELECT version, deleted FROM records WHERE rid = ?", (rid,)).fetchone()
+            if row is None or row[1]:
+                return False
+            if expected_version is not None and expected_version != row[0]:
+                raise VersionConflict(rid, expected_version, row[0])
+            db.execute(
+                "UPDATE records SET version = version + 1, seq = ?, deleted = 1, updated_at = ? WHERE rid = ?",
+                (self._next_seq(db), _now(), rid),
+            )
+            return True
+
+    def apply_batch(self, upserts: Iterable[Dict[str, Any]] = (), deletes: Iterable[Dict[str, Any]] = ()) -> Dict[str, Any]:
+        """
+        差分の書き込み（1トランザクション）。版が合わないものは書かずに conflicts に入れ、残りは書く。
+          upserts  レコード。_version があれば「編集元の版」（新規は 0）として照合する。無ければ上書き
+          deletes  {"_id", "_version"?}。削除済み・存在しないものは何もしない（applied に削除済みとして返す）
+        戻り値: {"applied": [{"_id", "_version", "_deleted"?}], "conflicts": [{"_id", "op", "_version": 現在の版, "record": 現在の内容 or None}]}
+        """
+        applied: List[Dict[str, Any]] = []
+        conflicts: List[Dict[str, Any]] = []
+
+        def current(db, rid):
+            row = db.execute("SELECT data, version, deleted FROM records WHERE rid = ?", (rid,)).fetchone()
+            return (row[1], None if row[2] else self._decode(row)) if row else (0, None)
+
+        with self._tx() as db:
+            for rec in upserts:
+                expected = rec.get("_version")
+                try:
+                    saved = self._put(db, rec, None if expected is None else int(expected))
+                except VersionConflict as e:
+                    version, data = current(db, e.rid)
+                    conflicts.append({"_id": e.rid, "op": "upsert", "_version": version, "record": data})
+                    continue
+                applied.append({"_id": saved["_id"], "_version": saved["_version"]})
+            for d in deletes:
+                rid = str(d.get("_id") or "")
+                if not rid:
+                    raise ValueError("削除には _id が必要です")
+                row = db.execute("SELECT version, deleted FROM records WHERE rid = ?", (rid,)).fetchone()
+                expected = d.get("_version")
+                if row is not None and expected is not None and int(expected) != row[0]:
+                    version, data = current(db, rid)
+                    conflicts.append({"_id": rid, "op": "delete", "_version": version, "record": data})
+                    continue
+                if row is None or row[1]:
+                    applied.append({"_id": rid, "_version": row[0] if row else 0, "_deleted": True})
+                    continue
+                db.execute(
+                    "UPDATE records SET version = version + 1, seq = ?, deleted = 1, updated_at = ? WHERE rid = ?",
+                    (self._next_seq(db), _now(), rid),
+                )
+                applied.append({"_id": rid, "_version": row[0] + 1, "_deleted": True})
+        return {"applied": applied, "conflicts": conflicts}
+
+    def compact(self) -> int:
+        """削除済みの行を物理削除して VACUUM する。消した件数を返す（それより前の差分カーソルは使えなくなる）。"""
+        with self._tx() as db:
+            purged = db.execute("SELECT MAX(seq) FROM records WHERE deleted = 1").fetchone()[0]
+            if purged is not None:
+                db.execute(
+                    "INSERT INTO meta (key, value) VALUES ('purged_seq', ?) "
+                    "ON CONFLICT(key) DO UPDATE SET value = MAX(CAST(value AS INTEGER), CAST(excluded.value AS INTEGER))",
+                    (str(purged),),
+                )
+            n = db.execute("DELETE FROM records WHERE deleted = 1").rowcount
+        self._conn().execute("VACUUM")
+        return n
+
+    # ----- 移行 -----
+
+    def migrate_json(self, json_path: str) -> int:
+        """records.json（レコードの配列）を取り込む。同じ _id があれば上書き。"""
+        with open(json_path, encoding="utf-8") as f:
+            data = json.load(f)
+        if not isinstance(data, list):
+            raise ValueError(f"配列ではありません: {json_path}")
+        return self.put_many(r for r in data if isinstance(r, dict))
+
+
+# ===== ベンチマーク =====
+
+def _synthetic_record(i: int, rng) -> Dict[str, Any]:
+    shapes = ["L曲げ", "コの字曲げ", "Z曲げ", "C型曲げ", "ハット曲げ", "三方曲げ", "四方曲げ"]
+    thick = ["1.6", "2.3", "3.2", "4.5", "6.0", "9.0", "12.0"]
+    calc = rng.randint(3, 200) * 100
+    return {
+        "_id": f"r_bench_{i:07d}",
+        "id": f"NO_{500000 + i}",
+        "date": f"20{rng.randint(22, 26)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+        "shape": rng.choice(shapes),
+        "thickness": rng.choice(thick),
+        "material": rng.choice(["SS400", "SUS304"]),
+        "length": rng.randint(40, 3000),
+        "width": rng.randint(30, 1500),
+        "qty": rng.choice([1, 2, 5, 10, 20, 50]),
+        "actual": calc + rng.randint(-5, 10) * 10,
+        "calc": calc,
+        "customer": f"得意先{rng.randint(1, 300):03d}",
+        "note": "",
+    }
+
+
+def bench(n: int = 100000, path: Optional[str] = None) -> Dict[str, Any]:
+    """n 件を入れて、旧方式（配列 JSON の全読み・全書き）と比べる。"""
+    import random
+    import tempfile
+
+    rng = random.Random(1)
+    records = [_synthetic_record(i, rng) for i in range(n)]
+    tmp = tempfile.mkdtemp(prefix="records_bench_")
+    db_path = path or os.path.join(tmp, "records.sqlite3")
+    json_path = os.path.join(tmp, "records.json")
+    result: Dict[str, Any] = {"n": n}
+
+    # 旧方式: 1件保存 = 全件読み込み + 全件書き直し
+    with open(json_path, "w", encoding="utf-8") as f:
+        json.dump(records, f, ensure_ascii=False, indent=4)
+    t0 = time.perf_counter()
+    with open(json_path, encoding="utf-8") as f:
+        data = json.load(f)
+    result["json_get_all_ms"] = round((time.perf_counter() - t0) * 1000, 2)
+    t0 = time.perf_counter()
+    data.append(_synthetic_record(n, rng))
+    with open(json_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=4)
+    result["json_save_one_ms"] = round((time.perf_counter() - t0) * 1000, 2)
+
+    store = RecordsStore(db_path)
+    t0 = time.perf_counter()
+    store.migrate_json(json_path)
+    result["migrate_ms"] = round((time.perf_counter() - t0) * 1000, 2)
+
+    k = 200
+    t0 = time.perf_counter()
+    for i in range(k):
+        store.put(_synthetic_record(n + 1 + i, rng), expected_version=0)
+    result["put_one_ms"] = round((time.perf_counter() - t0) * 1000 / k, 3)
+
+    t0 = time.perf_counter()
+    for i in range(k):
+        rec = store.get(f"r_bench_{rng.randrange(n):07d}")
+        rec["note"] = "更新"
+        store.put(rec, expected_version=rec["_version"])
+    result["update_one_ms"] = round((time.perf_counter() - t0) * 1000 / k, 3)
+
+    t0 = time.perf_counter()
+    page = store.query(limit=50)
+    result["page_first_ms"] = round((time.perf_counter() - t0) * 1000, 3)
+    t0 = time.perf_counter()
+    for _ in range(20):
+        page = store.query(limit=50, cursor=page["next_cursor"])
+    result["page_next_ms"] = round((time.perf_counter() - t0) * 1000 / 20, 3)
+    t0 = time.perf_counter()
+    store.query(shape="ハット曲げ", date_from="2025-01-01", date_to="2025-12-31", limit=50)
+    result["filter_shape_date_ms"] = round((time.perf_counter() - t0) * 1000, 3)
+    t0 = time.perf_counter()
+    store.query(customer="得意先042", limit=50)
+    result["filter_customer_ms"] = round((time.perf_counter() - t0) * 1000, 3)
+    store.close()
+    return result
+
+
+def main():
+    import argparse
+    import sys
+    p = argparse.ArgumentParser(description="見積り実績ストア（SQLite）")
+    p.add_argument("--db", default=DEFAULT_DB_PATH, help="DB ファイル")
+    sub = p.add_subparsers(dest="cmd", required=True)
+    m = sub.add_parser("migrate", help="records.json（配列）を取り込む")
+    m.add_argument("json_path")
+    sub.add_parser("export", help="配列形式の JSON を標準出力へ")
+    sub.add_parser("compact", help="削除済みの行を物理削除")
+    b = sub.add_parser("bench", help="ベンチマーク（一時ファイルで実行）")
+    b.add_argument("--n", type=int, default=100000)
+    args = p.parse_args()
+
+    if args.cmd == "bench":
+        print(json.dumps(bench(args.n), ensure_ascii=False, indent=2))
+        return 0
+    store = RecordsStore(args.db)
+    if args.cmd == "migrate":
+        n = store.migrate_json(args.json_path)
+        print(f"取り込みました: {n} 件 → {args.db}", file=sys.stderr)
+    elif args.cmd == "export":
+        json.dump(store.all_records(), sys.stdout, ensure_ascii=False, indent=2)
+        print()
+    elif args.cmd == "compact":
+        print(f"削除: {store.compact()} 件", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
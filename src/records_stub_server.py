@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+api/records.php の代わりになる開発・確認用サーバー（標準ライブラリのみ、PHP の無い環境向け）。
+同じ DB（records_store.RecordsStore）・同じ URL のクエリと JSON で答える:
+  GET  [?limit=&cursor=&shape=&customer=&date_from=&date_to=]  一覧（全件のときは X-Records-Cursor に head）
+  GET  ?since=<cursor>&limit=                                  差分
+  POST [?since=<X-Records-Cursor>] [...]                       全件として書き込み
+  POST {"upserts": [...], "deletes": [...]}                    差分の書き込み
+  DELETE ?id=&version=
+ETag / If-None-Match（304）、gzip（応答・POST 本文）、HTTP/1.1 keep-alive に対応。
+
+実行: python3 src/records_stub_server.py [--db data/records.sqlite3] [--port 8766]
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Optional
+from urllib.parse import parse_qs, urlsplit
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from records_store import DEFAULT_DB_PATH, MAX_CHANGES, CursorExpired, RecordsStore, VersionConflict  # noqa: E402
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8766
+GZIP_MIN_BYTES = 1024
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True  # ヘッダーと本文を別々に書くので、小さい応答が遅延 ACK 待ちにならないように
+    store: RecordsStore  # make_server() が設定する
+
+    def log_message(self, fmt, *args):  # noqa: D401 - 標準エラーへのアクセスログは出さない
+        pass
+
+    # ----- 応答 -----
+
+    def _send(self, status: int, payload: Any = None, etag: Optional[str] = None, cursor: Optional[int] = None) -> None:
+        body = b"" if payload is None else json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        gzipped = len(body) > GZIP_MIN_BYTES and "gzip" in self.headers.get("Accept-Encoding", "")
+        if gzipped:
+            body = gzip.compress(body, 6)
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Vary", "Accept-Encoding")
+        if etag:
+            self.send_header("ETag", etag)
+        if cursor is not None:
+            self.send_header("X-Records-Cursor", str(cursor))
+        if gzipped:
+            self.send_header("Content-Encoding", "gzip")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _fail(self, status: int, message: str) -> None:
+        self._send(status, {"error": message})
+
+    def _query(self):
+        parts = urlsplit(self.path)
+        return parts.query, {k: v[-1] for k, v in parse_qs(parts.query, keep_blank_values=True).items()}
+
+    def _body(self) -> Optional[bytes]:
+        n = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(n) if n else b""
+        if self.headers.get("Content-Encoding", "").lower() == "gzip":
+            try:
+                body = gzip.decompress(body)
+            except OSError:
+                return None
+        return body
+
+    # ----- メソッド -----
+
+    def do_GET(self):
+        raw_query, q = self._query()
+        store = self.store
+        head = store.head()  # 一覧を読む前に取る（あとの変更はこの番号より後になる）
+        etag = '"%d-%d-%s"' % (head, store.purged_seq(), hashlib.md5(raw_query.encode()).hexdigest()[:8])
+        for tag in self.headers.get("If-None-Match", "").split(","):
+            tag = tag.strip()
+            if tag.startswith("W/"):
+                tag = tag[2:]
+            if tag in (etag, "*"):
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+
+        if "since" in q:
+            try:
+                since = int(q["since"] or 0)
+            except ValueError:
+                since = 0
+            try:
+                res = store.changes_since(since, int(q.get("limit") or 1000))
+            except CursorExpired:
+                self._send(410, {"error": "Cursor expired", "cursor": "0"}, etag)
+                return
+            res["cursor"] = str(res["cursor"])
+            self._send(200, res, etag)
+            return
+        if not any(k in q for k in ("limit", "cursor", "shape", "customer", "date_from", "date_to")):
+            self._send(200, store.all_records(), etag, head)
+            return
+        page = store.query(
+            date_from=q.get("date_from"), date_to=q.get("date_to"), shape=q.get("shape"),
+            customer=q.get("customer"), limit=max(1, min(1000, int(q.get("limit") or 100))), cursor=q.get("cursor") or None,
+        )
+        self._send(200, page, etag)
+
+    def do_POST(self):
+        _, q = self._query()
+        body = self._body()
+        if body is None:
+            self._fail(400, "Invalid gzip body")
+            return
+        try:
+            data = json.loads(body.decode("utf-8"))
+        except (UnicodeDecodeError, ValueError):
+            data = None
+        if isinstance(data, dict) and ("upserts" in data or "deletes" in data):
+            upserts, deletes = data.get("upserts") or [], data.get("deletes") or []
+            if not isinstance(upserts, list) or not isinstance(deletes, list):
+                self._fail(400, "upserts and deletes must be arrays")
+                return
+            if len(upserts) + len(deletes) > MAX_CHANGES:
+                self._fail(413, "Too many changes")
+                return
+            if not all(isinstance(r, dict) for r in upserts + deletes):
+                self._fail(400, "Invalid record")
+                return
+            try:
+                res = self.store.apply_batch(upserts, deletes)
+            except ValueError as e:
+                self._fail(400, str(e))
+                return
+            self._send(200, {"ok": True, **res, "cursor": str(self.store.head())})
+            return
+        if not isinstance(data, list):
+            self._fail(400, "Invalid JSON array")
+            return
+        if not all(isinstance(r, dict) for r in data):
+            self._fail(400, "Invalid record")
+            return
+        # 従来の配列: 全件とみなす（無い _id は since までに変わったものだけ削除、同じ内容は書かない）。
+        # 1件でも版が合わなければ何も書かない
+        try:
+            since = int(q["since"]) if q.get("since") else None
+        except ValueError:
+            self._fail(400, "Invalid since")
+            return
+        try:
+            res = self.store.replace_all(data, since)
+        except VersionConflict as e:
+            self._send(409, {"error": "Version conflict", "_id": e.rid, "_version": e.current or 0})
+            return
+        self._send(200, {"ok": True, **res})
+
+    def do_DELETE(self):
+        _, q = self._query()
+        rid = q.get("id", "")
+        if not rid:
+            self._fail(400, "id is required")
+            return
+        version = q.get("version")
+        try:
+            ok = self.store.delete(rid, None if version in (None, "") else int(version))
+        except VersionConflict as e:
+            self._send(409, {"error": "Version conflict", "_id": rid, "_version": e.current})
+            return
+        if not ok:
+            self._fail(404, "Not found")
+            return
+        self._send(200, {"ok": True, "_id": rid, "_version": self.store.get(rid, include_deleted=True)["_version"]})
+
+
+def make_server(store: RecordsStore, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT) -> ThreadingHTTPServer:
+    """store を返すサーバーを作る（port=0 なら空いている番号）。serve_forever() は呼び出し側で。"""
+    handler = type("RecordsHandler", (_Handler,), {"store": store})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def serve_in_thread(store: RecordsStore, host: str = DEFAULT_HOST, port: int = 0) -> ThreadingHTTPServer:
+    """裏のスレッドで動かす（確認・ベンチマーク用）。止めるときは server.shutdown()。"""
+    server = make_server(store, host, port)
+    threading.Thread(target=server.serve_forever, name="records-stub", daemon=True).start()
+    return server
+
+
+def main():
+    import argparse
+    p = argparse.ArgumentParser(description="api/records.php 互換の確認用サーバー")
+    p.add_argument("--db", default=DEFAULT_DB_PATH, help="DB ファイル")
+    p.add_argument("--host", default=DEFAULT_HOST)
+    p.add_argument("--port", type=int, default=DEFAULT_PORT)
+    args = p.parse_args()
+    server = make_server(RecordsStore(args.db), args.host, args.port)
+    print(f"records API（確認用）: http://{args.host}:{server.server_address[1]}/", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
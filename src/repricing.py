@@ -0,0 +1,371 @@
+# -*- coding: utf-8 -*-
+"""
+価格表の変更による実績の再計算 — 実績一覧（records.json / records.sqlite3）の各レコードを
+v2.1 の estimate() で計算した単価（税抜・1個あたり）について、価格表を変えたらどれがいくら変わるかを出す。
+
+全件を計算し直す代わりに:
+  1. 新旧の価格表を比べ、価格が変わったセル（形状, 重量区分, 長さ区分）を出す。
+     形状の重量範囲そのものが変わった（行の追加・削除）ときは、その形状全体を対象にする。
+  2. レコードごとの区分キー（形状, 重量区分, 長さ区分, ピアスの板厚帯）を整数にして並べた転置索引から、
+     変わったセルに入るレコードだけを取り出す（キーの範囲を二分探索）。
+  3. そのレコードだけを estimate_many() で計算し直し、レコード別の差額と集計を返す。
+
+レコードの入力: shape, thickness, material, length（展開L）, width（展開W）, qty。
+重量は 展開L × 展開W × 板厚 × 比重（nesting.weight_kg() と同じ）、長辺は展開L・W の大きい方。
+punch_count / pierce_count / nakagoshi などがあれば使う。要 numpy。
+
+実行:
+  python3 src/repricing.py --old 旧.csv --new src/data/bending_price_table.csv --records data/records.sqlite3
+  python3 src/repricing.py --bench 1000000     # 合成データで全件再計算と比べる
+"""
+
+import json
+import os
+import sys
+import time
+from typing import Any, Dict, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import calc_bending  # noqa: E402
+import nesting  # noqa: E402
+from calc_bending import LENGTH_COLUMNS, PIERCE_THICKNESS_BANDS, PriceTable  # noqa: E402
+
+# キーの桁: 形状 × 重量区分 × 長さ区分 × 板厚帯（板厚帯が一番下の桁なので、セル1つはキーの連続した範囲になる）
+N_LENGTH = len(LENGTH_COLUMNS)
+N_BAND = len(PIERCE_THICKNESS_BANDS) + 1
+
+OPTION_FLAGS = (
+    ("nakagoshi", calc_bending.FLAG_NAKAGOSHI),
+    ("reverse_bend", calc_bending.FLAG_REVERSE_BEND),
+    ("meoshi_long", calc_bending.FLAG_MEOSHI_LONG),
+    ("fukabend", calc_bending.FLAG_FUKABEND),
+)
+
+
+def load_records(path: str) -> List[Dict[str, Any]]:
+    """records.json（配列）または records_store の SQLite ファイルから、削除されていないレコード。"""
+    if path.endswith((".sqlite3", ".db")):
+        from records_store import RecordsStore
+        store = RecordsStore(path)
+        try:
+            return store.all_records()
+        finally:
+            store.close()
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    if not isinstance(data, list):
+        raise ValueError(f"配列ではありません: {path}")
+    return [r for r in data if isinstance(r, dict)]
+
+
+def diff_tables(old: PriceTable, new: PriceTable) -> Dict[str, Any]:
+    """
+    価格表の差分。
+      cells  価格が変わったセル [{"shape", "weight_index", "weight_class", "length_class", "old", "new"}]
+      shapes 重量範囲が変わった・追加・削除された形状（その形状のレコードは全部対象）
+    """
+    cells = []
+    shapes = []
+    for shape in sorted(set(old.shapes) | set(new.shapes)):
+        if shape not in old.shapes or shape not in new.shapes:
+            shapes.append(shape)
+            continue
+        ow, nw = old.weight_thresholds(shape), new.weight_thresholds(shape)
+        if ow != nw:
+            shapes.append(shape)
+            continue
+        orows, nrows = old._by_shape[shape][1], new._by_shape[shape][1]
+        for i, (o, n) in enumerate(zip(orows, nrows)):
+            for j, col in enumerate(LENGTH_COLUMNS):
+                if o[col] != n[col]:
+                    cells.append({
+                        "shape": shape, "weight_index": i, "weight_class": f"{ow[i]}kg",
+                        "length_index": j, "length_class": col, "old": o[col], "new": n[col],
+                    })
+    return {"cells": cells, "shapes": shapes}
+
+
+class RepricingIndex:
+    """
+    実績レコードの列と区分キーの転置索引。最初に全件を table で計算しておき、
+    reprice(new_table) のたびに変わったセルのレコードだけを計算し直して、自分の単価と表を更新する。
+    """
+
+    def __init__(self, records: List[Dict[str, Any]], table: PriceTable, rates: Optional[Dict[str, Any]] = None, tax_rate: float = 0.1):
+        np = calc_bending._import_numpy()
+        self.np = np
+        self.tax_rate = tax_rate
+        rates = rates if rates is not None else nesting.load_rates()
+
+        ids: List[str] = []
+        labels: List[str] = []
+        shape_names: List[str] = []
+        shape_code: Dict[str, int] = {}
+        cols: Dict[str, List[float]] = {k: [] for k in ("shape", "weight_kg", "length_mm", "long_side_mm", "lot", "thickness_mm", "punch_count", "pierce_count", "flags")}
+        self.skipped: List[Dict[str, Any]] = []
+        for rec in records:
+            try:
+                shape = str(rec["shape"])
+                thickness = float(rec["thickness"])
+                length = float(rec["length"])
+                width = float(rec["width"])
+                lot = int(rec.get("qty") or 1)
+            except (KeyError, TypeError, ValueError):
+                self.skipped.append({"_id": rec.get("_id"), "reason": "形状・板厚・展開寸法が不足"})
+                continue
+            code = shape_code.get(shape)
+            if code is None:
+                code = shape_code[shape] = len(shape_names)
+                shape_names.append(shape)
+            flags = 0
+            for name, bit in OPTION_FLAGS:
+                if calc_bending._parse_flag(rec.get(name, False)):
+                    flags |= bit
+            ids.append(rec.get("_id"))
+            labels.append(rec.get("id"))
+            cols["shape"].append(code)
+            cols["weight_kg"].append(nesting.weight_kg(length * width, thickness, str(rec.get("material") or "SS400"), rates))
+            cols["length_mm"].append(length)
+            cols["long_side_mm"].append(max(length, width))
+            cols["lot"].append(lot)
+            cols["thickness_mm"].append(thickness)
+            cols["punch_count"].append(int(rec.get("punch_count") or 0))
+            cols["pierce_count"].append(int(rec.get("pierce_count") or 0))
+            cols["flags"].append(flags)
+
+        self.ids = ids
+        self.labels = labels
+        self.shapes = shape_names
+        self.shape = np.asarray(cols.pop("shape"), dtype=np.int64)
+        for k in ("punch_count", "pierce_count", "flags"):
+            setattr(self, k, np.asarray(cols.pop(k), dtype=np.int64))
+        for k, v in cols.items():
+            setattr(self, k, np.asarray(v, dtype=np.float64))
+        self.lot = self.lot.astype(np.int64)
+
+        n = len(ids)
+        self.length_index = np.minimum(
+            np.searchsorted(np.asarray(calc_bending.LENGTH_THRESHOLDS, dtype=np.float64), self.length_mm, side="left"),
+            N_LENGTH - 1,
+        )
+        self.band = np.searchsorted(np.asarray(PIERCE_THICKNESS_BANDS, dtype=np.float64), self.thickness_mm, side="left")
+        self.weight_index = np.zeros(n, dtype=np.int64)
+        self.table = table
+        self._classify(np.arange(n))
+        self._build_index()
+        # 単価（税抜・1個）。価格表に形状が無いレコードは -1
+        self.unit = self._price(np.arange(n), table)
+
+    # ----- 区分キーと索引 -----
+
+    def _weight_width(self) -> int:
+        """重量区分の桁の幅（どちらの表でも足りるよう余裕を持たせる）。"""
+        return max([len(self.table.weight_thresholds(s)) for s in self.table.shapes] + [1]) * 2
+
+    def _classify(self, rows) -> None:
+        """rows の重量区分を現在の表で決め直す。"""
+        np = self.np
+        arrays = self.table.shape_arrays(np)
+        for code in np.unique(self.shape[rows]).tolist():
+            entry = arrays.get(self.shapes[code])
+            sel = rows[self.shape[rows] == code]
+            if entry is None:
+                self.weight_index[sel] = 0
+                continue
+            weights = entry[0]
+            self.weight_index[sel] = np.minimum(np.searchsorted(weights, self.weight_kg[sel], side="left"), len(weights) - 1)
+
+    def _build_index(self) -> None:
+        np = self.np
+        self.n_weight = max(self._weight_width(), int(self.weight_index.max(initial=0)) + 1)
+        key = ((self.shape * self.n_weight + self.weight_index) * N_LENGTH + self.length_index) * N_BAND + self.band
+        self.order = np.argsort(key, kind="stable")
+        self.sorted_keys = key[self.order]
+
+    def _key(self, shape_code: int, weight_index: int = 0, length_index: int = 0, band: int = 0) -> int:
+        return ((shape_code * self.n_weight + weight_index) * N_LENGTH + length_index) * N_BAND + band
+
+    def rows_for(self, shape: str, weight_index: Optional[int] = None, length_index: Optional[int] = None) -> Any:
+        """セル（省略した軸は全部）に入るレコードの行番号。"""
+        if shape not in self.shapes:
+            return self.np.zeros(0, dtype=self.np.int64)
+        code = self.shapes.index(shape)
+        if weight_index is None:
+            lo, hi = self._key(code), self._key(code + 1)
+        elif length_index is None:
+            lo, hi = self._key(code, weight_index), self._key(code, weight_index + 1)
+        else:
+            lo, hi = self._key(code, weight_index, length_index), self._key(code, weight_index, length_index + 1)
+        a, b = self.np.searchsorted(self.sorted_keys, [lo, hi], side="left")
+        return self.order[a:b]
+
+    # ----- 計算 -----
+
+    def _price(self, rows, table: PriceTable) -> Any:
+        """rows を table で計算した単価（rows と同じ順。表に無い形状は -1）。"""
+        np = self.np
+        out = np.full(len(rows), -1, dtype=np.int64)
+        if len(rows) == 0:
+            return out
+        index = {name: i for i, name in enumerate(table.shapes)}
+        to_table = np.asarray([index.get(s, -1) for s in self.shapes], dtype=np.int64)
+        codes = to_table[self.shape[rows]]
+        ok = codes >= 0
+        r = rows[ok]
+        if len(r):
+            res = calc_bending.estimate_many(
+                codes[ok], self.weight_kg[r], self.length_mm[r], self.long_side_mm[r], self.lot[r], self.thickness_mm[r],
+                self.punch_count[r], self.pierce_count[r], self.flags[r], tax_rate=self.tax_rate, table=table,
+            )
+            out[ok] = res["processing_cost_tax_excluded"]
+        return out
+
+    def affected_rows(self, diff: Dict[str, Any]) -> Any:
+        np = self.np
+        parts = [self.rows_for(s) for s in diff["shapes"]]
+        whole = set(diff["shapes"])
+        parts += [self.rows_for(c["shape"], c["weight_index"], c["length_index"]) for c in diff["cells"] if c["shape"] not in whole]
+        if not parts:
+            return np.zeros(0, dtype=np.int64)
+        return np.unique(np.concatenate(parts))
+
+    def reprice(self, new_table: PriceTable, top: Optional[int] = None) -> Dict[str, Any]:
+        """
+        new_table に差し替えたときの差分を出し、索引の単価と表を new_table に更新する。
+        records は差額のあるレコード（|差額 × 数量| の大きい順、top 件まで）。
+        """
+        np = self.np
+        t0 = time.perf_counter()
+        diff = diff_tables(self.table, new_table)
+        rows = self.affected_rows(diff)
+        old_unit = self.unit[rows].copy()
+        self.table = new_table
+        if diff["shapes"]:
+            # 重量範囲が変わった形状は区分を決め直して索引を作り直す
+            self._classify(rows)
+            self._build_index()
+        new_unit = self._price(rows, new_table)
+        self.unit[rows] = new_unit
+        elapsed = time.perf_counter() - t0
+
+        both = (old_unit >= 0) & (new_unit >= 0)
+        delta = np.where(both, new_unit - old_unit, 0)
+        changed = both & (delta != 0)
+        order_delta = delta * self.lot[rows]
+
+        by_shape: Dict[str, Dict[str, int]] = {}
+        for code in np.unique(self.shape[rows[changed]]).tolist():
+            sel = changed & (self.shape[rows] == code)
+            by_shape[self.shapes[code]] = {
+                "records": int(sel.sum()),
+                "unit_delta_sum": int(delta[sel].sum()),
+                "order_delta_sum": int(order_delta[sel].sum()),
+            }
+        by_cell = []
+        for c in diff["cells"]:
+            cell_rows = self.rows_for(c["shape"], c["weight_index"], c["length_index"])
+            pos = np.searchsorted(rows, cell_rows)
+            sel = changed[pos]
+            by_cell.append({**c, "records": int(len(cell_rows)), "changed": int(sel.sum()), "order_delta_sum": int(order_delta[pos][sel].sum())})
+
+        idx = np.nonzero(changed)[0]
+        idx = idx[np.argsort(-np.abs(order_delta[idx]), kind="stable")]
+        if top is not None:
+            idx = idx[:top]
+        detail = []
+        for k in idx.tolist():
+            r = int(rows[k])
+            old, new = int(old_unit[k]), int(new_unit[k])
+            detail.append({
+                "_id": self.ids[r], "id": self.labels[r], "shape": self.shapes[self.shape[r]],
+                "old": old, "new": new, "delta": new - old,
+                "delta_pct": round((new - old) / old * 100, 2) if old else None,
+                "qty": int(self.lot[r]), "order_delta": int(order_delta[k]),
+            })
+
+        return {
+            "changed_cells": len(diff["cells"]),
+            "changed_shapes": diff["shapes"],
+            "records_total": len(self.ids),
+            "records_affected": int(len(rows)),
+            "records_changed": int(changed.sum()),
+            "records_unpriced": int(((old_unit < 0) | (new_unit < 0)).sum()),
+            "unit_delta_sum": int(delta.sum()),
+            "order_delta_sum": int(order_delta.sum()),
+            "elapsed_ms": round(elapsed * 1000, 2),
+            "by_shape": by_shape,
+            "by_cell": by_cell,
+            "records": detail,
+        }
+
+    def reprice_all(self, table: PriceTable) -> Any:
+        """全件を table で計算した単価（比較・検証用。索引は更新しない）。"""
+        return self._price(self.np.arange(len(self.ids)), table)
+
+
+def load_table(path: str) -> PriceTable:
+    """プロセス内キャッシュを通さずに CSV を読む（新旧2つを並べて持つため）。"""
+    with open(path, encoding="utf-8") as f:
+        return PriceTable(calc_bending._parse_price_rows(f.read().splitlines()))
+
+
+def bench(n: int = 1000000, cells: int = 5, seed: int = 1) -> Dict[str, Any]:
+    """合成レコード n 件で、セルを cells 個変えたときの差分再計算と全件再計算を比べる。"""
+    import random
+    from records_store import _synthetic_record
+
+    rng = random.Random(seed)
+    t0 = time.perf_counter()
+    records = [_synthetic_record(i, rng) for i in range(n)]
+    old = load_table(calc_bending.DEFAULT_TABLE_PATH)
+    result: Dict[str, Any] = {"n": n, "generate_s": round(time.perf_counter() - t0, 2)}
+
+    t0 = time.perf_counter()
+    index = RepricingIndex(records, old)
+    result["index_build_s"] = round(time.perf_counter() - t0, 2)
+
+    new_rows = [dict(r) for r in old.rows]
+    for r in rng.sample(new_rows, cells):
+        r[rng.choice(LENGTH_COLUMNS)] += 100
+    new = PriceTable(new_rows)
+
+    t0 = time.perf_counter()
+    full = index.reprice_all(new)
+    result["full_reprice_s"] = round(time.perf_counter() - t0, 3)
+
+    before = index.unit.copy()
+    t0 = time.perf_counter()
+    report = index.reprice(new, top=10)
+    result["incremental_reprice_s"] = round(time.perf_counter() - t0, 3)
+    result["records_affected"] = report["records_affected"]
+    result["records_changed"] = report["records_changed"]
+    result["matches_full"] = bool((index.unit == full).all())
+    result["changed_matches_full"] = int((before != full).sum()) == report["records_changed"]
+    return result
+
+
+def main():
+    import argparse
+    p = argparse.ArgumentParser(description="価格表の変更で実績の単価がどう変わるか（変わったセルのレコードだけ再計算）")
+    p.add_argument("--old", help="変更前の bending_price_table.csv")
+    p.add_argument("--new", default=calc_bending.DEFAULT_TABLE_PATH, help="変更後の bending_price_table.csv（既定: 現在の表）")
+    p.add_argument("--records", help="records.json または records.sqlite3")
+    p.add_argument("--top", type=int, default=100, help="レコード別の差額を何件まで出すか")
+    p.add_argument("--bench", type=int, default=None, metavar="N", help="合成データ N 件でベンチマーク")
+    args = p.parse_args()
+
+    if args.bench is not None:
+        print(json.dumps(bench(args.bench), ensure_ascii=False, indent=2))
+        return 0
+    if not args.old or not args.records:
+        p.error("--old と --records が必要です（または --bench）")
+    index = RepricingIndex(load_records(args.records), load_table(args.old))
+    report = index.reprice(load_table(args.new), top=args.top)
+    report["records_skipped"] = len(index.skipped)
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
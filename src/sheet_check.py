@@ -0,0 +1,334 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+計算書（build_calc_sheet.py が書く Excel の数式）と Python の計算の突き合わせ。LibreOffice は使わず、
+ビルダーが組み立てるセルと数式をそのまま sheet_formula.Workbook で評価する。
+
+Python 側:
+  比重・重量・基準価格・形状乗率・数量調整・単価   calc_sheet（calc_weight()・calc_見積り_税抜()）
+  穴あけ                                           calc_bending.hole_result(holes=…)（穴あけ単価表の標準。
+                                                   径の指定なしの丸穴と長穴）
+  曲げ工賃・消費税・合計                           単価×数量＋穴あけ、税込は計算書の ROUND(税抜*0.1,0) と同じ fixed_point.tax_included(…, "half_up")
+
+入力は価格が一定になる領域ごとに1点だけ選ぶ（密な格子は使わない）。軸の境目は data の表からそのまま取る:
+  重量   prices.json の重量区分       長さ   prices.json の長さ区分
+  数量   rates.json の数量調整の min/max   板厚   hole_prices.json の板厚min/max
+境目ごとに「境目ちょうど」と両側の区間を別の領域にする（price_sweep.split_range() に LE・GE の両方の境目を
+渡す）。計算書と Python で境目がどちらの区間に入るかが違っても見つけられるように。
+  価格の格子  形状 × 材質 × 重量 × 長さ × 数量（重量は fit_weight() で展開幅・板厚を選んで合わせる）
+  穴の格子    材質 × 板厚 × 丸穴/長穴
+単価は板厚に重量を通してしか依存しない（重量は格子で直接振っている）ので、2つの格子で全領域を覆う。
+比重が数値でない材質（CP400 の縞板）は Python 側が計算しないので対象外として報告する。
+
+各件で項目を比べ、食い違いの元になった項目（計算書の数式で参照している項目はすべて一致しているのに
+値が違うもの。下流の食い違いは数えない）ごとに件数と例を出す。どちらもエラー（Excel のエラー値・"" と
+Python の例外）なら一致とみなす。
+
+実行: python3 src/sheet_check.py [--examples 3] [--json]
+  食い違いがあれば終了コード 1。要 openpyxl（build_calc_sheet.py を読み込むため）。
+"""
+
+import functools
+import json
+import math
+import os
+import sys
+import time
+from itertools import product
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import calc_bending  # noqa: E402
+import calc_sheet  # noqa: E402
+import fixed_point  # noqa: E402
+import hole_table  # noqa: E402
+import price_sweep  # noqa: E402
+from sheet_formula import ExcelError, Workbook, compile_formula  # noqa: E402
+
+QUOTE_SHEET = "見積り"
+DATA_SHEET = "データ"
+# 比べる項目（計算順）。重量区分・長さ区分は計算書の中間の行番号なので比べず、基準価格で比べる
+CHECK_KEYS = ("比重", "重量", "基準価格", "形状乗率", "数量調整", "単価", "穴あけ", "曲げ工賃", "消費税", "合計")
+# 数値の比較の許容（相対）。重量は両方とも同じ順番の浮動小数点演算なので、実際は完全に一致する
+REL_TOL = 1e-9
+
+
+class EngineError(str):
+    """Python 側の計算が例外になったときの値（メッセージ）。"""
+
+
+def _builder():
+    """build_calc_sheet（スキルルートにある）を読み込む。"""
+    if calc_sheet.SKILL_DIR not in sys.path:
+        sys.path.insert(0, calc_sheet.SKILL_DIR)
+    import build_calc_sheet
+    return build_calc_sheet
+
+
+def build_workbook(prices: Dict[str, Any], rates: Dict[str, Any], hole_prices: Optional[Dict[str, Any]]) -> Tuple[Workbook, Dict[str, str]]:
+    """
+    ビルダーと同じレイアウトの「データ」「見積り」シートを Workbook にする。戻り値は (ブック, 項目名 → 見積りシートの番地)。
+    一覧シート（--summary）の数式も評価器が読めることを確かめる（同じ calc_formulas() の式で、番地だけが違う）。
+    """
+    b = _builder()
+    data_sheet, ranges = b.layout_data_sheet(prices, rates, hole_prices)
+    quote_sheet = b.layout_quote_sheet(b.DEFAULT_QUOTE, rates, ranges)
+    for value, _ in b.summary_row(1, b.DEFAULT_QUOTE, ranges):
+        if isinstance(value, str) and value.startswith("="):
+            compile_formula(value, "一覧")
+    wb = Workbook({
+        DATA_SHEET: {k: v for k, (v, _) in data_sheet.cells.items()},
+        QUOTE_SHEET: {k: v for k, (v, _) in quote_sheet.cells.items()},
+    })
+    refs = {key: f"B{row}" for row, key, _ in b.QUOTE_INPUT_ROWS + b.QUOTE_CALC_ROWS}
+    return wb, refs
+
+
+def dependencies(wb: Workbook, refs: Dict[str, str]) -> Dict[str, set]:
+    """CHECK_KEYS の各項目 → 計算書の数式で（間接的にも）参照している CHECK_KEYS の項目。"""
+    names = {wb.key(QUOTE_SHEET, ref): name for name, ref in refs.items()}
+    out = {}
+    for name in CHECK_KEYS:
+        seen, stack = set(), [wb.key(QUOTE_SHEET, refs[name])]
+        while stack:
+            f = wb.formulas.get(stack.pop())
+            for cell in f.cells if f is not None else ():
+                if cell not in seen:
+                    seen.add(cell)
+                    stack.append(cell)
+        out[name] = {names[c] for c in seen if names.get(c) in CHECK_KEYS}
+    return out
+
+
+def sheet_values(wb: Workbook, refs: Dict[str, str], quote: Dict[str, Any]) -> Dict[str, Any]:
+    """見積りシートに quote を入れて CHECK_KEYS の値を評価する。"""
+    for key in _builder().QUOTE_FIELDS:
+        wb.set(QUOTE_SHEET, refs[key], quote[key])
+    return {key: wb.get(QUOTE_SHEET, refs[key]) for key in CHECK_KEYS}
+
+
+def engine_values(quote: Dict[str, Any], prices: Dict[str, Any], rates: Dict[str, Any], holes: Optional[hole_table.HoleTable]) -> Dict[str, Any]:
+    """Python 側の CHECK_KEYS の値。例外になった項目（とそれに依存する項目）は EngineError。"""
+    out: Dict[str, Any] = {}
+    gravity = rates["比重"].get(quote["材質"])
+    out["比重"] = gravity if gravity is not None else EngineError(f"未知の材質: {quote['材質']}")
+    if gravity is not None:
+        out["重量"] = calc_sheet.calc_weight(quote["展開幅_mm"], quote["製品長さ_mm"], quote["板厚_mm"], gravity)
+    try:
+        r = calc_sheet.calc_見積り_税抜(quote, prices, rates)
+        out.update({"基準価格": r["基準価格"], "形状乗率": r["形状乗率"], "数量調整": r["数量調整"], "単価": r["単価_税抜"]})
+        bending = r["見積り_税抜"]
+    except ValueError as e:
+        bending = EngineError(str(e))
+    try:
+        specs = [{"type": "丸穴", "count": quote["丸穴数"]}, {"type": "長穴", "count": quote["長穴数"]}]
+        out["穴あけ"] = 0 if holes is None else calc_bending.hole_result(quote["板厚_mm"], holes=specs, hole_prices=holes).total
+    except ValueError as e:
+        out["穴あけ"] = EngineError(str(e))
+    if isinstance(bending, EngineError) or isinstance(out["穴あけ"], EngineError):
+        err = bending if isinstance(bending, EngineError) else out["穴あけ"]
+        out.update({"曲げ工賃": err, "消費税": err, "合計": err})
+    else:
+        excl = bending + out["穴あけ"]
+        incl = fixed_point.tax_included(excl, 0.1, "half_up")
+        out.update({"曲げ工賃": excl, "消費税": incl - excl, "合計": incl})
+    for key in CHECK_KEYS:
+        out.setdefault(key, EngineError("計算できません"))
+    return out
+
+
+def _missing(v: Any) -> bool:
+    return isinstance(v, (ExcelError, EngineError)) or v == ""
+
+
+def same(sheet: Any, engine: Any) -> bool:
+    """計算書の値と Python の値が同じか（どちらも値なし・数値は相対 REL_TOL）。"""
+    if _missing(sheet) or _missing(engine):
+        return _missing(sheet) and _missing(engine)
+    if isinstance(sheet, (int, float)) and isinstance(engine, (int, float)) and not isinstance(sheet, bool):
+        return abs(sheet - engine) <= REL_TOL * max(1.0, abs(sheet), abs(engine))
+    return sheet == engine
+
+
+# ===== 代表点 =====
+
+def axis_points(edges: Sequence[float], lo: float, hi: float, integer: bool = False) -> List[float]:
+    """[lo, hi] を edges のそれぞれで「境目ちょうど」と両側に分けた各区間から1点（integer なら整数の無い区間は除く）。"""
+    cuts = [(t, price_sweep.LE) for t in edges] + [(t, price_sweep.GE) for t in edges]
+    points = []
+    for piece in price_sweep.split_range(lo, hi, cuts):
+        if integer:
+            x = math.floor(piece["hi"]) if piece["hi_closed"] else math.ceil(piece["hi"]) - 1
+            if not price_sweep.contains(piece, x):
+                continue
+        else:
+            x = price_sweep.representative(piece)
+        points.append(x)
+    return points
+
+
+# 価格の格子で重量を合わせるときに試す板厚（単価は板厚に重量を通してしか依存しないので、どれを使ってもよい）
+FIT_THICKNESSES_MM = (3.2, 1.6, 2.3, 4.5, 6.0, 9.0, 12.0)
+
+
+@functools.lru_cache(maxsize=None)
+def fit_weight(weight_kg: float, length_mm: float, gravity: float) -> Tuple[float, float, bool]:
+    """
+    calc_weight() がちょうど weight_kg になる (展開幅, 板厚, ちょうどか)。FIT_THICKNESSES_MM の順に、
+    計算した展開幅の前後数 ulp を試す。どれでも合わなければ最初の板厚で近い値（ちょうどか = False）。
+    """
+    for t in FIT_THICKNESSES_MM:
+        w = weight_kg * 1e6 / (length_mm * t * gravity)
+        up = down = w
+        if calc_sheet.calc_weight(w, length_mm, t, gravity) == weight_kg:
+            return w, t, True
+        for _ in range(16):
+            up, down = math.nextafter(up, math.inf), math.nextafter(down, -math.inf)
+            for c in (up, down):
+                if calc_sheet.calc_weight(c, length_mm, t, gravity) == weight_kg:
+                    return c, t, True
+    t = FIT_THICKNESSES_MM[0]
+    return weight_kg * 1e6 / (length_mm * t * gravity), t, False
+
+
+def quotes(prices: Dict[str, Any], rates: Dict[str, Any], holes: Optional[hole_table.HoleTable], base: Dict[str, Any]):
+    """(格子名, 代表点での軸の値, 入力) を順に返す。"""
+    materials = [m for m, g in rates["比重"].items() if isinstance(g, (int, float))]
+    weights = prices["重量区分"]
+    lengths = prices["長さ区分"]
+    qty_edges = sorted({b[k] for b in rates["数量調整"] for k in ("min", "max") if b[k] is not None})
+    w_pts = axis_points(weights, min(weights) / 2, max(weights) * 2)
+    l_pts = axis_points(lengths, min(lengths) / 2, max(lengths) * 2)
+    q_pts = axis_points(qty_edges, 1, max(qty_edges) * 2, integer=True)
+    edges = set(weights)
+    for shape, material, w, length, qty in product(rates["形状乗率"], materials, w_pts, l_pts, q_pts):
+        width, t, exact = fit_weight(w, length, rates["比重"][material])
+        q = dict(base, 形状=shape, 材質=material, 板厚_mm=t, 展開幅_mm=width, 製品長さ_mm=length, 数量=qty, 丸穴数=0, 長穴数=0)
+        # 境目の重量にちょうど合わせられなかった点（境目のどちら側に入るかは確かめられていない）
+        yield "価格", {"重量": w, "inexact": w in edges and not exact}, q
+    if holes is None:
+        return
+    edges = sorted(set(holes.mins) | set(holes.maxs))
+    t_pts = axis_points(edges, min(edges) / 2, max(edges) * 2)
+    for material, t, (maru, naga) in product(materials, t_pts, ((1, 0), (0, 1))):
+        yield "穴あけ", {}, dict(base, 材質=material, 板厚_mm=t, 丸穴数=maru, 長穴数=naga)
+
+
+# ===== 突き合わせ =====
+
+def check(examples: int = 3) -> Dict[str, Any]:
+    """
+    全領域の代表点で計算書と Python を比べる。戻り値:
+      rows          比べた件数（grids に格子ごとの件数）
+      mismatched    どこかの項目が食い違った件数
+      by_cell       食い違いの元になった項目 → {"count", "examples": [{"input", "axes", "sheet", "engine", "sheet_classes"}]}
+      inexact_weights    境目ちょうどの重量に合わせられなかった点
+      skipped_materials  Python 側で計算しない材質
+      evaluations   数式を実際に評価した回数（同じ参照値の組は1回）
+    """
+    started = time.perf_counter()
+    b = _builder()
+    prices, rates, hole_prices = b.load_data()
+    holes = hole_table.HoleTable(hole_prices["穴あけ単価"]) if hole_prices else None
+    wb, refs = build_workbook(prices, rates, hole_prices)
+    inputs = b.QUOTE_FIELDS
+
+    deps = dependencies(wb, refs)
+    grids: Dict[str, int] = {}
+    by_cell: Dict[str, Dict[str, Any]] = {}
+    mismatched = 0
+    inexact = set()
+    for grid, axes, q in quotes(prices, rates, holes, b.DEFAULT_QUOTE):
+        grids[grid] = grids.get(grid, 0) + 1
+        if axes.pop("inexact", False):
+            inexact.add((axes["重量"], q["製品長さ_mm"], q["材質"]))
+        theirs = sheet_values(wb, refs, q)
+        mine = engine_values(q, prices, rates, holes)
+        diff = {key for key in CHECK_KEYS if not same(theirs[key], mine[key])}
+        if not diff:
+            continue
+        mismatched += 1
+        for key in CHECK_KEYS:
+            # 参照先がすべて一致しているのに値が違う項目だけを数える（下流の食い違いは数えない）
+            if key not in diff or deps[key] & diff:
+                continue
+            entry = by_cell.setdefault(key, {"count": 0, "examples": []})
+            entry["count"] += 1
+            if len(entry["examples"]) < examples:
+                entry["examples"].append({
+                    "input": {k: q[k] for k in inputs}, "axes": axes,
+                    "sheet": _jsonable(theirs[key]), "engine": _jsonable(mine[key]),
+                    "sheet_classes": [wb.get(QUOTE_SHEET, refs["重量区分"]), wb.get(QUOTE_SHEET, refs["長さ区分"])],
+                })
+    return {
+        "rows": sum(grids.values()),
+        "grids": grids,
+        "mismatched": mismatched,
+        "by_cell": {k: by_cell[k] for k in CHECK_KEYS if k in by_cell},
+        "skipped_materials": [m for m, g in rates["比重"].items() if not isinstance(g, (int, float))],
+        "inexact_weights": [{"重量": w, "製品長さ_mm": length, "材質": m} for w, length, m in sorted(inexact)],
+        "evaluations": wb.evaluations,
+        "seconds": round(time.perf_counter() - started, 3),
+    }
+
+
+def _jsonable(v: Any) -> Any:
+    if isinstance(v, ExcelError):
+        return v.code
+    if isinstance(v, EngineError):
+        return f"エラー: {v}"
+    return v
+
+
+def format_report(result: Dict[str, Any]) -> str:
+    grids = "・".join(f"{k} {v:,}" for k, v in result["grids"].items())
+    lines = [
+        f"計算書と Python の突き合わせ: {result['rows']:,} 件（{grids}）、"
+        f"数式の評価 {result['evaluations']:,} 回、{result['seconds']:.2f} 秒",
+    ]
+    if result["skipped_materials"]:
+        lines.append(f"対象外の材質: {', '.join(result['skipped_materials'])}（Python 側に比重が無い）")
+    if result["inexact_weights"]:
+        pts = {(p["重量"], p["材質"]) for p in result["inexact_weights"]}
+        lines.append(f"境目ちょうどの重量に合わせられなかった点: {len(result['inexact_weights'])} 件（"
+                     + "、".join(f"{m} {w}kg" for w, m in sorted(pts)) + "。展開幅の丸めで届かない）")
+    if not result["mismatched"]:
+        lines.append("すべて一致")
+        return "\n".join(lines)
+    lines.append(f"食い違い: {result['mismatched']:,} 件。元になった項目ごと:")
+    for key, entry in result["by_cell"].items():
+        lines.append(f"  {key}: {entry['count']:,} 件")
+        for ex in entry["examples"]:
+            q = ex["input"]
+            desc = " ".join(f"{k}={_short(v)}" for k, v in q.items())
+            if ex["axes"]:
+                desc += " (" + " ".join(f"{k}={_short(v)}" for k, v in ex["axes"].items()) + ")"
+            lines.append(f"    {desc}")
+            lines.append(f"      計算書 {_short(ex['sheet'])} / Python {_short(ex['engine'])}"
+                         f"（計算書の重量区分・長さ区分 {_short(ex['sheet_classes'][0])}・{_short(ex['sheet_classes'][1])}）")
+    return "\n".join(lines)
+
+
+def _short(v: Any) -> str:
+    if isinstance(v, float):
+        return f"{v:.6g}"
+    return str(v)
+
+
+def main():
+    import argparse
+    p = argparse.ArgumentParser(description="計算書（Excel の数式）と Python の計算の突き合わせ")
+    p.add_argument("--examples", type=int, default=3, help="項目ごとに出す例の数")
+    p.add_argument("--json", action="store_true", help="結果を JSON で出力")
+    args = p.parse_args()
+    result = check(args.examples)
+    if args.json:
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+    else:
+        print(format_report(result))
+    return 1 if result["mismatched"] else 0
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,581 @@
+# -*- coding: utf-8 -*-
+"""
+計算書（build_calc_sheet.py が書く Excel）の数式の評価器 — LibreOffice・Excel なしで計算書の値を出すための、
+ビルダーが使う範囲だけを評価する（標準ライブラリのみ）。
+
+対応: 数値・文字列・TRUE/FALSE、セル参照（B4 / $B$4 / データ!$A$1:$B$9）、+ - * / と比較（= <> < > <= >=）、
+関数 IF・IFERROR・MOD・ROUND・INDEX・MATCH・VLOOKUP・SUMPRODUCT。範囲を含む演算は要素ごとの配列になる
+（SUMPRODUCT の中の配列式）。エラー値（#N/A・#VALUE!・#REF!・#DIV/0!）は ExcelError で伝わり、IFERROR で
+受け止められる。これ以外の関数・演算子（& ^ % など）は compile_formula() が FormulaError にする
+（ビルダーが新しい書き方を使い始めたら、評価できないことがすぐ分かるように）。
+
+Excel に合わせているところ:
+  - 空のセル（値 "" のセルも。openpyxl は空のセルとして書く）は数値の演算で 0、比較では相手に合わせて 0 か ""。
+    数式の結果が空のセルなら 0
+  - 文字列の比較は大文字小文字を区別しない。型が違うときは 数値 < 文字列 < 論理値
+  - ROUND は有効15桁に直してから 0.5 を 0 から遠い方へ丸める（ROUND(2.675,2)=2.68）
+  - MOD(n, d) = n - d*INT(n/d)（結果は d と同じ符号）
+  - MATCH(…,1)・VLOOKUP(…,TRUE) は範囲が昇順に並んでいるものとして「値以下の最後」を返す
+
+  wb = Workbook({"見積り": {(5, 2): 3.2, (22, 2): "=ROUND(B5*10,0)"}})
+  wb.get("見積り", "B22")   # 32.0
+  wb.set("見積り", "B5", 1.6)
+"""
+
+import math
+import re
+from decimal import ROUND_HALF_UP, Decimal
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+CellKey = Tuple[str, int, int]                  # (シート名, 行, 列)
+RangeKey = Tuple[str, int, int, int, int]       # (シート名, 先頭行, 先頭列, 末尾行, 末尾列)
+
+
+class ExcelError(NamedTuple):
+    """Excel のエラー値。"""
+
+    code: str
+
+    def __repr__(self) -> str:
+        return self.code
+
+
+NA = ExcelError("#N/A")
+VALUE = ExcelError("#VALUE!")
+REF = ExcelError("#REF!")
+DIV0 = ExcelError("#DIV/0!")
+
+
+class FormulaError(ValueError):
+    """評価器が対応していない数式（読めない書式・関数・演算子）。"""
+
+
+class Formula(NamedTuple):
+    """コンパイル済みの数式。cells は直接参照する1セルの参照、ranges は範囲の参照（どちらも出てくる順）。"""
+
+    text: str
+    fn: Callable[["Workbook"], Any]
+    cells: Tuple[CellKey, ...]
+    ranges: Tuple[RangeKey, ...]
+
+
+# ===== セル番地 =====
+
+_CELL = re.compile(r"\$?([A-Za-z]{1,3})\$?([0-9]+)$")
+
+
+def parse_cell(ref: str) -> Tuple[int, int]:
+    """"B4" / "$B$4" → (行, 列)。"""
+    m = _CELL.match(ref)
+    if not m:
+        raise FormulaError(f"セル番地が不正です: {ref!r}")
+    col = 0
+    for ch in m.group(1).upper():
+        col = col * 26 + ord(ch) - 64
+    return int(m.group(2)), col
+
+
+# ===== 字句解析 =====
+
+_TOKEN = re.compile(r"""
+    (?P<ws>\s+)
+  | (?P<str>"(?:[^"]|"")*")
+  | (?P<func>[A-Za-z][A-Za-z0-9.]*)(?=\()
+  | (?P<ref>(?:(?P<sheet>'(?:[^']|'')+'|[^\W\d][\w.]*)!)?\$?[A-Za-z]{1,3}\$?[0-9]+(?::\$?[A-Za-z]{1,3}\$?[0-9]+)?)(?![\w.!(])
+  | (?P<num>(?:[0-9]+\.?[0-9]*|\.[0-9]+)(?:[eE][+-]?[0-9]+)?)
+  | (?P<bool>TRUE|FALSE)\b
+  | (?P<op><>|<=|>=|[-+*/=<>(),])
+""", re.X)
+
+
+def _tokenize(text: str) -> List[Tuple[str, Any]]:
+    tokens = []
+    pos = 0
+    while pos < len(text):
+        m = _TOKEN.match(text, pos)
+        if not m:
+            raise FormulaError(f"数式を読めません: {text!r}（{pos + 1} 文字目 {text[pos]!r}）")
+        pos = m.end()
+        kind = m.lastgroup
+        if kind == "ws":
+            continue
+        value = m.group(kind)
+        if kind == "ref":
+            value = (m.group("sheet"), value)
+        tokens.append((kind, value))
+    tokens.append(("end", None))
+    return tokens
+
+
+# ===== 値の変換 =====
+
+def _number(v: Any) -> Any:
+    """演算用の数値。変換できなければ #VALUE!（エラー値はそのまま）。"""
+    cls = v.__class__
+    if cls is int or cls is float:
+        return v
+    if v is None:
+        return 0
+    if cls is bool:
+        return int(v)
+    if cls is ExcelError:
+        return v
+    if cls is str:
+        try:
+            return float(v)
+        except ValueError:
+            return VALUE
+    return VALUE
+
+
+def _truth(v: Any) -> Any:
+    """IF の条件。"""
+    cls = v.__class__
+    if cls is bool:
+        return v
+    if cls is int or cls is float:
+        return v != 0
+    if v is None:
+        return False
+    if cls is ExcelError:
+        return v
+    if cls is str and v.upper() in ("TRUE", "FALSE"):
+        return v.upper() == "TRUE"
+    return VALUE
+
+
+def _rank(v: Any) -> int:
+    cls = v.__class__
+    if cls is bool:
+        return 2
+    if cls is str:
+        return 1
+    return 0
+
+
+def _cmp(a: Any, b: Any) -> int:
+    """Excel の大小（-1 / 0 / 1）。a・b はエラー値でないこと。"""
+    if a is None:
+        a = "" if b.__class__ is str else (False if b.__class__ is bool else 0)
+    if b is None:
+        b = "" if a.__class__ is str else (False if a.__class__ is bool else 0)
+    ra, rb = _rank(a), _rank(b)
+    if ra != rb:
+        return -1 if ra < rb else 1
+    if ra == 1:
+        a, b = a.lower(), b.lower()
+    return (a > b) - (a < b)
+
+
+def excel_round(x: float, digits: int = 0) -> float:
+    """Excel の ROUND（有効15桁に直してから、0.5 は 0 から遠い方へ）。"""
+    d = Decimal(format(x, ".15g"))
+    return float(d.quantize(Decimal(1).scaleb(-int(digits)), rounding=ROUND_HALF_UP))
+
+
+def _arith(op: str, a: Any, b: Any) -> Any:
+    a = _number(a)
+    if a.__class__ is ExcelError:
+        return a
+    b = _number(b)
+    if b.__class__ is ExcelError:
+        return b
+    if op == "+":
+        return a + b
+    if op == "-":
+        return a - b
+    if op == "*":
+        return a * b
+    if b == 0:
+        return DIV0
+    return a / b
+
+
+_COMPARE = {
+    "=": lambda c: c == 0, "<>": lambda c: c != 0, "<": lambda c: c < 0,
+    ">": lambda c: c > 0, "<=": lambda c: c <= 0, ">=": lambda c: c >= 0,
+}
+
+
+def _compare(op: str, a: Any, b: Any) -> Any:
+    if a.__class__ is ExcelError:
+        return a
+    if b.__class__ is ExcelError:
+        return b
+    return _COMPARE[op](_cmp(a, b))
+
+
+def _elementwise(f: Callable[[str, Any, Any], Any], op: str, a: Any, b: Any) -> Any:
+    """2項演算。どちらかが配列（行のリスト）なら要素ごと（1x1 とスカラーは広げる）。"""
+    a_arr, b_arr = isinstance(a, list), isinstance(b, list)
+    if not a_arr and not b_arr:
+        return f(op, a, b)
+    if a_arr and b_arr and (len(a), len(a[0])) != (len(b), len(b[0])):
+        if len(a) == 1 and len(a[0]) == 1:
+            a = a[0][0]
+        elif len(b) == 1 and len(b[0]) == 1:
+            b = b[0][0]
+        else:
+            return VALUE
+    rows = len(a) if isinstance(a, list) else len(b)
+    cols = len(a[0]) if isinstance(a, list) else len(b[0])
+    return [
+        [f(op, a[i][j] if isinstance(a, list) else a, b[i][j] if isinstance(b, list) else b) for j in range(cols)]
+        for i in range(rows)
+    ]
+
+
+def _scalar(v: Any) -> Any:
+    """関数の引数のスカラー（1x1 の範囲は中身、それより大きい範囲は #VALUE!）。"""
+    if isinstance(v, list):
+        return v[0][0] if len(v) == 1 and len(v[0]) == 1 else VALUE
+    return v
+
+
+def _as_array(v: Any) -> List[List[Any]]:
+    return v if isinstance(v, list) else [[v]]
+
+
+# ===== 関数 =====
+
+def _fn_mod(n: Any, d: Any) -> Any:
+    n, d = _number(_scalar(n)), _number(_scalar(d))
+    for v in (n, d):
+        if v.__class__ is ExcelError:
+            return v
+    if d == 0:
+        return DIV0
+    return n - d * math.floor(n / d)
+
+
+def _fn_round(x: Any, digits: Any) -> Any:
+    x, digits = _number(_scalar(x)), _number(_scalar(digits))
+    for v in (x, digits):
+        if v.__class__ is ExcelError:
+            return v
+    return excel_round(x, int(digits))
+
+
+def _fn_index(arr: Any, r: Any, c: Any = 1) -> Any:
+    arr = _as_array(arr)
+    r, c = _number(_scalar(r)), _number(_scalar(c))
+    for v in (r, c):
+        if v.__class__ is ExcelError:
+            return v
+    r, c = int(r), int(c)
+    if not (1 <= r <= len(arr) and 1 <= c <= len(arr[0])):
+        return REF
+    return arr[r - 1][c - 1]
+
+
+def _lookup_position(x: Any, values: List[Any], approximate: bool) -> Optional[int]:
+    """昇順の values で x 以下の最後（approximate）か x と等しい最初の位置。無ければ None。"""
+    found = None
+    for i, v in enumerate(values):
+        if v is None or v.__class__ is ExcelError or _rank(v) != _rank(x):
+            continue
+        c = _cmp(v, x)
+        if approximate:
+            if c <= 0:
+                found = i
+        elif c == 0:
+            return i
+    return found
+
+
+def _fn_match(x: Any, arr: Any, match_type: Any = 1) -> Any:
+    x, match_type = _scalar(x), _number(_scalar(match_type))
+    for v in (x, match_type):
+        if v.__class__ is ExcelError:
+            return v
+    arr = _as_array(arr)
+    if len(arr) == 1:
+        values = arr[0]
+    elif all(len(row) == 1 for row in arr):
+        values = [row[0] for row in arr]
+    else:
+        return NA
+    if match_type not in (0, 1):
+        return VALUE  # -1（降順）はビルダーが使わない
+    if x is None:
+        x = 0
+    i = _lookup_position(x, values, match_type == 1)
+    return NA if i is None else i + 1
+
+
+def _fn_vlookup(x: Any, arr: Any, col: Any, approximate: Any = True) -> Any:
+    x, col = _scalar(x), _number(_scalar(col))
+    approximate = _truth(_scalar(approximate))
+    for v in (x, col, approximate):
+        if v.__class__ is ExcelError:
+            return v
+    arr = _as_array(arr)
+    col = int(col)
+    if col < 1:
+        return VALUE
+    if col > len(arr[0]):
+        return REF
+    if x is None:
+        x = 0
+    i = _lookup_position(x, [row[0] for row in arr], approximate)
+    return NA if i is None else arr[i][col - 1]
+
+
+def _fn_sumproduct(*arrays: Any) -> Any:
+    arrays = [_as_array(a) for a in arrays]
+    shape = (len(arrays[0]), len(arrays[0][0]))
+    if any((len(a), len(a[0])) != shape for a in arrays):
+        return VALUE
+    total = 0
+    for i in range(shape[0]):
+        for j in range(shape[1]):
+            p = 1
+            for a in arrays:
+                v = a[i][j]
+                cls = v.__class__
+                if cls is ExcelError:
+                    return v
+                # 配列の中の数値でない値（文字列・論理値・空）は 0 として扱う
+                p *= v if (cls is int or cls is float) else 0
+            total += p
+    return total
+
+
+# 引数の個数（最小, 最大）
+_FUNCTIONS: Dict[str, Tuple[Callable[..., Any], int, int]] = {
+    "MOD": (_fn_mod, 2, 2),
+    "ROUND": (_fn_round, 2, 2),
+    "INDEX": (_fn_index, 2, 3),
+    "MATCH": (_fn_match, 2, 3),
+    "VLOOKUP": (_fn_vlookup, 3, 4),
+    "SUMPRODUCT": (_fn_sumproduct, 1, 255),
+}
+# 引数を必要になってから評価する関数
+_LAZY_FUNCTIONS = {"IF": (2, 3), "IFERROR": (2, 2)}
+
+
+# ===== 構文解析（評価する関数をそのまま組み立てる）=====
+
+class _Parser:
+    def __init__(self, text: str, sheet: str):
+        self.text = text
+        self.sheet = sheet
+        self.tokens = _tokenize(text[1:] if text.startswith("=") else text)
+        self.pos = 0
+        self.cells: List[CellKey] = []
+        self.ranges: List[RangeKey] = []
+
+    def peek(self) -> Tuple[str, Any]:
+        return self.tokens[self.pos]
+
+    def take(self) -> Tuple[str, Any]:
+        tok = self.tokens[self.pos]
+        self.pos += 1
+        return tok
+
+    def expect(self, value: str) -> None:
+        kind, v = self.take()
+        if kind != "op" or v != value:
+            raise FormulaError(f"{value!r} が必要です: {self.text!r}")
+
+    def parse(self) -> Callable[["Workbook"], Any]:
+        fn = self.comparison()
+        if self.peek()[0] != "end":
+            raise FormulaError(f"対応していない書き方です（{self.peek()[1]!r}）: {self.text!r}")
+        return fn
+
+    def comparison(self):
+        left = self.additive()
+        while self.peek()[0] == "op" and self.peek()[1] in _COMPARE:
+            op = self.take()[1]
+            right = self.additive()
+            left = (lambda l, r, op: lambda wb: _elementwise(_compare, op, l(wb), r(wb)))(left, right, op)
+        return left
+
+    def additive(self):
+        left = self.term()
+        while self.peek() in (("op", "+"), ("op", "-")):
+            op = self.take()[1]
+            right = self.term()
+            left = (lambda l, r, op: lambda wb: _elementwise(_arith, op, l(wb), r(wb)))(left, right, op)
+        return left
+
+    def term(self):
+        left = self.unary()
+        while self.peek() in (("op", "*"), ("op", "/")):
+            op = self.take()[1]
+            right = self.unary()
+            left = (lambda l, r, op: lambda wb: _elementwise(_arith, op, l(wb), r(wb)))(left, right, op)
+        return left
+
+    def unary(self):
+        if self.peek() in (("op", "-"), ("op", "+")):
+            op = self.take()[1]
+            operand = self.unary()
+            return lambda wb: _elementwise(_arith, op, 0, operand(wb))
+        return self.primary()
+
+    def primary(self):
+        kind, v = self.take()
+        if kind == "num":
+            n = float(v)
+            if n.is_integer() and "." not in v and "e" not in v.lower():
+                n = int(v)
+            return lambda wb: n
+        if kind == "str":
+            s = v[1:-1].replace('""', '"')
+            return lambda wb: s
+        if kind == "bool":
+            b = v == "TRUE"
+            return lambda wb: b
+        if kind == "ref":
+            return self.reference(*v)
+        if kind == "func":
+            return self.call(v.upper())
+        if kind == "op" and v == "(":
+            inner = self.comparison()
+            self.expect(")")
+            return inner
+        raise FormulaError(f"対応していない書き方です（{v!r}）: {self.text!r}")
+
+    def reference(self, sheet: Optional[str], text: str):
+        if sheet is None:
+            sheet = self.sheet
+        else:
+            text = text[len(sheet) + 1:]
+            if sheet.startswith("'"):
+                sheet = sheet[1:-1].replace("''", "'")
+        if ":" in text:
+            (r1, c1), (r2, c2) = (parse_cell(part) for part in text.split(":"))
+            key = (sheet, min(r1, r2), min(c1, c2), max(r1, r2), max(c1, c2))
+            self.ranges.append(key)
+            return lambda wb: wb._range(key)
+        row, col = parse_cell(text)
+        cell = (sheet, row, col)
+        if cell not in self.cells:
+            self.cells.append(cell)
+        return lambda wb: wb._get(cell)
+
+    def call(self, name: str):
+        self.expect("(")
+        args = []
+        if self.peek() != ("op", ")"):
+            args.append(self.comparison())
+            while self.peek() == ("op", ","):
+                self.take()
+                args.append(self.comparison())
+        self.expect(")")
+        if name in _LAZY_FUNCTIONS:
+            lo, hi = _LAZY_FUNCTIONS[name]
+        elif name in _FUNCTIONS:
+            lo, hi = _FUNCTIONS[name][1:]
+        else:
+            raise FormulaError(f"対応していない関数です: {name}（{self.text!r}）")
+        if not lo <= len(args) <= hi:
+            raise FormulaError(f"{name} の引数の数が不正です: {self.text!r}")
+        if name == "IF":
+            cond, then = args[0], args[1]
+            otherwise = args[2] if len(args) > 2 else (lambda wb: False)
+
+            def fn_if(wb):
+                c = _truth(_scalar(cond(wb)))
+                if c.__class__ is ExcelError:
+                    return c
+                return then(wb) if c else otherwise(wb)
+            return fn_if
+        if name == "IFERROR":
+            value, fallback = args
+
+            def fn_iferror(wb):
+                v = value(wb)
+                return fallback(wb) if v.__class__ is ExcelError else v
+            return fn_iferror
+        f = _FUNCTIONS[name][0]
+        return lambda wb: f(*[a(wb) for a in args])
+
+
+def compile_formula(text: str, sheet: str) -> Formula:
+    """"=..." の数式をコンパイルする。sheet はシート名を省いた参照のシート。"""
+    p = _Parser(text, sheet)
+    fn = p.parse()
+    return Formula(text, fn, tuple(p.cells), tuple(p.ranges))
+
+
+def is_formula(value: Any) -> bool:
+    return isinstance(value, str) and value.startswith("=") and len(value) > 1
+
+
+# ===== ブック =====
+
+_MISSING = object()
+
+
+class Workbook:
+    """
+    シート名 → {(行, 列): 値 or "=数式"}。get() は数式を評価した値を返す。
+    数式セルの値は「そのセルが直接参照するセルの値の組」ごとに覚えておくので、set() で入力を変えながら
+    何度も評価しても、同じ組に対しては1回しか計算しない（範囲の中身は set() されたときだけ覚え直す）。
+    """
+
+    def __init__(self, sheets: Dict[str, Dict[Tuple[int, int], Any]]):
+        self.cells: Dict[CellKey, Any] = {
+            (name, r, c): v for name, cells in sheets.items() for (r, c), v in cells.items()
+        }
+        self.formulas: Dict[CellKey, Formula] = {
+            key: compile_formula(v, key[0]) for key, v in self.cells.items() if is_formula(v)
+        }
+        self._ranges = sorted({r for f in self.formulas.values() for r in f.ranges})
+        self._values: Dict[CellKey, Any] = {}
+        self._range_values: Dict[RangeKey, List[List[Any]]] = {}
+        self._memo: Dict[CellKey, Dict[tuple, Any]] = {key: {} for key in self.formulas}
+        self.evaluations = 0
+
+    def key(self, sheet: str, ref: str) -> CellKey:
+        row, col = parse_cell(ref)
+        return sheet, row, col
+
+    def set(self, sheet: str, ref: str, value: Any) -> None:
+        """入力セルの値を変える（数式セルは変えられない）。"""
+        key = self.key(sheet, ref)
+        if key in self.formulas:
+            raise ValueError(f"数式のセルには値を入れられません: {sheet}!{ref}")
+        self.cells[key] = value
+        self._values.clear()
+        s, r, c = key
+        if any(rs == s and r1 <= r <= r2 and c1 <= c <= c2 for rs, r1, c1, r2, c2 in self._ranges):
+            self._range_values.clear()
+            self._memo = {k: {} for k in self.formulas}
+
+    def get(self, sheet: str, ref: str) -> Any:
+        """セルの値（数式なら評価した値）。"""
+        return self._get(self.key(sheet, ref))
+
+    def _get(self, key: CellKey) -> Any:
+        v = self._values.get(key, _MISSING)
+        if v is not _MISSING:
+            return v
+        f = self.formulas.get(key)
+        if f is None:
+            v = self.cells.get(key)
+            return None if v == "" else v
+        args = tuple(self._get(k) for k in f.cells)
+        # TRUE と 1 を同じ組にしないよう型も含める
+        memo_key = tuple((a.__class__, a) for a in args)
+        memo = self._memo[key]
+        v = memo.get(memo_key, _MISSING)
+        if v is _MISSING:
+            self.evaluations += 1
+            v = f.fn(self)
+            if v is None:
+                v = 0
+            memo[memo_key] = v
+        self._values[key] = v
+        return v
+
+    def _range(self, key: RangeKey) -> List[List[Any]]:
+        v = self._range_values.get(key)
+        if v is None:
+            sheet, r1, c1, r2, c2 = key
+            v = [[self._get((sheet, r, c)) for c in range(c1, c2 + 1)] for r in range(r1, r2 + 1)]
+            self._range_values[key] = v
+        return v
@@ -0,0 +1,256 @@
+# -*- coding: utf-8 -*-
+"""
+価格表スナップショット — 常駐プロセス用。曲げ価格表（bending_price_table.csv）・曲げロジック
+（data/bending_logic.json）・穴あけ単価（data/hole_prices.json）を1つの読み取り専用の TableSnapshot にまとめ、
+TableStore が参照の差し替え1回で公開する。
+
+  store = TableStore()
+  store.start_polling(2.0)       # 裏のスレッドがファイルの変更を見て作り直す
+  snap = store.current()         # ロックなし。1件の見積もりの間はこの snap を使い続ける
+  result = snap.estimate(...)    # result["_version"] にどの表で計算したかが入る
+
+読む側はロックを取らない。作り直しは裏で新しいスナップショットを最後まで組み立ててから
+self._snapshot に代入するだけなので、読む側には古い表か新しい表のどちらかが丸ごと見える。
+読み込みに失敗したとき（書きかけの JSON など）は前の表を使い続け、ファイルがまた変わったらやり直す。
+"""
+
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import bending_logic  # noqa: E402
+import calc_bending  # noqa: E402
+import hole_table  # noqa: E402
+
+DEFAULT_HOLE_PRICES_PATH = hole_table.DEFAULT_HOLE_PRICES_PATH
+
+
+class TableSnapshot(NamedTuple):
+    """
+    ある時点の価格表一式（読み取り専用）。
+    version は3ファイルの内容（sha256）から作る12桁の16進数で、内容が同じなら別プロセスでも同じ値になる。
+    generation はこのプロセスで公開した順番（1から）。sources はファイル名 → sha256。
+    """
+
+    price: calc_bending.PriceTable
+    logic: bending_logic.CompiledLogic
+    holes: hole_table.HoleTable
+    version: str
+    generation: int
+    loaded_at: float
+    sources: Dict[str, str]
+
+    def estimate(
+        self,
+        shape: str,
+        weight_kg: float,
+        length_mm: float,
+        long_side_mm: float,
+        lot: int,
+        thickness_mm: float,
+        punch_count: int = 0,
+        pierce_count: int = 0,
+        nakagoshi: bool = False,
+        reverse_bend: bool = False,
+        meoshi_long: bool = False,
+        fukabend: bool = False,
+        tax_rate: float = 0.1,
+        holes: Optional[List[Dict[str, Any]]] = None,
+        hole_gap: str = "error",
+    ) -> Dict[str, Any]:
+        """calc_bending.estimate() と同じ計算をこのスナップショットの表（穴あけ単価表も）で行い、_version を付ける。"""
+        result = calc_bending.estimate_result(
+            shape, weight_kg, length_mm, long_side_mm, lot, thickness_mm, punch_count, pierce_count,
+            nakagoshi, reverse_bend, meoshi_long, fukabend, tax_rate=tax_rate, table=self.price,
+            holes=holes, hole_gap=hole_gap, hole_prices=self.holes,
+        ).to_dict()
+        result["_version"] = self.version
+        return result
+
+    def calc_bending_v3(self, shape: Optional[str], thickness_mm: float, weight_kg: float, length_mm: float, bends: Optional[int] = None) -> Dict[str, Any]:
+        """bending_logic.calc_bending_v3() をこのスナップショットのロジックで計算し、_version を付ける。"""
+        result = bending_logic.calc_bending_v3(shape, thickness_mm, weight_kg, length_mm, bends, logic=self.logic)
+        result["_version"] = self.version
+        return result
+
+    def info(self) -> Dict[str, Any]:
+        return {
+            "version": self.version,
+            "generation": self.generation,
+            "loaded_at": self.loaded_at,
+            "sources": dict(self.sources),
+        }
+
+
+def _read(path: str) -> Tuple[bytes, str]:
+    with open(path, "rb") as f:
+        raw = f.read()
+    return raw, hashlib.sha256(raw).hexdigest()
+
+
+def _signature(paths) -> Tuple[Tuple[int, int], ...]:
+    """各ファイルの (mtime_ns, size)。変更の確認に使う。"""
+    out = []
+    for p in paths:
+        st = os.stat(p)
+        out.append((st.st_mtime_ns, st.st_size))
+    return tuple(out)
+
+
+class TableStore:
+    """
+    最新の TableSnapshot を持ち、ファイルが変わったら作り直して差し替える。
+    current() はロックを取らない（属性の読み出し1回）。reload() / poll() は書く側同士だけ直列にする。
+    """
+
+    def __init__(self, price_path: Optional[str] = None, logic_path: Optional[str] = None, holes_path: Optional[str] = None):
+        self.paths = {
+            "price": os.path.abspath(price_path or calc_bending.DEFAULT_TABLE_PATH),
+            "logic": os.path.abspath(logic_path or bending_logic.DEFAULT_LOGIC_PATH),
+            "holes": os.path.abspath(holes_path or DEFAULT_HOLE_PRICES_PATH),
+        }
+        self._write_lock = threading.Lock()
+        self._signature: Optional[tuple] = None
+        self._failed_signature: Optional[tuple] = None
+        self._snapshot: Optional[TableSnapshot] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self.reloads = 0
+        self.errors = 0
+        self.last_error: Optional[str] = None
+        self.reload()
+
+    def current(self) -> TableSnapshot:
+        """いま公開中のスナップショット。"""
+        return self._snapshot
+
+    def _build(self, prev: Optional[TableSnapshot]) -> TableSnapshot:
+        """3ファイルを読んで新しいスナップショットを作る。内容が変わっていない部分は前のものを使い回す。"""
+        price_raw, price_sha = _read(self.paths["price"])
+        logic_raw, logic_sha = _read(self.paths["logic"])
+        holes_raw, holes_sha = _read(self.paths["holes"])
+
+        if prev is not None and prev.sources["price"] == price_sha:
+            # 曲げ工賃のキャッシュもそのまま引き継ぐ（キーは価格表の中身だけで決まる）
+            price = prev.price
+        else:
+            price = calc_bending.PriceTable(calc_bending._parse_price_rows(price_raw.decode("utf-8").splitlines()), price_sha)
+        if prev is not None and prev.sources["logic"] == logic_sha:
+            logic = prev.logic
+        else:
+            logic = bending_logic.CompiledLogic(json.loads(logic_raw.decode("utf-8")))
+        if prev is not None and prev.sources["holes"] == holes_sha:
+            holes = prev.holes
+        else:
+            holes = hole_table.HoleTable(json.loads(holes_raw.decode("utf-8"))["穴あけ単価"], holes_sha)
+
+        sources = {"price": price_sha, "logic": logic_sha, "holes": holes_sha}
+        version = hashlib.sha256("".join(sources[k] for k in ("price", "logic", "holes")).encode()).hexdigest()[:12]
+        return TableSnapshot(
+            price=price, logic=logic, holes=holes, version=version,
+            generation=(prev.generation + 1) if prev is not None else 1,
+            loaded_at=time.time(), sources=sources,
+        )
+
+    def reload(self, force: bool = False) -> bool:
+        """
+        ファイルの mtime・サイズが変わっていれば作り直して公開する。内容が同じ（touch だけ）なら差し替えない。
+        公開したら True。読み込みに失敗したら、最初の読み込みなら例外、2回目以降は前の表のまま False。
+        """
+        with self._write_lock:
+            sig = _signature(self.paths.values())
+            if not force and (sig == self._signature or sig == self._failed_signature):
+                return False
+            prev = self._snapshot
+            try:
+                snap = self._build(prev)
+            except (OSError, ValueError, KeyError, TypeError) as e:
+                if prev is None:
+                    raise
+                # 同じ状態のファイルでは何度も読み直さない（もう一度変更されたらやり直す）
+                self._failed_signature = sig
+                self.errors += 1
+                self.last_error = f"{type(e).__name__}: {e}"
+                return False
+            self._signature = sig
+            self._failed_signature = None
+            self.last_error = None
+            if prev is not None and snap.version == prev.version:
+                return False
+            self._snapshot = snap
+            self.reloads += 1
+            return True
+
+    def poll(self) -> bool:
+        """reload() と同じ。stat に失敗したとき（置き換え中でファイルが一瞬ない等）は何もしない。"""
+        try:
+            return self.reload()
+        except OSError as e:
+            self.errors += 1
+            self.last_error = f"{type(e).__name__}: {e}"
+            return False
+
+    def start_polling(self, interval_s: float = 2.0) -> None:
+        """interval_s 秒ごとに poll() する daemon スレッドを始める。"""
+        if self._thread is not None:
+            return
+        self._stop.clear()
+
+        def run():
+            while not self._stop.wait(interval_s):
+                self.poll()
+
+        self._thread = threading.Thread(target=run, name="table-snapshot-poll", daemon=True)
+        self._thread.start()
+
+    def stop_polling(self) -> None:
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+
+    def stats(self) -> Dict[str, Any]:
+        snap = self._snapshot
+        return {
+            **snap.info(),
+            "paths": dict(self.paths),
+            "reloads": self.reloads,
+            "errors": self.errors,
+            "last_error": self.last_error,
+            "polling": self._thread is not None,
+        }
+
+
+def main():
+    import argparse
+    p = argparse.ArgumentParser(description="価格表スナップショットの版を表示（--watch で変更を監視）")
+    p.add_argument("--csv", default=None, help="bending_price_table.csv のパス")
+    p.add_argument("--logic", default=None, help="bending_logic.json のパス")
+    p.add_argument("--holes", default=None, help="hole_prices.json のパス")
+    p.add_argument("--watch", type=float, default=None, metavar="SECONDS", help="指定秒ごとに確認し、変わるたびに表示")
+    args = p.parse_args()
+    store = TableStore(args.csv, args.logic, args.holes)
+    print(json.dumps(store.stats(), ensure_ascii=False), flush=True)
+    if args.watch is None:
+        return 0
+    try:
+        while True:
+            time.sleep(args.watch)
+            if store.poll():
+                print(json.dumps(store.stats(), ensure_ascii=False), flush=True)
+            elif store.last_error:
+                print(f"読み込み失敗（前の表のまま）: {store.last_error}", file=sys.stderr, flush=True)
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())